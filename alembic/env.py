@@ -64,8 +64,11 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
+        # one transaction per revision: a long revision (e.g. a backfill, see
+        # repository/backfill.py) does not hold the locks of the earlier ones
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata,
+            transaction_per_migration=True,
         )
 
         with context.begin_transaction():
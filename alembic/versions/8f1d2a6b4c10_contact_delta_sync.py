@@ -0,0 +1,71 @@
+"""contact delta sync
+
+Revision ID: 8f1d2a6b4c10
+Revises: 3c95eac7caec
+Create Date: 2026-10-19 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f1d2a6b4c10'
+down_revision: Union[str, None] = '3c95eac7caec'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('change_seq', sa.BigInteger(), nullable=True))
+    op.create_index('ix_contacts_owner_change_seq', 'contacts', ['owner_id', 'change_seq'])
+
+    op.create_table(
+        'contact_tombstones',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('contact_id', sa.Integer(), nullable=False),
+        sa.Column('owner_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('change_seq', sa.BigInteger(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_contact_tombstones_owner_change_seq', 'contact_tombstones', ['owner_id', 'change_seq'])
+    op.create_index('ix_contact_tombstones_deleted_at', 'contact_tombstones', ['deleted_at'])
+
+    op.create_table(
+        'contact_sync_state',
+        sa.Column('owner_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('last_seq', sa.BigInteger(), nullable=False),
+        sa.Column('compacted_seq', sa.BigInteger(), nullable=False),
+    )
+
+    # Number existing contacts per owner so that the first sync returns them.
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("""
+            UPDATE contacts AS c SET change_seq = numbered.seq
+            FROM (SELECT id, row_number() OVER (PARTITION BY owner_id ORDER BY id) AS seq
+                  FROM contacts WHERE owner_id IS NOT NULL) AS numbered
+            WHERE c.id = numbered.id
+        """)
+    else:
+        op.execute("""
+            UPDATE contacts SET change_seq = (
+                SELECT COUNT(*) FROM contacts AS c2
+                WHERE c2.owner_id = contacts.owner_id AND c2.id <= contacts.id)
+            WHERE owner_id IS NOT NULL
+        """)
+    op.execute("""
+        INSERT INTO contact_sync_state (owner_id, last_seq, compacted_seq)
+        SELECT owner_id, MAX(change_seq), 0 FROM contacts
+        WHERE owner_id IS NOT NULL GROUP BY owner_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('contact_sync_state')
+    op.drop_index('ix_contact_tombstones_deleted_at', table_name='contact_tombstones')
+    op.drop_index('ix_contact_tombstones_owner_change_seq', table_name='contact_tombstones')
+    op.drop_table('contact_tombstones')
+    op.drop_index('ix_contacts_owner_change_seq', table_name='contacts')
+    op.drop_column('contacts', 'change_seq')
@@ -0,0 +1,51 @@
+"""sqlite contact search
+
+Revision ID: a7c4e2f19b38
+Revises: f5a3c1d8e926
+Create Date: 2026-10-19 17:25:31.904127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c4e2f19b38'
+down_revision: Union[str, None] = 'f5a3c1d8e926'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# copied rather than imported from contactpr.models, so the migration keeps working when the model changes
+CONTACTS_FTS_DDL = (
+    "CREATE VIRTUAL TABLE contacts_fts USING fts5("
+    "first_name, last_name, email, content='contacts', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER contacts_fts_insert AFTER INSERT ON contacts BEGIN "
+    "INSERT INTO contacts_fts(rowid, first_name, last_name, email) "
+    "VALUES (new.id, new.first_name, new.last_name, new.email); END",
+    "CREATE TRIGGER contacts_fts_delete AFTER DELETE ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.email); END",
+    "CREATE TRIGGER contacts_fts_update AFTER UPDATE OF first_name, last_name, email ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.email); "
+    "INSERT INTO contacts_fts(rowid, first_name, last_name, email) "
+    "VALUES (new.id, new.first_name, new.last_name, new.email); END",
+)
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for statement in CONTACTS_FTS_DDL:
+        op.execute(statement)
+    op.execute("INSERT INTO contacts_fts(contacts_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for trigger in ('contacts_fts_update', 'contacts_fts_delete', 'contacts_fts_insert'):
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    op.execute("DROP TABLE IF EXISTS contacts_fts")
@@ -0,0 +1,31 @@
+"""cache generations
+
+Revision ID: a9d3e5f72c18
+Revises: f7a2c4e9d160
+Create Date: 2026-10-19 23:05:17.204561
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9d3e5f72c18'
+down_revision: Union[str, None] = 'f7a2c4e9d160'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'cache_generations',
+        sa.Column('scope', sa.String(length=64), nullable=False),
+        sa.Column('generation', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('scope'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('cache_generations')
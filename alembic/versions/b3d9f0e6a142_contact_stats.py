@@ -0,0 +1,53 @@
+"""contact stats
+
+Revision ID: b3d9f0e6a142
+Revises: a7c4e2f19b38
+Create Date: 2026-10-19 18:48:12.660871
+
+"""
+from collections import Counter
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3d9f0e6a142'
+down_revision: Union[str, None] = 'a7c4e2f19b38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    stats = op.create_table(
+        'contact_stats',
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=16), nullable=False),
+        sa.Column('bucket', sa.String(length=255), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('owner_id', 'kind', 'bucket'),
+    )
+    # initial counts; later drift is repaired by the reconcile job
+    counts = Counter()
+    rows = op.get_bind().execute(sa.text(
+        "SELECT owner_id, email, birthday FROM contacts WHERE owner_id IS NOT NULL AND deleted_at IS NULL"))
+    for owner_id, email, birthday in rows:
+        counts[(owner_id, 'total', '')] += 1
+        if birthday is not None:
+            month = birthday.month if hasattr(birthday, 'month') else int(str(birthday)[5:7])
+            counts[(owner_id, 'birth_month', f"{month:02d}")] += 1
+        if email and '@' in email:
+            domain = email.rsplit('@', 1)[1].strip().lower()[:255]
+            if domain:
+                counts[(owner_id, 'email_domain', domain)] += 1
+    if counts:
+        op.bulk_insert(stats, [
+            {'owner_id': owner_id, 'kind': kind, 'bucket': bucket, 'count': count}
+            for (owner_id, kind, bucket), count in counts.items()
+        ])
+
+
+def downgrade() -> None:
+    op.drop_table('contact_stats')
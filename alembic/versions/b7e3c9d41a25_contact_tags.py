@@ -0,0 +1,40 @@
+"""contact tags
+
+Revision ID: b7e3c9d41a25
+Revises: 8f1d2a6b4c10
+Create Date: 2026-10-19 11:02:17.530912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e3c9d41a25'
+down_revision: Union[str, None] = '8f1d2a6b4c10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'tags',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('owner_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('name', sa.String(50), nullable=False),
+        sa.UniqueConstraint('owner_id', 'name', name='uq_tags_owner_name'),
+    )
+    op.create_table(
+        'contact_tags',
+        sa.Column('contact_id', sa.Integer(), sa.ForeignKey('contacts.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('tag_id', sa.Integer(), sa.ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True),
+    )
+    op.create_index('ix_contact_tags_tag_id', 'contact_tags', ['tag_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contact_tags_tag_id', table_name='contact_tags')
+    op.drop_table('contact_tags')
+    op.drop_table('tags')
@@ -0,0 +1,40 @@
+"""contact birthday ordinal
+
+Revision ID: c8e5a1f04b7d
+Revises: b3d9f0e6a142
+Create Date: 2026-10-19 19:52:37.418206
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from repository.backfill import CONTACT_BIRTHDAY_ORDINAL, checkpoints, run_in_migration
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8e5a1f04b7d'
+down_revision: Union[str, None] = 'b3d9f0e6a142'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LIVE = sa.text('deleted_at IS NULL')
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('birthday_ordinal', sa.Integer(), nullable=True))
+    # chunked and checkpointed outside the migration transaction, see repository/backfill.py
+    run_in_migration(op, CONTACT_BIRTHDAY_ORDINAL)
+    with op.get_context().autocommit_block():
+        # CONCURRENTLY does not block contact writes while PostgreSQL builds the index
+        op.create_index('ix_contacts_owner_birthday_ordinal', 'contacts', ['owner_id', 'birthday_ordinal'],
+                        postgresql_where=LIVE, sqlite_where=LIVE, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_owner_birthday_ordinal', table_name='contacts')
+    op.drop_column('contacts', 'birthday_ordinal')
+    if not op.get_context().as_sql and sa.inspect(op.get_bind()).has_table('backfill_checkpoints'):
+        # a later upgrade must backfill again instead of resuming a finished run
+        op.execute(checkpoints.delete().where(checkpoints.c.name == CONTACT_BIRTHDAY_ORDINAL.name))
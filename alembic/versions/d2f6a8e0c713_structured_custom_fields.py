@@ -0,0 +1,77 @@
+"""structured custom fields
+
+Revision ID: d2f6a8e0c713
+Revises: b7e3c9d41a25
+Create Date: 2026-10-19 12:20:45.884301
+
+"""
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2f6a8e0c713'
+down_revision: Union[str, None] = 'b7e3c9d41a25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+json_type = sa.JSON().with_variant(postgresql.JSONB(), 'postgresql')
+
+
+def to_fields(value):
+    # keep in sync with contactpr.schemas.parse_custom_fields
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        parsed = None
+    return parsed if isinstance(parsed, dict) else {"note": value}
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('custom_fields', json_type, nullable=True))
+
+    connection = op.get_bind()
+    contacts = sa.table('contacts', sa.column('id', sa.Integer), sa.column('additional_data', sa.String),
+                        sa.column('custom_fields', json_type))
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(contacts.c.id, contacts.c.additional_data)
+            .where(contacts.c.id > last_id, contacts.c.additional_data.isnot(None))
+            .order_by(contacts.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        connection.execute(
+            contacts.update().where(contacts.c.id == sa.bindparam('row_id')).values(custom_fields=sa.bindparam('fields')),
+            [{'row_id': row.id, 'fields': to_fields(row.additional_data)} for row in rows],
+        )
+        last_id = rows[-1].id
+
+    with op.batch_alter_table('contacts') as batch:
+        batch.drop_column('additional_data')
+        batch.alter_column('custom_fields', new_column_name='additional_data')
+
+    if connection.dialect.name == 'postgresql':
+        op.execute("CREATE INDEX ix_contacts_additional_data ON contacts USING gin (additional_data jsonb_path_ops)")
+
+
+def downgrade() -> None:
+    connection = op.get_bind()
+    if connection.dialect.name == 'postgresql':
+        op.execute("DROP INDEX ix_contacts_additional_data")
+    op.add_column('contacts', sa.Column('legacy_data', sa.String(), nullable=True))
+    contacts = sa.table('contacts', sa.column('additional_data', json_type), sa.column('legacy_data', sa.String))
+    if connection.dialect.name == 'postgresql':
+        op.execute("UPDATE contacts SET legacy_data = additional_data::text")
+    else:
+        connection.execute(contacts.update().values(legacy_data=contacts.c.additional_data))
+    with op.batch_alter_table('contacts') as batch:
+        batch.drop_column('additional_data')
+        batch.alter_column('legacy_data', new_column_name='additional_data')
@@ -0,0 +1,29 @@
+"""contact updated at
+
+Revision ID: d6a1e9c3f285
+Revises: c4f8b2d61e07
+Create Date: 2026-10-19 15:02:31.118406
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd6a1e9c3f285'
+down_revision: Union[str, None] = 'c4f8b2d61e07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    # existing contacts count as changed now, which gives them a stable DTSTAMP from here on
+    op.execute(sa.text("UPDATE contacts SET updated_at = :now").bindparams(now=datetime.utcnow()))
+
+
+def downgrade() -> None:
+    op.drop_column('contacts', 'updated_at')
@@ -0,0 +1,45 @@
+"""contact soft delete
+
+Revision ID: e41c07b9f5d2
+Revises: d2f6a8e0c713
+Create Date: 2026-10-19 13:41:09.270554
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e41c07b9f5d2'
+down_revision: Union[str, None] = 'd2f6a8e0c713'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LIVE = sa.text('deleted_at IS NULL')
+DELETED = sa.text('deleted_at IS NOT NULL')
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_contacts_owner_live', 'contacts', ['owner_id'],
+                    postgresql_where=LIVE, sqlite_where=LIVE)
+    op.create_index('ix_contacts_deleted_at', 'contacts', ['deleted_at'],
+                    postgresql_where=DELETED, sqlite_where=DELETED)
+    # email stays unique among live contacts only, so a deleted address can be reused
+    op.create_index('uq_contacts_email_live', 'contacts', ['email'], unique=True,
+                    postgresql_where=LIVE, sqlite_where=LIVE)
+    op.drop_index('ix_contacts_email', table_name='contacts')
+    op.create_index('ix_contacts_email', 'contacts', ['email'])
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM contact_tags WHERE contact_id IN (SELECT id FROM contacts WHERE deleted_at IS NOT NULL)")
+    op.execute("DELETE FROM contacts WHERE deleted_at IS NOT NULL")
+    op.drop_index('ix_contacts_email', table_name='contacts')
+    op.create_index('ix_contacts_email', 'contacts', ['email'], unique=True)
+    op.drop_index('uq_contacts_email_live', table_name='contacts')
+    op.drop_index('ix_contacts_deleted_at', table_name='contacts')
+    op.drop_index('ix_contacts_owner_live', table_name='contacts')
+    op.drop_column('contacts', 'deleted_at')
@@ -0,0 +1,49 @@
+"""refresh tokens
+
+Revision ID: f5a3c1d8e926
+Revises: e41c07b9f5d2
+Create Date: 2026-10-19 16:02:44.518310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5a3c1d8e926'
+down_revision: Union[str, None] = 'e41c07b9f5d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+REVOKED = sa.text('revoked_at IS NOT NULL')
+
+
+def upgrade() -> None:
+    op.create_table(
+        'refresh_tokens',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('family_id', sa.String(length=32), nullable=False),
+        sa.Column('token_hash', sa.String(length=64), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.Column('used_at', sa.DateTime(), nullable=True),
+        sa.Column('revoked_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_refresh_tokens_token_hash', 'refresh_tokens', ['token_hash'], unique=True)
+    op.create_index('ix_refresh_tokens_family_id', 'refresh_tokens', ['family_id'])
+    op.create_index('ix_refresh_tokens_expires_at', 'refresh_tokens', ['expires_at'])
+    op.create_index('ix_refresh_tokens_revoked_at', 'refresh_tokens', ['revoked_at'],
+                    postgresql_where=REVOKED, sqlite_where=REVOKED)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_refresh_tokens_revoked_at', table_name='refresh_tokens')
+    op.drop_index('ix_refresh_tokens_expires_at', table_name='refresh_tokens')
+    op.drop_index('ix_refresh_tokens_family_id', table_name='refresh_tokens')
+    op.drop_index('ix_refresh_tokens_token_hash', table_name='refresh_tokens')
+    op.drop_table('refresh_tokens')
@@ -0,0 +1,43 @@
+"""contact query indexes
+
+Revision ID: f7a2c4e9d160
+Revises: c8e5a1f04b7d
+Create Date: 2026-10-19 21:14:08.530917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7a2c4e9d160'
+down_revision: Union[str, None] = 'c8e5a1f04b7d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LIVE = sa.text('deleted_at IS NULL')
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        # upcoming birthdays of all owners (GET /contacts/birthdays/)
+        op.create_index('ix_contacts_birthday_ordinal_live', 'contacts', ['birthday_ordinal'],
+                        postgresql_where=LIVE, sqlite_where=LIVE, postgresql_concurrently=True)
+        # restoring a contact deletes its tombstone by contact id
+        op.create_index('ix_contact_tombstones_contact_id', 'contact_tombstones', ['contact_id'],
+                        postgresql_concurrently=True)
+        if op.get_bind().dialect.name == 'postgresql':
+            # ILIKE '%...%' contact search; SQLite uses the contacts_fts table instead
+            op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            op.execute("CREATE INDEX CONCURRENTLY ix_contacts_search_trgm ON contacts USING gin "
+                       "(first_name gin_trgm_ops, last_name gin_trgm_ops, email gin_trgm_ops) "
+                       "WHERE deleted_at IS NULL")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP INDEX ix_contacts_search_trgm")
+    op.drop_index('ix_contact_tombstones_contact_id', table_name='contact_tombstones')
+    op.drop_index('ix_contacts_birthday_ordinal_live', table_name='contacts')
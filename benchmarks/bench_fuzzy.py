@@ -0,0 +1,61 @@
+"""
+Latency benchmark of the fuzzy contact search on one large owner.
+
+Builds a contactpr.fuzzy.FuzzyIndex over synthetic contacts (names made of
+random syllables, so that there are many distinct and similar words) and
+times searches for existing names with one or two typos and for full names.
+
+Usage:
+    python -m benchmarks.bench_fuzzy [contacts] [queries]
+"""
+import random
+import statistics
+import sys
+import time
+from contactpr.fuzzy import FuzzyIndex
+
+SYLLABLES = ["ka", "lo", "mi", "ser", "an", "dr", "ol", "ek", "san", "ta", "na", "vo", "ry", "ko", "len", "ma",
+             "ri", "ia", "ste", "pan", "hor", "yu", "li", "dim", "tro", "vik", "bo", "zh", "ch", "en"]
+
+
+def name(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+
+
+def typo(rng: random.Random, word: str) -> str:
+    position = rng.randrange(len(word))
+    kind = rng.randrange(3)
+    if kind == 0:
+        return word[:position] + word[position + 1:]
+    if kind == 1 and position < len(word) - 1:
+        return word[:position] + word[position + 1] + word[position] + word[position + 2:]
+    return word[:position] + rng.choice("aeioukrstn") + word[position + 1:]
+
+
+def main(contacts: int = 100000, queries: int = 500):
+    rng = random.Random(42)
+    first_names = [name(rng) for _ in range(3000)]
+    last_names = [name(rng) for _ in range(20000)]
+    rows = [(i, rng.choice(first_names), rng.choice(last_names), f"c{i}@example.com", i)
+            for i in range(1, contacts + 1)]
+    started = time.perf_counter()
+    index = FuzzyIndex(rows)
+    print(f"build {contacts} contacts: {time.perf_counter() - started:.2f}s, {index.cost()} entries")
+
+    for label, make_query in (
+        ("exact last name", lambda row: row[2]),
+        ("last name, 1 typo", lambda row: typo(rng, row[2])),
+        ("full name, 1 typo each", lambda row: f"{typo(rng, row[1])} {typo(rng, row[2])}"),
+    ):
+        timings = []
+        for row in rng.sample(rows, queries):
+            query = make_query(row)
+            started = time.perf_counter()
+            index.search(query, 10)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        print(f"{label:<24} mean {statistics.mean(timings):6.2f} ms  p99 {timings[int(len(timings) * 0.99)]:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,66 @@
+"""
+Microbenchmark of per-query Python overhead: ad-hoc ``db.query(...).filter(...)``
+versus the pre-built statements in repository.queries.
+
+Runs against an in-memory SQLite database so that the measured time is
+dominated by SQLAlchemy's Python work (query construction, cache key
+generation, compilation lookup, result processing) rather than by I/O.
+
+Usage:
+    python -m benchmarks.bench_queries [iterations]
+"""
+import sys
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from contactpr import models
+from repository import queries
+
+
+def setup_session():
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add(models.User(id=1, email="owner@example.com", hashed_password="x"))
+    session.add_all(
+        models.Contact(id=i, first_name=f"First{i}", last_name=f"Last{i}", email=f"c{i}@example.com",
+                       phone_number=str(i), owner_id=1)
+        for i in range(1, 101)
+    )
+    session.commit()
+    return session
+
+
+def measure(label, func, iterations):
+    func()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    per_call = (time.perf_counter() - start) / iterations * 1e6
+    print(f"{label:<40} {per_call:8.1f} us/query")
+    return per_call
+
+
+def main(iterations: int = 20000):
+    db = setup_session()
+    cases = [
+        ("contact by id",
+         lambda: db.query(models.Contact).filter(models.Contact.id == 50).first(),
+         lambda: queries.contact_by_id(db, 50)),
+        ("user by email",
+         lambda: db.query(models.User).filter(models.User.email == "owner@example.com").first(),
+         lambda: queries.user_by_email(db, "owner@example.com")),
+        ("contacts by owner (100 rows)",
+         lambda: db.query(models.Contact).filter(models.Contact.owner_id == 1).all(),
+         lambda: queries.contacts_by_owner(db, 1)),
+    ]
+    for name, legacy, prebuilt in cases:
+        count = iterations if "rows" not in name else iterations // 10
+        before = measure(f"{name}: db.query", legacy, count)
+        after = measure(f"{name}: repository.queries", prebuilt, count)
+        print(f"{'':<40} {before / after:8.2f}x\n")
+        db.expunge_all()
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
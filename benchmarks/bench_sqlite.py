@@ -0,0 +1,117 @@
+"""
+Throughput benchmark of the embedded SQLite mode versus default SQLite and PostgreSQL.
+
+Every mode runs the same mixed workload from several threads for a fixed
+time: 80% contact reads by id, 10% searches and 10% contact inserts, each in
+its own session and transaction, as in a request. Compared are:
+
+* ``sqlite-default``: a file database with SQLAlchemy's and SQLite's defaults
+  (rollback journal, ``synchronous=FULL``, every writer contends for the lock);
+* ``sqlite-tuned``: contactpr.database.create_sqlite_engines (WAL,
+  ``synchronous=NORMAL``, mmap, writer queue plus reader pool);
+* ``postgresql``: only when a URL is given; it must point to a scratch
+  database, whose tables are created and dropped by the benchmark.
+
+Both SQLite modes search through the FTS5 index, which is part of the schema.
+
+Usage:
+    python -m benchmarks.bench_sqlite [seconds] [threads] [postgresql-url]
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from contactpr import models
+from contactpr.database import RoutingSession, create_sqlite_engines
+from repository import queries
+
+CONTACTS = 2000
+
+
+def populate(session_factory):
+    db = session_factory()
+    db.add(models.User(id=1, email="owner@example.com", hashed_password="x"))
+    db.add_all(
+        models.Contact(id=i, first_name=f"First{i}", last_name=f"Last{i}", email=f"c{i}@example.com",
+                       phone_number=str(i), owner_id=1)
+        for i in range(1, CONTACTS + 1)
+    )
+    db.commit()
+    db.close()
+
+
+def worker(session_factory, deadline, counts, lock):
+    done = errors = 0
+    rng = random.Random()
+    while time.perf_counter() < deadline:
+        db = session_factory()
+        try:
+            roll = rng.random()
+            if roll < 0.8:
+                queries.contact_by_id(db, rng.randint(1, CONTACTS))
+            elif roll < 0.9:
+                queries.search_contacts(db, f"Last{rng.randint(1, CONTACTS // 10)}")
+            else:
+                db.add(models.Contact(first_name="New", last_name="Contact", phone_number="0", owner_id=1,
+                                      email=f"{threading.get_ident()}-{time.perf_counter_ns()}@example.com"))
+                db.commit()
+            done += 1
+        except Exception:
+            db.rollback()
+            errors += 1
+        finally:
+            db.close()
+    with lock:
+        counts[0] += done
+        counts[1] += errors
+
+
+def run(label, session_factory, seconds, threads):
+    counts, lock = [0, 0], threading.Lock()
+    deadline = time.perf_counter() + seconds
+    pool = [threading.Thread(target=worker, args=(session_factory, deadline, counts, lock)) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    print(f"{label:<16} {counts[0] / seconds:10.0f} ops/s {counts[1]:8d} errors")
+
+
+def main(seconds: float = 5, threads: int = 8, postgresql_url: str = ""):
+    seconds, threads = float(seconds), int(threads)
+    with tempfile.TemporaryDirectory() as directory:
+        url = f"sqlite:///{os.path.join(directory, 'default.db')}"
+        engine = create_engine(url, connect_args={"check_same_thread": False})
+        models.Base.metadata.create_all(engine)
+        factory = sessionmaker(bind=engine)
+        populate(factory)
+        run("sqlite-default", factory, seconds, threads)
+        engine.dispose()
+
+        url = f"sqlite:///{os.path.join(directory, 'tuned.db')}"
+        writer, reader = create_sqlite_engines(url, threads, 30)
+        models.Base.metadata.create_all(writer)
+        factory = sessionmaker(class_=RoutingSession, bind=writer, reader=reader)
+        populate(factory)
+        run("sqlite-tuned", factory, seconds, threads)
+        writer.dispose()
+        reader.dispose()
+
+    if postgresql_url:
+        engine = create_engine(postgresql_url, pool_size=threads)
+        models.Base.metadata.create_all(engine)
+        try:
+            factory = sessionmaker(bind=engine)
+            populate(factory)
+            run("postgresql", factory, seconds, threads)
+        finally:
+            models.Base.metadata.drop_all(engine)
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -1,29 +1,137 @@
-from pydantic import BaseSettings
-
-class Settings(BaseSettings):
-    sqlalchemy_database_url: str
-    secret_key: str
-    algorithm: str
-    mail_username: str
-    mail_password: str
-    mail_from: str
-    mail_port: int
-    mail_server: str
-    mail_from_name: str
-    mail_starttls: bool
-    mail_ssl_tls: bool
-    use_credentials: bool
-    validate_certs: bool
-    template_folder: str
-    access_token_expire_minutes: int
-    cloudinary_name: str
-    cloudinary_api_key: str
-    cloudinary_api_secret: str
-
-
-    class Config:
-        env_file = ".env"
-        env_file_encoding = "utf-8"
-
-
-settings = Settings()
+from pydantic import BaseSettings
+
+class Settings(BaseSettings):
+    sqlalchemy_database_url: str
+    secret_key: str
+    algorithm: str
+    mail_username: str
+    mail_password: str
+    mail_from: str
+    mail_port: int
+    mail_server: str
+    mail_from_name: str
+    mail_starttls: bool
+    mail_ssl_tls: bool
+    use_credentials: bool
+    validate_certs: bool
+    template_folder: str
+    access_token_expire_minutes: int
+    cloudinary_name: str
+    cloudinary_api_key: str
+    cloudinary_api_secret: str
+    admin_emails: str = ""
+
+    # Refresh tokens (see repository/refresh_tokens.py, contactpr/revocation.py)
+    refresh_token_expire_days: int = 30
+    refresh_token_cleanup_interval_seconds: int = 3600
+    revocation_filter_capacity: int = 100000
+    revocation_filter_error_rate: float = 0.001
+    # with several workers and no events Redis, how often a worker checks for revocations in others
+    revocation_poll_seconds: float = 1.0
+
+    # Production server (see server.py)
+    web_concurrency: int = 0
+    web_host: str = "0.0.0.0"
+    web_port: int = 8000
+    web_backlog: int = 2048
+    web_keepalive: int = 5
+    web_graceful_timeout: int = 30
+    web_preload: bool = True
+    # set by server.py; with several workers and no Redis, caches check generations in the database
+    web_workers: int = 1
+
+    # Database connection pool
+    db_max_connections: int = 100
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: int = 30
+    db_prepare_threshold: int = 5
+
+    # Embedded SQLite mode, used for on-disk sqlite:/// URLs (see contactpr/database.py)
+    sqlite_reader_pool_size: int = 4
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_cache_size_kib: int = 64 * 1024
+    sqlite_busy_timeout_ms: int = 5000
+
+    # Contact change stream (SSE / WebSocket)
+    events_redis_url: str = ""
+    events_buffer_size: int = 100
+    events_heartbeat_seconds: int = 15
+
+    # Birthday calendar feed
+    ical_cache_max_feeds: int = 10000
+
+    # Contact name autocomplete
+    autocomplete_max_entries: int = 2000000
+    autocomplete_max_scan: int = 2000
+
+    # Typo-tolerant and phonetic contact search (see contactpr/fuzzy.py)
+    fuzzy_index_max_entries: int = 2000000
+
+    # Contact tag filtering
+    tags_index_max_entries: int = 5000000
+
+    # Soft delete and maintenance jobs
+    contacts_undo_window_hours: int = 72
+    contacts_purge_interval_seconds: int = 600
+    contacts_purge_batch_size: int = 500
+    contacts_purge_pause_seconds: float = 0.2
+    contacts_purge_max_batches: int = 200
+    sync_tombstone_retention_days: int = 30
+    sync_compaction_interval_seconds: int = 3600
+    stats_reconcile_interval_seconds: int = 3600
+    stats_reconcile_batch_size: int = 200
+    stats_reconcile_pause_seconds: float = 0.1
+
+    # Online backfills run from the command line (see repository/backfill.py); 0 disables a limit
+    backfill_chunk_size: int = 1000
+    backfill_target_chunk_seconds: float = 0.5
+    backfill_pause_seconds: float = 0.05
+    backfill_max_replication_lag_seconds: float = 5.0
+    backfill_max_active_queries: int = 0
+
+    # Idempotency-Key handling (see contactpr/idempotency.py)
+    idempotency_redis_url: str = ""
+    idempotency_ttl_seconds: int = 24 * 3600
+    idempotency_lock_seconds: int = 60
+    idempotency_wait_seconds: float = 10.0
+
+    # Batch endpoint
+    batch_max_requests: int = 20
+
+    # Tracing (requires opentelemetry-sdk, see contactpr/tracing.py)
+    tracing_enabled: bool = False
+    tracing_exporter: str = "file"
+    tracing_file: str = "traces.jsonl"
+    tracing_otlp_endpoint: str = ""
+    tracing_sample_ratio: float = 0.05
+    tracing_service_name: str = "contacts-api"
+
+    # On-demand sampling profiler (admin only, see contactpr/profiler.py)
+    profiler_max_seconds: int = 60
+    profiler_max_requests: int = 10000
+
+    # Admission control and load shedding, per worker (see contactpr/admission.py)
+    admission_enabled: bool = True
+    admission_target_latency_ms: int = 250
+    admission_max_concurrency: int = 64
+    admission_queue_size: int = 128
+    admission_expensive_target_latency_ms: int = 1000
+    admission_expensive_max_concurrency: int = 8
+    admission_expensive_queue_size: int = 16
+    admission_queue_timeout_seconds: float = 2.0
+
+    # Contact query cache
+    cache_redis_url: str = ""
+    cache_max_bytes: int = 64 * 1024 * 1024
+    cache_ttl_seconds: int = 300
+    # how long a worker reuses generations read from the database (see contactpr/cache.py)
+    cache_generation_ttl_seconds: float = 1.0
+    singleflight_timeout_seconds: float = 5.0
+
+    class Config:
+        env_file = ".env"
+        env_file_encoding = "utf-8"
+
+
+settings = Settings()
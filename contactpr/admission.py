@@ -0,0 +1,309 @@
+"""
+Admission control: per-route-class concurrency limits and load shedding.
+
+Without it, a slow database lets requests pile up in the worker until all of
+them time out together, and expensive routes (search, birthdays, signup)
+starve the cheap ones. Every HTTP request is classified by method and path
+into a route class with its own AdaptiveLimiter:
+
+* The concurrency limit of a class adapts with AIMD: it grows by about one
+  per round of requests finishing within the class's target latency and is
+  multiplied by ``BACKOFF`` when a request is slower or fails with a 5xx, at
+  most once per target latency.
+* Requests above the limit wait in a bounded queue. Authenticated reads
+  (GET/HEAD with an Authorization header) are served first and may push an
+  anonymous or writing request out of a full queue.
+* Requests that find the queue full, or wait longer than
+  ``settings.admission_queue_timeout_seconds``, get an immediate 503 with a
+  ``Retry-After`` header instead of adding to the backlog.
+
+Limits are per worker process. Websockets, the event stream and /admin/
+routes are not limited. Neither is POST /batch itself: each of its
+sub-requests passes the middleware again and is admitted on its own route
+class, so a batch never runs more reads of a class than its limit allows.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import re
+import time
+from typing import Dict, List, Optional
+from contactpr import metrics
+from config import settings
+
+BACKOFF = 0.9
+AUTHENTICATED_READ = 0
+OTHER = 1
+
+EXPENSIVE_ROUTES = {
+    ("GET", "/contacts/"),
+    ("GET", "/contacts/search/"),
+    ("GET", "/contacts/search/fuzzy/"),
+    ("GET", "/contacts/birthdays/"),
+    ("POST", "/signup"),
+    ("POST", "/login"),
+}
+EXEMPT = re.compile(r"^/(admin/|contacts/stream/|batch$)")
+
+
+class Overloaded(Exception):
+    """
+    Raised when a request is shed instead of admitted.
+    """
+
+
+def route_class(method: str, path: str) -> Optional[str]:
+    """
+    Classifies a request.
+
+    Args:
+        method (str): HTTP method.
+        path (str): Request path.
+
+    Returns:
+        str, optional: "expensive" or "default"; None for requests that are not limited.
+    """
+    if EXEMPT.match(path):
+        return None
+    if (method, path) in EXPENSIVE_ROUTES or path.startswith("/calendar/"):
+        return "expensive"
+    return "default"
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit with a bounded priority queue, for one route class.
+
+    Runs on the event loop of its worker, so it needs no locking.
+
+    Args:
+        name (str): Route class name, used in the metrics.
+        target_latency (float): Seconds above which a request counts as a sign of overload.
+        max_limit (int): Upper bound of the concurrency limit, also its initial value.
+        queue_size (int): Number of requests allowed to wait for a slot.
+        queue_timeout (float): Seconds a request may wait before it is shed.
+        min_limit (int): Lower bound of the concurrency limit.
+        clock (Callable[[], float]): Monotonic clock.
+    """
+
+    def __init__(self, name: str, target_latency: float, max_limit: int, queue_size: int, queue_timeout: float,
+                 min_limit: int = 1, clock=time.monotonic):
+        self.name = name
+        self.target_latency = target_latency
+        self.max_limit = max_limit
+        self.min_limit = min(min_limit, max_limit)
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.clock = clock
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.shed = 0
+        self.latency = 0.0
+        self._waiters: List[list] = []
+        self._sequence = itertools.count()
+        self._last_decrease = float("-inf")
+
+    def _has_slot(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    async def acquire(self, priority: int = OTHER) -> None:
+        """
+        Waits for a slot.
+
+        Args:
+            priority (int): AUTHENTICATED_READ or OTHER; lower values are served first.
+
+        Raises:
+            Overloaded: The queue is full, the request was pushed out of it or waited too long.
+        """
+        if self._has_slot() and not self.queued:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+        if self.queued >= self.queue_size and not self._evict(priority):
+            self.shed += 1
+            raise Overloaded()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [priority, next(self._sequence), future])
+        self.queued += 1
+        try:
+            await asyncio.wait({future}, timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            # the client went away while waiting
+            if not future.done():
+                future.cancel()
+                self.queued -= 1
+            elif future.exception() is None:
+                self.in_flight -= 1
+                self._grant()
+            raise
+        if not future.done():
+            future.cancel()
+            self.queued -= 1
+            self.shed += 1
+            raise Overloaded()
+        if future.exception() is not None:
+            raise Overloaded()
+        self.admitted += 1
+
+    def _evict(self, priority: int) -> bool:
+        # pushes the newest waiter of a lower priority out of a full queue
+        waiting = [entry for entry in self._waiters if not entry[2].done() and entry[0] > priority]
+        if not waiting:
+            return False
+        victim = max(waiting, key=lambda entry: (entry[0], entry[1]))
+        victim[2].set_exception(Overloaded())
+        self.queued -= 1
+        self.shed += 1
+        return True
+
+    def release(self, latency: float, failed: bool = False) -> None:
+        """
+        Frees the slot of a finished request, adapts the limit and admits waiting requests.
+
+        Args:
+            latency (float): Seconds the request took.
+            failed (bool): Whether it ended with an error (5xx or exception).
+        """
+        self.in_flight -= 1
+        self.latency = latency if not self.latency else 0.9 * self.latency + 0.1 * latency
+        if failed or latency > self.target_latency:
+            now = self.clock()
+            # requests admitted before the last decrease report the same overload
+            if now - self._last_decrease >= self.target_latency:
+                self.limit = max(self.min_limit, self.limit * BACKOFF)
+                self._last_decrease = now
+        elif self.in_flight + 1 >= self.limit / 2:
+            # grow only while the limit is actually in use
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        self._grant()
+
+    def _grant(self) -> None:
+        while self._waiters and self._has_slot():
+            future = heapq.heappop(self._waiters)[2]
+            if future.done():
+                continue
+            future.set_result(None)
+            self.queued -= 1
+            self.in_flight += 1
+
+    def retry_after(self) -> int:
+        """
+        Estimates when a shed request should be retried.
+
+        Returns:
+            int: Seconds, between 1 and 60, enough to drain the current queue at the recent latency.
+        """
+        rounds = (self.queued + 1) / max(1, int(self.limit))
+        return min(60, max(1, math.ceil(rounds * self.latency)))
+
+    def stats(self) -> dict:
+        """
+        Returns the limit, the load and the counters of the route class.
+
+        Returns:
+            dict: Limiter metrics.
+        """
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "latency_ms": round(1000 * self.latency, 3),
+        }
+
+
+def default_limiters() -> Dict[str, AdaptiveLimiter]:
+    """
+    Creates the limiters of the route classes from the settings.
+
+    Returns:
+        Dict[str, AdaptiveLimiter]: Limiters by route class.
+    """
+    return {
+        "default": AdaptiveLimiter("default", settings.admission_target_latency_ms / 1000,
+                                   settings.admission_max_concurrency, settings.admission_queue_size,
+                                   settings.admission_queue_timeout_seconds),
+        "expensive": AdaptiveLimiter("expensive", settings.admission_expensive_target_latency_ms / 1000,
+                                     settings.admission_expensive_max_concurrency,
+                                     settings.admission_expensive_queue_size,
+                                     settings.admission_queue_timeout_seconds),
+    }
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware admitting HTTP requests through the limiter of their route class.
+
+    Args:
+        app: ASGI application.
+        limiters (Dict[str, AdaptiveLimiter], optional): Limiters by route class; by default from the settings.
+    """
+
+    def __init__(self, app, limiters: Optional[Dict[str, AdaptiveLimiter]] = None):
+        self.app = app
+        self.limiters = limiters if limiters is not None else default_limiters()
+        metrics.register("admission", self.stats)
+
+    async def __call__(self, scope, receive, send):
+        limiter = None
+        if scope["type"] == "http":
+            limiter = self.limiters.get(route_class(scope["method"], scope["path"]))
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+        authenticated = any(name == b"authorization" for name, _ in scope["headers"])
+        priority = AUTHENTICATED_READ if authenticated and scope["method"] in ("GET", "HEAD") else OTHER
+        try:
+            await limiter.acquire(priority)
+        except Overloaded:
+            await _send_overloaded(send, limiter.retry_after())
+            return
+
+        started = time.perf_counter()
+        status = 500
+        released = False
+
+        def finish() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                limiter.release(time.perf_counter() - started, failed=status >= 500)
+
+        async def measured_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                # background tasks (e.g. e-mails) run after the response and do not hold the slot
+                finish()
+
+        try:
+            await self.app(scope, receive, measured_send)
+        finally:
+            finish()
+
+    def stats(self) -> dict:
+        """
+        Returns the metrics of every route class.
+
+        Returns:
+            dict: Limiter metrics by route class.
+        """
+        return {name: limiter.stats() for name, limiter in self.limiters.items()}
+
+
+async def _send_overloaded(send, retry_after: int) -> None:
+    body = json.dumps({"detail": "Сервер перевантажений, спробуйте пізніше"}).encode()
+    await send({"type": "http.response.start", "status": 503, "headers": [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+        (b"retry-after", str(retry_after).encode()),
+    ]})
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,177 @@
+import bisect
+import heapq
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+from contactpr import cache, events
+from contactpr.owner_cache import OwnerIndexCache
+from config import settings
+
+# length of the prefixes that keep their contacts in recency order
+SHORT_PREFIX = 2
+
+
+class PrefixIndex:
+    """
+    In-memory prefix index over the first names, last names and emails of one owner's contacts.
+
+    Terms are kept in a sorted list of ``(term, contact_id)`` pairs, so a prefix
+    lookup is a binary search followed by a short scan. Matches are ranked by
+    recency (the contact's change sequence number).
+
+    Short prefixes (the first keystrokes) match too many terms to rank them all
+    on every keystroke, so every prefix of up to SHORT_PREFIX characters also
+    keeps its contacts ordered by recency. Such lookups walk that list from
+    the most recent contact and stop after ``limit`` matches.
+
+    Args:
+        rows (Iterable[tuple]): (id, first_name, last_name, email, change_seq) rows.
+    """
+
+    def __init__(self, rows: Iterable[Tuple[int, str, str, str, Optional[int]]] = ()):
+        self._terms: List[Tuple[str, int]] = []
+        self._recent: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self._recent_entries = 0
+        self._contacts = {}
+        self._lock = threading.Lock()
+        for contact_id, first_name, last_name, email, seq in rows:
+            terms = self._terms_of(first_name, last_name, email)
+            self._contacts[contact_id] = (first_name, last_name, email, seq or 0, terms)
+            self._terms.extend((term, contact_id) for term in terms)
+            for prefix in self._short_prefixes(terms):
+                self._recent[prefix].append((-(seq or 0), contact_id))
+                self._recent_entries += 1
+        self._terms.sort()
+        for contacts in self._recent.values():
+            contacts.sort()
+
+    @staticmethod
+    def _terms_of(first_name: str, last_name: str, email: str) -> tuple:
+        return tuple({value.lower() for value in (first_name, last_name, email) if value})
+
+    @staticmethod
+    def _short_prefixes(terms: tuple) -> set:
+        return {term[:length] for term in terms for length in range(1, min(len(term), SHORT_PREFIX) + 1)}
+
+    def cost(self) -> int:
+        """
+        Returns the number of indexed terms and recency entries, used as the memory estimate.
+
+        Returns:
+            int: Number of entries.
+        """
+        return len(self._terms) + self._recent_entries
+
+    def add(self, contact_id: int, first_name: str, last_name: str, email: str, seq: Optional[int]) -> None:
+        """
+        Adds or replaces a contact.
+
+        Args:
+            contact_id (int): Identifier of the contact.
+            first_name (str): First name.
+            last_name (str): Last name.
+            email (str): Email address.
+            seq (int, optional): Change sequence number used for ranking.
+        """
+        with self._lock:
+            self._remove(contact_id)
+            terms = self._terms_of(first_name, last_name, email)
+            self._contacts[contact_id] = (first_name, last_name, email, seq or 0, terms)
+            for term in terms:
+                bisect.insort(self._terms, (term, contact_id))
+            for prefix in self._short_prefixes(terms):
+                bisect.insort(self._recent[prefix], (-(seq or 0), contact_id))
+                self._recent_entries += 1
+
+    def remove(self, contact_id: int) -> None:
+        """
+        Removes a contact.
+
+        Args:
+            contact_id (int): Identifier of the contact.
+        """
+        with self._lock:
+            self._remove(contact_id)
+
+    def _remove(self, contact_id: int) -> None:
+        contact = self._contacts.pop(contact_id, None)
+        if contact is None:
+            return
+        for term in contact[4]:
+            position = bisect.bisect_left(self._terms, (term, contact_id))
+            if position < len(self._terms) and self._terms[position] == (term, contact_id):
+                del self._terms[position]
+        entry = (-contact[3], contact_id)
+        for prefix in self._short_prefixes(contact[4]):
+            contacts = self._recent[prefix]
+            position = bisect.bisect_left(contacts, entry)
+            if position < len(contacts) and contacts[position] == entry:
+                del contacts[position]
+                self._recent_entries -= 1
+            if not contacts:
+                del self._recent[prefix]
+
+    def apply(self, event: dict) -> None:
+        """
+        Applies a contact change event.
+
+        Args:
+            event (dict): Contact change event.
+        """
+        contact = event.get('contact')
+        if event['type'] == 'contact.deleted':
+            self.remove(event['contact_id'])
+        elif contact is not None:
+            self.add(event['contact_id'], contact['first_name'], contact['last_name'], contact['email'], event.get('seq'))
+
+    def search(self, query: str, limit: int, max_scan: int) -> List[dict]:
+        """
+        Returns the most recently changed contacts matching a prefix query.
+
+        Every whitespace-separated word of the query must be a prefix of one
+        of the contact's terms ("jo do" matches John Doe). The result is the
+        exact top ``limit`` by recency.
+
+        Args:
+            query (str): Text typed so far.
+            limit (int): Number of suggestions to return.
+            max_scan (int): Number of index entries matching the leading word up to which they are
+                ranked directly; beyond that the recency list of its short prefix is walked instead.
+
+        Returns:
+            List[dict]: Suggestions with id, first_name, last_name and email.
+        """
+        words = query.lower().split()
+        if not words:
+            return []
+        lead = max(words, key=len)
+
+        def matches(contact_id: int) -> bool:
+            terms = self._contacts[contact_id][4]
+            return all(any(term.startswith(word) for term in terms) for word in words)
+
+        with self._lock:
+            start = bisect.bisect_left(self._terms, (lead,))
+            stop = bisect.bisect_left(self._terms, (lead[:-1] + chr(ord(lead[-1]) + 1),))
+            if stop - start <= max_scan:
+                candidates = {contact_id for _, contact_id in self._terms[start:stop]}
+                if len(words) > 1:
+                    candidates = {contact_id for contact_id in candidates if matches(contact_id)}
+                best = heapq.nlargest(limit, candidates,
+                                      key=lambda contact_id: (self._contacts[contact_id][3], -contact_id))
+            else:
+                best = []
+                for _, contact_id in self._recent.get(lead[:SHORT_PREFIX], ()):
+                    if matches(contact_id):
+                        best.append(contact_id)
+                        if len(best) == limit:
+                            break
+            return [
+                {"id": contact_id, "first_name": self._contacts[contact_id][0],
+                 "last_name": self._contacts[contact_id][1], "email": self._contacts[contact_id][2]}
+                for contact_id in best
+            ]
+
+
+index_cache: OwnerIndexCache[PrefixIndex] = OwnerIndexCache(settings.autocomplete_max_entries, cache.owner_generation())
+events.broker.add_listener(index_cache.on_change)
@@ -1,3 +1,169 @@
-from fastapi import BackgroundTasks
-
-background_tasks = BackgroundTasks()
+import asyncio
+import functools
+import logging
+import signal
+import threading
+import time
+from typing import Callable, Iterable, List, Optional
+from fastapi import BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
+from contactpr import tracing
+
+logger = logging.getLogger(__name__)
+
+background_tasks = BackgroundTasks()
+
+_periodic: List[asyncio.Task] = []
+
+_in_flight = 0
+_idle = asyncio.Event()
+_idle.set()
+
+_shutdown_deadline: Optional[float] = None
+
+
+def track(func):
+    """
+    Decorator that registers running calls of a coroutine function as in-flight background work.
+
+    Args:
+        func (Callable): Coroutine function to track, e.g. send_email.
+
+    Returns:
+        Callable: Wrapped coroutine function.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        global _in_flight
+        _in_flight += 1
+        _idle.clear()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            _in_flight -= 1
+            if _in_flight == 0:
+                _idle.set()
+    return wrapper
+
+
+def in_flight() -> int:
+    """
+    Returns the number of tracked background tasks that are still running.
+
+    Returns:
+        int: Number of in-flight tasks.
+    """
+    return _in_flight
+
+
+async def drain(timeout: float) -> bool:
+    """
+    Waits until all tracked background tasks have finished.
+
+    Args:
+        timeout (float): Maximum number of seconds to wait.
+
+    Returns:
+        bool: True if everything was flushed, False if the timeout expired first.
+    """
+    try:
+        await asyncio.wait_for(_idle.wait(), timeout)
+    except asyncio.TimeoutError:
+        return False
+    return True
+
+
+def begin_shutdown(budget: float) -> None:
+    """
+    Starts the shutdown clock when the worker is asked to exit.
+
+    The whole shutdown (closing connections, the lifespan shutdown and the
+    drain) has to fit into ``budget`` seconds counted from this call. Only the
+    first call counts, so a repeated signal does not extend the budget.
+
+    Args:
+        budget (float): Seconds the process manager waits before killing the worker.
+    """
+    global _shutdown_deadline
+    if _shutdown_deadline is None:
+        _shutdown_deadline = time.monotonic() + budget
+
+
+def watch_exit_signals(budget: float, signals: Iterable[int] = (signal.SIGTERM, signal.SIGINT)) -> None:
+    """
+    Starts the shutdown clock as soon as the process receives an exit signal.
+
+    Wraps the handlers the server installed for ``signals`` (uvicorn installs
+    them with signal.signal before the lifespan startup), so the server still
+    handles the signal as before. Signals without a Python handler are left
+    alone; their clock starts with the lifespan shutdown instead. Does nothing
+    outside the main thread, where signal handlers cannot be set.
+
+    Args:
+        budget (float): Seconds the process manager waits before killing the worker.
+        signals (Iterable[int]): Exit signals to watch.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    for signum in signals:
+        previous = signal.getsignal(signum)
+        if not callable(previous):
+            continue
+
+        def handler(received, frame, previous=previous):
+            begin_shutdown(budget)
+            previous(received, frame)
+
+        signal.signal(signum, handler)
+
+
+def shutdown_time_left(budget: float, margin: float = 1.0) -> float:
+    """
+    Returns how long the remaining shutdown steps may still take.
+
+    Args:
+        budget (float): Shutdown budget, used when begin_shutdown was never called
+            (e.g. under plain uvicorn), in which case the clock starts now.
+        margin (float): Seconds kept back for the steps after the drain.
+
+    Returns:
+        float: Seconds left, never negative.
+    """
+    begin_shutdown(budget)
+    return max(0.0, _shutdown_deadline - time.monotonic() - margin)
+
+
+def start_periodic(name: str, interval: float, job: Callable[[], object]) -> None:
+    """
+    Runs a blocking maintenance job in the thread pool every ``interval`` seconds.
+
+    Must be called from the event loop (e.g. a startup hook). Failures are
+    logged and the job keeps its schedule.
+
+    Args:
+        name (str): Name of the job, used in logs.
+        interval (float): Seconds between runs; the first run happens after one interval.
+        job (Callable[[], object]): Job to run.
+    """
+    job = tracing.traced(f"job {name}")(job)
+
+    async def run():
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                result = await run_in_threadpool(job)
+                logger.debug("Periodic job %s finished: %s", name, result)
+            except Exception:
+                logger.exception("Periodic job %s failed", name)
+
+    _periodic.append(asyncio.get_running_loop().create_task(run(), name=name))
+
+
+async def stop_periodic() -> None:
+    """
+    Cancels all jobs started with start_periodic.
+    """
+    for task in _periodic:
+        task.cancel()
+    await asyncio.gather(*_periodic, return_exceptions=True)
+    _periodic.clear()
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import logging
+from typing import Any, List, Optional
+from urllib.parse import urlsplit
+from contactpr import schemas
+
+logger = logging.getLogger(__name__)
+
+# Long-lived endpoints never complete inside a batch.
+UNBATCHABLE_PREFIXES = ("/batch", "/contacts/stream/", "/contacts/ws")
+
+
+async def dispatch(app, parent_scope: dict, item: schemas.BatchRequestItem, user) -> dict:
+    """
+    Runs one sub-request through the ASGI application in-process.
+
+    The authenticated user is handed to the sub-request through the scope
+    state, so auth.get_current_user does not decode the token or query the
+    user again.
+
+    Args:
+        app: ASGI application (the FastAPI app with its middleware).
+        parent_scope (dict): Scope of the /batch request; server and client info are reused.
+        item (schemas.BatchRequestItem): Sub-request.
+        user (models.User): User authenticated by the /batch request.
+
+    Returns:
+        dict: Sub-response with id, status and the decoded body; an unhandled
+        error of the sub-request becomes its own 500 response.
+    """
+    url = urlsplit(item.path)
+    if not url.path.startswith("/") or url.path.startswith(UNBATCHABLE_PREFIXES):
+        return {"id": item.id, "status": 400, "body": {"detail": f"Path {url.path} cannot be batched"}}
+
+    body = b"" if item.body is None else json.dumps(item.body).encode("utf-8")
+    headers = [(name, value) for name, value in parent_scope["headers"] if name == b"authorization"]
+    headers.append((b"content-type", b"application/json"))
+    headers.append((b"content-length", str(len(body)).encode("ascii")))
+    scope = {
+        "type": "http",
+        "asgi": parent_scope.get("asgi", {"version": "3.0"}),
+        "http_version": parent_scope.get("http_version", "1.1"),
+        "method": item.method,
+        "scheme": parent_scope.get("scheme", "http"),
+        "server": parent_scope.get("server"),
+        "client": parent_scope.get("client"),
+        "root_path": parent_scope.get("root_path", ""),
+        "path": url.path,
+        "raw_path": url.path.encode("utf-8"),
+        "query_string": url.query.encode("utf-8"),
+        "headers": headers,
+        "state": {"batch_user": user},
+    }
+    received = False
+
+    async def receive():
+        nonlocal received
+        if received:
+            return {"type": "http.disconnect"}
+        received = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    response = {"status": 500, "headers": [], "body": b""}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = message.get("headers", [])
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    try:
+        await app(scope, receive, send)
+    except Exception:
+        # ServerErrorMiddleware re-raises after responding; keep it to this item
+        logger.exception("Batch sub-request %s %s failed", item.method, url.path)
+        return {"id": item.id, "status": 500, "body": {"detail": "Internal Server Error"}}
+    return {"id": item.id, "status": response["status"], "body": _decode(response)}
+
+
+def _decode(response: dict) -> Any:
+    content_type = dict(response["headers"]).get(b"content-type", b"")
+    if not response["body"]:
+        return None
+    if content_type.startswith(b"application/json"):
+        return json.loads(response["body"])
+    return response["body"].decode("utf-8", "replace")
+
+
+async def run(app, parent_scope: dict, items: List[schemas.BatchRequestItem], user) -> List[dict]:
+    """
+    Executes sub-requests, running consecutive reads concurrently.
+
+    Writes act as barriers: they run alone, in request order, after every
+    earlier item has finished, so a read after a write sees its effect.
+
+    Args:
+        app: ASGI application.
+        parent_scope (dict): Scope of the /batch request.
+        items (List[schemas.BatchRequestItem]): Sub-requests.
+        user (models.User): User authenticated by the /batch request.
+
+    Returns:
+        List[dict]: Sub-responses in request order.
+    """
+    results: List[Optional[dict]] = []
+    reads = []
+
+    async def flush():
+        results.extend(await asyncio.gather(*reads))
+        reads.clear()
+
+    for item in items:
+        if item.method == "GET":
+            reads.append(dispatch(app, parent_scope, item, user))
+        else:
+            await flush()
+            results.append(await dispatch(app, parent_scope, item, user))
+    await flush()
+    return results
@@ -0,0 +1,182 @@
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, Union
+
+ARRAY_LIMIT = 4096
+
+Container = Union[array, int]
+
+
+def _to_int(container: Container) -> int:
+    # Python ints are immutable, so bits are set in a buffer and converted once
+    if isinstance(container, int):
+        return container
+    buffer = bytearray(8192)
+    for low in container:
+        buffer[low >> 3] |= 1 << (low & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+_BYTE_BITS = tuple(tuple(offset for offset in range(8) if byte >> offset & 1) for byte in range(256))
+
+
+def _int_values(bits: int) -> Iterator[int]:
+    for index, byte in enumerate(bits.to_bytes(8192, 'little')):
+        if byte:
+            base = index << 3
+            for offset in _BYTE_BITS[byte]:
+                yield base | offset
+
+
+def _filter(lows: array, bits: int, keep: bool) -> array:
+    buffer = bits.to_bytes(8192, 'little')
+    return array('H', (low for low in lows if bool(buffer[low >> 3] >> (low & 7) & 1) == keep))
+
+
+def _normalize(container: Container) -> Container:
+    # sparse containers are sorted uint16 arrays, dense ones are 65536-bit ints
+    if isinstance(container, int):
+        if container.bit_count() <= ARRAY_LIMIT:
+            return array('H', _int_values(container))
+        return container
+    if len(container) > ARRAY_LIMIT:
+        return _to_int(container)
+    return container
+
+
+def _copy(container: Container) -> Container:
+    return container if isinstance(container, int) else array('H', container)
+
+
+def _cardinality(container: Container) -> int:
+    return container.bit_count() if isinstance(container, int) else len(container)
+
+
+class RoaringBitmap:
+    """
+    Compressed bitmap of non-negative integers in the style of Roaring bitmaps.
+
+    Values are split by their high 16 bits into containers. A container is a
+    sorted ``array('H')`` while it holds at most 4096 values and a 65536-bit
+    integer bitset once it gets denser, so set operations run on compact
+    C-level structures.
+
+    Args:
+        values (Iterable[int], optional): Initial values.
+    """
+
+    __slots__ = ('_containers',)
+
+    def __init__(self, values: Iterable[int] = ()):
+        self._containers: Dict[int, Container] = {}
+        grouped: Dict[int, list] = {}
+        for value in values:
+            grouped.setdefault(value >> 16, []).append(value & 0xFFFF)
+        for high, lows in grouped.items():
+            self._containers[high] = _normalize(array('H', sorted(set(lows))))
+
+    @classmethod
+    def _from_containers(cls, containers: Dict[int, Container]) -> "RoaringBitmap":
+        # results of set operations are usually short-lived, so dense containers
+        # are not converted back to arrays here; add/discard re-normalize
+        bitmap = cls()
+        bitmap._containers = {high: c for high, c in containers.items() if c}
+        return bitmap
+
+    def add(self, value: int) -> None:
+        high, low = value >> 16, value & 0xFFFF
+        container = self._containers.get(high)
+        if container is None:
+            self._containers[high] = array('H', [low])
+        elif isinstance(container, int):
+            self._containers[high] = container | (1 << low)
+        else:
+            position = bisect_left(container, low)
+            if position == len(container) or container[position] != low:
+                container.insert(position, low)
+                if len(container) > ARRAY_LIMIT:
+                    self._containers[high] = _to_int(container)
+
+    def discard(self, value: int) -> None:
+        high, low = value >> 16, value & 0xFFFF
+        container = self._containers.get(high)
+        if container is None:
+            return
+        if isinstance(container, int):
+            container = _normalize(container & ~(1 << low))
+            self._containers[high] = container
+        else:
+            position = bisect_left(container, low)
+            if position < len(container) and container[position] == low:
+                del container[position]
+        if _cardinality(container):
+            self._containers[high] = container
+        else:
+            del self._containers[high]
+
+    def __contains__(self, value: int) -> bool:
+        container = self._containers.get(value >> 16)
+        if container is None:
+            return False
+        low = value & 0xFFFF
+        if isinstance(container, int):
+            return bool(container >> low & 1)
+        position = bisect_left(container, low)
+        return position < len(container) and container[position] == low
+
+    def __len__(self) -> int:
+        return sum(_cardinality(container) for container in self._containers.values())
+
+    def __iter__(self) -> Iterator[int]:
+        for high in sorted(self._containers):
+            container = self._containers[high]
+            lows = _int_values(container) if isinstance(container, int) else container
+            base = high << 16
+            for low in lows:
+                yield base | low
+
+    def __and__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        result = {}
+        for high in self._containers.keys() & other._containers.keys():
+            a, b = self._containers[high], other._containers[high]
+            if isinstance(a, int) and isinstance(b, int):
+                result[high] = a & b
+            elif isinstance(a, int) or isinstance(b, int):
+                bits, lows = (a, b) if isinstance(a, int) else (b, a)
+                result[high] = _filter(lows, bits, True)
+            else:
+                result[high] = array('H', sorted(set(a).intersection(b)))
+        return RoaringBitmap._from_containers(result)
+
+    def __or__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        result = {high: _copy(container) for high, container in self._containers.items()}
+        for high, b in other._containers.items():
+            a = result.get(high)
+            if a is None:
+                result[high] = _copy(b)
+            elif isinstance(a, int) or isinstance(b, int) or len(a) + len(b) > ARRAY_LIMIT:
+                result[high] = _to_int(a) | _to_int(b)
+            else:
+                result[high] = array('H', sorted(set(a).union(b)))
+        return RoaringBitmap._from_containers(result)
+
+    def __sub__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        result = {}
+        for high, a in self._containers.items():
+            b = other._containers.get(high)
+            if b is None:
+                result[high] = _copy(a)
+            elif isinstance(a, int):
+                result[high] = a & ~_to_int(b)
+            elif isinstance(b, int):
+                result[high] = _filter(a, b, False)
+            else:
+                result[high] = array('H', sorted(set(a).difference(b)))
+        return RoaringBitmap._from_containers(result)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, RoaringBitmap) and list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return f"RoaringBitmap({len(self)} values)"
+
@@ -0,0 +1,51 @@
+import hashlib
+import math
+from typing import Iterable
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter of strings.
+
+    Membership tests may return false positives at about ``error_rate`` once
+    ``capacity`` items were added, but never false negatives. Items cannot be
+    removed; rebuild the filter instead.
+
+    Args:
+        capacity (int): Expected number of items.
+        error_rate (float): Target false positive rate at capacity.
+        items (Iterable[str], optional): Initial items.
+    """
+
+    __slots__ = ('size', 'hashes', 'count', '_bits')
+
+    def __init__(self, capacity: int, error_rate: float = 0.001, items: Iterable[str] = ()):
+        capacity = max(1, capacity)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+        for item in items:
+            self.add(item)
+
+    def _positions(self, item: str):
+        # double hashing (Kirsch-Mitzenmacher) over one 128-bit digest
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        for index in range(self.hashes):
+            yield (first + index * second) % self.size
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] >> (position & 7) & 1 for position in self._positions(item))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __repr__(self) -> str:
+        return f"BloomFilter({self.count} items, {self.size} bits, {self.hashes} hashes)"
@@ -0,0 +1,430 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from contactpr import database, events, metrics, models
+from contactpr.singleflight import SingleFlight
+from config import settings
+
+
+# above this many generations read from the database, expired ones are dropped
+MAX_CACHED_GENERATIONS = 10000
+
+
+class LocalLRU:
+    """
+    Per-worker LRU tier with a byte budget and per-entry TTL.
+
+    Args:
+        max_bytes (int): Maximum total size of the cached values (JSON-encoded size).
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, size, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.size -= size
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, size: int, ttl: float) -> None:
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[1]
+            self._entries[key] = (time.monotonic() + ttl, size, value)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class InMemorySharedTier:
+    """
+    In-process stand-in for the shared cache tier, used in tests and single-worker setups.
+    """
+
+    def __init__(self):
+        self._values: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            return entry[1]
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        with self._lock:
+            self._values[key] = (time.monotonic() + ttl, value)
+
+    def get_int(self, key: str) -> int:
+        with self._lock:
+            entry = self._values.get(key)
+            return int(entry[1]) if entry is not None else 0
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value = (int(self._values[key][1]) if key in self._values else 0) + 1
+            self._values[key] = (float('inf'), value)
+            return value
+
+
+class RedisSharedTier:
+    """
+    Shared cache tier in Redis, visible to all workers.
+
+    Args:
+        url (str): Redis connection URL.
+    """
+
+    def __init__(self, url: str):
+        import redis
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._client.set(key, value, ex=max(1, int(ttl)))
+
+    def get_int(self, key: str) -> int:
+        return int(self._client.get(key) or 0)
+
+    def incr(self, key: str) -> int:
+        return self._client.incr(key)
+
+
+class DatabaseGenerations:
+    """
+    Cache generations kept in the cache_generations table, visible to all workers.
+
+    Used when several workers serve the app without Redis: reading a
+    generation is a primary-key lookup and bumping it an upsert, so a write in
+    one worker invalidates what every other worker cached. Each worker reuses
+    a generation it read for ``ttl`` seconds, so a cache hit costs no query
+    and a write in another worker is seen at most ``ttl`` seconds late. Bumps
+    take effect in their own worker at once.
+
+    Args:
+        engine: Engine of the primary database.
+        ttl (float): Seconds a generation read from the database is reused.
+    """
+
+    def __init__(self, engine, ttl: float = 1.0):
+        self.engine = engine
+        self.ttl = ttl
+        self.reads = 0
+        self._table = models.CacheGeneration.__table__
+        self._values: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def cached_int(self, key: str) -> Optional[int]:
+        """
+        Returns a generation if it was read less than ``ttl`` seconds ago, without a query.
+
+        Args:
+            key (str): Generation key.
+
+        Returns:
+            int, optional: Generation, or None if it has to be read again.
+        """
+        with self._lock:
+            entry = self._values.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def get_int(self, key: str) -> int:
+        value = self.cached_int(key)
+        if value is not None:
+            return value
+        statement = select(self._table.c.generation).where(self._table.c.scope == key)
+        with self.engine.connect() as connection:
+            value = connection.execute(statement).scalar() or 0
+        self.reads += 1
+        with self._lock:
+            self._values[key] = (time.monotonic() + self.ttl, value)
+            if len(self._values) > MAX_CACHED_GENERATIONS:
+                now = time.monotonic()
+                self._values = {cached: entry for cached, entry in self._values.items() if entry[0] >= now}
+        return value
+
+    def incr(self, key: str) -> None:
+        with self._lock:
+            self._values.pop(key, None)
+        table = self._table
+        with self.engine.begin() as connection:
+            dialect = connection.dialect.name
+            if dialect in ("postgresql", "sqlite"):
+                insert = (postgresql if dialect == "postgresql" else sqlite).insert(table)
+                statement = insert.values(scope=key, generation=1)
+                connection.execute(statement.on_conflict_do_update(
+                    index_elements=[table.c.scope], set_={"generation": table.c.generation + 1}))
+                return
+            updated = connection.execute(update(table).where(table.c.scope == key).values(
+                generation=table.c.generation + 1)).rowcount
+            if not updated:
+                connection.execute(table.insert().values(scope=key, generation=1))
+
+
+class ContactQueryCache:
+    """
+    Read-through cache of contact query results with generation-based invalidation.
+
+    Every cache key embeds the current generation of its scope (an owner id, or
+    ``*`` for queries across owners). Contact writes bump the generations of the
+    affected scopes, so invalidation is O(1) and an entry written under an old
+    generation can never be read again; old entries simply age out of the LRU.
+
+    Args:
+        local (LocalLRU): Per-worker tier.
+        shared: Optional shared tier (RedisSharedTier or InMemorySharedTier); it
+            also holds the generations so that all workers agree on them.
+        ttl (float): Default time to live of entries in seconds.
+        flights (SingleFlight, optional): Coalesces concurrent misses of the same key
+            into one load; by default a private instance with a 5 second timeout.
+        generations (optional): Where generations are kept without a shared tier
+            (DatabaseGenerations); by default they are local to the worker.
+    """
+
+    def __init__(self, local: LocalLRU, shared=None, ttl: float = 300, flights: Optional[SingleFlight] = None,
+                 generations=None):
+        self.local = local
+        self.shared = shared
+        self.generations = shared if shared is not None else generations
+        self.ttl = ttl
+        self.flights = flights if flights is not None else SingleFlight(5.0)
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self._generations: Dict[str, int] = {}
+        # generation of scopes that were not bumped since the last resync
+        self._floor = 0
+        self._lock = threading.Lock()
+
+    def generation(self, scope) -> int:
+        """
+        Returns the current generation of a scope.
+
+        Args:
+            scope: Owner id, None for contacts without an owner, or ``*``.
+
+        Returns:
+            int: Generation counter.
+        """
+        if self.generations is not None:
+            return self.generations.get_int(f"gen:{scope}")
+        return self._generations.get(str(scope), self._floor)
+
+    def cached_generation(self, scope) -> Optional[int]:
+        """
+        Returns the generation of a scope if it is known without a query.
+
+        Args:
+            scope: Owner id, None for contacts without an owner, or ``*``.
+
+        Returns:
+            int, optional: Generation counter, or None if it has to be read from
+            the shared tier or the database (see generation).
+        """
+        if self.generations is None:
+            return self.generation(scope)
+        if isinstance(self.generations, DatabaseGenerations):
+            return self.generations.cached_int(f"gen:{scope}")
+        return None
+
+    def bump(self, scope) -> None:
+        """
+        Invalidates every cached result of a scope.
+
+        Args:
+            scope: Owner id, None for contacts without an owner, or ``*``.
+        """
+        if self.generations is not None:
+            self.generations.incr(f"gen:{scope}")
+            return
+        with self._lock:
+            self._generations[str(scope)] = self._generations.get(str(scope), self._floor) + 1
+
+    def get_or_load(self, key: str, scope, loader: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """
+        Returns a cached result or loads and caches it.
+
+        Concurrent misses of the same key share one loader call and its result.
+
+        Args:
+            key (str): Query name and parameters.
+            scope: Scope whose writes invalidate the result.
+            loader (Callable[[], Any]): Runs the query; must return JSON-serializable data.
+                None results are not cached.
+            ttl (float, optional): Time to live, defaults to the cache TTL.
+
+        Returns:
+            Any: Query result.
+        """
+        full_key = f"{key}|{scope}:{self.generation(scope)}"
+        value = self.local.get(full_key)
+        if value is not None:
+            self.hits += 1
+            return value
+        ttl = self.ttl if ttl is None else ttl
+        if self.shared is not None:
+            raw = self.shared.get(full_key)
+            if raw is not None:
+                self.shared_hits += 1
+                value = json.loads(raw)
+                self.local.set(full_key, value, len(raw), ttl)
+                return value
+
+        def load():
+            self.misses += 1
+            value = loader()
+            if value is not None:
+                raw = json.dumps(value).encode('utf-8')
+                self.local.set(full_key, value, len(raw), ttl)
+                if self.shared is not None:
+                    self.shared.set(full_key, raw, ttl)
+            return value
+
+        return self.flights.do(full_key, load)
+
+    def get_pointer(self, key: str) -> Optional[Any]:
+        """
+        Returns an unversioned cached fact (e.g. the owner of a contact id).
+
+        Args:
+            key (str): Key.
+
+        Returns:
+            Any: Cached value or None.
+        """
+        return self.local.get(f"ptr|{key}")
+
+    def set_pointer(self, key: str, value: Any) -> None:
+        """
+        Caches an unversioned fact that never changes once written.
+
+        Args:
+            key (str): Key.
+            value (Any): JSON-serializable value.
+        """
+        self.local.set(f"ptr|{key}", value, len(key) + 16, self.ttl)
+
+    def on_change(self, event: dict) -> None:
+        """
+        Change listener bumping the generations affected by a contact write.
+
+        After a broker ``resync`` every local generation moves past all
+        previous ones, since the writes that were missed are unknown.
+
+        Args:
+            event (dict): Contact change event.
+        """
+        if event['type'] == 'resync' and self.generations is None:
+            with self._lock:
+                self._floor = max(self._generations.values(), default=self._floor) + 1
+                self._generations.clear()
+            self.local.clear()
+        elif event['type'].startswith('contact.'):
+            self.bump(event['owner_id'])
+            self.bump('*')
+
+    def stats(self) -> dict:
+        """
+        Returns hit/miss/eviction counters and the size of the local tier.
+
+        Returns:
+            dict: Cache metrics.
+        """
+        return {
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "evictions": self.local.evictions,
+            "expirations": self.local.expirations,
+            "entries": len(self.local),
+            "bytes": self.local.size,
+        }
+
+
+def _shared_tier():
+    if settings.cache_redis_url:
+        return RedisSharedTier(settings.cache_redis_url)
+    return None
+
+
+def _generations():
+    # local generations are bumped by the change events of every worker
+    # only if those events reach every worker
+    if settings.cache_redis_url or events.reach_every_worker():
+        return None
+    return DatabaseGenerations(database.engine, settings.cache_generation_ttl_seconds)
+
+
+query_cache = ContactQueryCache(LocalLRU(settings.cache_max_bytes), _shared_tier(), settings.cache_ttl_seconds,
+                                SingleFlight(settings.singleflight_timeout_seconds), _generations())
+
+
+def owner_generation() -> Optional[Callable[[int], int]]:
+    """
+    Returns the check for per-owner in-memory state (indexes, feeds) kept current from change events.
+
+    When change events do not reach every worker, such state is only reused
+    while its owner's cache generation is unchanged. Generations are reused
+    for ``settings.cache_generation_ttl_seconds``, so such state may miss the
+    writes of other workers for that long.
+
+    Returns:
+        Callable[[int], int]: Current generation of an owner, or None when change events suffice.
+    """
+    if events.reach_every_worker():
+        return None
+    return query_cache.generation
+
+
+def cached_owner_generation() -> Optional[Callable[[int], Optional[int]]]:
+    """
+    Returns the query-free variant of owner_generation, for checks made on the event loop.
+
+    Returns:
+        Callable[[int], Optional[int]]: Generation of an owner if known without
+        a query, else None; or None when change events suffice.
+    """
+    if events.reach_every_worker():
+        return None
+    return query_cache.cached_generation
+
+
+events.broker.add_listener(query_cache.on_change)
+metrics.register("cache", query_cache.stats)
+metrics.register("singleflight", query_cache.flights.stats)
@@ -1,17 +1,359 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from ..config import settings
-
-SQLALCHEMY_DATABASE_URL = settings.sqlalchemy_database_url
-
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
\ No newline at end of file
+import threading
+import time
+from typing import Optional
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.routing import APIRoute
+from sqlalchemy import __version__ as sqlalchemy_version, create_engine, event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql import Select
+from config import settings
+from contactpr import metrics, tracing
+
+SQLALCHEMY_DATABASE_URL = settings.sqlalchemy_database_url
+
+
+def is_sqlite_file(url: str) -> bool:
+    """
+    Checks whether a URL points to an on-disk SQLite database.
+
+    Args:
+        url (str): SQLAlchemy database URL.
+
+    Returns:
+        bool: False for other databases and for in-memory SQLite.
+    """
+    parsed = make_url(url)
+    return (parsed.get_backend_name() == "sqlite" and parsed.database not in (None, "", ":memory:")
+            and parsed.query.get("mode") != "memory")
+
+
+class PoolMetrics:
+    """
+    Checkout wait and hold times of the connections of a pool.
+    """
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.checkins = 0
+        self.hold_seconds = 0.0
+        self.max_hold_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def waited(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+
+    def checked_out(self, dbapi_connection, connection_record, connection_proxy) -> None:
+        connection_record.info["checked_out_at"] = time.perf_counter()
+
+    def checked_in(self, dbapi_connection, connection_record) -> None:
+        started = connection_record.info.pop("checked_out_at", None)
+        if started is None:
+            return
+        held = time.perf_counter() - started
+        with self._lock:
+            self.checkins += 1
+            self.hold_seconds += held
+            self.max_hold_seconds = max(self.max_hold_seconds, held)
+
+    def stats(self, pool) -> dict:
+        """
+        Returns the counters together with the current state of the pool.
+
+        Args:
+            pool (TimedQueuePool): Pool the metrics belong to.
+
+        Returns:
+            dict: Checkouts, timeouts, average and maximum wait and hold times in milliseconds,
+                connections in use and pool size.
+        """
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(1000 * self.wait_seconds / max(1, self.checkouts + self.timeouts), 3),
+                "max_wait_ms": round(1000 * self.max_wait_seconds, 3),
+                "avg_hold_ms": round(1000 * self.hold_seconds / max(1, self.checkins), 3),
+                "max_hold_ms": round(1000 * self.max_hold_seconds, 3),
+                "in_use": pool.checkedout(),
+                "size": pool.size(),
+                "overflow": max(0, pool.overflow()),
+            }
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool measuring how long checkouts wait for a connection and how long connections are held.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+        if "_dispatch" not in kwargs:
+            # recreate() (engine.dispose()) hands the listeners over to the new pool
+            event.listen(self, "checkout", self.metrics.checked_out)
+            event.listen(self, "checkin", self.metrics.checked_in)
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.metrics.waited(time.perf_counter() - started, timed_out=True)
+            raise
+        self.metrics.waited(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+def register_pool_metrics(name: str, engine) -> None:
+    """
+    Exposes the pool metrics of an engine in the metrics snapshot, if its pool is a TimedQueuePool.
+
+    Args:
+        name (str): Section name.
+        engine: Engine whose pool is reported (looked up on every snapshot, as dispose() replaces it).
+    """
+    if isinstance(engine.pool, TimedQueuePool):
+        metrics.register(name, lambda: engine.pool.metrics.stats(engine.pool))
+
+
+def _configure_sqlite(engine, begin: str, query_only: bool = False) -> None:
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        # let SQLAlchemy issue BEGIN itself instead of pysqlite's implicit, deferred one
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+        cursor.execute(f"PRAGMA cache_size=-{int(settings.sqlite_cache_size_kib)}")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        if query_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def do_begin(connection):
+        connection.exec_driver_sql(begin)
+
+
+def create_sqlite_engines(url: str, reader_pool_size: int, timeout: float):
+    """
+    Creates the writer and reader engines of the embedded SQLite mode.
+
+    WAL journaling lets readers run concurrently with the single writer, and
+    ``synchronous=NORMAL`` only fsyncs at checkpoints, which in WAL mode is
+    still safe against corruption (a power loss may drop the last commits).
+    The writer engine holds exactly one connection, so its pool is the
+    process-wide writer queue: write transactions wait for it in turn instead
+    of failing with "database is locked". They start with BEGIN IMMEDIATE,
+    so writers in other worker processes queue on SQLite's lock (busy_timeout)
+    before reading anything they are about to update.
+
+    Args:
+        url (str): URL of an on-disk SQLite database.
+        reader_pool_size (int): Number of read-only connections.
+        timeout (float): Seconds to wait for a connection.
+
+    Returns:
+        tuple: Writer engine and reader engine.
+    """
+    options = dict(poolclass=TimedQueuePool, max_overflow=0, pool_timeout=timeout,
+                   connect_args={"check_same_thread": False})
+    writer = create_engine(url, pool_size=1, **options)
+    reader = create_engine(url, pool_size=reader_pool_size, **options)
+    _configure_sqlite(writer, "BEGIN IMMEDIATE")
+    _configure_sqlite(reader, "BEGIN", query_only=True)
+    return writer, reader
+
+
+class RoutingSession(Session):
+    """
+    Session sending plain SELECTs to the reader engine and everything else to the writer.
+
+    Once a transaction has used the writer, its remaining statements stay on
+    the writer, so reads see the transaction's own uncommitted writes. A
+    read-only session uses the reader for everything and refuses to flush.
+
+    Args:
+        reader: Engine for read-only statements; by default the bound engine.
+        read_only (bool): Whether the session may only read.
+    """
+
+    def __init__(self, *args, reader=None, read_only=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reader = reader
+        self.read_only = read_only
+        self.writing = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.reader is not None and self.read_only:
+            return self.reader
+        if (self.reader is not None and not self.writing and not self._flushing
+                and isinstance(clause, Select) and clause._for_update_arg is None):
+            return self.reader
+        if clause is not None or self._flushing:
+            self.writing = True
+        return super().get_bind(mapper, clause, **kwargs)
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _release_writer(session, transaction):
+    if transaction.parent is None:
+        session.writing = False
+
+
+@event.listens_for(RoutingSession, "before_flush")
+def _refuse_read_only_flush(session, flush_context, instances):
+    if session.read_only:
+        raise exc.InvalidRequestError("Read-only session cannot write; declare the route with get_db")
+
+
+def release(db: Session) -> None:
+    """
+    Ends the transaction of a read-only session, returning its connection to the pool.
+
+    Loaded objects stay usable (read-only sessions do not expire them), and the
+    next query checks out a connection again. Read-write sessions release
+    their connection on commit, so they are left alone.
+
+    Args:
+        db (Session): Session to release.
+    """
+    if isinstance(db, RoutingSession) and db.read_only and db.in_transaction():
+        db.commit()
+
+
+engine_options = {}
+if not SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
+    # server.py sizes the pool per worker so that all workers together stay
+    # within settings.db_max_connections
+    engine_options.update(
+        poolclass=TimedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_pre_ping=True,
+    )
+
+if SQLALCHEMY_DATABASE_URL.startswith("postgresql+psycopg:") and int(sqlalchemy_version.split(".")[0]) >= 2:
+    # psycopg 3 turns statements executed this many times on a connection into
+    # server-side prepared statements (psycopg2 has no such support); its
+    # dialect only exists from SQLAlchemy 2.0 on
+    engine_options["connect_args"] = {"prepare_threshold": settings.db_prepare_threshold}
+
+# Sessions only check out a connection on their first query and return it on
+# commit, rollback or close. Read-only sessions keep loaded objects on commit,
+# so release() can hand their connection back early.
+if is_sqlite_file(SQLALCHEMY_DATABASE_URL):
+    # single-node deployments: tuned SQLite with one writer and a reader pool
+    engine, read_engine = create_sqlite_engines(
+        SQLALCHEMY_DATABASE_URL, settings.sqlite_reader_pool_size, settings.db_pool_timeout)
+    tracing.instrument_engine(read_engine)
+    register_pool_metrics("db_read_pool", read_engine)
+    reader = read_engine
+else:
+    engine = read_engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options)
+    reader = None
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine, reader=reader)
+ReadSessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine, reader=reader,
+                                read_only=True, expire_on_commit=False)
+tracing.instrument_engine(engine)
+register_pool_metrics("db_pool", engine)
+Base = declarative_base()
+
+
+def _open(factory, request: Optional[Request]) -> Session:
+    with tracing.span("get_db"):
+        db = factory()
+    if request is not None:
+        request.scope.setdefault("state", {}).setdefault("db_sessions", []).append(db)
+    return db
+
+
+def get_db(request: Request = None):
+    """
+    Dependency providing a read-write session.
+
+    Args:
+        request (Request, optional): Incoming request; the session is closed by
+            SessionScopedRoute as soon as the response is built.
+
+    Yields:
+        Session: Database session object.
+    """
+    db = _open(SessionLocal, request)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_read_db(request: Request = None):
+    """
+    Dependency providing a read-only session for routes that do not write.
+
+    Its connection can be returned early with release(); on SQLite it reads
+    from the reader pool.
+
+    Args:
+        request (Request, optional): Incoming request; the session is closed by
+            SessionScopedRoute as soon as the response is built.
+
+    Yields:
+        Session: Read-only database session object.
+    """
+    db = _open(ReadSessionLocal, request)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+class SessionScopedRoute(APIRoute):
+    """
+    Route closing the sessions of get_db / get_read_db as soon as its response is built.
+
+    FastAPI runs the cleanup of ``yield`` dependencies only after the response
+    has been sent and the background tasks (e.g. SMTP) have finished, which
+    would keep the connection of an open transaction checked out meanwhile.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def scoped_handler(request: Request):
+            try:
+                return await handler(request)
+            finally:
+                sessions = request.scope.get("state", {}).pop("db_sessions", [])
+                if any(db.in_transaction() for db in sessions):
+                    # ending a transaction is a round trip to the database
+                    await run_in_threadpool(_close_all, sessions)
+                else:
+                    _close_all(sessions)
+
+        return scoped_handler
+
+
+def _close_all(sessions) -> None:
+    for db in sessions:
+        db.close()
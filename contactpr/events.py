@@ -0,0 +1,397 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import uuid
+from typing import Callable, Dict, List, Optional, Set
+from fastapi.encoders import jsonable_encoder
+from contactpr import schemas
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "contacts:changes"
+
+RECONNECT_MIN_SECONDS = 0.5
+RECONNECT_MAX_SECONDS = 30.0
+
+# internal events (e.g. auth.revoked) reach listeners only, never client connections
+LISTENER_ONLY_PREFIX = "auth."
+
+
+class Subscription:
+    """
+    Bounded event buffer of a single SSE / WebSocket connection.
+
+    When the client reads slower than changes arrive, the oldest buffered
+    events are dropped and the next event the client receives is ``resync``,
+    telling it to catch up through ``/contacts/sync/`` instead.
+
+    Attributes:
+        owner_id (int): Identifier of the user the connection belongs to.
+        overflowed (bool): Whether events were dropped since the last read.
+    """
+
+    def __init__(self, owner_id: int, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.owner_id = owner_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def put(self, event: dict) -> None:
+        """
+        Buffers an event. Must run on the subscription's event loop.
+
+        Args:
+            event (dict): Change event.
+        """
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.overflowed = True
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: float) -> Optional[dict]:
+        """
+        Waits for the next event.
+
+        Args:
+            timeout (float): Seconds to wait before giving up (used for heartbeats).
+
+        Returns:
+            dict: Next event, a ``resync`` event after an overflow, or None on timeout.
+        """
+        if self.overflowed:
+            self.overflowed = False
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            return {"type": "resync", "owner_id": self.owner_id}
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def resync(self) -> None:
+        """
+        Replaces the buffered events with a ``resync`` event. Must run on the subscription's event loop.
+        """
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.overflowed = False
+        self.queue.put_nowait({"type": "resync", "owner_id": self.owner_id})
+
+
+class RedisBackend:
+    """
+    Cross-worker transport publishing change events through Redis pub/sub.
+
+    Args:
+        url (str): Redis connection URL.
+    """
+
+    def __init__(self, url: str):
+        import redis
+        import redis.asyncio
+        self.url = url
+        self._client = redis.Redis.from_url(url)
+        self._async_client = redis.asyncio.from_url(url)
+
+    def publish(self, event: dict) -> None:
+        self._client.publish(CHANNEL, json.dumps(event))
+
+    async def listen(self, deliver: Callable[[dict], None], subscribed: Callable[[], None]) -> None:
+        pubsub = self._async_client.pubsub()
+        try:
+            await pubsub.subscribe(CHANNEL)
+            subscribed()
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    deliver(json.loads(message["data"]))
+        finally:
+            await pubsub.close()
+
+
+class ChangeBroker:
+    """
+    In-process pub/sub of contact changes with an optional cross-worker backend.
+
+    Listeners registered with add_listener run synchronously in the publishing
+    thread (cache invalidation, in-memory indexes); connection subscriptions are
+    fed through their event loop, except for the internal ``auth.*`` events. publish() blocks on the backend, so async
+    code calls it through run_in_threadpool.
+
+    When the backend connection drops, the broker reconnects with exponential
+    backoff. Events published meanwhile are lost, so after reconnecting every
+    listener receives a ``resync`` event (drop what may be stale) and every
+    connection a ``resync`` event (catch up through ``/contacts/sync/``).
+
+    Args:
+        buffer_size (int): Maximum number of buffered events per connection.
+    """
+
+    def __init__(self, buffer_size: int = 100):
+        self.buffer_size = buffer_size
+        self.backend = None
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._listeners: List[Callable[[dict], None]] = []
+        self._lock = threading.Lock()
+        self._listen_task = None
+
+    def add_listener(self, listener: Callable[[dict], None]) -> None:
+        """
+        Registers a synchronous in-process consumer of change events.
+
+        Args:
+            listener (Callable[[dict], None]): Function called with every event.
+        """
+        self._listeners.append(listener)
+
+    def subscribe(self, owner_id: int) -> Subscription:
+        """
+        Opens a subscription to the changes of a user. Must be called from the event loop.
+
+        Args:
+            owner_id (int): Identifier of the user.
+
+        Returns:
+            Subscription: New subscription.
+        """
+        subscription = Subscription(owner_id, asyncio.get_running_loop(), self.buffer_size)
+        with self._lock:
+            self._subscribers.setdefault(owner_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """
+        Closes a subscription.
+
+        Args:
+            subscription (Subscription): Subscription returned by subscribe.
+        """
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.owner_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.owner_id]
+
+    def connections(self) -> int:
+        """
+        Returns the number of open subscriptions in this worker.
+
+        Returns:
+            int: Number of subscriptions.
+        """
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, event: dict) -> None:
+        """
+        Publishes a change event. Safe to call from any thread.
+
+        Args:
+            event (dict): Change event with at least ``type`` and ``owner_id``.
+        """
+        event = dict(event, origin=self.origin)
+        self._notify_listeners(event)
+        if self.backend is not None:
+            try:
+                self.backend.publish(event)
+                return
+            except Exception as err:
+                logger.warning("Change backend publish failed, delivering locally: %s", err)
+        self._fan_out(event)
+
+    def deliver(self, event: dict) -> None:
+        """
+        Delivers an event received from the backend.
+
+        Args:
+            event (dict): Change event.
+        """
+        if event.get("origin") != self.origin:
+            self._notify_listeners(event)
+        self._fan_out(event)
+
+    def resync(self) -> None:
+        """
+        Tells every listener and connection that events may have been lost.
+        """
+        self._notify_listeners({"type": "resync", "owner_id": None, "origin": self.origin})
+        with self._lock:
+            subscriptions = [subscription for subscribers in self._subscribers.values()
+                             for subscription in subscribers]
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription.resync)
+
+    def _notify_listeners(self, event: dict) -> None:
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception:
+                logger.exception("Change listener %r failed", listener)
+
+    def _fan_out(self, event: dict) -> None:
+        if event["type"].startswith(LISTENER_ONLY_PREFIX):
+            return
+        with self._lock:
+            subscribers = list(self._subscribers.get(event.get("owner_id"), ()))
+        for subscription in subscribers:
+            subscription.loop.call_soon_threadsafe(subscription.put, event)
+
+    async def start(self) -> None:
+        """
+        Connects the cross-worker backend if settings.events_redis_url is set.
+        """
+        if not settings.events_redis_url:
+            return
+        self.backend = RedisBackend(settings.events_redis_url)
+        self._listen_task = asyncio.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        delay = RECONNECT_MIN_SECONDS
+        connections = 0
+
+        def subscribed():
+            nonlocal connections, delay
+            connections += 1
+            delay = RECONNECT_MIN_SECONDS
+            if connections > 1:
+                self.resync()
+
+        while True:
+            try:
+                await self.backend.listen(self.deliver, subscribed)
+                logger.warning("Change backend connection closed, reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                logger.warning("Change backend connection lost, reconnecting in %.1fs: %s", delay, err)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_SECONDS)
+
+    async def stop(self) -> None:
+        """
+        Stops listening to the cross-worker backend.
+        """
+        if self._listen_task is not None:
+            self._listen_task.cancel()
+            await asyncio.gather(self._listen_task, return_exceptions=True)
+            self._listen_task = None
+
+
+broker = ChangeBroker(settings.events_buffer_size)
+
+
+def reach_every_worker() -> bool:
+    """
+    Tells whether events published in one worker reach every worker.
+
+    That is the case with a single worker or with the Redis backend; several
+    workers without it (the default of server.py) each only see their own
+    events.
+
+    Returns:
+        bool: True if in-memory state kept current from events is current in every worker.
+    """
+    return settings.web_workers <= 1 or bool(settings.events_redis_url)
+
+
+CONTACT_WRITES = ("contact.created", "contact.updated", "contact.deleted")
+
+
+def publish_contact(event_type: str, contact, seq: Optional[int] = None) -> None:
+    """
+    Publishes a change of a contact.
+
+    Args:
+        event_type (str): One of ``contact.created``, ``contact.updated``, ``contact.deleted``.
+        contact (models.Contact): Changed contact; for deletions only id and owner_id are used.
+        seq (int, optional): Change sequence number, defaults to contact.change_seq.
+    """
+    event = {
+        "type": event_type,
+        "owner_id": contact.owner_id,
+        "contact_id": contact.id,
+        "seq": contact.change_seq if seq is None else seq,
+    }
+    if event_type != "contact.deleted":
+        event["contact"] = jsonable_encoder(schemas.Contact.from_orm(contact))
+        event["updated_at"] = jsonable_encoder(contact.updated_at)
+    broker.publish(event)
+
+
+def publish_contact_tags(contact, tags: List[str]) -> None:
+    """
+    Publishes a change of a contact's tags.
+
+    Args:
+        contact (models.Contact): Tagged contact.
+        tags (List[str]): Tag names now attached to the contact.
+    """
+    broker.publish({
+        "type": "contact.tags",
+        "owner_id": contact.owner_id,
+        "contact_id": contact.id,
+        "tags": tags,
+    })
+
+
+def publish_user(event_type: str, user) -> None:
+    """
+    Publishes a change of the user's own profile (e.g. avatar updates).
+
+    Args:
+        event_type (str): Event type, e.g. ``user.avatar``.
+        user (models.User): Changed user.
+    """
+    broker.publish({
+        "type": event_type,
+        "owner_id": user.id,
+        "user": jsonable_encoder(schemas.User.from_orm(user)),
+    })
+
+
+def publish_revocation(user_id: int, family_id: str) -> None:
+    """
+    Publishes the revocation of a refresh-token family (logout or token reuse).
+
+    Args:
+        user_id (int): Identifier of the user the family belongs to.
+        family_id (str): Identifier of the revoked family.
+    """
+    broker.publish({
+        "type": "auth.revoked",
+        "owner_id": user_id,
+        "family_id": family_id,
+    })
+
+
+def public(event: dict) -> dict:
+    """
+    Strips broker-internal fields from an event before sending it to a client.
+
+    Args:
+        event (dict): Change event.
+
+    Returns:
+        dict: Event as seen by clients.
+    """
+    return {key: value for key, value in event.items() if key != "origin"}
+
+
+def format_sse(event: dict) -> str:
+    """
+    Formats an event as a server-sent events frame.
+
+    Args:
+        event (dict): Change event.
+
+    Returns:
+        str: SSE frame.
+    """
+    frame = f"event: {event['type']}\ndata: {json.dumps(public(event))}\n\n"
+    if event.get("seq") is not None:
+        frame = f"id: {event['seq']}\n" + frame
+    return frame
@@ -0,0 +1,299 @@
+import heapq
+import re
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from contactpr import cache, events, metrics
+from contactpr.owner_cache import OwnerIndexCache
+from config import settings
+
+# Ukrainian (and Russian) letters, transliterated so that "Олександр" finds "Oleksandr"
+CYRILLIC = dict(zip(
+    "абвгґдеєжзиіїйклмнопрстуфхцчшщьюяёыэъ'’",
+    ["a", "b", "v", "h", "g", "d", "e", "ie", "zh", "z", "y", "i", "i", "i", "k", "l", "m", "n", "o", "p",
+     "r", "s", "t", "u", "f", "kh", "ts", "ch", "sh", "shch", "", "iu", "ia", "e", "y", "e", "", "", ""],
+))
+
+# spellings of the same sound, applied in order before vowels and "h" are dropped
+PHONETIC_RULES = [(re.compile(pattern), replacement) for pattern, replacement in (
+    (r"shch|sch|sh", "S"), (r"zh", "Z"), (r"tch|ch|ts|tz", "C"), (r"ph", "f"), (r"ck|q", "k"),
+    (r"x", "ks"), (r"w", "v"), (r"g", "h"), (r"c(?=[eiy])", "s"), (r"c", "k"),
+    (r"^[aeiouy]+", "A"), (r"[aeiouyh]", ""), (r"(.)\1+", r"\1"),
+)]
+
+PHONETIC_COST = 1.0
+
+
+def normalize(value: Optional[str]) -> List[str]:
+    """
+    Splits a name into lower-case ASCII words.
+
+    Cyrillic is transliterated and accents are stripped ("Zoë" becomes "zoe").
+
+    Args:
+        value (str, optional): Name.
+
+    Returns:
+        List[str]: Words of the name.
+    """
+    if not value:
+        return []
+    value = "".join(CYRILLIC.get(char, char) for char in value.lower())
+    value = unicodedata.normalize("NFKD", value).encode("ascii", "ignore").decode("ascii")
+    return re.findall(r"[a-z0-9]+", value)
+
+
+def phonetic_key(word: str) -> str:
+    """
+    Returns a coarse sound-alike key of a normalized word.
+
+    Spellings of the same sound are unified, then vowels (except a leading one,
+    kept as "A"), "h" and doubled letters are dropped: "Oleksandr",
+    "Olexandr", "Alexander" and "Олександр" all become ``ALKSNDR``.
+
+    Args:
+        word (str): Word returned by normalize.
+
+    Returns:
+        str: Phonetic key.
+    """
+    for pattern, replacement in PHONETIC_RULES:
+        word = pattern.sub(replacement, word)
+    return word.upper()
+
+
+def max_distance(word: str) -> int:
+    """
+    Returns the number of typos tolerated in a query word of this length.
+
+    Args:
+        word (str): Normalized query word.
+
+    Returns:
+        int: 0 up to 2 letters, 1 above.
+    """
+    return 0 if len(word) <= 2 else 1
+
+
+def deletions(word: str) -> Set[str]:
+    """
+    Returns a word and the variants of it with one letter removed.
+
+    Two words within one typo (insertion, deletion, substitution or swap of
+    adjacent letters) always share one of these variants.
+
+    Args:
+        word (str): Normalized word.
+
+    Returns:
+        Set[str]: Variants, including the word itself.
+    """
+    variants = {word}
+    if max_distance(word):
+        variants.update(word[:position] + word[position + 1:] for position in range(len(word)))
+    return variants
+
+
+def edit_distance(first: str, second: str, limit: int) -> int:
+    """
+    Damerau-Levenshtein distance (optimal string alignment), a swap of adjacent letters counting as one edit.
+
+    Args:
+        first (str): Word.
+        second (str): Word.
+        limit (int): Distance above which the exact value does not matter.
+
+    Returns:
+        int: Distance, or limit + 1 if it exceeds limit.
+    """
+    if abs(len(first) - len(second)) > limit:
+        return limit + 1
+    previous_row = None
+    row = list(range(len(second) + 1))
+    for i in range(1, len(first) + 1):
+        previous_row, prior = row, previous_row
+        row = [i] + [0] * len(second)
+        for j in range(1, len(second) + 1):
+            cost = first[i - 1] != second[j - 1]
+            row[j] = min(previous_row[j] + 1, row[j - 1] + 1, previous_row[j - 1] + cost)
+            if (i > 1 and j > 1 and first[i - 1] == second[j - 2] and first[i - 2] == second[j - 1]):
+                row[j] = min(row[j], prior[j - 2] + 1)
+        if min(row) > limit:
+            return limit + 1
+    return row[-1]
+
+
+class FuzzyIndex:
+    """
+    In-memory typo-tolerant and phonetic index over the first and last names of one owner's contacts.
+
+    Distinct name words are indexed by their one-letter deletions (a
+    symmetric-deletion index, as in SymSpell) and by phonetic key. A query
+    word looks up its own deletions and phonetic key, so candidates are found
+    with a few dictionary lookups and only they are checked with the edit
+    distance: a search never scans every contact.
+
+    Args:
+        rows (Iterable[tuple]): (id, first_name, last_name, email, change_seq) rows.
+    """
+
+    def __init__(self, rows: Iterable[Tuple[int, str, str, str, Optional[int]]] = ()):
+        self._contacts: Dict[int, tuple] = {}
+        self._words: Dict[str, Set[int]] = {}
+        self._deletions: Dict[str, Set[str]] = {}
+        self._phonetic: Dict[str, Set[str]] = {}
+        self._postings = 0
+        self._lock = threading.Lock()
+        for contact_id, first_name, last_name, email, seq in rows:
+            self._add(contact_id, first_name, last_name, email, seq)
+
+    def cost(self) -> int:
+        """
+        Returns the number of (word, contact) entries and deletion variants, used as the memory estimate.
+
+        Returns:
+            int: Number of entries.
+        """
+        return self._postings + len(self._deletions)
+
+    def add(self, contact_id: int, first_name: str, last_name: str, email: str, seq: Optional[int]) -> None:
+        """
+        Adds or replaces a contact.
+
+        Args:
+            contact_id (int): Identifier of the contact.
+            first_name (str): First name.
+            last_name (str): Last name.
+            email (str): Email address, returned with the matches.
+            seq (int, optional): Change sequence number, breaking ties in the ranking.
+        """
+        with self._lock:
+            self._remove(contact_id)
+            self._add(contact_id, first_name, last_name, email, seq)
+
+    def remove(self, contact_id: int) -> None:
+        """
+        Removes a contact.
+
+        Args:
+            contact_id (int): Identifier of the contact.
+        """
+        with self._lock:
+            self._remove(contact_id)
+
+    def _add(self, contact_id: int, first_name: str, last_name: str, email: str, seq: Optional[int]) -> None:
+        words = frozenset(normalize(first_name) + normalize(last_name))
+        self._contacts[contact_id] = (first_name, last_name, email, seq or 0, words)
+        for word in words:
+            contacts = self._words.get(word)
+            if contacts is None:
+                contacts = self._words[word] = set()
+                for variant in deletions(word):
+                    self._deletions.setdefault(variant, set()).add(word)
+                self._phonetic.setdefault(phonetic_key(word), set()).add(word)
+            contacts.add(contact_id)
+        self._postings += len(words)
+
+    def _remove(self, contact_id: int) -> None:
+        contact = self._contacts.pop(contact_id, None)
+        if contact is None:
+            return
+        for word in contact[4]:
+            contacts = self._words[word]
+            contacts.discard(contact_id)
+            if contacts:
+                continue
+            del self._words[word]
+            for variant in deletions(word):
+                _discard(self._deletions, variant, word)
+            _discard(self._phonetic, phonetic_key(word), word)
+        self._postings -= len(contact[4])
+
+    def apply(self, event: dict) -> None:
+        """
+        Applies a contact change event.
+
+        Args:
+            event (dict): Contact change event.
+        """
+        contact = event.get('contact')
+        if event['type'] == 'contact.deleted':
+            self.remove(event['contact_id'])
+        elif contact is not None:
+            self.add(event['contact_id'], contact['first_name'], contact['last_name'], contact['email'],
+                     event.get('seq'))
+
+    def _matches(self, query: str) -> Dict[str, float]:
+        # indexed words close to one query word, with their cost (0 for an exact match)
+        limit = max_distance(query)
+        matches = {}
+        for variant in deletions(query):
+            for word in self._deletions.get(variant, ()):
+                if word not in matches:
+                    distance = edit_distance(query, word, limit)
+                    if distance <= limit:
+                        matches[word] = float(distance)
+        key = phonetic_key(query)
+        if len(key) > 2:
+            for word in self._phonetic.get(key, ()):
+                if word not in matches:
+                    matches[word] = PHONETIC_COST + edit_distance(query, word, 9) / 10
+        return matches
+
+    def search(self, query: str, limit: int) -> List[dict]:
+        """
+        Returns the contacts best matching a query, allowing typos and sound-alike spellings.
+
+        Every word of the query must match a word of the contact's first or last
+        name exactly, with one typo (from three letters on) or by phonetic key.
+        Contacts are ranked by the total cost of their words: an exact word costs
+        0, a typo 1 and a phonetic match a little over 1; ties go to the most
+        recently changed contact.
+
+        Args:
+            query (str): Search text.
+            limit (int): Number of contacts to return.
+
+        Returns:
+            List[dict]: Matches with id, first_name, last_name, email and score
+                (1 for an exact match, lower for more typos).
+        """
+        words = normalize(query)
+        if not words:
+            return []
+        with self._lock:
+            costs: Optional[Dict[int, float]] = None
+            for query_word in dict.fromkeys(words):
+                word_costs: Dict[int, float] = {}
+                for word, cost in self._matches(query_word).items():
+                    for contact_id in self._words[word]:
+                        if costs is not None and contact_id not in costs:
+                            continue
+                        if cost < word_costs.get(contact_id, float("inf")):
+                            word_costs[contact_id] = cost
+                if costs is not None:
+                    word_costs = {contact_id: costs[contact_id] + cost for contact_id, cost in word_costs.items()}
+                costs = word_costs
+                if not costs:
+                    return []
+            best = heapq.nsmallest(limit, costs.items(), key=lambda item: (item[1], -self._contacts[item[0]][3],
+                                                                          item[0]))
+            return [
+                {"id": contact_id, "first_name": self._contacts[contact_id][0],
+                 "last_name": self._contacts[contact_id][1], "email": self._contacts[contact_id][2],
+                 "score": round(1 / (1 + cost), 3)}
+                for contact_id, cost in best
+            ]
+
+
+def _discard(index: dict, key, word: str) -> None:
+    words = index.get(key)
+    if words is not None:
+        words.discard(word)
+        if not words:
+            del index[key]
+
+
+index_cache: OwnerIndexCache[FuzzyIndex] = OwnerIndexCache(settings.fuzzy_index_max_entries, cache.owner_generation())
+events.broker.add_listener(index_cache.on_change)
+metrics.register("fuzzy_index", index_cache.stats)
@@ -0,0 +1,262 @@
+import datetime
+import hashlib
+import hmac
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from contactpr import cache, events
+from config import settings
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def feed_token(user_id: int) -> str:
+    """
+    Returns the token that authenticates the birthday feed of a user.
+
+    Calendar clients cannot send bearer tokens, so the feed URL itself carries
+    an HMAC of the user id.
+
+    Args:
+        user_id (int): Identifier of the user.
+
+    Returns:
+        str: Feed token.
+    """
+    message = f"ical-feed:{user_id}".encode('utf-8')
+    return hmac.new(settings.secret_key.encode('utf-8'), message, hashlib.sha256).hexdigest()[:32]
+
+
+def verify_feed_token(user_id: int, token: str) -> bool:
+    """
+    Checks a feed token without touching the database.
+
+    Args:
+        user_id (int): Identifier of the user from the feed URL.
+        token (str): Token from the feed URL.
+
+    Returns:
+        bool: True if the token belongs to the user.
+    """
+    return hmac.compare_digest(token, feed_token(user_id))
+
+
+def _escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _fold(line: str) -> str:
+    # RFC 5545: lines longer than 75 octets are folded with CRLF + space
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line
+    parts, start = [], 0
+    while start < len(encoded):
+        end = min(start + (75 if not parts else 74), len(encoded))
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode('utf-8'))
+        start = end
+    return '\r\n '.join(parts)
+
+
+def render_event(contact_id: int, first_name: str, last_name: str, birthday: datetime.date,
+                 updated_at: Optional[datetime.datetime]) -> str:
+    """
+    Renders the yearly recurring birthday event of a contact.
+
+    Args:
+        contact_id (int): Identifier of the contact.
+        first_name (str): First name of the contact.
+        last_name (str): Last name of the contact.
+        birthday (datetime.date): Birthday of the contact.
+        updated_at (datetime.datetime, optional): Time the contact was last edited (UTC),
+            used as DTSTAMP; the Unix epoch if unknown.
+
+    Returns:
+        str: VEVENT block with CRLF line endings.
+    """
+    rule = 'FREQ=YEARLY'
+    if birthday.month == 2 and birthday.day == 29:
+        rule += ';BYMONTH=2;BYMONTHDAY=-1'
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:contact-{contact_id}-birthday@contacts',
+        f'DTSTAMP:{updated_at or EPOCH:%Y%m%dT%H%M%SZ}',
+        f'DTSTART;VALUE=DATE:{birthday:%Y%m%d}',
+        f'RRULE:{rule}',
+        f'SUMMARY:{_escape(f"Birthday: {first_name} {last_name}".strip())}',
+        'TRANSP:TRANSPARENT',
+        'END:VEVENT',
+    ]
+    return ''.join(_fold(line) + '\r\n' for line in lines)
+
+
+def render_calendar(vevents: Iterable[str]) -> bytes:
+    """
+    Wraps rendered events into a VCALENDAR document.
+
+    Args:
+        vevents (Iterable[str]): Rendered VEVENT blocks.
+
+    Returns:
+        bytes: UTF-8 encoded calendar.
+    """
+    header = (
+        'BEGIN:VCALENDAR\r\n'
+        'VERSION:2.0\r\n'
+        'PRODID:-//contacts//birthdays//EN\r\n'
+        'CALSCALE:GREGORIAN\r\n'
+        'X-WR-CALNAME:Birthdays\r\n'
+    )
+    return (header + ''.join(vevents) + 'END:VCALENDAR\r\n').encode('utf-8')
+
+
+class BirthdayFeedCache:
+    """
+    LRU cache of rendered birthday feeds, kept current from contact change events.
+
+    Every cached feed keeps its VEVENT blocks per contact. A change event
+    re-renders only the block of the changed contact (events carry the contact
+    data, so no query is needed) and marks the document for re-assembly. When
+    change events do not reach every worker, a feed is only reused while its
+    owner's generation is the one it was loaded at.
+
+    Args:
+        max_feeds (int): Maximum number of cached feeds.
+        generation (Callable[[int], int], optional): Current generation of an owner
+            (see contactpr.cache.owner_generation).
+        cached_generation (Callable[[int], Optional[int]], optional): Generation of an
+            owner if known without a query (see contactpr.cache.cached_owner_generation).
+    """
+
+    def __init__(self, max_feeds: int, generation: Optional[Callable[[int], int]] = None,
+                 cached_generation: Optional[Callable[[int], Optional[int]]] = None):
+        self.max_feeds = max_feeds
+        self.generation = generation
+        self.cached_generation = cached_generation
+        self._feeds: "OrderedDict[int, dict]" = OrderedDict()
+        self._loading: Dict[int, int] = {}
+        self._changed_while_loading = set()
+        self._lock = threading.Lock()
+
+    def peek(self, owner_id: int) -> Optional[Tuple[bytes, str]]:
+        """
+        Returns the cached feed of a user without loading it or touching the database.
+
+        Args:
+            owner_id (int): Identifier of the user.
+
+        Returns:
+            tuple: Calendar body and ETag, or None if the feed is not cached or
+            its owner's generation has to be read first.
+        """
+        generation = None
+        if self.generation is not None:
+            generation = self.cached_generation(owner_id) if self.cached_generation is not None else None
+            if generation is None:
+                return None
+        return self._cached(owner_id, generation)
+
+    def _cached(self, owner_id: int, generation: Optional[int]) -> Optional[Tuple[bytes, str]]:
+        with self._lock:
+            feed = self._feeds.get(owner_id)
+            if feed is None:
+                return None
+            if feed['generation'] != generation:
+                del self._feeds[owner_id]
+                return None
+            self._feeds.move_to_end(owner_id)
+            if feed['body'] is None:
+                self._assemble(feed)
+            return feed['body'], feed['etag']
+
+    def get(self, owner_id: int, loader: Callable[[], Iterable[tuple]]) -> Tuple[bytes, str]:
+        """
+        Returns the rendered feed of a user and its ETag.
+
+        Args:
+            owner_id (int): Identifier of the user.
+            loader (Callable): Called on a cache miss; returns
+                (id, first_name, last_name, birthday, updated_at) rows.
+
+        Returns:
+            tuple: Calendar body and ETag.
+        """
+        generation = self.generation(owner_id) if self.generation is not None else None
+        cached = self._cached(owner_id, generation)
+        if cached is not None:
+            return cached
+        with self._lock:
+            self._loading[owner_id] = self._loading.get(owner_id, 0) + 1
+        try:
+            feed = {'events': {row[0]: render_event(*row) for row in loader()}, 'body': None, 'etag': None,
+                    'generation': generation}
+            self._assemble(feed)
+        finally:
+            with self._lock:
+                raced = owner_id in self._changed_while_loading
+                self._loading[owner_id] -= 1
+                if not self._loading[owner_id]:
+                    del self._loading[owner_id]
+                    self._changed_while_loading.discard(owner_id)
+        with self._lock:
+            # a write that raced with the loader may be missing from the result,
+            # so serve it once without caching it
+            if not raced:
+                self._feeds[owner_id] = feed
+                while len(self._feeds) > self.max_feeds:
+                    self._feeds.popitem(last=False)
+        return feed['body'], feed['etag']
+
+    @staticmethod
+    def _assemble(feed: dict) -> None:
+        body = render_calendar(feed['events'][contact_id] for contact_id in sorted(feed['events']))
+        feed['body'] = body
+        feed['etag'] = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+    def on_change(self, event: dict) -> None:
+        """
+        Change listener updating the cached feed of the event's owner.
+
+        A broker ``resync`` drops every feed, including those being loaded.
+
+        Args:
+            event (dict): Contact change event.
+        """
+        if event['type'] == 'resync':
+            with self._lock:
+                self._changed_while_loading.update(self._loading)
+                self._feeds.clear()
+            return
+        if event['type'] not in events.CONTACT_WRITES:
+            return
+        with self._lock:
+            if event['owner_id'] in self._loading:
+                self._changed_while_loading.add(event['owner_id'])
+            feed = self._feeds.get(event['owner_id'])
+            if feed is None:
+                return
+            contact = event.get('contact')
+            if event['type'] == 'contact.deleted' or not contact or not contact.get('birthday'):
+                if feed['events'].pop(event['contact_id'], None) is None:
+                    return
+            else:
+                birthday = datetime.date.fromisoformat(contact['birthday'])
+                updated_at = event.get('updated_at')
+                feed['events'][event['contact_id']] = render_event(
+                    event['contact_id'], contact['first_name'], contact['last_name'], birthday,
+                    datetime.datetime.fromisoformat(updated_at) if updated_at else None)
+            feed['body'] = None
+
+    def clear(self) -> None:
+        """
+        Drops all cached feeds.
+        """
+        with self._lock:
+            self._feeds.clear()
+
+
+feed_cache = BirthdayFeedCache(settings.ical_cache_max_feeds, cache.owner_generation(),
+                               cache.cached_owner_generation())
+events.broker.add_listener(feed_cache.on_change)
@@ -0,0 +1,393 @@
+"""
+Idempotency-Key support for non-repeatable POSTs.
+
+A client that retries ``POST /contacts/`` or ``POST /signup`` with the same
+``Idempotency-Key`` header gets the stored response of the first execution
+instead of running the endpoint again. Keys are scoped to the user of the
+bearer token (requests without a valid token, e.g. signups, share one
+scope), so different users cannot see each other's responses.
+
+* The first request claims the key in the store and runs normally; its status,
+  headers and body are stored for ``settings.idempotency_ttl_seconds``.
+* A duplicate arriving while the first one runs waits for it (on an asyncio
+  event in the same worker, by polling the store across workers) and then
+  replays its response.
+* Records live in Redis if ``settings.idempotency_redis_url`` is set, in the
+  idempotency_keys table if several workers serve the app without it, and in
+  the memory of the worker otherwise.
+* Replays are served by the middleware before routing, so they never reach the
+  database or bcrypt. They carry ``Idempotent-Replayed: true``.
+* Reusing a key with a different request body is rejected with 422.
+* 5xx responses, exceptions and the transient RETRYABLE_STATUSES (401, 408,
+  409, 429) release the key, so the retry runs again.
+"""
+import asyncio
+import base64
+import hashlib
+import heapq
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from jose import JWTError, jwt
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+from contactpr import database, metrics, models
+from config import settings
+
+IDEMPOTENT_ROUTES = {("POST", "/contacts/"), ("POST", "/signup")}
+HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+# not the outcome of the request itself: a retry may well succeed
+RETRYABLE_STATUSES = {401, 408, 409, 429}
+POLL_INTERVAL = 0.05
+# how often the database store deletes expired records
+SWEEP_INTERVAL = 60.0
+
+
+class InMemoryIdempotencyStore:
+    """
+    Per-process store of idempotency records, for tests and single-worker setups.
+
+    Expiry times are kept in a heap as well, so every claim and set sweeps the
+    expired records in O(log n) each instead of keeping them until their key
+    comes back.
+    """
+
+    def __init__(self):
+        self._records: Dict[str, Tuple[float, bytes]] = {}
+        self._expiry: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+
+    def _sweep(self) -> None:
+        now = time.monotonic()
+        while self._expiry and self._expiry[0][0] < now:
+            expires_at, key = heapq.heappop(self._expiry)
+            entry = self._records.get(key)
+            # the key may have been set again since
+            if entry is not None and entry[0] == expires_at:
+                del self._records[key]
+
+    def _put(self, key: str, record: bytes, ttl: float) -> None:
+        expires_at = time.monotonic() + ttl
+        self._records[key] = (expires_at, record)
+        heapq.heappush(self._expiry, (expires_at, key))
+
+    def claim(self, key: str, record: bytes, ttl: float) -> Optional[bytes]:
+        with self._lock:
+            self._sweep()
+            entry = self._records.get(key)
+            if entry is not None:
+                return entry[1]
+            self._put(key, record, ttl)
+            return None
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._records.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            return entry[1]
+
+    def set(self, key: str, record: bytes, ttl: float) -> None:
+        with self._lock:
+            self._sweep()
+            self._put(key, record, ttl)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._records.pop(key, None)
+
+
+class RedisIdempotencyStore:
+    """
+    Idempotency records in Redis, shared by all workers.
+
+    Args:
+        url (str): Redis connection URL.
+    """
+
+    def __init__(self, url: str):
+        import redis
+        self._client = redis.Redis.from_url(url)
+
+    def claim(self, key: str, record: bytes, ttl: float) -> Optional[bytes]:
+        while True:
+            if self._client.set(key, record, nx=True, ex=max(1, int(ttl))):
+                return None
+            existing = self._client.get(key)
+            if existing is not None:
+                return existing
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(key)
+
+    def set(self, key: str, record: bytes, ttl: float) -> None:
+        self._client.set(key, record, ex=max(1, int(ttl)))
+
+    def delete(self, key: str) -> None:
+        self._client.delete(key)
+
+
+class DatabaseIdempotencyStore:
+    """
+    Idempotency records in the idempotency_keys table, shared by all workers.
+
+    Used when several workers serve the app without Redis. A key is claimed
+    with an insert that only overwrites an expired record, so of two workers
+    claiming it at once exactly one wins; expired records are deleted at most
+    every SWEEP_INTERVAL seconds per worker.
+
+    Args:
+        engine: Engine of the primary database.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._table = models.IdempotencyRecord.__table__
+        self._next_sweep = 0.0
+
+    def claim(self, key: str, record: bytes, ttl: float) -> Optional[bytes]:
+        table = self._table
+        while True:
+            now = datetime.utcnow()
+            values = {"key": key, "record": record, "expires_at": now + timedelta(seconds=ttl)}
+            with self.engine.begin() as connection:
+                dialect = connection.dialect.name
+                if dialect in ("postgresql", "sqlite"):
+                    insert = (postgresql if dialect == "postgresql" else sqlite).insert(table).values(**values)
+                    claimed = connection.execute(insert.on_conflict_do_update(
+                        index_elements=[table.c.key],
+                        set_={"record": insert.excluded.record, "expires_at": insert.excluded.expires_at},
+                        where=table.c.expires_at < now)).rowcount
+                else:
+                    connection.execute(delete(table).where(table.c.key == key, table.c.expires_at < now))
+                    try:
+                        with connection.begin_nested():
+                            connection.execute(table.insert().values(**values))
+                        claimed = 1
+                    except IntegrityError:
+                        claimed = 0
+                if claimed:
+                    return None
+                existing = connection.execute(
+                    select(table.c.record).where(table.c.key == key, table.c.expires_at >= now)).scalar()
+            if existing is not None:
+                return existing
+
+    def get(self, key: str) -> Optional[bytes]:
+        table = self._table
+        statement = select(table.c.record).where(table.c.key == key, table.c.expires_at >= datetime.utcnow())
+        with self.engine.connect() as connection:
+            return connection.execute(statement).scalar()
+
+    def set(self, key: str, record: bytes, ttl: float) -> None:
+        table = self._table
+        now = datetime.utcnow()
+        with self.engine.begin() as connection:
+            if time.monotonic() >= self._next_sweep:
+                self._next_sweep = time.monotonic() + SWEEP_INTERVAL
+                connection.execute(delete(table).where(table.c.expires_at < now))
+            # the claim row exists unless it expired while the request ran
+            connection.execute(table.update().where(table.c.key == key).values(
+                record=record, expires_at=now + timedelta(seconds=ttl)))
+
+    def delete(self, key: str) -> None:
+        with self.engine.begin() as connection:
+            connection.execute(delete(self._table).where(self._table.c.key == key))
+
+
+def _store():
+    if settings.idempotency_redis_url:
+        return RedisIdempotencyStore(settings.idempotency_redis_url)
+    # a claim in the memory of one worker is invisible to a retry landing on another
+    if settings.web_workers > 1:
+        return DatabaseIdempotencyStore(database.engine)
+    return InMemoryIdempotencyStore()
+
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware honouring the Idempotency-Key header on IDEMPOTENT_ROUTES.
+
+    Store calls block (Redis or the database), so they run in the thread pool.
+
+    Args:
+        app: ASGI application.
+        store: Record store; by default Redis, the database or in-memory (see _store).
+    """
+
+    def __init__(self, app, store=None):
+        self.app = app
+        self.store = store if store is not None else _store()
+        self.executions = 0
+        self.replays = 0
+        self.waits = 0
+        self.conflicts = 0
+        self._in_flight: Dict[str, asyncio.Event] = {}
+        metrics.register("idempotency", self.stats)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (scope["method"], scope["path"]) not in IDEMPOTENT_ROUTES:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        idempotency_key = headers.get(HEADER)
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            await _send_json(send, 400, {"detail": "Invalid Idempotency-Key header"})
+            return
+
+        body = await _read_body(receive)
+        caller = hashlib.sha256(_caller(headers.get(b"authorization", b"")).encode()).hexdigest()[:32]
+        key = f"idem:{caller}:{scope['path']}:{idempotency_key.decode('latin-1')}"
+        fingerprint = hashlib.sha256(b"%s %s?%s\n%s" % (
+            scope["method"].encode(), scope["path"].encode(), scope["query_string"], body)).hexdigest()
+
+        claim = json.dumps({"state": "in_flight", "fingerprint": fingerprint}).encode()
+        deadline = time.monotonic() + settings.idempotency_wait_seconds
+        waited = False
+        while True:
+            existing = await run_in_threadpool(self.store.claim, key, claim, settings.idempotency_lock_seconds)
+            if existing is None:
+                # first execution, or the one we waited for failed and released the key
+                await self._execute(key, fingerprint, scope, body, receive, send)
+                return
+            record = json.loads(existing)
+            if record["fingerprint"] != fingerprint:
+                self.conflicts += 1
+                await _send_json(send, 422, {"detail": "Idempotency-Key was used for a different request"})
+                return
+            if record["state"] == "done":
+                break
+            if not waited:
+                self.waits += 1
+                waited = True
+            if time.monotonic() >= deadline:
+                self.conflicts += 1
+                await _send_json(send, 409, {"detail": "A request with this Idempotency-Key is still in progress"})
+                return
+            await self._wait(key, deadline)
+        self.replays += 1
+        await _replay(send, record)
+
+    async def _execute(self, key: str, fingerprint: str, scope, body: bytes, receive, send) -> None:
+        self.executions += 1
+        done = self._in_flight[key] = asyncio.Event()
+        response = {"status": 500, "headers": [], "body": []}
+        stored = False
+        delivered = False
+
+        async def buffered_receive():
+            # the body was read to fingerprint it; later reads wait for the disconnect
+            nonlocal delivered
+            if delivered:
+                return await receive()
+            delivered = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def capture(message):
+            nonlocal stored
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = message.get("headers", [])
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+                if not message.get("more_body", False) and _final(response["status"]):
+                    # stored before background tasks (e.g. the signup e-mail) run
+                    await run_in_threadpool(self.store.set, key, _encode(fingerprint, response),
+                                            settings.idempotency_ttl_seconds)
+                    stored = True
+                    done.set()
+            await send(message)
+
+        try:
+            await self.app(scope, buffered_receive, capture)
+        finally:
+            if not stored:
+                await run_in_threadpool(self.store.delete, key)
+            del self._in_flight[key]
+            done.set()
+
+    async def _wait(self, key: str, deadline: float) -> None:
+        remaining = max(0.0, deadline - time.monotonic())
+        local = self._in_flight.get(key)
+        if local is None:
+            # claimed by another worker: poll the store
+            await asyncio.sleep(min(POLL_INTERVAL, remaining))
+            return
+        try:
+            await asyncio.wait_for(local.wait(), remaining)
+        except asyncio.TimeoutError:
+            pass
+
+    def stats(self) -> dict:
+        """
+        Returns execution, replay, wait and conflict counters.
+
+        Returns:
+            dict: Idempotency metrics.
+        """
+        return {
+            "executions": self.executions,
+            "replays": self.replays,
+            "waits": self.waits,
+            "conflicts": self.conflicts,
+            "in_flight": len(self._in_flight),
+        }
+
+
+def _caller(authorization: bytes) -> str:
+    scheme, _, token = authorization.decode("latin-1").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return "anonymous"
+    try:
+        subject = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm]).get("sub")
+    except JWTError:
+        return "anonymous"
+    return f"user:{subject}" if subject else "anonymous"
+
+
+def _final(status: int) -> bool:
+    return status < 500 and status not in RETRYABLE_STATUSES
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+
+def _encode(fingerprint: str, response: dict) -> bytes:
+    return json.dumps({
+        "state": "done",
+        "fingerprint": fingerprint,
+        "status": response["status"],
+        "headers": [[name.decode("latin-1"), value.decode("latin-1")] for name, value in response["headers"]],
+        "body": base64.b64encode(b"".join(response["body"])).decode("ascii"),
+    }).encode()
+
+
+async def _replay(send, record: dict) -> None:
+    headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in record["headers"]]
+    headers.append((b"idempotent-replayed", b"true"))
+    await send({"type": "http.response.start", "status": record["status"], "headers": headers})
+    await send({"type": "http.response.body", "body": base64.b64decode(record["body"])})
+
+
+async def _send_json(send, status: int, payload: dict) -> None:
+    body = json.dumps(payload).encode()
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
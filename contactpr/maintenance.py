@@ -0,0 +1,134 @@
+import os
+import socket
+from datetime import timedelta
+from typing import Callable
+from contactpr.background_tasks import start_periodic
+from contactpr.database import SessionLocal
+from contactpr.revocation import recent_revocations, revoked_families
+from repository import job_leases as repository_job_leases
+from repository import refresh_tokens as repository_refresh_tokens
+from repository import stats as repository_stats
+from repository import soft_delete as repository_soft_delete
+from repository import sync as repository_sync
+from config import settings
+
+# lifetime of a job lease, in job intervals
+LEASE_INTERVALS = 1.5
+
+
+def purge_deleted_contacts() -> int:
+    """
+    Purges contacts whose undo window has expired, in throttled batches.
+
+    Returns:
+        int: Number of purged contacts.
+    """
+    db = SessionLocal()
+    try:
+        return repository_soft_delete.purge_deleted_contacts(
+            db, timedelta(hours=settings.contacts_undo_window_hours), settings.contacts_purge_batch_size,
+            settings.contacts_purge_pause_seconds, settings.contacts_purge_max_batches)
+    finally:
+        db.close()
+
+
+def compact_tombstones() -> int:
+    """
+    Removes delta sync tombstones older than the retention period.
+
+    Returns:
+        int: Number of removed tombstones.
+    """
+    db = SessionLocal()
+    try:
+        return repository_sync.compact_tombstones(db, timedelta(days=settings.sync_tombstone_retention_days))
+    finally:
+        db.close()
+
+
+def reconcile_contact_stats() -> int:
+    """
+    Repairs drift between the contact statistics and the contacts, in batches of users.
+
+    Returns:
+        int: Number of corrected counters.
+    """
+    db = SessionLocal()
+    try:
+        return repository_stats.reconcile_contact_stats(
+            db, settings.stats_reconcile_batch_size, settings.stats_reconcile_pause_seconds)
+    finally:
+        db.close()
+
+
+def load_revocations() -> None:
+    """
+    Rebuilds the revocation filter from families revoked within the access token lifetime.
+    """
+    revoked_families.reload(recent_revocations)
+
+
+def clean_refresh_tokens() -> int:
+    """
+    Deletes expired refresh tokens.
+
+    Returns:
+        int: Number of deleted tokens.
+    """
+    db = SessionLocal()
+    try:
+        return repository_refresh_tokens.purge_expired_refresh_tokens(db)
+    finally:
+        db.close()
+
+
+def leader_only(name: str, interval: float, job: Callable[[], object]) -> Callable[[], object]:
+    """
+    Restricts a job that works on shared data to one worker at a time.
+
+    With several workers, each run first takes or renews the job's lease in
+    the job_leases table and is skipped unless this worker holds it. The
+    lease lasts LEASE_INTERVALS intervals, so the holder keeps it from run to
+    run and another worker takes over when the holder is gone.
+
+    Args:
+        name (str): Name of the job.
+        interval (float): Seconds between runs.
+        job (Callable[[], object]): Job to run.
+
+    Returns:
+        Callable[[], object]: Job returning None in the workers that skip it.
+    """
+    if settings.web_workers <= 1:
+        return job
+
+    def run():
+        db = SessionLocal()
+        try:
+            # resolved at run time: the app may be imported in the gunicorn master before forking
+            holder = f"{socket.gethostname()}:{os.getpid()}"
+            leader = repository_job_leases.acquire_lease(db, name, holder, timedelta(seconds=interval * LEASE_INTERVALS))
+        finally:
+            db.close()
+        return job() if leader else None
+
+    return run
+
+
+def _schedule(name: str, interval: float, job: Callable[[], object]) -> None:
+    start_periodic(name, interval, leader_only(name, interval, job))
+
+
+def start() -> None:
+    """
+    Schedules the maintenance jobs of this worker.
+
+    Jobs on shared data run in one worker at a time (see leader_only); every
+    worker rebuilds its own revocation filter, which also drops revocations
+    whose access tokens have expired.
+    """
+    _schedule("purge-deleted-contacts", settings.contacts_purge_interval_seconds, purge_deleted_contacts)
+    _schedule("compact-tombstones", settings.sync_compaction_interval_seconds, compact_tombstones)
+    _schedule("clean-refresh-tokens", settings.refresh_token_cleanup_interval_seconds, clean_refresh_tokens)
+    _schedule("reconcile-contact-stats", settings.stats_reconcile_interval_seconds, reconcile_contact_stats)
+    start_periodic("load-revocations", settings.refresh_token_cleanup_interval_seconds, load_revocations)
@@ -0,0 +1,278 @@
+"""
+On-demand tracemalloc profiling of a running worker, per route.
+
+A memory session turns tracemalloc on (unless it is already tracing) and
+attributes memory to routes in two ways:
+
+* peak: for every request that ran alone in the worker, how far traced
+  memory rose above its level when the request started. This is the
+  transient spike behind RSS growth (loading a whole contact list, reading
+  an upload). Overlapping requests cannot be told apart and are only counted.
+* retained: at the end, a snapshot is compared with the one taken at the
+  start, and every allocation site that grew is attributed to the route
+  whose endpoint is on its traceback (caches, leaks).
+
+Outside a session tracemalloc is off (see contactpr.profiling for the
+session registry and middleware). peak_allocation() measures a single call
+the same way, for the allocation budget tests.
+"""
+import asyncio
+import dis
+import linecache
+import os
+import tracemalloc
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from contactpr import profiling
+
+
+class MemoryProfilerBusy(profiling.SessionBusy):
+    """
+    Raised when a memory profiling session is already running in this worker.
+    """
+
+
+def _line_range(code) -> Tuple[int, int]:
+    lines = [line for _, line in dis.findlinestarts(code) if line is not None]
+    for const in code.co_consts:
+        # nested functions (e.g. the cache loaders of the list routes)
+        if hasattr(const, "co_code"):
+            lines.extend(_line_range(const))
+    return min(lines, default=code.co_firstlineno), max(lines, default=code.co_firstlineno)
+
+
+def _site(frame) -> str:
+    filename = os.sep.join(frame.filename.split(os.sep)[-2:])
+    source = linecache.getline(frame.filename, frame.lineno).strip()
+    return f"{filename}:{frame.lineno} {source}".rstrip()
+
+
+def peak_allocation(func: Callable, *args, **kwargs) -> Tuple[Any, int]:
+    """
+    Calls a function and measures how far traced memory rose during the call.
+
+    Tracemalloc is started for the call if it is not already tracing. All
+    threads are traced, so concurrent work in the process is included.
+
+    Args:
+        func (Callable): Function to call.
+        *args: Positional arguments of the call.
+        **kwargs: Keyword arguments of the call.
+
+    Returns:
+        Tuple[Any, int]: Result of the call and peak allocation in bytes.
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        result = func(*args, **kwargs)
+        return result, tracemalloc.get_traced_memory()[1] - base
+    finally:
+        if started:
+            tracemalloc.stop()
+
+
+class MemorySession:
+    """
+    One memory profiling run.
+
+    Args:
+        app: FastAPI application whose routes are profiled.
+        seconds (float): Maximum duration of the session.
+        route (str, optional): Only count requests of this route template.
+        requests (int, optional): Stop after this many requests matching ``route`` (or any route) finished.
+        frames (int): Traceback depth stored per allocation; deep enough to reach the endpoint.
+        top (int): Number of allocation sites reported per route.
+    """
+
+    def __init__(self, app, seconds: float, route: Optional[str] = None, requests: Optional[int] = None,
+                 frames: int = 25, top: int = 10):
+        self.seconds = seconds
+        self.route = route
+        self.requests = requests
+        self.frames = frames
+        self.top = top
+        self.finished_requests = 0
+        self.overlapping_requests = 0
+        self.peaks: Dict[str, List[int]] = defaultdict(list)
+        self.retained: Dict[str, dict] = {}
+        self.endpoints: Dict[str, List[Tuple[int, int, str]]] = defaultdict(list)
+        for code, label in profiling.route_table(app):
+            first, last = _line_range(code)
+            self.endpoints[code.co_filename].append((first, last, label))
+        self._in_flight: Dict[object, Optional[int]] = {}
+        self._started_tracing = False
+        self._start_snapshot = None
+        self._stop = asyncio.Event()
+        self._done = asyncio.Event()
+
+    def _begin(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracing = True
+        self._start_snapshot = tracemalloc.take_snapshot()
+
+    def request_started(self, token: object, scope: dict) -> None:
+        """
+        Registers a request; only a request that starts in an idle worker gets a peak baseline.
+
+        Args:
+            token (object): Identifies the request until request_finished.
+            scope (dict): ASGI scope of the request.
+        """
+        if self._in_flight:
+            for other in self._in_flight:
+                self._in_flight[other] = None
+            self._in_flight[token] = None
+            return
+        tracemalloc.reset_peak()
+        self._in_flight[token] = tracemalloc.get_traced_memory()[0]
+
+    def request_finished(self, token: object, scope: dict) -> None:
+        """
+        Records the peak of a finished request and stops the session once enough matching requests were seen.
+
+        Args:
+            token (object): Token passed to request_started.
+            scope (dict): ASGI scope of the request.
+        """
+        base = self._in_flight.pop(token, None)
+        label = profiling.request_label(scope, self.route)
+        if label is None:
+            return
+        if base is None:
+            self.overlapping_requests += 1
+        else:
+            self.peaks[label].append(tracemalloc.get_traced_memory()[1] - base)
+        self.finished_requests += 1
+        if self.requests is not None and self.finished_requests >= self.requests:
+            self._stop.set()
+
+    def _label(self, traceback) -> Optional[str]:
+        for frame in traceback:
+            for first, last, label in self.endpoints.get(frame.filename, ()):
+                if first <= frame.lineno <= last:
+                    return label
+        return None
+
+    def _compare(self, snapshot) -> None:
+        routes: Dict[str, dict] = {}
+        for stat in snapshot.compare_to(self._start_snapshot, "traceback"):
+            if stat.size_diff <= 0:
+                continue
+            label = self._label(stat.traceback) or "unattributed"
+            if self.route is not None and label != "unattributed" and label.split(" ", 1)[1] != self.route:
+                continue
+            entry = routes.setdefault(label, {"size_diff": 0, "count_diff": 0,
+                                              "sites": defaultdict(lambda: [0, 0])})
+            entry["size_diff"] += stat.size_diff
+            entry["count_diff"] += stat.count_diff
+            site = entry["sites"][_site(stat.traceback[-1])]
+            site[0] += stat.size_diff
+            site[1] += stat.count_diff
+        for label, entry in routes.items():
+            sites = sorted(entry.pop("sites").items(), key=lambda item: -item[1][0])[:self.top]
+            entry["top"] = [{"site": site, "size_diff": size, "count_diff": count} for site, (size, count) in sites]
+            self.retained[label] = entry
+
+    async def run(self) -> None:
+        """
+        Traces until ``seconds`` have passed or enough requests finished, then compares the snapshots.
+        """
+        try:
+            try:
+                await asyncio.wait_for(self._stop.wait(), self.seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._compare(tracemalloc.take_snapshot())
+        finally:
+            if self._started_tracing:
+                tracemalloc.stop()
+            self._done.set()
+
+    async def wait(self) -> None:
+        """
+        Waits until the session has finished.
+        """
+        await self._done.wait()
+
+    def report(self) -> dict:
+        """
+        Returns the per-route peaks and retained memory.
+
+        Returns:
+            dict: ``routes`` with, per route, the number of requests measured alone, their
+                maximum and average peak and the retained memory with its top allocation
+                sites; ``unattributed`` retained memory; request counters.
+        """
+        routes = {}
+        for label in sorted((set(self.peaks) | set(self.retained)) - {"unattributed"}):
+            peaks = self.peaks.get(label, [])
+            routes[label] = {
+                "requests": len(peaks),
+                "max_peak_bytes": max(peaks, default=0),
+                "avg_peak_bytes": sum(peaks) // len(peaks) if peaks else 0,
+                "retained": self.retained.get(label, {"size_diff": 0, "count_diff": 0, "top": []}),
+            }
+        return {
+            "routes": routes,
+            "unattributed": self.retained.get("unattributed", {"size_diff": 0, "count_diff": 0, "top": []}),
+            "requests": self.finished_requests,
+            "overlapping_requests": self.overlapping_requests,
+            "frames": tracemalloc.get_traceback_limit() if tracemalloc.is_tracing() else self.frames,
+        }
+
+
+sessions = profiling.SessionRegistry(MemoryProfilerBusy)
+
+
+def start(app, seconds: float, route: Optional[str] = None, requests: Optional[int] = None,
+          frames: int = 25, top: int = 10) -> MemorySession:
+    """
+    Starts a memory profiling session in this worker. Must be called from the event loop.
+
+    Args:
+        app: FastAPI application.
+        seconds (float): Maximum duration.
+        route (str, optional): Route template or path to profile; a path is
+            resolved to the template of its route.
+        requests (int, optional): Stop after this many matching requests.
+        frames (int): Traceback depth stored per allocation.
+        top (int): Number of allocation sites reported per route.
+
+    Returns:
+        MemorySession: Running session; await ``session.wait()`` for the result.
+
+    Raises:
+        MemoryProfilerBusy: If a session is already running.
+    """
+    def create() -> MemorySession:
+        session = MemorySession(app, seconds, profiling.route_template(app, route), requests, frames, top)
+        session._begin()
+        return session
+
+    session = sessions.claim(create)
+    asyncio.get_running_loop().create_task(_run(session))
+    return session
+
+
+async def _run(session: MemorySession) -> None:
+    try:
+        await session.run()
+    finally:
+        sessions.release(session)
+
+
+class MemoryProfilerMiddleware(profiling.SessionMiddleware):
+    """
+    ASGI middleware that lets a running memory session measure requests.
+
+    Args:
+        app: ASGI application.
+    """
+
+    def __init__(self, app):
+        super().__init__(app, sessions)
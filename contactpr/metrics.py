@@ -0,0 +1,24 @@
+from typing import Callable, Dict
+
+_providers: Dict[str, Callable[[], dict]] = {}
+
+
+def register(name: str, provider: Callable[[], dict]) -> None:
+    """
+    Registers a source of runtime metrics.
+
+    Args:
+        name (str): Section name in the metrics snapshot.
+        provider (Callable[[], dict]): Returns the current values of the section.
+    """
+    _providers[name] = provider
+
+
+def snapshot() -> dict:
+    """
+    Collects the current values of all registered metrics of this worker.
+
+    Returns:
+        dict: Metrics by section name.
+    """
+    return {name: provider() for name, provider in _providers.items()}
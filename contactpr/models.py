@@ -1,64 +1,304 @@
-from sqlalchemy import Column, Integer, ForeignKey, String, Date, Boolean, MetaData
-from pydantic import BaseModel, EmailStr
-from contactpr.database import Base
-from sqlalchemy.orm import relationship
-from passlib.context import CryptContext
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import MetaData
-
-Base = declarative_base()
-
-metadata = MetaData()
-
-Base.metadata = metadata
-
-
-class Contact(Base):
-    """
-    Model for storing user contacts.
-
-    Attributes:
-        id (int): Unique identifier for the contact.
-        first_name (str): First name of the contact.
-        last_name (str): Last name of the contact.
-        email (str): Email of the contact.
-        phone_number (str): Phone number of the contact.
-        birthday (Date): Birthday of the contact.
-        additional_data (str, optional): Additional data about the contact (optional field).
-        owner_id (int): Identifier of the owner of the contact (foreign key).
-        owner (User): Relationship with the user who owns this contact.
-    """
-    __tablename__ = 'contacts'
-    id = Column(Integer, primary_key=True, index=True)
-    first_name = Column(String, index=True)
-    last_name = Column(String, index=True)
-    email = Column(String, unique=True, index=True)
-    phone_number = Column(String, index=True)
-    birthday = Column(Date)
-    additional_data = Column(String, nullable=True)
-    owner_id = Column(Integer, ForeignKey('users.id'))
-    owner = relationship("User", back_populates="contacts")
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-class User(Base):
-    """
-    Model for storing users.
-
-    Attributes:
-        id (int): Unique identifier for the user.
-        email (str): Email of the user (unique field).
-        hashed_password (str): Hashed password of the user.
-        contacts (List[Contact]): List of contacts belonging to this user.
-        avatar_url (str): URL of the user's avatar.
-        confirmed (bool): Confirmation of user registration (default False).
-    """
-    __tablename__ = "users"
-
-    id = Column(Integer, primary_key=True, index=True)
-    email = Column(String, unique=True, index=True)
-    hashed_password = Column(String)
-    contacts = relationship("Contact", back_populates="owner")
-    avatar_url = Column(String)
-    confirmed = Column(Boolean, default=False)
-
+from sqlalchemy import Column, Integer, BigInteger, ForeignKey, String, Date, DateTime, Boolean, LargeBinary, MetaData, Index, Table, UniqueConstraint, JSON, DDL, event, text
+from sqlalchemy.dialects.postgresql import JSONB
+from pydantic import BaseModel, EmailStr
+from contactpr.database import Base
+from sqlalchemy.orm import relationship
+from passlib.context import CryptContext
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import MetaData
+from datetime import datetime
+from repository.backfill import birthday_ordinal
+
+Base = declarative_base()
+
+metadata = MetaData()
+
+Base.metadata = metadata
+
+
+contact_tags = Table(
+    'contact_tags', Base.metadata,
+    Column('contact_id', Integer, ForeignKey('contacts.id', ondelete='CASCADE'), primary_key=True),
+    Column('tag_id', Integer, ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True),
+    Index('ix_contact_tags_tag_id', 'tag_id'),
+)
+
+
+class Contact(Base):
+    """
+    Model for storing user contacts.
+
+    Attributes:
+        id (int): Unique identifier for the contact.
+        first_name (str): First name of the contact.
+        last_name (str): Last name of the contact.
+        email (str): Email of the contact.
+        phone_number (str): Phone number of the contact.
+        birthday (Date): Birthday of the contact.
+        birthday_ordinal (int, optional): ``month * 100 + day`` of the birthday, kept in sync on
+            every ORM write; backfilled for older rows by repository.backfill.
+        additional_data (dict, optional): Custom fields of the contact (JSONB on PostgreSQL, JSON elsewhere).
+        owner_id (int): Identifier of the owner of the contact (foreign key).
+        owner (User): Relationship with the user who owns this contact.
+        change_seq (int): Owner-scoped change sequence number of the last write, used by delta sync.
+        tags (List[Tag]): Tags attached to the contact.
+        deleted_at (DateTime, optional): Time of the soft deletion; None for live contacts.
+        updated_at (DateTime): Time the contact was created or last edited.
+    """
+    __tablename__ = 'contacts'
+    __table_args__ = (
+        Index('ix_contacts_owner_change_seq', 'owner_id', 'change_seq'),
+        # Partial indexes: live-row lookups never scan soft-deleted contacts, and
+        # the purge job finds expired rows without touching live ones.
+        Index('ix_contacts_owner_live', 'owner_id',
+              postgresql_where=text('deleted_at IS NULL'), sqlite_where=text('deleted_at IS NULL')),
+        Index('ix_contacts_deleted_at', 'deleted_at',
+              postgresql_where=text('deleted_at IS NOT NULL'), sqlite_where=text('deleted_at IS NOT NULL')),
+        Index('uq_contacts_email_live', 'email', unique=True,
+              postgresql_where=text('deleted_at IS NULL'), sqlite_where=text('deleted_at IS NULL')),
+        Index('ix_contacts_owner_birthday_ordinal', 'owner_id', 'birthday_ordinal',
+              postgresql_where=text('deleted_at IS NULL'), sqlite_where=text('deleted_at IS NULL')),
+        Index('ix_contacts_birthday_ordinal_live', 'birthday_ordinal',
+              postgresql_where=text('deleted_at IS NULL'), sqlite_where=text('deleted_at IS NULL')),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    first_name = Column(String, index=True)
+    last_name = Column(String, index=True)
+    email = Column(String, index=True)
+    phone_number = Column(String, index=True)
+    birthday = Column(Date)
+    birthday_ordinal = Column(Integer, nullable=True)
+    additional_data = Column(JSON().with_variant(JSONB(), 'postgresql'), nullable=True)
+    owner_id = Column(Integer, ForeignKey('users.id'))
+    owner = relationship("User", back_populates="contacts")
+    change_seq = Column(BigInteger, nullable=True)
+    tags = relationship("Tag", secondary=contact_tags)
+    deleted_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, nullable=True, default=datetime.utcnow)
+
+
+@event.listens_for(Contact.birthday, 'set')
+def _set_birthday_ordinal(target, value, oldvalue, initiator):
+    target.birthday_ordinal = birthday_ordinal(value)
+
+
+# jsonb_path_ops only supports containment (@>), which is what custom field filters use,
+# and is considerably smaller than the default GIN operator class.
+event.listen(Contact.__table__, 'after_create', DDL(
+    "CREATE INDEX ix_contacts_additional_data ON contacts USING gin (additional_data jsonb_path_ops)"
+).execute_if(dialect='postgresql'))
+
+# On PostgreSQL, the ILIKE '%...%' contact search uses a trigram index (pg_trgm);
+# a GIN index on several columns serves an OR of conditions on any of them.
+CONTACTS_TRGM_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX ix_contacts_search_trgm ON contacts USING gin "
+    "(first_name gin_trgm_ops, last_name gin_trgm_ops, email gin_trgm_ops) WHERE deleted_at IS NULL",
+)
+for statement in CONTACTS_TRGM_DDL:
+    event.listen(Contact.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+
+# On SQLite, contact search uses an FTS5 trigram index kept in sync by triggers;
+# trigram phrases match substrings case-insensitively, like the ILIKE search.
+CONTACTS_FTS_DDL = (
+    "CREATE VIRTUAL TABLE contacts_fts USING fts5("
+    "first_name, last_name, email, content='contacts', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER contacts_fts_insert AFTER INSERT ON contacts BEGIN "
+    "INSERT INTO contacts_fts(rowid, first_name, last_name, email) "
+    "VALUES (new.id, new.first_name, new.last_name, new.email); END",
+    "CREATE TRIGGER contacts_fts_delete AFTER DELETE ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.email); END",
+    "CREATE TRIGGER contacts_fts_update AFTER UPDATE OF first_name, last_name, email ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.email); "
+    "INSERT INTO contacts_fts(rowid, first_name, last_name, email) "
+    "VALUES (new.id, new.first_name, new.last_name, new.email); END",
+)
+for statement in CONTACTS_FTS_DDL:
+    event.listen(Contact.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(Contact.__table__, 'before_drop', DDL("DROP TABLE IF EXISTS contacts_fts").execute_if(dialect='sqlite'))
+
+
+class Tag(Base):
+    """
+    Model for owner-scoped contact tags ("family", "work", ...).
+
+    Attributes:
+        id (int): Unique identifier for the tag.
+        owner_id (int): Identifier of the user who owns the tag.
+        name (str): Normalized (lower-case) tag name, unique per owner.
+    """
+    __tablename__ = 'tags'
+    __table_args__ = (
+        UniqueConstraint('owner_id', 'name', name='uq_tags_owner_name'),
+    )
+    id = Column(Integer, primary_key=True)
+    owner_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    name = Column(String(50), nullable=False)
+
+
+class ContactTombstone(Base):
+    """
+    Model recording deleted contacts so that delta sync can report deletions.
+
+    Attributes:
+        id (int): Unique identifier for the tombstone.
+        contact_id (int): Identifier of the deleted contact.
+        owner_id (int): Identifier of the owner of the deleted contact.
+        change_seq (int): Owner-scoped change sequence number of the deletion.
+        deleted_at (DateTime): Time of the deletion, used for compaction.
+    """
+    __tablename__ = 'contact_tombstones'
+    __table_args__ = (
+        Index('ix_contact_tombstones_owner_change_seq', 'owner_id', 'change_seq'),
+        # restoring a contact drops its tombstone
+        Index('ix_contact_tombstones_contact_id', 'contact_id'),
+    )
+    id = Column(Integer, primary_key=True)
+    contact_id = Column(Integer, nullable=False)
+    owner_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    change_seq = Column(BigInteger, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class ContactSyncState(Base):
+    """
+    Model holding the delta sync counters of a user.
+
+    Attributes:
+        owner_id (int): Identifier of the user (primary key).
+        last_seq (int): Last change sequence number handed out for this user.
+        compacted_seq (int): Highest sequence number removed by tombstone compaction;
+            sync tokens older than this are no longer valid.
+    """
+    __tablename__ = 'contact_sync_state'
+    owner_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    last_seq = Column(BigInteger, nullable=False, default=0)
+    compacted_seq = Column(BigInteger, nullable=False, default=0)
+
+
+class ContactStat(Base):
+    """
+    Model holding per-owner contact counters, maintained incrementally.
+
+    One row per (owner, kind, bucket): kind ``total`` has a single empty
+    bucket, ``birth_month`` is bucketed by two-digit month and
+    ``email_domain`` by lower-cased domain. Only live contacts are counted.
+
+    Attributes:
+        owner_id (int): Identifier of the user (part of the primary key).
+        kind (str): Statistic name (part of the primary key).
+        bucket (str): Bucket within the statistic (part of the primary key).
+        count (int): Number of live contacts in the bucket.
+    """
+    __tablename__ = 'contact_stats'
+    owner_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    kind = Column(String(16), primary_key=True)
+    bucket = Column(String(255), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class CacheGeneration(Base):
+    """
+    Model holding contact query cache generations shared by all workers.
+
+    Only used when several workers serve the app without a Redis cache tier
+    or change broker (see contactpr/cache.py).
+
+    Attributes:
+        scope (str): Cache key of the generation, e.g. ``gen:42`` or ``gen:*`` (primary key).
+        generation (int): Generation counter, bumped by every contact write in the scope.
+    """
+    __tablename__ = 'cache_generations'
+    scope = Column(String(64), primary_key=True)
+    generation = Column(BigInteger, nullable=False, default=0)
+
+class JobLease(Base):
+    """
+    Model holding the lease of a maintenance job, so that one worker runs it at a time.
+
+    Only used when several workers serve the app (see contactpr/maintenance.py).
+
+    Attributes:
+        name (str): Name of the job (primary key).
+        holder (str): Worker holding the lease (``host:pid``).
+        expires_at (DateTime): Time after which another worker may take the lease over.
+    """
+    __tablename__ = 'job_leases'
+    name = Column(String(64), primary_key=True)
+    holder = Column(String(255), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+class IdempotencyRecord(Base):
+    """
+    Model holding Idempotency-Key records shared by all workers.
+
+    Only used when several workers serve the app without an idempotency Redis
+    (see contactpr/idempotency.py).
+
+    Attributes:
+        key (str): Scoped idempotency key (primary key).
+        record (bytes): JSON record: the claim of a running request or the stored response.
+        expires_at (DateTime): Time after which the key may be claimed again.
+    """
+    __tablename__ = 'idempotency_keys'
+    key = Column(String(512), primary_key=True)
+    record = Column(LargeBinary, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+class User(Base):
+    """
+    Model for storing users.
+
+    Attributes:
+        id (int): Unique identifier for the user.
+        email (str): Email of the user (unique field).
+        hashed_password (str): Hashed password of the user.
+        contacts (List[Contact]): List of contacts belonging to this user.
+        avatar_url (str): URL of the user's avatar.
+        confirmed (bool): Confirmation of user registration (default False).
+    """
+    __tablename__ = "users"
+
+    id = Column(Integer, primary_key=True, index=True)
+    email = Column(String, unique=True, index=True)
+    hashed_password = Column(String)
+    contacts = relationship("Contact", back_populates="owner")
+    avatar_url = Column(String)
+    confirmed = Column(Boolean, default=False)
+
+
+class RefreshToken(Base):
+    """
+    Model storing issued refresh tokens by hash.
+
+    Tokens are opaque random strings; only their SHA-256 digest is stored, so a
+    database leak does not leak usable tokens and lookups need no bcrypt. Every
+    login starts a family; each refresh marks the presented token used and
+    issues its successor in the same family.
+
+    Attributes:
+        id (int): Unique identifier for the token.
+        user_id (int): Identifier of the user the token was issued to.
+        family_id (str): Identifier shared by all tokens rotated from one login.
+        token_hash (str): Hex SHA-256 digest of the token (unique).
+        created_at (DateTime): Time of issue.
+        expires_at (DateTime): Time after which the token is rejected.
+        used_at (DateTime, optional): Time the token was rotated; presenting it again is reuse.
+        revoked_at (DateTime, optional): Time the family was revoked.
+    """
+    __tablename__ = 'refresh_tokens'
+    __table_args__ = (
+        Index('ix_refresh_tokens_revoked_at', 'revoked_at',
+              postgresql_where=text('revoked_at IS NOT NULL'), sqlite_where=text('revoked_at IS NOT NULL')),
+    )
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    family_id = Column(String(32), nullable=False, index=True)
+    token_hash = Column(String(64), nullable=False, unique=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    used_at = Column(DateTime, nullable=True)
+    revoked_at = Column(DateTime, nullable=True)
@@ -0,0 +1,129 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Generic, Optional, TypeVar
+
+Index = TypeVar("Index")
+
+
+class OwnerIndexCache(Generic[Index]):
+    """
+    LRU cache of per-owner in-memory indexes kept current from contact change events.
+
+    Indexes are built lazily on first use. Cached indexes receive every change
+    event of their owner through ``index.apply(event)``; an index whose build
+    raced with a write is returned once but not cached. When change events do
+    not reach every worker, ``generation`` is given as well and an index is
+    only reused while its owner's generation is the one it was built at, so
+    writes in other workers are never missed. The total ``index.cost()`` of
+    cached indexes is kept below ``max_cost`` by evicting the least recently
+    used owners.
+
+    Args:
+        max_cost (int): Maximum total cost (e.g. number of entries) of cached indexes.
+        generation (Callable[[int], int], optional): Current generation of an owner
+            (see contactpr.cache.owner_generation).
+    """
+
+    def __init__(self, max_cost: int, generation: Optional[Callable[[int], int]] = None):
+        self.max_cost = max_cost
+        self.generation = generation
+        self._indexes: "OrderedDict[int, Index]" = OrderedDict()
+        self._built_at: Dict[int, Optional[int]] = {}
+        self._cost = 0
+        self._building: Dict[int, int] = {}
+        self._changed_while_building = set()
+        self._lock = threading.Lock()
+
+    def get(self, owner_id: int, build: Callable[[], Index]) -> Index:
+        """
+        Returns the index of an owner, building it on a miss.
+
+        Args:
+            owner_id (int): Identifier of the owner.
+            build (Callable[[], Index]): Builds the index from the database.
+
+        Returns:
+            Index: Index of the owner.
+        """
+        generation = self.generation(owner_id) if self.generation is not None else None
+        with self._lock:
+            index = self._indexes.get(owner_id)
+            if index is not None and self._built_at[owner_id] == generation:
+                self._indexes.move_to_end(owner_id)
+                return index
+            if index is not None:
+                self._drop(owner_id)
+            self._building[owner_id] = self._building.get(owner_id, 0) + 1
+        try:
+            index = build()
+        finally:
+            with self._lock:
+                raced = owner_id in self._changed_while_building
+                self._building[owner_id] -= 1
+                if not self._building[owner_id]:
+                    del self._building[owner_id]
+                    self._changed_while_building.discard(owner_id)
+        with self._lock:
+            if not raced and owner_id not in self._indexes:
+                self._indexes[owner_id] = index
+                self._built_at[owner_id] = generation
+                self._cost += index.cost()
+                self._evict()
+        return index
+
+    def on_change(self, event: dict) -> None:
+        """
+        Change listener forwarding contact events to the owner's cached index.
+
+        A broker ``resync`` drops every index, including those being built.
+
+        Args:
+            event (dict): Contact change event.
+        """
+        if event['type'] == 'resync':
+            with self._lock:
+                self._changed_while_building.update(self._building)
+                self._indexes.clear()
+                self._built_at.clear()
+                self._cost = 0
+            return
+        if not event['type'].startswith('contact.'):
+            return
+        owner_id = event['owner_id']
+        with self._lock:
+            if owner_id in self._building:
+                self._changed_while_building.add(owner_id)
+            index = self._indexes.get(owner_id)
+            if index is None:
+                return
+            before = index.cost()
+            index.apply(event)
+            self._cost += index.cost() - before
+            self._evict()
+
+    def _drop(self, owner_id: int) -> None:
+        self._cost -= self._indexes.pop(owner_id).cost()
+        del self._built_at[owner_id]
+
+    def _evict(self) -> None:
+        while self._cost > self.max_cost and len(self._indexes) > 1:
+            self._drop(next(iter(self._indexes)))
+
+    def stats(self) -> dict:
+        """
+        Returns the size of the cache.
+
+        Returns:
+            dict: Number of cached owners and their total cost.
+        """
+        with self._lock:
+            return {"owners": len(self._indexes), "cost": self._cost}
+
+    def clear(self) -> None:
+        """
+        Drops all cached indexes.
+        """
+        with self._lock:
+            self._indexes.clear()
+            self._built_at.clear()
+            self._cost = 0
@@ -0,0 +1,248 @@
+"""
+On-demand statistical sampling profiler for a running worker.
+
+A profiling session samples the stacks of all threads every few
+milliseconds from a background thread and attributes every sample to the
+route it belongs to:
+
+* samples taken on the event loop are matched to the request whose
+  ProfilerMiddleware frame is on the stack (this includes dependency
+  resolution and response serialization);
+* samples taken in the thread pool (sync endpoints) are matched by the
+  endpoint's code object.
+
+Samples that belong to no request (idle threads, background jobs) are only
+counted. Outside a session nothing runs (see contactpr.profiling for the
+session registry and middleware).
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from contactpr import profiling
+
+
+class ProfilerBusy(profiling.SessionBusy):
+    """
+    Raised when a profiling session is already running in this worker.
+    """
+
+
+def _frame_name(code) -> str:
+    filename = os.sep.join(code.co_filename.split(os.sep)[-2:])
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class ProfileSession:
+    """
+    One sampling run.
+
+    Args:
+        app: FastAPI application whose routes are profiled.
+        seconds (float): Maximum duration of the session.
+        route (str, optional): Only keep samples of this route template.
+        requests (int, optional): Stop after this many requests matching ``route`` (or any route) finished.
+        interval (float): Seconds between samples.
+    """
+
+    def __init__(self, app, seconds: float, route: Optional[str] = None, requests: Optional[int] = None,
+                 interval: float = 0.005):
+        self.seconds = seconds
+        self.route = route
+        self.requests = requests
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.total_samples = 0
+        self.unattributed_samples = 0
+        self.finished_requests = 0
+        self.started_at = time.monotonic()
+        self.elapsed = 0.0
+        self.in_flight: Dict[object, dict] = {}
+        self.endpoints = dict(profiling.route_table(app))
+        self._stop = threading.Event()
+        self._loop = asyncio.get_running_loop()
+        self._done = asyncio.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _label(self, frame) -> Optional[str]:
+        endpoint = None
+        while frame is not None:
+            code = frame.f_code
+            if code is _MIDDLEWARE_CODE:
+                scope = self.in_flight.get(frame)
+                if scope is not None and scope.get("route") is not None:
+                    return f"{scope['method']} {scope['route'].path}"
+            elif code in self.endpoints:
+                endpoint = self.endpoints[code]
+            frame = frame.f_back
+        return endpoint
+
+    def _matches(self, label: str) -> bool:
+        return self.route is None or label.split(" ", 1)[1] == self.route
+
+    def _record(self, frame) -> None:
+        self.total_samples += 1
+        label = self._label(frame)
+        if label is None:
+            self.unattributed_samples += 1
+            return
+        if not self._matches(label):
+            return
+        stack = []
+        while frame is not None:
+            stack.append(_frame_name(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        self.samples[(label, tuple(stack))] += 1
+
+    def _run(self) -> None:
+        own_thread = threading.get_ident()
+        deadline = self.started_at + self.seconds
+        try:
+            while not self._stop.is_set() and time.monotonic() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id != own_thread:
+                        self._record(frame)
+                self._stop.wait(self.interval)
+        finally:
+            self.elapsed = time.monotonic() - self.started_at
+            self._loop.call_soon_threadsafe(self._done.set)
+
+    def request_started(self, frame, scope: dict) -> None:
+        """
+        Registers a request, so that samples of the event loop can be attributed to it.
+
+        Args:
+            frame: Frame of the middleware handling the request.
+            scope (dict): ASGI scope of the request.
+        """
+        self.in_flight[frame] = scope
+
+    def request_finished(self, frame, scope: dict) -> None:
+        """
+        Counts a finished request and stops the session once enough matching requests were seen.
+
+        Args:
+            frame: Frame passed to request_started.
+            scope (dict): ASGI scope of the request.
+        """
+        del self.in_flight[frame]
+        if profiling.request_label(scope, self.route) is None:
+            return
+        self.finished_requests += 1
+        if self.requests is not None and self.finished_requests >= self.requests:
+            self._stop.set()
+
+    async def wait(self) -> None:
+        """
+        Waits until the session has finished.
+        """
+        await self._done.wait()
+
+    def collapsed(self) -> str:
+        """
+        Renders the samples in collapsed-stack format (``route;frame;frame count``).
+
+        Returns:
+            str: One line per unique stack, usable with flamegraph.pl or speedscope.
+        """
+        lines = [f"{label};{';'.join(stack)} {count}" for (label, stack), count in self.samples.items()]
+        return "\n".join(sorted(lines)) + "\n"
+
+    def speedscope(self) -> dict:
+        """
+        Renders the samples as a speedscope file with one sampled profile per route.
+
+        Returns:
+            dict: Speedscope JSON document.
+        """
+        frames: List[dict] = []
+        frame_index: Dict[str, int] = {}
+        profiles: Dict[str, Tuple[list, list]] = {}
+        for (label, stack), count in sorted(self.samples.items()):
+            indexes = []
+            for name in stack:
+                if name not in frame_index:
+                    frame_index[name] = len(frames)
+                    frames.append({"name": name})
+                indexes.append(frame_index[name])
+            samples, weights = profiles.setdefault(label, ([], []))
+            samples.append(indexes)
+            weights.append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"contacts-api worker {os.getpid()}",
+            "exporter": "contactpr.profiler",
+            "shared": {"frames": frames},
+            "profiles": [
+                {"type": "sampled", "name": label, "unit": "seconds", "startValue": 0,
+                 "endValue": sum(weights), "samples": samples, "weights": weights}
+                for label, (samples, weights) in profiles.items()
+            ],
+        }
+
+    def summary(self) -> dict:
+        """
+        Returns session counters.
+
+        Returns:
+            dict: Duration, sample counts and finished matching requests.
+        """
+        return {
+            "seconds": round(self.elapsed, 3),
+            "samples": self.total_samples,
+            "unattributed_samples": self.unattributed_samples,
+            "requests": self.finished_requests,
+        }
+
+
+sessions = profiling.SessionRegistry(ProfilerBusy)
+
+
+def start(app, seconds: float, route: Optional[str] = None, requests: Optional[int] = None,
+          interval: float = 0.005) -> ProfileSession:
+    """
+    Starts a profiling session in this worker. Must be called from the event loop.
+
+    Args:
+        app: FastAPI application.
+        seconds (float): Maximum duration.
+        route (str, optional): Route template or path to profile; a path is
+            resolved to the template of its route.
+        requests (int, optional): Stop after this many matching requests.
+        interval (float): Seconds between samples.
+
+    Returns:
+        ProfileSession: Running session; await ``session.wait()`` for the result.
+
+    Raises:
+        ProfilerBusy: If a session is already running.
+    """
+    session = sessions.claim(
+        lambda: ProfileSession(app, seconds, profiling.route_template(app, route), requests, interval))
+    session._thread.start()
+    session._loop.create_task(_release_when_done(session))
+    return session
+
+
+async def _release_when_done(session: ProfileSession) -> None:
+    await session.wait()
+    sessions.release(session)
+
+
+class ProfilerMiddleware(profiling.SessionMiddleware):
+    """
+    ASGI middleware that lets a running profiling session attribute samples to requests.
+
+    Args:
+        app: ASGI application.
+    """
+
+    def __init__(self, app):
+        super().__init__(app, sessions)
+
+
+_MIDDLEWARE_CODE = profiling.SessionMiddleware.__call__.__code__
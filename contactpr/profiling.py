@@ -0,0 +1,155 @@
+"""
+Scaffolding shared by the on-demand profilers (contactpr.profiler and contactpr.memprofile).
+
+Each profiler runs at most one session per worker, kept in a SessionRegistry.
+SessionMiddleware reports the HTTP requests of the worker to the running
+session and costs a single attribute lookup per request when none runs.
+Sessions profile one route template or all routes; the route table maps
+endpoints to ``METHODS /template`` labels.
+"""
+import sys
+import threading
+from typing import Callable, List, Optional, Tuple, Type
+from fastapi.routing import APIRoute
+
+
+class SessionBusy(Exception):
+    """
+    Raised when a session of the same profiler is already running in this worker.
+    """
+
+
+def _unwrap(func):
+    while hasattr(func, "__wrapped__"):
+        func = func.__wrapped__
+    return func
+
+
+def route_table(app) -> List[Tuple[object, str]]:
+    """
+    Lists the endpoints of an application with their route labels.
+
+    Args:
+        app: FastAPI application.
+
+    Returns:
+        List[Tuple[object, str]]: Code object of every endpoint (decorators
+        unwrapped) and its ``METHODS /template`` label.
+    """
+    return [(_unwrap(route.endpoint).__code__, f"{','.join(sorted(route.methods))} {route.path}")
+            for route in app.routes if isinstance(route, APIRoute)]
+
+
+def route_template(app, route: Optional[str]) -> Optional[str]:
+    """
+    Resolves the route a session is limited to into a route template.
+
+    Args:
+        app: FastAPI application.
+        route (str, optional): Route template (``/contacts/{contact_id}``) or a
+            concrete path (``/contacts/5``), which stands for the route serving it.
+
+    Returns:
+        str, optional: Route template; ``route`` itself if no route serves it.
+    """
+    if route is None:
+        return None
+    routes = [app_route for app_route in app.routes if isinstance(app_route, APIRoute)]
+    if any(app_route.path == route for app_route in routes):
+        return route
+    for app_route in routes:
+        if app_route.path_regex.match(route):
+            return app_route.path
+    return route
+
+
+def request_label(scope: dict, template: Optional[str]) -> Optional[str]:
+    """
+    Labels a finished request if it belongs to the profiled route.
+
+    Args:
+        scope (dict): ASGI scope of the request.
+        template (str, optional): Profiled route template; None for all routes.
+
+    Returns:
+        str, optional: ``METHOD /template``, or None for requests of other routes
+        and requests that matched no route.
+    """
+    route = scope.get("route")
+    if route is None or (template is not None and route.path != template):
+        return None
+    return f"{scope['method']} {route.path}"
+
+
+class SessionRegistry:
+    """
+    The running session of one profiler in this worker.
+
+    Args:
+        busy (Type[SessionBusy]): Exception raised when a session is already running.
+    """
+
+    def __init__(self, busy: Type[SessionBusy] = SessionBusy):
+        self.busy = busy
+        self.session = None
+        self._lock = threading.Lock()
+
+    def claim(self, create: Callable[[], object]):
+        """
+        Creates and registers a session unless one is running.
+
+        Args:
+            create (Callable[[], object]): Creates the session.
+
+        Returns:
+            object: The new session.
+
+        Raises:
+            SessionBusy: If a session is already running.
+        """
+        with self._lock:
+            if self.session is not None:
+                raise self.busy()
+            self.session = create()
+            return self.session
+
+    def release(self, session) -> None:
+        """
+        Unregisters a finished session.
+
+        Args:
+            session: Session passed to claim.
+        """
+        with self._lock:
+            if self.session is session:
+                self.session = None
+
+
+class SessionMiddleware:
+    """
+    ASGI middleware reporting HTTP requests to the running session of a registry.
+
+    The session gets ``request_started(token, scope)`` and
+    ``request_finished(token, scope)``; the token is the middleware's frame,
+    which stays on the stack of the request's task while it runs.
+
+    Args:
+        app: ASGI application.
+        registry (SessionRegistry): Registry of the profiler.
+    """
+
+    def __init__(self, app, registry: SessionRegistry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        session = self.registry.session
+        if session is None or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = sys._getframe()
+        session.request_started(token, scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            session.request_finished(token, scope)
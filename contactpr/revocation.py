@@ -0,0 +1,186 @@
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, List, Optional
+from contactpr import database, events, metrics
+from contactpr.bloom import BloomFilter
+from contactpr.cache import DatabaseGenerations
+from repository import refresh_tokens as repository_refresh_tokens
+from config import settings
+
+# key of the revocation counter in the cache_generations table
+WATERMARK = "revocations"
+
+
+class RevocationFilter:
+    """
+    In-memory Bloom filter of revoked refresh-token families.
+
+    Access tokens carry the family of the refresh token they were issued
+    with. Validating an access token checks the family against this filter,
+    which answers "not revoked" without touching the database; only filter
+    hits are confirmed with a query, so false positives cost one lookup and
+    never reject a valid token.
+
+    The filter only has to remember revocations younger than the access token
+    lifetime: older access tokens have expired anyway. It is rebuilt from the
+    database periodically (see contactpr.maintenance), which also bounds its
+    size. Revocations in other workers arrive through the change broker. When
+    they cannot (several workers without events_redis_url), every revocation
+    bumps a watermark in the cache_generations table instead; checks read it
+    at most once per ``settings.revocation_poll_seconds`` and rebuild the
+    filter when it moved, so a revocation reaches every worker within that
+    time and valid tokens still cost no query.
+
+    Args:
+        capacity (int): Expected number of revocations per rebuild period.
+        error_rate (float): Target false positive rate at capacity.
+        watermark (DatabaseGenerations, optional): Shared revocation counter, for
+            workers that share no change broker.
+        load (Callable[[], Iterable[str]], optional): Returns the families revoked within
+            the access token lifetime; used to rebuild the filter when the watermark moves.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, watermark: Optional[DatabaseGenerations] = None,
+                 load: Optional[Callable[[], Iterable[str]]] = None):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.watermark = watermark
+        self.load = load
+        self.checks = 0
+        self.positives = 0
+        self.confirmed = 0
+        self._filter = BloomFilter(capacity, error_rate)
+        self._recent = None
+        # revocations may have been missed; confirm every check until the next reload
+        self._confirm_all = False
+        self._resyncs = 0
+        self._seen = None
+        self._lock = threading.Lock()
+
+    def add(self, family_id: str) -> None:
+        """
+        Records a revoked family.
+
+        Args:
+            family_id (str): Identifier of the family.
+        """
+        with self._lock:
+            self._filter.add(family_id)
+            if self._recent is not None:
+                self._recent.add(family_id)
+
+    def is_revoked(self, family_id: str, confirm: Callable[[], bool]) -> bool:
+        """
+        Checks whether a family is revoked.
+
+        Args:
+            family_id (str): Identifier of the family.
+            confirm (Callable[[], bool]): Authoritative check, only called on filter hits.
+
+        Returns:
+            bool: True if the family is revoked.
+        """
+        self.checks += 1
+        if self.watermark is not None:
+            self._catch_up()
+        if family_id not in self._filter and not self._confirm_all:
+            return False
+        self.positives += 1
+        if confirm():
+            self.confirmed += 1
+            return True
+        return False
+
+    def reload(self, load: Callable[[], Iterable[str]]) -> None:
+        """
+        Replaces the filter with one built from the database.
+
+        Revocations recorded while ``load`` runs are carried over, so none are
+        lost to the swap.
+
+        Args:
+            load (Callable[[], Iterable[str]]): Returns the families revoked within the access token lifetime.
+        """
+        with self._lock:
+            self._recent = set()
+            resyncs = self._resyncs
+        try:
+            fresh = BloomFilter(self.capacity, self.error_rate, load())
+        finally:
+            with self._lock:
+                recent, self._recent = self._recent, None
+        with self._lock:
+            for family_id in recent:
+                fresh.add(family_id)
+            self._filter = fresh
+            if self._resyncs == resyncs:
+                self._confirm_all = False
+
+    def _catch_up(self) -> None:
+        # the watermark is bumped after the revocation is committed, so a
+        # reload started after reading it sees the revocation
+        seen = self.watermark.get_int(WATERMARK)
+        if seen != self._seen:
+            self.reload(self.load)
+            self._seen = seen
+
+    def on_change(self, event: dict) -> None:
+        """
+        Change listener recording revocations published by any worker.
+
+        After a broker ``resync`` every check is confirmed with the database
+        until the next reload, because revocations may have been missed.
+
+        Args:
+            event (dict): Change event.
+        """
+        if event['type'] == 'auth.revoked':
+            self.add(event['family_id'])
+            if self.watermark is not None:
+                self.watermark.incr(WATERMARK)
+        elif event['type'] == 'resync':
+            with self._lock:
+                self._resyncs += 1
+                self._confirm_all = True
+
+    def stats(self) -> dict:
+        """
+        Returns filter size and check counters.
+
+        Returns:
+            dict: Filter metrics.
+        """
+        return {
+            "families": len(self._filter),
+            "bits": self._filter.size,
+            "checks": self.checks,
+            "positives": self.positives,
+            "confirmed": self.confirmed,
+        }
+
+
+def recent_revocations() -> List[str]:
+    """
+    Lists the families revoked within the access token lifetime.
+
+    Returns:
+        List[str]: Family identifiers.
+    """
+    db = database.SessionLocal()
+    try:
+        since = datetime.utcnow() - timedelta(minutes=settings.access_token_expire_minutes)
+        return repository_refresh_tokens.revoked_families_since(db, since)
+    finally:
+        db.close()
+
+
+def _watermark() -> Optional[DatabaseGenerations]:
+    if events.reach_every_worker():
+        return None
+    return DatabaseGenerations(database.engine, settings.revocation_poll_seconds)
+
+
+revoked_families = RevocationFilter(settings.revocation_filter_capacity, settings.revocation_filter_error_rate,
+                                    _watermark(), recent_revocations)
+events.broker.add_listener(revoked_families.on_change)
+metrics.register("revocation_filter", revoked_families.stats)
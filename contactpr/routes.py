@@ -1,350 +1,1088 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, File, UploadFile, BackgroundTasks, status, Request
-from pydantic import EmailStr
-from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
-from contactpr import schemas, models, database
-from contactpr.models import User
-from fastapi.security import OAuth2PasswordBearer
-from ..auth import create_jwt_token, get_current_user, verify_password, get_email_from_token
-from fastapi_limiter.depends import RateLimiter
-from .database import get_db
-from ..config import settings
-import cloudinary
-import cloudinary.uploader
-from repository import users as repository_users
-from fastapi import APIRouter
-from send_email import send_email
-import bcrypt
-from schemas import RequestEmail
-
-router = APIRouter()
-
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-
-@router.get("/")
-async def read_root():
-    """
-    Root endpoint returning a welcome message.
-
-    Returns:
-        dict: Welcome message.
-    """
-    return {"message": "Ласкаво просимо до мого додатку FastAPI!"}
-
-# Маршрут для створення нового контакту
-@router.post("/contacts/", response_model=schemas.Contact)
-def create_contact(contact: schemas.ContactCreate, db: Session = Depends(get_db), 
-                    rate_limiter: RateLimiter = Depends(RateLimiter(times=2, seconds=60))):
-    """
-    Creates a new contact in the database.
-
-    Args:
-        contact (schemas.ContactCreate): Data of the new contact.
-        db (Session, optional): Database session object. Defaults to Depends(get_db).
-        rate_limiter (RateLimiter, optional): Rate limiter dependency. Defaults to Depends(RateLimiter(times=2, seconds=60)).
-
-    Returns:
-        models.Contact: Created contact object.
-    """
-    db_contact = models.Contact(**contact.dict())
-    db.add(db_contact)
-    db.commit()
-    db.refresh(db_contact)
-    return db_contact
-
-# Маршрут для отримання списку всіх контактів
-@router.get("/contacts/", response_model=list[schemas.Contact])
-def get_contacts_by_owner(current_user: str = Depends(get_current_user), db: Session = Depends(get_db)):
-    """
-    Retrieves a list of all contacts owned by the authenticated user.
-
-    Args:
-        current_user (str): Authenticated user.
-        db (Session): Database session object.
-
-    Returns:
-        List[models.Contact]: List of contacts owned by the authenticated user.
-    """
-    contacts = db.query(models.Contact).filter(models.Contact.owner_id == current_user.id).all()
-    return contacts
-
-# Маршрут для отримання одного контакту по його ідентифікатору
-@router.get("/contacts/{contact_id}", response_model=schemas.Contact)
-def read_contact(contact_id: int, db: Session = Depends(get_db)):
-    """
-    Retrieves a single contact by its ID.
-
-    Args:
-        contact_id (int): ID of the contact to retrieve.
-        db (Session): Database session object.
-
-    Returns:
-        models.Contact: Retrieved contact object.
-
-    Raises:
-        HTTPException: If the contact with the specified ID is not found.
-    """
-    contact = db.query(models.Contact).filter(models.Contact.id == contact_id).first()
-    if contact is None:
-        raise HTTPException(status_code=404, detail="Контакт не знайдено")
-    return contact
-
-# Маршрут для оновлення контакту по його ідентифікатору
-@router.put("/contacts/{contact_id}", response_model=schemas.Contact)
-def update_contact(contact_id: int, contact_update: schemas.ContactUpdate, db: Session = Depends(get_db)):
-    """
-    Updates a contact by its ID.
-
-    Args:
-        contact_id (int): ID of the contact to update.
-        contact_update (schemas.ContactUpdate): Data to update the contact with.
-        db (Session): Database session object.
-
-    Returns:
-        models.Contact: Updated contact object.
-
-    Raises:
-        HTTPException: If the contact with the specified ID is not found.
-    """
-    db_contact = db.query(models.Contact).filter(models.Contact.id == contact_id).first()
-    if db_contact is None:
-        raise HTTPException(status_code=404, detail="Контакт не знайдено")
-    for key, value in contact_update.dict(exclude_unset=True).items():
-        setattr(db_contact, key, value)
-    db.commit()
-    db.refresh(db_contact)
-    return db_contact
-
-# Маршрут для видалення контакту по його ідентифікатору
-@router.delete("/contacts/{contact_id}")
-def delete_contact(contact_id: int, db: Session = Depends(get_db)):
-    """
-    Deletes a contact by its ID.
-
-    Args:
-        contact_id (int): ID of the contact to delete.
-        db (Session): Database session object.
-
-    Returns:
-        dict: Confirmation message upon successful deletion.
-
-    Raises:
-        HTTPException: If the contact with the specified ID is not found.
-    """
-    db_contact = db.query(models.Contact).filter(models.Contact.id == contact_id).first()
-    if db_contact is None:
-        raise HTTPException(status_code=404, detail="Контакт не знайдено")
-    db.delete(db_contact)
-    db.commit()
-    return {"message": "Контакт успішно видалено"}
-
-# Маршрут для пошуку контактів за ім'ям, прізвищем або адресою електронної пошти
-@router.get("/contacts/search/")
-def search_contacts(query: str = Query(..., min_length=1), db: Session = Depends(get_db)):
-    """
-    Searches for contacts by their first name, last name, or email address.
-
-    Args:
-        query (str): Search query.
-        db (Session): Database session object.
-
-    Returns:
-        List[models.Contact]: List of contacts matching the search query.
-    """
-    contacts = db.query(models.Contact).filter(
-        models.Contact.first_name.ilike(f"%{query}%") |
-        models.Contact.last_name.ilike(f"%{query}%") |
-        models.Contact.email.ilike(f"%{query}%")
-    ).all()
-    return contacts
-
-# Маршрут для отримання списку контактів з днями народження в найближчі 7 днів
-@router.get("/contacts/birthdays/")
-def upcoming_birthdays(db: Session = Depends(get_db)):
-    """
-    Retrieves contacts with birthdays in the next 7 days.
-
-    Args:
-        db (Session): Database session object.
-
-    Returns:
-        List[models.Contact]: List of contacts with upcoming birthdays.
-    """
-    today = datetime.now().date()
-    week_later = today + timedelta(days=7)
-    upcoming_contacts = []
-
-    # Отримання всіх контактів з бази даних
-    all_contacts = db.query(models.Contact).all()
-
-    # Ітерація через всі контакти для перевірки, чи має кожен контакт день народження в найближчій неділі
-    for contact in all_contacts:
-        if contact.birthday:
-            birthday_this_year = datetime(today.year, contact.birthday.month, contact.birthday.day).date()
-            if today <= birthday_this_year <= week_later:
-                upcoming_contacts.append(contact)
-
-    return upcoming_contacts
-
-# Маршрут для реєстрації користувача
-@router.post("/signup", response_model=schemas.UserResponse, status_code=status.HTTP_201_CREATED)
-async def signup(body: schemas.UserCreate, background_tasks: BackgroundTasks, request: Request, db: Session = Depends(database.get_db)):
-    """
-    Registers a new user.
-
-    Args:
-        body (schemas.UserCreate): Data of the new user.
-        background_tasks (BackgroundTasks): Background tasks to execute.
-        request (Request): Incoming HTTP request object.
-        db (Session, optional): Database session object. Defaults to Depends(database.get_db).
-
-    Returns:
-        dict: User creation confirmation message.
-
-    Raises:
-        HTTPException: If the account already exists.
-    """
-    exist_user = await repository_users.get_user_by_email(body.email, db)
-    if exist_user:
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
-    hashed_password = bcrypt.hashpw(body.password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-    new_user = await repository_users.create_user(email=body.email, hashed_password=hashed_password, db=db)
-    background_tasks.add_task(send_email, new_user.email, new_user.username, request.base_url)
-    return {"user": new_user, "detail": "User successfully created. Check your email for confirmation."}
-
-@router.post("/login", response_model=User)
-async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    """
-    Logs in a user.
-
-    Args:
-        body (OAuth2PasswordRequestForm): Form containing user login credentials.
-        db (Session): Database session object.
-
-    Returns:
-        dict: Access token and refresh token for the authenticated user.
-
-    Raises:
-        HTTPException: If the email or password is invalid, or if the email is not confirmed.
-    """
-    user = await repository_users.get_user_by_email(body.username, db)
-    if user is None:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email")
-    if not user.confirmed:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Email not confirmed")
-    if not verify_password(body.password, user.password):
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
-    # Generate JWT
-    access_token = create_jwt_token(data={"sub": user.email})
-    refresh_token = create_jwt_token(data={"sub": user.email})
-    await repository_users.update_token(user, refresh_token, db)
-    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
-
-@router.get('/confirmed_email/{token}')
-async def confirmed_email(token: str, db: Session = Depends(get_db)):
-    """
-    Confirms the user's email.
-
-    Args:
-        token (str): Token for email confirmation.
-        db (Session): Database session object.
-
-    Returns:
-        dict: Confirmation message upon successful email confirmation.
-
-    Raises:
-        HTTPException: If the token is invalid or the user cannot be found.
-    """
-    email = await get_email_from_token(token)
-    user = await repository_users.get_user_by_email(email, db)
-    if user is None:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Verification error")
-    if user.confirmed:
-        return {"message": "Your email is already confirmed"}
-    await repository_users.confirmed_email(email, db)
-    return {"message": "Email confirmed"}
-
-# Маршрут для перегляду профілю користувача
-@router.get("/users/profile/", response_model=schemas.User)
-async def read_user_profile(current_user: schemas.User = Depends(get_current_user)):
-    """
-    Retrieves the authenticated user's profile.
-
-    Args:
-        current_user (schemas.User): Authenticated user.
-
-    Returns:
-        dict: Authenticated user's profile data.
-    """
-    return current_user
-
-# Маршрут для оновлення аватара користувача
-@router.patch('/avatar', response_model=schemas.User)
-async def update_avatar_user(file: UploadFile = File(...), 
-                             current_user: models.User = Depends(get_current_user),
-                             db: Session = Depends(get_db)):
-    """
-    Updates the authenticated user's avatar.
-
-    Args:
-        file (UploadFile): Uploaded avatar file.
-        current_user (models.User): Authenticated user.
-        db (Session): Database session object.
-
-    Returns:
-        dict: Updated user data with the new avatar URL.
-    """
-    if not file:
-        raise HTTPException(status_code=400, detail="Файл не був переданий")
-
-    cloudinary.config(
-        cloud_name=settings.cloudinary_name,
-        api_key=settings.cloudinary_api_key,
-        api_secret=settings.cloudinary_api_secret,
-        secure=True
-    )
-
-    r = cloudinary.uploader.upload(file.file, public_id=f'NotesApp/{current_user.username}', overwrite=True)
-    src_url = cloudinary.CloudinaryImage(f'NotesApp/{current_user.username}')\
-                        .build_url(width=250, height=250, crop='fill', version=r.get('version'))
-    user = await repository_users.update_avatar(current_user.email, src_url, db)
-    return user
-
-@router.post("/send-email")
-async def send_email_background(email: EmailStr, background_tasks: BackgroundTasks):
-    """
-    Sends an email in the background.
-
-    Args:
-        email (EmailStr): Email address of the recipient.
-        background_tasks (BackgroundTasks): Background tasks to execute.
-
-    Returns:
-        dict: Confirmation message upon successful email sending.
-    """
-    await send_email(email)
-    return {"message": "email has been sent"}
-
-@router.post('/request_email')
-async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, request: Request,
-                        db: Session = Depends(get_db)):
-    """
-    Requests email confirmation for a user.
-
-    Args:
-        body (RequestEmail): Email request data.
-        background_tasks (BackgroundTasks): Background tasks to execute.
-        request (Request): Incoming HTTP request object.
-        db (Session): Database session object.
-
-    Returns:
-        dict: Confirmation message for email confirmation request.
-    """
-    user = await repository_users.get_user_by_email(body.email, db)
-
-    if user.confirmed:
-        return {"message": "Your email is already confirmed"}
-    if user:
-        background_tasks.add_task(send_email, user.email, user.username, request.base_url)
+from fastapi import APIRouter, Depends, HTTPException, Query, File, UploadFile, BackgroundTasks, status, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse, Response
+from pydantic import EmailStr
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+import asyncio
+import json
+from contactpr import schemas, models, database, events, ical, autocomplete, fuzzy, metrics, batch, tracing, profiler, memprofile, profiling, tags as contact_tags
+from contactpr.cache import query_cache
+from fastapi.encoders import jsonable_encoder
+from contactpr.models import User
+from fastapi.security import OAuth2PasswordBearer
+from ..auth import create_jwt_token, get_current_user, get_optional_user, get_current_admin, verify_password, get_email_from_token
+from fastapi_limiter.depends import RateLimiter
+from .database import get_db, get_read_db
+from ..config import settings
+import cloudinary
+import cloudinary.uploader
+from repository import users as repository_users
+from repository import sync as repository_sync
+from repository import tags as repository_tags
+from repository import custom_fields as repository_custom_fields
+from repository import soft_delete as repository_soft_delete
+from repository import refresh_tokens as repository_refresh_tokens
+from repository import stats as repository_stats
+from repository import queries
+from fastapi import APIRouter
+from send_email import send_email
+import bcrypt
+from schemas import RequestEmail
+
+# sessions are closed as soon as a response is built, not after it was sent
+router = APIRouter(route_class=database.SessionScopedRoute)
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+
+@router.get("/")
+async def read_root():
+    """
+    Root endpoint returning a welcome message.
+
+    Returns:
+        dict: Welcome message.
+    """
+    return {"message": "Ласкаво просимо до мого додатку FastAPI!"}
+
+# Маршрут для створення нового контакту
+@router.post("/contacts/", response_model=schemas.Contact)
+def create_contact(contact: schemas.ContactCreate, current_user: models.User = Depends(get_current_user),
+                    db: Session = Depends(get_db),
+                    rate_limiter: RateLimiter = Depends(RateLimiter(times=2, seconds=60))):
+    """
+    Creates a new contact in the database.
+
+    Args:
+        contact (schemas.ContactCreate): Data of the new contact.
+        current_user (models.User): Authenticated user who becomes the owner of the contact.
+        db (Session, optional): Database session object. Defaults to Depends(get_db).
+        rate_limiter (RateLimiter, optional): Rate limiter dependency. Defaults to Depends(RateLimiter(times=2, seconds=60)).
+
+    Returns:
+        models.Contact: Created contact object.
+    """
+    db_contact = models.Contact(**contact.dict(), owner_id=current_user.id)
+    db_contact.change_seq = repository_sync.next_change_seq(db, current_user.id)
+    db.add(db_contact)
+    db.commit()
+    db.refresh(db_contact)
+    events.publish_contact("contact.created", db_contact)
+    return db_contact
+
+def _serialize(contacts) -> list:
+    """
+    Converts contacts into JSON-compatible dicts that can be cached.
+
+    Args:
+        contacts (Iterable[models.Contact]): Contacts to convert.
+
+    Returns:
+        list: Serialized contacts.
+    """
+    return [jsonable_encoder(schemas.Contact.from_orm(contact)) for contact in contacts]
+
+def _parse_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """
+    Validates a sparse fieldset against schemas.Contact.
+
+    Args:
+        fields (str, optional): Comma-separated field names, e.g. ``first_name,phone_number``.
+
+    Returns:
+        Tuple[str, ...]: Requested fields plus ``id`` in schema order, or None for all fields.
+
+    Raises:
+        HTTPException: If a field is not part of schemas.Contact.
+    """
+    if not fields:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - schemas.Contact.__fields__.keys()
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(name for name in schemas.Contact.__fields__ if name == "id" or name in requested)
+
+def _fields_key(fields: Optional[Tuple[str, ...]]) -> str:
+    return "" if fields is None else f":fields={','.join(fields)}"
+
+def _respond(contacts, fields: Optional[Tuple[str, ...]]):
+    """
+    Returns trimmed contacts as they are; full contacts go through the route's response_model.
+
+    Args:
+        contacts: Serialized contact or list of contacts.
+        fields (Tuple[str, ...], optional): Sparse fieldset.
+
+    Returns:
+        Response or the contacts unchanged.
+    """
+    return contacts if fields is None else JSONResponse(contacts)
+
+def _tag_index(owner_id: int, db: Session) -> contact_tags.TagIndex:
+    """
+    Returns the tag bitmap index of a user, building it on first use.
+
+    Args:
+        owner_id (int): ID of the user.
+        db (Session): Database session object, used only to build the index.
+
+    Returns:
+        contact_tags.TagIndex: Tag index of the user.
+    """
+    def build():
+        return contact_tags.TagIndex(queries.contact_ids_by_owner(db, owner_id),
+                                     queries.tag_memberships_by_owner(db, owner_id))
+
+    return contact_tags.index_cache.get(owner_id, build)
+
+def _filter_by_tags(contacts: list, owner_id: int, db: Session, tags: Optional[str],
+                    any_tags: Optional[str], exclude_tags: Optional[str]) -> list:
+    """
+    Keeps the serialized contacts matching a tag filter.
+
+    Args:
+        contacts (list): Serialized contacts.
+        owner_id (int): ID of the user whose tags are used.
+        db (Session): Database session object.
+        tags (str, optional): Comma-separated tags a contact must all have.
+        any_tags (str, optional): Comma-separated tags of which a contact must have at least one.
+        exclude_tags (str, optional): Comma-separated tags a contact must not have.
+
+    Returns:
+        list: Matching contacts; the input list if no filter is given.
+    """
+    all_tags = contact_tags.parse_tags(tags)
+    some_tags = contact_tags.parse_tags(any_tags)
+    excluded = contact_tags.parse_tags(exclude_tags)
+    if not (all_tags or some_tags or excluded):
+        return contacts
+    matching = _tag_index(owner_id, db).query(all_tags, some_tags, excluded)
+    return [contact for contact in contacts if contact["id"] in matching]
+
+# Маршрут для отримання списку всіх контактів
+@router.get("/contacts/", response_model=list[schemas.Contact])
+def get_contacts_by_owner(tags: Optional[str] = None, any_tags: Optional[str] = None,
+                          exclude_tags: Optional[str] = None, field: Optional[List[str]] = Query(None),
+                          contains: Optional[str] = None, fields: Optional[str] = None,
+                          current_user: str = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    """
+    Retrieves a list of all contacts owned by the authenticated user.
+
+    Custom field filters run inside the database (JSONB containment on PostgreSQL).
+
+    Args:
+        tags (str, optional): Comma-separated tags a contact must all have.
+        any_tags (str, optional): Comma-separated tags of which a contact must have at least one.
+        exclude_tags (str, optional): Comma-separated tags a contact must not have.
+        field (List[str], optional): ``key:value`` custom field equality filters, e.g. ``field=company:Acme``.
+        contains (str, optional): JSON object the custom fields must contain, e.g. ``{"langs": ["en"]}``.
+        fields (str, optional): Comma-separated contact fields to return; only these columns are selected.
+        current_user (str): Authenticated user.
+        db (Session): Database session object.
+
+    Returns:
+        List[models.Contact]: List of contacts owned by the authenticated user.
+
+    Raises:
+        HTTPException: If a custom field filter or the fieldset is malformed.
+    """
+    columns = _parse_fields(fields)
+    try:
+        criteria = repository_custom_fields.parse_filters(field, contains)
+    except ValueError as error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(error))
+
+    def load():
+        if criteria and columns:
+            return jsonable_encoder(repository_custom_fields.contact_fields_by_custom_fields(
+                db, current_user.id, criteria, columns))
+        if criteria:
+            return _serialize(repository_custom_fields.contacts_by_custom_fields(db, current_user.id, criteria))
+        if columns:
+            return jsonable_encoder(queries.contact_fields(
+                db, queries.CONTACTS_BY_OWNER, {"owner_id": current_user.id}, columns))
+        return _serialize(queries.contacts_by_owner(db, current_user.id))
+
+    key = f"contacts:fields:{json.dumps(criteria, sort_keys=True)}" if criteria else "contacts"
+    contacts = query_cache.get_or_load(key + _fields_key(columns), current_user.id, load)
+    return _respond(_filter_by_tags(contacts, current_user.id, db, tags, any_tags, exclude_tags), columns)
+
+# Маршрут для отримання одного контакту по його ідентифікатору
+@router.get("/contacts/{contact_id}", response_model=schemas.Contact)
+def read_contact(contact_id: int, fields: Optional[str] = None, db: Session = Depends(get_read_db)):
+    """
+    Retrieves a single contact by its ID.
+
+    Args:
+        contact_id (int): ID of the contact to retrieve.
+        fields (str, optional): Comma-separated contact fields to return; only these columns are selected.
+        db (Session): Database session object.
+
+    Returns:
+        models.Contact: Retrieved contact object.
+
+    Raises:
+        HTTPException: If the contact with the specified ID is not found or the fieldset is malformed.
+    """
+    columns = _parse_fields(fields)
+
+    def load():
+        if columns:
+            rows = queries.contact_fields(db, queries.CONTACT_BY_ID, {"contact_id": contact_id}, columns)
+            return jsonable_encoder(rows[0]) if rows else None
+        contact = queries.contact_by_id(db, contact_id)
+        return None if contact is None else _serialize([contact])[0]
+
+    # The owner of a contact never changes, so it is cached without a generation;
+    # the contact itself is cached under its owner's generation.
+    owner = query_cache.get_pointer(f"contact-owner:{contact_id}")
+    if owner is None and columns:
+        contact = load()
+    elif owner is None:
+        contact = queries.contact_by_id(db, contact_id)
+        if contact is not None:
+            query_cache.set_pointer(f"contact-owner:{contact_id}", [contact.owner_id])
+    else:
+        contact = query_cache.get_or_load(f"contact:{contact_id}{_fields_key(columns)}", owner[0], load)
+    if contact is None:
+        raise HTTPException(status_code=404, detail="Контакт не знайдено")
+    return _respond(contact, columns)
+
+# Маршрут для оновлення контакту по його ідентифікатору
+@router.put("/contacts/{contact_id}", response_model=schemas.Contact)
+def update_contact(contact_id: int, contact_update: schemas.ContactUpdate, db: Session = Depends(get_db)):
+    """
+    Updates a contact by its ID.
+
+    Args:
+        contact_id (int): ID of the contact to update.
+        contact_update (schemas.ContactUpdate): Data to update the contact with.
+        db (Session): Database session object.
+
+    Returns:
+        models.Contact: Updated contact object.
+
+    Raises:
+        HTTPException: If the contact with the specified ID is not found.
+    """
+    db_contact = queries.contact_by_id(db, contact_id)
+    if db_contact is None:
+        raise HTTPException(status_code=404, detail="Контакт не знайдено")
+    for key, value in contact_update.dict(exclude_unset=True).items():
+        setattr(db_contact, key, value)
+    db_contact.updated_at = datetime.utcnow()
+    if db_contact.owner_id is not None:
+        db_contact.change_seq = repository_sync.next_change_seq(db, db_contact.owner_id)
+    db.commit()
+    db.refresh(db_contact)
+    events.publish_contact("contact.updated", db_contact)
+    return db_contact
+
+# Маршрут для видалення контакту по його ідентифікатору
+@router.delete("/contacts/{contact_id}")
+def delete_contact(contact_id: int, db: Session = Depends(get_db)):
+    """
+    Deletes a contact by its ID.
+
+    The contact is soft-deleted: it disappears from all reads immediately and
+    can be restored through /contacts/{contact_id}/restore during
+    ``settings.contacts_undo_window_hours``; afterwards the purge job removes it.
+
+    Args:
+        contact_id (int): ID of the contact to delete.
+        db (Session): Database session object.
+
+    Returns:
+        dict: Confirmation message upon successful deletion.
+
+    Raises:
+        HTTPException: If the contact with the specified ID is not found.
+    """
+    db_contact = queries.contact_by_id(db, contact_id)
+    if db_contact is None:
+        raise HTTPException(status_code=404, detail="Контакт не знайдено")
+    seq = repository_soft_delete.soft_delete_contact(db, db_contact)
+    events.publish_contact("contact.deleted", db_contact, seq)
+    return {"message": "Контакт успішно видалено"}
+
+# Маршрут для відновлення видаленого контакту
+@router.post("/contacts/{contact_id}/restore", response_model=schemas.Contact)
+def restore_contact(contact_id: int, current_user: models.User = Depends(get_current_user),
+                    db: Session = Depends(get_db)):
+    """
+    Restores a deleted contact while its undo window is open.
+
+    Args:
+        contact_id (int): ID of the deleted contact.
+        current_user (models.User): Authenticated user.
+        db (Session): Database session object.
+
+    Returns:
+        models.Contact: Restored contact object.
+
+    Raises:
+        HTTPException: 404 if there is no such deleted contact, 410 if the undo window
+            expired, 409 if a contact with the same email was created meanwhile.
+    """
+    db_contact = queries.deleted_contact_by_id(db, contact_id)
+    if db_contact is None or db_contact.owner_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Контакт не знайдено")
+    window = timedelta(hours=settings.contacts_undo_window_hours)
+    try:
+        restored = repository_soft_delete.restore_contact(db, db_contact, window)
+    except IntegrityError:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Контакт з такою електронною поштою вже існує")
+    if not restored:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Час для відновлення контакту минув")
+    events.publish_contact("contact.created", db_contact)
+    if db_contact.tags:
+        events.publish_contact_tags(db_contact, sorted(tag.name for tag in db_contact.tags))
+    return db_contact
+
+# Маршрут для пошуку контактів за ім'ям, прізвищем або адресою електронної пошти
+@router.get("/contacts/search/")
+def search_contacts(query: str = Query(..., min_length=1), tags: Optional[str] = None,
+                    any_tags: Optional[str] = None, exclude_tags: Optional[str] = None,
+                    fields: Optional[str] = None,
+                    current_user: Optional[models.User] = Depends(get_optional_user),
+                    db: Session = Depends(get_read_db)):
+    """
+    Searches for contacts by their first name, last name, or email address.
+
+    Tag filters require authentication and restrict the results to the
+    authenticated user's contacts.
+
+    Args:
+        query (str): Search query.
+        tags (str, optional): Comma-separated tags a contact must all have.
+        any_tags (str, optional): Comma-separated tags of which a contact must have at least one.
+        exclude_tags (str, optional): Comma-separated tags a contact must not have.
+        fields (str, optional): Comma-separated contact fields to return; only these columns are selected.
+        current_user (models.User, optional): Authenticated user, if any.
+        db (Session): Database session object.
+
+    Returns:
+        List[models.Contact]: List of contacts matching the search query.
+
+    Raises:
+        HTTPException: If tag filters are used without authentication or the fieldset is malformed.
+    """
+    columns = _parse_fields(fields)
+
+    def load():
+        if columns:
+            statement, params = queries.search_statement(db, query)
+            return jsonable_encoder(queries.contact_fields(db, statement, params, columns))
+        return _serialize(queries.search_contacts(db, query))
+
+    contacts = query_cache.get_or_load(f"search:{query}{_fields_key(columns)}", "*", load)
+    if not (tags or any_tags or exclude_tags):
+        return _respond(contacts, columns)
+    if current_user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return _respond(_filter_by_tags(contacts, current_user.id, db, tags, any_tags, exclude_tags), columns)
+
+# Маршрут для нечіткого пошуку контактів користувача
+@router.get("/contacts/search/fuzzy/", response_model=list[schemas.FuzzyMatch])
+def fuzzy_search_contacts(q: str = Query(..., min_length=1, max_length=100), limit: int = Query(10, ge=1, le=50),
+                          current_user: models.User = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    """
+    Searches the user's contacts by first and last name, tolerating typos and sound-alike spellings.
+
+    "Jonh" finds John and "Olexandr" finds Oleksandr (and Олександр). Served
+    from a per-user in-memory index that is built on first use and kept
+    current from contact change events.
+
+    Args:
+        q (str): Search text.
+        limit (int): Number of contacts to return.
+        current_user (models.User): Authenticated user.
+        db (Session): Database session object, used only to build the index.
+
+    Returns:
+        List[dict]: Best matches first.
+    """
+    def build():
+        return fuzzy.FuzzyIndex(queries.contact_names_by_owner(db, current_user.id))
+
+    return fuzzy.index_cache.get(current_user.id, build).search(q, limit)
+
+# Маршрут для встановлення тегів контакту
+@router.put("/contacts/{contact_id}/tags", response_model=schemas.ContactTags)
+def set_contact_tags(contact_id: int, body: schemas.ContactTags,
+                     current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    Replaces the tags of one of the authenticated user's contacts.
+
+    Args:
+        contact_id (int): ID of the contact.
+        body (schemas.ContactTags): New tag names; missing tags are created.
+        current_user (models.User): Authenticated user.
+        db (Session): Database session object.
+
+    Returns:
+        dict: Normalized tag names of the contact.
+
+    Raises:
+        HTTPException: If the contact is not found or belongs to another user.
+    """
+    db_contact = queries.contact_by_id(db, contact_id)
+    if db_contact is None or db_contact.owner_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Контакт не знайдено")
+    names = repository_tags.set_contact_tags(db, db_contact, body.tags)
+    events.publish_contact_tags(db_contact, names)
+    return {"tags": names}
+
+# Маршрут для отримання тегів користувача
+@router.get("/tags/", response_model=list[schemas.TagCount])
+def list_tags(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    """
+    Lists the authenticated user's tags with the number of tagged contacts.
+
+    Args:
+        current_user (models.User): Authenticated user.
+        db (Session): Database session object.
+
+    Returns:
+        List[dict]: Tag names and contact counts.
+    """
+    counts = _tag_index(current_user.id, db).counts()
+    return [{"name": name, "contacts": count} for name, count in counts.items()]
+
+# Маршрут для статистики контактів користувача
+@router.get("/contacts/stats/", response_model=schemas.ContactStats)
+def read_contact_stats(top: int = Query(10, ge=1, le=100), current_user: models.User = Depends(get_current_user),
+                       db: Session = Depends(get_read_db)):
+    """
+    Returns dashboard statistics of the user's contacts.
+
+    The numbers come from the contact_stats summary table, which contact
+    writes update incrementally, so no contacts are scanned.
+
+    Args:
+        top (int): Number of email domains to return.
+        current_user (models.User): Authenticated user.
+        db (Session): Database session object.
+
+    Returns:
+        dict: Total, birthdays per month and the most frequent email domains.
+    """
+    return repository_stats.contact_stats(db, current_user.id, top)
+
+# Маршрут для автодоповнення імен контактів
+@router.get("/contacts/autocomplete/", response_model=list[schemas.ContactSuggestion])
+def autocomplete_contacts(q: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=50),
+                          current_user: models.User = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    """
+    Suggests contacts whose first name, last name or email starts with the typed text.
+
+    Served from a per-user in-memory prefix index that is built on first use
+    and kept current from contact change events.
+
+    Args:
+        q (str): Text typed so far.
+        limit (int): Number of suggestions to return.
+        current_user (models.User): Authenticated user.
+        db (Session): Database session object, used only to build the index.
+
+    Returns:
+        List[dict]: Suggestions, most recently changed contacts first.
+    """
+    def build():
+        return autocomplete.PrefixIndex(queries.contact_names_by_owner(db, current_user.id))
+
+    index = autocomplete.index_cache.get(current_user.id, build)
+    return index.search(q, limit, settings.autocomplete_max_scan)
+
+# Маршрут для отримання списку контактів з днями народження в найближчі 7 днів
+@router.get("/contacts/birthdays/")
+def upcoming_birthdays(fields: Optional[str] = None, db: Session = Depends(get_read_db)):
+    """
+    Retrieves contacts with birthdays in the next 7 days.
+
+    Args:
+        fields (str, optional): Comma-separated contact fields to return; only these columns are selected.
+        db (Session): Database session object.
+
+    Returns:
+        List[models.Contact]: List of contacts with upcoming birthdays.
+
+    Raises:
+        HTTPException: If the fieldset is malformed.
+    """
+    columns = _parse_fields(fields)
+    today = datetime.now().date()
+
+    def load():
+        if columns:
+            params = {"ordinals": queries.upcoming_ordinals(today, 7)}
+            return jsonable_encoder(queries.contact_fields(db, queries.UPCOMING_BIRTHDAYS, params, columns))
+        return _serialize(queries.upcoming_birthdays(db, today, 7))
+
+    return query_cache.get_or_load(f"birthdays:{today.isoformat()}{_fields_key(columns)}", "*", load)
+
+# Маршрут для інкрементальної синхронізації контактів
+@router.get("/contacts/sync/", response_model=schemas.ContactSync)
+def sync_contacts(token: Optional[str] = None, limit: int = Query(500, ge=1, le=1000),
+                  current_user: models.User = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    """
+    Returns contacts created, updated or deleted since a sync token.
+
+    Without a token all contacts of the user are returned. Clients keep calling
+    with the returned token while ``has_more`` is true.
+
+    Args:
+        token (str, optional): Sync token from the previous response.
+        limit (int): Maximum number of changes in the page.
+        current_user (models.User): Authenticated user.
+        db (Session): Database session object.
+
+    Returns:
+        dict: Changed contacts, ids of deleted contacts, the next sync token and the ``has_more`` flag.
+
+    Raises:
+        HTTPException: 400 if the token is invalid, 410 if it expired and a full resync is required.
+    """
+    since = 0
+    if token is not None:
+        since = repository_sync.decode_sync_token(token, current_user.id)
+        if since is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sync token")
+    try:
+        changed, deleted, next_seq, has_more = repository_sync.get_changes(db, current_user.id, since, limit)
+    except repository_sync.StaleSyncToken:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Sync token expired, full resync required")
+    return {
+        "changed": changed,
+        "deleted": deleted,
+        "sync_token": repository_sync.encode_sync_token(current_user.id, next_seq),
+        "has_more": has_more,
+    }
+
+def _authenticate_stream(token: str) -> models.User:
+    """
+    Resolves the user of a long-lived connection.
+
+    Uses a short-lived session so that open streams do not hold database connections.
+
+    Args:
+        token (str): JWT token.
+
+    Returns:
+        models.User: Authenticated user.
+
+    Raises:
+        HTTPException: If credentials in the token cannot be validated.
+    """
+    db = database.SessionLocal()
+    try:
+        return get_current_user(token, db)
+    finally:
+        db.close()
+
+# Маршрут для потоку змін контактів (server-sent events)
+@router.get("/contacts/stream/")
+async def stream_contacts(token: str = Depends(oauth2_scheme)):
+    """
+    Streams changes of the authenticated user's contacts as server-sent events.
+
+    Sends a comment heartbeat every ``settings.events_heartbeat_seconds``. After
+    a buffer overflow the client receives a ``resync`` event and should catch
+    up through ``/contacts/sync/``.
+
+    Args:
+        token (str): JWT token.
+
+    Returns:
+        StreamingResponse: ``text/event-stream`` response.
+    """
+    current_user = await run_in_threadpool(_authenticate_stream, token)
+    subscription = events.broker.subscribe(current_user.id)
+
+    async def event_stream():
+        try:
+            yield ": connected\n\n"
+            while True:
+                event = await subscription.get(settings.events_heartbeat_seconds)
+                yield ": ping\n\n" if event is None else events.format_sse(event)
+        finally:
+            events.broker.unsubscribe(subscription)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Маршрут для потоку змін контактів (WebSocket)
+@router.websocket("/contacts/ws")
+async def contacts_websocket(websocket: WebSocket, token: str = Query(...)):
+    """
+    Pushes changes of the user's contacts over a WebSocket.
+
+    Browsers cannot set headers on WebSocket requests, so the JWT token is
+    passed as the ``token`` query parameter. Idle connections receive
+    ``{"type": "ping"}`` heartbeats.
+
+    Args:
+        websocket (WebSocket): WebSocket connection.
+        token (str): JWT token.
+    """
+    try:
+        current_user = await run_in_threadpool(_authenticate_stream, token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    subscription = events.broker.subscribe(current_user.id)
+
+    async def disconnected():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    # the client never sends anything, but reading is how its disconnect is noticed
+    closed = asyncio.ensure_future(disconnected())
+    try:
+        while True:
+            getter = asyncio.ensure_future(subscription.get(settings.events_heartbeat_seconds))
+            await asyncio.wait({closed, getter}, return_when=asyncio.FIRST_COMPLETED)
+            if not getter.done():
+                getter.cancel()
+                break
+            event = getter.result()
+            await websocket.send_json({"type": "ping"} if event is None else events.public(event))
+    except (WebSocketDisconnect, RuntimeError, OSError):
+        pass
+    finally:
+        closed.cancel()
+        events.broker.unsubscribe(subscription)
+
+def _load_birthdays(owner_id: int):
+    db = database.SessionLocal()
+    try:
+        return queries.birthdays_by_owner(db, owner_id)
+    finally:
+        db.close()
+
+# Маршрут для календаря днів народження у форматі iCalendar
+@router.get("/calendar/{user_id}/{token}/birthdays.ics")
+async def birthday_calendar(user_id: int, token: str, request: Request):
+    """
+    Serves the user's contacts' birthdays as an iCalendar feed.
+
+    The feed is authenticated by the token in its URL (see /users/calendar/).
+    Rendered feeds are cached and kept current from contact change events, so
+    a cache hit needs neither the database nor the renderer.
+
+    Args:
+        user_id (int): Identifier of the feed owner.
+        token (str): Feed token.
+        request (Request): Incoming HTTP request object.
+
+    Returns:
+        Response: ``text/calendar`` body, or 304 if the client's ETag is current.
+
+    Raises:
+        HTTPException: If the feed token is invalid.
+    """
+    if not ical.verify_feed_token(user_id, token):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Календар не знайдено")
+    cached = ical.feed_cache.peek(user_id)
+    if cached is None:
+        cached = await run_in_threadpool(ical.feed_cache.get, user_id, lambda: _load_birthdays(user_id))
+    body, etag = cached
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=300"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="text/calendar; charset=utf-8", headers=headers)
+
+# Маршрут для отримання посилання на календар днів народження
+@router.get("/users/calendar/")
+async def birthday_calendar_url(request: Request, current_user: models.User = Depends(get_current_user)):
+    """
+    Returns the personal iCalendar feed URL of the authenticated user.
+
+    Args:
+        request (Request): Incoming HTTP request object.
+        current_user (models.User): Authenticated user.
+
+    Returns:
+        dict: Feed URL to subscribe to in a calendar app.
+    """
+    url = request.url_for("birthday_calendar", user_id=current_user.id, token=ical.feed_token(current_user.id))
+    return {"url": str(url)}
+
+# Маршрут для виконання кількох запитів за один виклик
+@router.post("/batch", response_model=schemas.BatchResponse)
+async def batch_requests(body: schemas.BatchRequest, request: Request,
+                         current_user: models.User = Depends(get_current_user)):
+    """
+    Executes several API calls in one round trip.
+
+    The caller is authenticated once for the whole batch. Consecutive GET
+    sub-requests run concurrently, each with its own pooled database session
+    (sessions are not thread-safe); other methods run one at a time in order.
+
+    Args:
+        body (schemas.BatchRequest): Sub-requests.
+        request (Request): Incoming HTTP request object.
+        current_user (models.User): Authenticated user.
+
+    Returns:
+        dict: Per-request statuses and bodies in request order.
+
+    Raises:
+        HTTPException: If the batch is larger than ``settings.batch_max_requests``.
+    """
+    if len(body.requests) > settings.batch_max_requests:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"At most {settings.batch_max_requests} requests per batch")
+    responses = await batch.run(request.app, request.scope, body.requests, current_user)
+    return {"responses": responses}
+
+# Маршрут для перегляду метрик воркера
+@router.get("/admin/metrics")
+def read_metrics(current_user: models.User = Depends(get_current_admin)):
+    """
+    Returns runtime metrics of the worker that serves the request.
+
+    Args:
+        current_user (models.User): Authenticated administrator.
+
+    Returns:
+        dict: Metrics by section (cache, ...).
+    """
+    return metrics.snapshot()
+
+def _profiling_window(seconds: float = Query(10, gt=0), route: Optional[str] = None,
+                      requests: Optional[int] = Query(None, ge=1)) -> Tuple[float, Optional[str], Optional[int]]:
+    """
+    Reads how long and on which route a profiling session runs.
+
+    Args:
+        seconds (float): Maximum duration, capped by ``settings.profiler_max_seconds``.
+        route (str, optional): Route template (``/contacts/{contact_id}``) or path to profile.
+        requests (int, optional): Stop after this many matching requests, capped by
+            ``settings.profiler_max_requests``.
+
+    Returns:
+        Tuple[float, Optional[str], Optional[int]]: Duration, route and number of requests.
+    """
+    if requests is not None:
+        requests = min(requests, settings.profiler_max_requests)
+    return min(seconds, settings.profiler_max_seconds), route, requests
+
+
+async def _profile(start: Callable, busy_detail: str):
+    """
+    Starts a profiling session and waits until it has finished.
+
+    Args:
+        start (Callable): Starts the session (profiler.start or memprofile.start with their arguments bound).
+        busy_detail (str): Error detail if a session of the same profiler is already running.
+
+    Returns:
+        Finished session.
+
+    Raises:
+        HTTPException: If a session of the same profiler is already running in this worker.
+    """
+    try:
+        session = start()
+    except profiling.SessionBusy:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=busy_detail)
+    await session.wait()
+    return session
+
+# Маршрут для профілювання воркера
+@router.post("/admin/profile")
+async def profile_worker(request: Request, window: tuple = Depends(_profiling_window),
+                         interval_ms: float = Query(5, ge=1, le=100),
+                         format: str = Query("speedscope", regex="^(speedscope|collapsed)$"),
+                         current_user: models.User = Depends(get_current_admin)):
+    """
+    Runs the sampling profiler in the worker that serves the request.
+
+    The request returns when ``seconds`` have passed or, if ``requests`` is
+    given, once that many requests matching ``route`` (or any route) finished.
+    Only samples that belong to a request are kept, grouped by route template.
+
+    Args:
+        request (Request): Incoming HTTP request object.
+        window (tuple): Duration, route and number of requests (see _profiling_window).
+        interval_ms (float): Sampling interval in milliseconds.
+        format (str): ``speedscope`` (JSON) or ``collapsed`` (flamegraph.pl input).
+        current_user (models.User): Authenticated administrator.
+
+    Returns:
+        Response: Speedscope document or collapsed stacks; the session counters
+        are sent in the ``X-Profile-Summary`` header.
+
+    Raises:
+        HTTPException: If a profiling session is already running in this worker.
+    """
+    session = await _profile(lambda: profiler.start(request.app, *window, interval_ms / 1000),
+                             "Профілювання вже виконується")
+    headers = {"X-Profile-Summary": json.dumps(session.summary())}
+    if format == "collapsed":
+        return PlainTextResponse(session.collapsed(), headers=headers)
+    return JSONResponse(session.speedscope(), headers=headers)
+
+# Маршрут для профілювання пам'яті воркера
+@router.post("/admin/memory")
+async def profile_worker_memory(request: Request, window: tuple = Depends(_profiling_window),
+                                frames: int = Query(25, ge=1, le=100), top: int = Query(10, ge=1, le=100),
+                                current_user: models.User = Depends(get_current_admin)):
+    """
+    Traces memory allocations with tracemalloc in the worker that serves the request.
+
+    The request returns when ``seconds`` have passed or, if ``requests`` is
+    given, once that many requests matching ``route`` (or any route) finished.
+
+    Args:
+        request (Request): Incoming HTTP request object.
+        window (tuple): Duration, route and number of requests (see _profiling_window).
+        frames (int): Traceback depth stored per allocation.
+        top (int): Number of allocation sites reported per route.
+        current_user (models.User): Authenticated administrator.
+
+    Returns:
+        dict: Peak allocation of the requests of every route and the memory each
+        route retained since the session started, with its top allocation sites.
+
+    Raises:
+        HTTPException: If a memory profiling session is already running in this worker.
+    """
+    session = await _profile(lambda: memprofile.start(request.app, *window, frames, top),
+                             "Профілювання пам'яті вже виконується")
+    return session.report()
+
+# Маршрут для реєстрації користувача
+@router.post("/signup", response_model=schemas.UserResponse, status_code=status.HTTP_201_CREATED)
+def signup(body: schemas.UserCreate, background_tasks: BackgroundTasks, request: Request, db: Session = Depends(database.get_db)):
+    """
+    Registers a new user.
+
+    Args:
+        body (schemas.UserCreate): Data of the new user.
+        background_tasks (BackgroundTasks): Background tasks to execute.
+        request (Request): Incoming HTTP request object.
+        db (Session, optional): Database session object. Defaults to Depends(database.get_db).
+
+    Returns:
+        dict: User creation confirmation message.
+
+    Raises:
+        HTTPException: If the account already exists.
+    """
+    exist_user = repository_users.get_user_by_email(db, body.email)
+    if exist_user:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
+    with tracing.span("password.hash"):
+        hashed_password = bcrypt.hashpw(body.password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    new_user = repository_users.create_user(db, {"email": body.email, "hashed_password": hashed_password})
+    background_tasks.add_task(send_email, new_user.email, new_user.email, str(request.base_url))
+    return {"user": new_user, "detail": "User successfully created. Check your email for confirmation."}
+
+def _access_token(user: models.User, family_id: str) -> str:
+    # the family lets get_current_user reject access tokens of revoked sessions
+    return create_jwt_token(data={"sub": user.email, "fam": family_id},
+                            expires_delta=timedelta(minutes=settings.access_token_expire_minutes))
+
+def _issue_tokens(db: Session, user: models.User, family_id: Optional[str] = None) -> dict:
+    lifetime = timedelta(days=settings.refresh_token_expire_days)
+    refresh_token, row = repository_refresh_tokens.issue_refresh_token(db, user.id, lifetime, family_id)
+    return {"access_token": _access_token(user, row.family_id), "refresh_token": refresh_token, "token_type": "bearer"}
+
+@router.post("/login", response_model=schemas.Token)
+def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    """
+    Logs in a user.
+
+    Starts a new refresh-token family; later access tokens are obtained
+    through /refresh without checking the password again.
+
+    Args:
+        body (OAuth2PasswordRequestForm): Form containing user login credentials.
+        db (Session): Database session object.
+
+    Returns:
+        dict: Access token and refresh token for the authenticated user.
+
+    Raises:
+        HTTPException: If the email or password is invalid, or if the email is not confirmed.
+    """
+    user = repository_users.get_user_by_email(db, body.username)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email")
+    if not user.confirmed:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Email not confirmed")
+    if not verify_password(body.password, user.hashed_password):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
+    return _issue_tokens(db, user)
+
+# Маршрут для оновлення токенів
+@router.post("/refresh", response_model=schemas.Token)
+def refresh_tokens(body: schemas.RefreshRequest, db: Session = Depends(get_db)):
+    """
+    Exchanges a refresh token for a new access token and a new refresh token.
+
+    Refresh tokens are single-use and looked up by their SHA-256 digest, so
+    this never runs bcrypt. Presenting an already used token revokes its
+    whole family: either the client or an attacker holds a stolen copy.
+
+    Args:
+        body (schemas.RefreshRequest): Current refresh token.
+        db (Session): Database session object.
+
+    Returns:
+        dict: New access token and refresh token.
+
+    Raises:
+        HTTPException: If the refresh token is unknown, expired, revoked or reused.
+    """
+    lifetime = timedelta(days=settings.refresh_token_expire_days)
+    try:
+        refresh_token, row = repository_refresh_tokens.rotate_refresh_token(db, body.refresh_token, lifetime)
+    except repository_refresh_tokens.RefreshTokenReuse as reuse:
+        events.publish_revocation(reuse.user_id, reuse.family_id)
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Недійсний токен оновлення")
+    except repository_refresh_tokens.InvalidRefreshToken:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Недійсний токен оновлення")
+    user = db.get(models.User, row.user_id)
+    return {"access_token": _access_token(user, row.family_id), "refresh_token": refresh_token, "token_type": "bearer"}
+
+# Маршрут для виходу із сесії
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+def logout(body: schemas.RefreshRequest, db: Session = Depends(get_db)):
+    """
+    Revokes the refresh-token family of a session.
+
+    Access tokens issued to the session are rejected from now on as well
+    (see contactpr.revocation).
+
+    Args:
+        body (schemas.RefreshRequest): Refresh token of the session.
+        db (Session): Database session object.
+
+    Returns:
+        Response: Empty response.
+    """
+    row = repository_refresh_tokens.revoke_token(db, body.refresh_token)
+    if row is not None:
+        events.publish_revocation(row.user_id, row.family_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+@router.get('/confirmed_email/{token}')
+async def confirmed_email(token: str, db: Session = Depends(get_db)):
+    """
+    Confirms the user's email.
+
+    Args:
+        token (str): Token for email confirmation.
+        db (Session): Database session object.
+
+    Returns:
+        dict: Confirmation message upon successful email confirmation.
+
+    Raises:
+        HTTPException: If the token is invalid or the user cannot be found.
+    """
+    email = await get_email_from_token(token)
+    user = await repository_users.get_user_by_email(email, db)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Verification error")
+    if user.confirmed:
+        return {"message": "Your email is already confirmed"}
+    await repository_users.confirmed_email(email, db)
+    return {"message": "Email confirmed"}
+
+# Маршрут для перегляду профілю користувача
+@router.get("/users/profile/", response_model=schemas.User)
+async def read_user_profile(current_user: schemas.User = Depends(get_current_user)):
+    """
+    Retrieves the authenticated user's profile.
+
+    Args:
+        current_user (schemas.User): Authenticated user.
+
+    Returns:
+        dict: Authenticated user's profile data.
+    """
+    return current_user
+
+# Маршрут для оновлення аватара користувача
+@router.patch('/avatar', response_model=schemas.User)
+async def update_avatar_user(file: UploadFile = File(...), 
+                             current_user: models.User = Depends(get_current_user),
+                             db: Session = Depends(get_db)):
+    """
+    Updates the authenticated user's avatar.
+
+    Args:
+        file (UploadFile): Uploaded avatar file.
+        current_user (models.User): Authenticated user.
+        db (Session): Database session object.
+
+    Returns:
+        dict: Updated user data with the new avatar URL.
+    """
+    if not file:
+        raise HTTPException(status_code=400, detail="Файл не був переданий")
+
+    cloudinary.config(
+        cloud_name=settings.cloudinary_name,
+        api_key=settings.cloudinary_api_key,
+        api_secret=settings.cloudinary_api_secret,
+        secure=True
+    )
+
+    with tracing.span("cloudinary.upload"):
+        r = cloudinary.uploader.upload(file.file, public_id=f'NotesApp/{current_user.id}', overwrite=True)
+    src_url = cloudinary.CloudinaryImage(f'NotesApp/{current_user.id}')\
+                        .build_url(width=250, height=250, crop='fill', version=r.get('version'))
+    user = await run_in_threadpool(repository_users.update_avatar, current_user.email, src_url, db)
+    if user:
+        await run_in_threadpool(events.publish_user, "user.avatar", user)
+    return user
+
+@router.post("/send-email")
+async def send_email_background(email: EmailStr, background_tasks: BackgroundTasks):
+    """
+    Sends an email in the background.
+
+    Args:
+        email (EmailStr): Email address of the recipient.
+        background_tasks (BackgroundTasks): Background tasks to execute.
+
+    Returns:
+        dict: Confirmation message upon successful email sending.
+    """
+    await send_email(email)
+    return {"message": "email has been sent"}
+
+@router.post('/request_email')
+async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, request: Request,
+                        db: Session = Depends(get_read_db)):
+    """
+    Requests email confirmation for a user.
+
+    Args:
+        body (RequestEmail): Email request data.
+        background_tasks (BackgroundTasks): Background tasks to execute.
+        request (Request): Incoming HTTP request object.
+        db (Session): Database session object.
+
+    Returns:
+        dict: Confirmation message for email confirmation request.
+    """
+    user = await repository_users.get_user_by_email(body.email, db)
+
+    if user.confirmed:
+        return {"message": "Your email is already confirmed"}
+    if user:
+        background_tasks.add_task(send_email, user.email, user.username, request.base_url)
     return {"message": "Check your email for confirmation."}
\ No newline at end of file
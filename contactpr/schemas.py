@@ -1,128 +1,317 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
-import datetime
-
-class ContactBase(BaseModel):
-    """
-    Base schema for contact data.
-
-    Attributes:
-        first_name (str): First name of the contact.
-        last_name (str): Last name of the contact.
-        email (str): Email address of the contact.
-        phone_number (str): Phone number of the contact.
-        birthday (Optional[datetime.date], optional): Birthday of the contact (optional).
-        additional_data (Optional[str], optional): Additional data about the contact (optional).
-    """
-    first_name: str
-    last_name: str
-    email: str
-    phone_number: str
-    birthday: Optional[datetime.date] = None
-    additional_data: Optional[str] = None
-
-class ContactCreate(ContactBase):
-    """
-    Schema for creating a new contact.
-
-    Inherits attributes from ContactBase.
-    """
-    pass
-
-class Contact(ContactBase):
-    """
-    Schema for representing a contact.
-
-    Inherits attributes from ContactBase and adds an 'id' attribute.
-
-    Attributes:
-        id (int): Unique identifier for the contact.
-    """
-    id: int
-
-    class Config:
-        orm_mode = True
-
-class ContactUpdate(BaseModel):
-    """
-    Schema for updating an existing contact.
-
-    Attributes:
-        first_name (Optional[str], optional): Updated first name of the contact (optional).
-        last_name (Optional[str], optional): Updated last name of the contact (optional).
-        email (Optional[str], optional): Updated email address of the contact (optional).
-        phone_number (Optional[str], optional): Updated phone number of the contact (optional).
-        birthday (Optional[datetime.date], optional): Updated birthday of the contact (optional).
-        additional_data (Optional[str], optional): Updated additional data about the contact (optional).
-    """
-    first_name: Optional[str] = None
-    last_name: Optional[str] = None
-    email: Optional[str] = None
-    phone_number: Optional[str] = None
-    birthday: Optional[datetime.date] = None
-    additional_data: Optional[str] = None
-
-class UserBase(BaseModel):
-    """
-    Base schema for user data.
-
-    Attributes:
-        email (str): Email address of the user.
-        avatar_url (Optional[str], optional): URL of the user's avatar (optional).
-    """
-    email: str
-    avatar_url: Optional[str]
-
-class UserCreate(UserBase):
-    """
-    Schema for creating a new user.
-
-    Inherits attributes from UserBase and adds a 'password' attribute.
-
-    Attributes:
-        password (str): Password of the user.
-    """
-    password: str
-
-class User(UserBase):
-    """
-    Schema for representing a user.
-
-    Inherits attributes from UserBase and adds an 'id' attribute.
-
-    Attributes:
-        id (int): Unique identifier for the user.
-    """
-    id: int
-
-    class Config:
-        orm_mode = True
-
-class UserLogin(BaseModel):
-    """
-    Schema for user login data.
-
-    Attributes:
-        email (str): Email address of the user.
-        password (str): Password of the user.
-    """
-    email: str
-    password: str
-
-class EmailSchema(BaseModel):
-    """
-    Schema for representing an email address.
-
-    Attributes:
-        email (EmailStr): Email address.
-    """
-    email: EmailStr
-
-class RequestEmail(BaseModel):
-    """
-    Schema for requesting an email address.
-
-    Attributes:
-        email (EmailStr): Email address.
-    """
-    email: EmailStr
\ No newline at end of file
+from pydantic import BaseModel, EmailStr, constr, validator
+from typing import Any, Dict, Optional, List
+import datetime
+import json
+
+def parse_custom_fields(value: Any) -> Any:
+    """
+    Converts legacy ``additional_data`` strings into custom field objects.
+
+    JSON object strings are decoded; any other string is kept as the
+    ``note`` field, so clients sending free text keep working.
+
+    Args:
+        value (Any): Raw additional_data value.
+
+    Returns:
+        Any: Custom fields dict, or the value unchanged if it is not a string.
+    """
+    if not isinstance(value, str):
+        return value
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        parsed = None
+    return parsed if isinstance(parsed, dict) else {"note": value}
+
+class ContactBase(BaseModel):
+    """
+    Base schema for contact data.
+
+    Attributes:
+        first_name (str): First name of the contact.
+        last_name (str): Last name of the contact.
+        email (str): Email address of the contact.
+        phone_number (str): Phone number of the contact.
+        birthday (Optional[datetime.date], optional): Birthday of the contact (optional).
+        additional_data (Optional[Dict[str, Any]], optional): Custom fields of the contact (optional).
+            Free-text strings are stored as ``{"note": text}``.
+    """
+    first_name: str
+    last_name: str
+    email: str
+    phone_number: str
+    birthday: Optional[datetime.date] = None
+    additional_data: Optional[Dict[constr(min_length=1, max_length=64), Any]] = None
+
+    _parse_additional_data = validator('additional_data', pre=True, allow_reuse=True)(parse_custom_fields)
+
+class ContactCreate(ContactBase):
+    """
+    Schema for creating a new contact.
+
+    Inherits attributes from ContactBase.
+    """
+    pass
+
+class Contact(ContactBase):
+    """
+    Schema for representing a contact.
+
+    Inherits attributes from ContactBase and adds an 'id' attribute.
+
+    Attributes:
+        id (int): Unique identifier for the contact.
+    """
+    id: int
+
+    class Config:
+        orm_mode = True
+
+class ContactSync(BaseModel):
+    """
+    Schema for a page of delta sync results.
+
+    Attributes:
+        changed (List[Contact]): Contacts created or updated since the sync token.
+        deleted (List[int]): Identifiers of contacts deleted since the sync token.
+        sync_token (str): Token to pass to the next sync request.
+        has_more (bool): Whether more changes are pending after this page.
+    """
+    changed: List[Contact]
+    deleted: List[int]
+    sync_token: str
+    has_more: bool
+
+class ContactSuggestion(BaseModel):
+    """
+    Schema for an autocomplete suggestion.
+
+    Attributes:
+        id (int): Unique identifier for the contact.
+        first_name (str): First name of the contact.
+        last_name (str): Last name of the contact.
+        email (str): Email address of the contact.
+    """
+    id: int
+    first_name: str
+    last_name: str
+    email: str
+
+class FuzzyMatch(ContactSuggestion):
+    """
+    Schema for a fuzzy search result.
+
+    Attributes:
+        score (float): Match quality, 1 for an exact match and lower for more typos.
+    """
+    score: float
+
+class ContactTags(BaseModel):
+    """
+    Schema for the tags of a contact.
+
+    Attributes:
+        tags (List[str]): Tag names; they are stored lower-cased and without duplicates.
+    """
+    tags: List[constr(min_length=1, max_length=50)]
+
+class TagCount(BaseModel):
+    """
+    Schema for a tag with its usage.
+
+    Attributes:
+        name (str): Tag name.
+        contacts (int): Number of contacts with the tag.
+    """
+    name: str
+    contacts: int
+
+class BatchRequestItem(BaseModel):
+    """
+    Schema for one sub-request of a batch.
+
+    Attributes:
+        id (Optional[str], optional): Client-chosen identifier echoed in the response.
+        method (str): HTTP method.
+        path (str): Path with query string, e.g. ``/contacts/?fields=id,first_name``.
+        body (Any, optional): JSON body.
+    """
+    id: Optional[str] = None
+    method: constr(regex=r"^(GET|POST|PUT|PATCH|DELETE)$") = "GET"
+    path: constr(min_length=1, max_length=2048)
+    body: Any = None
+
+class BatchRequest(BaseModel):
+    """
+    Schema for a batch of API calls.
+
+    Attributes:
+        requests (List[BatchRequestItem]): Sub-requests, executed in order.
+    """
+    requests: List[BatchRequestItem]
+
+class BatchResponseItem(BaseModel):
+    """
+    Schema for the result of one sub-request.
+
+    Attributes:
+        id (Optional[str], optional): Identifier of the sub-request.
+        status (int): HTTP status code.
+        body (Any, optional): Decoded response body.
+    """
+    id: Optional[str] = None
+    status: int
+    body: Any = None
+
+class BatchResponse(BaseModel):
+    """
+    Schema for the results of a batch.
+
+    Attributes:
+        responses (List[BatchResponseItem]): Results in request order.
+    """
+    responses: List[BatchResponseItem]
+
+class ContactUpdate(BaseModel):
+    """
+    Schema for updating an existing contact.
+
+    Attributes:
+        first_name (Optional[str], optional): Updated first name of the contact (optional).
+        last_name (Optional[str], optional): Updated last name of the contact (optional).
+        email (Optional[str], optional): Updated email address of the contact (optional).
+        phone_number (Optional[str], optional): Updated phone number of the contact (optional).
+        birthday (Optional[datetime.date], optional): Updated birthday of the contact (optional).
+        additional_data (Optional[Dict[str, Any]], optional): Updated custom fields of the contact (optional).
+    """
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    email: Optional[str] = None
+    phone_number: Optional[str] = None
+    birthday: Optional[datetime.date] = None
+    additional_data: Optional[Dict[constr(min_length=1, max_length=64), Any]] = None
+
+    _parse_additional_data = validator('additional_data', pre=True, allow_reuse=True)(parse_custom_fields)
+
+class UserBase(BaseModel):
+    """
+    Base schema for user data.
+
+    Attributes:
+        email (str): Email address of the user.
+        avatar_url (Optional[str], optional): URL of the user's avatar (optional).
+    """
+    email: str
+    avatar_url: Optional[str]
+
+class UserCreate(UserBase):
+    """
+    Schema for creating a new user.
+
+    Inherits attributes from UserBase and adds a 'password' attribute.
+
+    Attributes:
+        password (str): Password of the user.
+    """
+    password: str
+
+class User(UserBase):
+    """
+    Schema for representing a user.
+
+    Inherits attributes from UserBase and adds an 'id' attribute.
+
+    Attributes:
+        id (int): Unique identifier for the user.
+    """
+    id: int
+
+    class Config:
+        orm_mode = True
+
+class UserResponse(BaseModel):
+    """
+    Schema for the response to a signup.
+
+    Attributes:
+        user (User): The registered user.
+        detail (str): Confirmation message.
+    """
+    user: User
+    detail: str = "User successfully created"
+
+class UserLogin(BaseModel):
+    """
+    Schema for user login data.
+
+    Attributes:
+        email (str): Email address of the user.
+        password (str): Password of the user.
+    """
+    email: str
+    password: str
+
+class EmailSchema(BaseModel):
+    """
+    Schema for representing an email address.
+
+    Attributes:
+        email (EmailStr): Email address.
+    """
+    email: EmailStr
+
+class RequestEmail(BaseModel):
+    """
+    Schema for requesting an email address.
+
+    Attributes:
+        email (EmailStr): Email address.
+    """
+    email: EmailStr
+
+class Token(BaseModel):
+    """
+    Schema for the tokens issued at login and refresh.
+
+    Attributes:
+        access_token (str): Short-lived JWT access token.
+        refresh_token (str): Opaque single-use refresh token.
+        token_type (str): Always ``bearer``.
+    """
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
+
+class RefreshRequest(BaseModel):
+    """
+    Schema for exchanging or revoking a refresh token.
+
+    Attributes:
+        refresh_token (str): Refresh token issued at login or by the last refresh.
+    """
+    refresh_token: str
+
+class EmailDomainCount(BaseModel):
+    """
+    Schema for the number of contacts with an email domain.
+
+    Attributes:
+        domain (str): Lower-cased email domain.
+        count (int): Number of contacts.
+    """
+    domain: str
+    count: int
+
+class ContactStats(BaseModel):
+    """
+    Schema for the contact statistics of a user.
+
+    Attributes:
+        total (int): Number of contacts.
+        birthdays_by_month (Dict[int, int]): Number of contacts born in each month (1-12).
+        top_email_domains (List[EmailDomainCount]): Most frequent email domains.
+    """
+    total: int
+    birthdays_by_month: Dict[int, int]
+    top_email_domains: List[EmailDomainCount]
@@ -0,0 +1,92 @@
+import threading
+from typing import Any, Callable, Dict, Optional
+
+
+class _Call:
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls into one execution.
+
+    The first caller of a key (the leader) runs the function; callers that
+    arrive while it is running wait for its result, or get its exception.
+    A waiter that is not served within ``timeout`` seconds stops waiting and
+    runs the function itself, so one stuck query cannot stall every request
+    for the same key.
+
+    Args:
+        timeout (float): Maximum number of seconds a waiter waits for the leader.
+    """
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.executions = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.errors = 0
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, func: Callable[[], Any]) -> Any:
+        """
+        Runs ``func`` unless an identical call is already in flight.
+
+        Args:
+            key (str): Identity of the call (route, owner and parameters).
+            func (Callable[[], Any]): Function producing the result.
+
+        Returns:
+            Any: Result of the leader's call (shared by all coalesced callers).
+
+        Raises:
+            Exception: Whatever the leader's call raised.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+            else:
+                self.coalesced += 1
+        if leader:
+            try:
+                call.value = func()
+                return call.value
+            except BaseException as error:
+                call.error = error
+                self.errors += 1
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        if not call.done.wait(self.timeout):
+            with self._lock:
+                self.timeouts += 1
+            return func()
+        if call.error is not None:
+            raise call.error
+        return call.value
+
+    def stats(self) -> dict:
+        """
+        Returns coalescing counters.
+
+        Returns:
+            dict: Executions, coalesced callers, waiter timeouts, leader errors and calls in flight.
+        """
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "in_flight": len(self._calls),
+        }
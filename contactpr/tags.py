@@ -0,0 +1,129 @@
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+from contactpr import cache, events, metrics
+from contactpr.bitmap import RoaringBitmap
+from contactpr.owner_cache import OwnerIndexCache
+from config import settings
+
+
+class TagIndex:
+    """
+    In-memory bitmap index of one owner's contact tags.
+
+    Every tag maps to a RoaringBitmap of contact ids, so AND/OR/NOT filters
+    over tags are set operations on compressed bitmaps instead of joins
+    through the contact_tags table.
+
+    Args:
+        contact_ids (Iterable[int]): IDs of all contacts of the owner.
+        memberships (Iterable[tuple]): (tag name, contact id) rows.
+    """
+
+    def __init__(self, contact_ids: Iterable[int] = (), memberships: Iterable[Tuple[str, int]] = ()):
+        self._contacts = RoaringBitmap(contact_ids)
+        grouped: Dict[str, List[int]] = {}
+        self._tags_of: Dict[int, Tuple[str, ...]] = {}
+        for name, contact_id in memberships:
+            grouped.setdefault(name, []).append(contact_id)
+            self._tags_of[contact_id] = self._tags_of.get(contact_id, ()) + (name,)
+        self._bitmaps = {name: RoaringBitmap(ids) for name, ids in grouped.items()}
+        self._size = len(self._contacts) + sum(len(tags) for tags in self._tags_of.values())
+        self._lock = threading.Lock()
+
+    def cost(self) -> int:
+        """
+        Returns the number of indexed contacts and tag memberships, used as the memory estimate.
+
+        Returns:
+            int: Number of entries.
+        """
+        return self._size
+
+    def apply(self, event: dict) -> None:
+        """
+        Applies a contact change event.
+
+        Args:
+            event (dict): Contact change or ``contact.tags`` event.
+        """
+        contact_id = event['contact_id']
+        with self._lock:
+            if event['type'] == 'contact.created' and contact_id not in self._contacts:
+                self._contacts.add(contact_id)
+                self._size += 1
+            elif event['type'] == 'contact.deleted' and contact_id in self._contacts:
+                self._set_tags(contact_id, ())
+                self._contacts.discard(contact_id)
+                self._size -= 1
+            elif event['type'] == 'contact.tags':
+                self._set_tags(contact_id, tuple(event['tags']))
+
+    def _set_tags(self, contact_id: int, tags: Tuple[str, ...]) -> None:
+        previous = self._tags_of.pop(contact_id, ())
+        for name in previous:
+            bitmap = self._bitmaps[name]
+            bitmap.discard(contact_id)
+            if not len(bitmap):
+                del self._bitmaps[name]
+        for name in tags:
+            self._bitmaps.setdefault(name, RoaringBitmap()).add(contact_id)
+        if tags:
+            self._tags_of[contact_id] = tags
+        self._size += len(tags) - len(previous)
+
+    def query(self, all_tags: Iterable[str] = (), any_tags: Iterable[str] = (),
+              exclude_tags: Iterable[str] = ()) -> RoaringBitmap:
+        """
+        Returns the contacts matching a tag filter.
+
+        Args:
+            all_tags (Iterable[str]): Tags a contact must all have.
+            any_tags (Iterable[str]): Tags of which a contact must have at least one.
+            exclude_tags (Iterable[str]): Tags a contact must not have.
+
+        Returns:
+            RoaringBitmap: IDs of the matching contacts.
+        """
+        empty = RoaringBitmap()
+        with self._lock:
+            result = self._contacts
+            for name in sorted(all_tags, key=lambda name: len(self._bitmaps.get(name, empty))):
+                result = result & self._bitmaps.get(name, empty)
+            if any_tags:
+                union = RoaringBitmap()
+                for name in any_tags:
+                    union = union | self._bitmaps.get(name, empty)
+                result = result & union
+            for name in exclude_tags:
+                result = result - self._bitmaps.get(name, empty)
+            return result if result is not self._contacts else result | empty
+
+    def counts(self) -> Dict[str, int]:
+        """
+        Returns the number of contacts per tag.
+
+        Returns:
+            Dict[str, int]: Contact count by tag name.
+        """
+        with self._lock:
+            return {name: len(bitmap) for name, bitmap in sorted(self._bitmaps.items())}
+
+
+def parse_tags(value: Optional[str]) -> List[str]:
+    """
+    Parses a comma-separated tag list from a query parameter.
+
+    Args:
+        value (str, optional): Comma-separated tag names.
+
+    Returns:
+        List[str]: Normalized tag names.
+    """
+    if not value:
+        return []
+    return sorted({name.strip().lower() for name in value.split(',') if name.strip()})
+
+
+index_cache: OwnerIndexCache[TagIndex] = OwnerIndexCache(settings.tags_index_max_entries, cache.owner_generation())
+events.broker.add_listener(index_cache.on_change)
+metrics.register("tags_index", index_cache.stats)
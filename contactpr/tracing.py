@@ -0,0 +1,205 @@
+"""
+Optional distributed tracing based on OpenTelemetry.
+
+Tracing is configured once at import time from ``settings.tracing_*``. When it
+is disabled (the default) or ``opentelemetry-sdk`` is not installed, ``span``
+returns a shared no-op context manager, ``traced`` returns the function
+unchanged and no middleware or engine listeners are installed, so the
+instrumentation costs next to nothing.
+
+Context lives in contextvars, so it follows the request into dependencies,
+the thread pool and Starlette background tasks (which run inside the request
+span, e.g. send_email after signup).
+"""
+import contextlib
+import functools
+import inspect
+import logging
+from typing import Callable, Optional
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_NOOP = contextlib.nullcontext()
+_tracer = None
+_trace = None
+_propagate = None
+
+
+def setup() -> bool:
+    """
+    Configures the tracer provider, sampler and exporter if tracing is enabled.
+
+    Spans are sampled by trace id (``tracing_sample_ratio``, honouring the
+    caller's sampling decision) and exported in batches either as JSON lines
+    to ``tracing_file`` or to an OTLP/HTTP collector.
+
+    Returns:
+        bool: Whether tracing is active.
+    """
+    global _tracer, _trace, _propagate
+    if _tracer is not None or not settings.tracing_enabled:
+        return _tracer is not None
+    try:
+        from opentelemetry import propagate, trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+        from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    except ImportError:
+        logger.warning("tracing_enabled is set but opentelemetry-sdk is not installed; tracing is off")
+        return False
+    if settings.tracing_exporter == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        exporter = OTLPSpanExporter(endpoint=settings.tracing_otlp_endpoint or None)
+    else:
+        output = open(settings.tracing_file, "a", buffering=1, encoding="utf-8")
+        exporter = ConsoleSpanExporter(out=output, formatter=lambda span: span.to_json(indent=None) + "\n")
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": settings.tracing_service_name}),
+        sampler=ParentBased(TraceIdRatioBased(settings.tracing_sample_ratio)),
+    )
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("contactpr")
+    _trace, _propagate = trace, propagate
+    return True
+
+
+def enabled() -> bool:
+    """
+    Returns whether tracing is active in this process.
+
+    Returns:
+        bool: True if spans are recorded.
+    """
+    return _tracer is not None
+
+
+def span(name: str, **attributes):
+    """
+    Opens a span as a context manager.
+
+    Args:
+        name (str): Span name, e.g. ``password.hash``.
+        **attributes: Span attributes.
+
+    Returns:
+        ContextManager: The span, or a no-op context manager if tracing is off.
+    """
+    if _tracer is None:
+        return _NOOP
+    return _tracer.start_as_current_span(name, attributes=attributes or None)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """
+    Decorator wrapping every call of a function in a span.
+
+    The signature is preserved, so it can be used on FastAPI dependencies.
+    When tracing is off the function is returned unchanged.
+
+    Args:
+        name (str, optional): Span name, defaults to the function's qualified name.
+
+    Returns:
+        Callable: Decorator.
+    """
+    def decorator(func: Callable) -> Callable:
+        if _tracer is None:
+            return func
+        span_name = name or func.__qualname__
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with _tracer.start_as_current_span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _tracer.start_as_current_span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_engine(engine) -> None:
+    """
+    Records a span for every SQL statement executed by an engine.
+
+    Args:
+        engine (Engine): SQLAlchemy engine.
+    """
+    if _tracer is None:
+        return
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_query_span(conn, cursor, statement, parameters, context, executemany):
+        context._trace_span = _tracer.start_span("db.query", attributes={
+            "db.system": engine.dialect.name,
+            "db.statement": statement[:2000],
+        })
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def end_query_span(conn, cursor, statement, parameters, context, executemany):
+        query_span = getattr(context, "_trace_span", None)
+        if query_span is not None:
+            query_span.end()
+
+    @event.listens_for(engine, "handle_error")
+    def fail_query_span(exception_context):
+        query_span = getattr(exception_context.execution_context, "_trace_span", None)
+        if query_span is not None:
+            query_span.record_exception(exception_context.original_exception)
+            query_span.set_status(_trace.Status(_trace.StatusCode.ERROR))
+            query_span.end()
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware opening a server span per HTTP request.
+
+    The span continues an incoming W3C ``traceparent`` and is named after the
+    matched route template (``GET /contacts/{contact_id}``).
+
+    Args:
+        app: ASGI application.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _tracer is None:
+            await self.app(scope, receive, send)
+            return
+        carrier = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]}
+        # without a traceparent header keep the current context (e.g. /batch sub-requests)
+        parent = _propagate.extract(carrier) if "traceparent" in carrier else None
+        response = {}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            await send(message)
+
+        with _tracer.start_as_current_span(
+            f"{scope['method']} {scope['path']}", context=parent, kind=_trace.SpanKind.SERVER,
+            attributes={"http.method": scope["method"], "http.target": scope["path"]},
+        ) as request_span:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                route = scope.get("route")
+                if route is not None:
+                    request_span.update_name(f"{scope['method']} {route.path}")
+                    request_span.set_attribute("http.route", route.path)
+                if "status" in response:
+                    request_span.set_attribute("http.status_code", response["status"])
+                    if response["status"] >= 500:
+                        request_span.set_status(_trace.Status(_trace.StatusCode.ERROR))
+
+
+setup()
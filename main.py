@@ -1,27 +1,80 @@
-import uvicorn
-from fastapi import FastAPI, Depends
-from fastapi.middleware.cors import CORSMiddleware
-from contactpr import routes
-from fastapi_limiter.depends import RateLimiter
-from contactpr.routes import router as contactpr_router
-
-
-app = FastAPI()
-
-app.include_router(routes.router)
-origins = [ 
-    "http://localhost:8000"
-    ]
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-@app.get("/", dependencies=[Depends(RateLimiter(times=2, seconds=5))])
-async def index():
-    pass
-
-if __name__ == "__main__":
+import uvicorn
+from fastapi import FastAPI, Depends
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.cors import CORSMiddleware
+from contactpr import routes
+from fastapi_limiter.depends import RateLimiter
+from contactpr.routes import router as contactpr_router
+from contactpr import admission, idempotency, maintenance, memprofile, profiler, tracing
+from contactpr.background_tasks import drain, shutdown_time_left, stop_periodic, watch_exit_signals
+from contactpr.events import broker
+from config import settings
+
+
+app = FastAPI()
+
+app.include_router(routes.router)
+origins = [ 
+    "http://localhost:8000"
+    ]
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=origins,
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+if tracing.enabled():
+    app.add_middleware(tracing.TracingMiddleware)
+app.add_middleware(idempotency.IdempotencyMiddleware)
+app.add_middleware(profiler.ProfilerMiddleware)
+app.add_middleware(memprofile.MemoryProfilerMiddleware)
+if settings.admission_enabled:
+    # outermost, so that shed requests cost as little as possible
+    app.add_middleware(admission.AdmissionMiddleware)
+@app.get("/", dependencies=[Depends(RateLimiter(times=2, seconds=5))])
+async def index():
+    pass
+
+@app.on_event("startup")
+async def start_change_broker():
+    """
+    Connects the contact change broker to its cross-worker backend.
+    """
+    await broker.start()
+
+@app.on_event("startup")
+async def start_shutdown_clock_on_exit_signal():
+    """
+    Starts the shutdown clock when the worker is asked to exit, before connections are closed.
+    """
+    watch_exit_signals(settings.web_graceful_timeout)
+
+@app.on_event("startup")
+async def start_maintenance_jobs():
+    """
+    Schedules the periodic maintenance jobs (see contactpr.maintenance).
+    """
+    maintenance.start()
+
+@app.on_event("startup")
+async def load_token_revocations():
+    """
+    Fills the refresh-token revocation filter before serving requests.
+    """
+    await run_in_threadpool(maintenance.load_revocations)
+
+@app.on_event("shutdown")
+async def drain_background_tasks():
+    """
+    Waits for in-flight background e-mail tasks before the worker exits.
+
+    The drain only gets what is left of the graceful timeout after uvicorn
+    has closed the connections, so the worker exits before it is killed.
+    """
+    await broker.stop()
+    await stop_periodic()
+    await drain(shutdown_time_left(settings.web_graceful_timeout))
+
+if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,466 @@
+"""
+Online backfills of derived columns on large tables.
+
+A backfill walks a table in primary key order (keyset pagination) and
+updates one chunk of rows per short transaction, so it never holds locks on
+more than a chunk and can run while the application serves traffic:
+
+* after every chunk its position is written to the ``backfill_checkpoints``
+  table in the same transaction, so an interrupted run resumes where it
+  stopped;
+* rows are only updated if the columns the new value was computed from are
+  unchanged (compare-and-set), so a concurrent application write is never
+  overwritten with a value derived from stale data;
+* before every chunk it waits while PostgreSQL replicas lag behind or the
+  database runs too many active queries, and it halves the chunk size when a
+  chunk takes longer than the target time (and grows it again when it is
+  fast);
+* progress (rows per second and ETA) is logged periodically.
+
+Backfills run from Alembic revisions (run_in_migration) or from the command
+line, e.g. to resume a run or to catch rows written by old application code
+during a deployment:
+
+    python -m repository.backfill contact-birthday-ordinal [--restart] [--chunk-size 1000]
+
+This module only depends on SQLAlchemy Core, so that migrations can import
+it whatever the state of the ORM models.
+"""
+import argparse
+import logging
+import time
+from datetime import date, datetime
+from typing import Callable, Dict, Optional, Sequence
+from sqlalchemy import (BigInteger, Column, Date, DateTime, Integer, MetaData, String, Table, and_, bindparam,
+                        column, create_engine, func, select, table, text)
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+checkpoints = Table(
+    'backfill_checkpoints', MetaData(),
+    Column('name', String(100), primary_key=True),
+    Column('last_key', BigInteger, nullable=True),
+    Column('rows_scanned', BigInteger, nullable=False, default=0),
+    Column('rows_updated', BigInteger, nullable=False, default=0),
+    Column('started_at', DateTime, nullable=False),
+    Column('updated_at', DateTime, nullable=False),
+    Column('finished_at', DateTime, nullable=True),
+)
+
+MIN_CHUNK_SIZE = 10
+
+
+class Backfill:
+    """
+    Definition of a backfill: which rows it reads and how it computes their new values.
+
+    Args:
+        name (str): Unique name, also the checkpoint key.
+        table (Table): Table to update; a lightweight ``sqlalchemy.table()`` is enough.
+        columns (Sequence[str]): Columns passed to compute; they must be comparable with
+            ``IS NOT DISTINCT FROM`` (the compare-and-set condition of the update).
+        compute (Callable[[dict], Optional[dict]]): Returns the new values of a row
+            (column name to value), or None if the row is already correct.
+        key (str): Integer primary key column walked by the backfill.
+    """
+
+    def __init__(self, name: str, table: Table, columns: Sequence[str],
+                 compute: Callable[[dict], Optional[dict]], key: str = 'id'):
+        self.name = name
+        self.table = table
+        self.columns = list(columns)
+        self.compute = compute
+        self.key = key
+
+    def chunk(self, last_key: Optional[int], size: int):
+        """
+        Builds the SELECT of the next chunk of rows after a key.
+
+        Args:
+            last_key (int, optional): Last key of the previous chunk; None to start at the beginning.
+            size (int): Maximum number of rows.
+
+        Returns:
+            Select: Statement returning the key and the read columns.
+        """
+        key = self.table.c[self.key]
+        statement = select(key, *(self.table.c[name] for name in self.columns)).order_by(key).limit(size)
+        if last_key is not None:
+            statement = statement.where(key > last_key)
+        return statement
+
+    def update(self, values: Sequence[str]):
+        """
+        Builds the compare-and-set UPDATE of one row, for executemany.
+
+        Args:
+            values (Sequence[str]): Columns set by the update.
+
+        Returns:
+            Update: Statement with ``_key``, ``_old_<column>`` and ``<column>`` parameters.
+        """
+        conditions = [self.table.c[self.key] == bindparam('_key')]
+        conditions += [self.table.c[name].is_not_distinct_from(bindparam(f'_old_{name}'))
+                       for name in self.columns]
+        return self.table.update().where(and_(*conditions)).values(
+            {name: bindparam(name) for name in values})
+
+
+class Throttle:
+    """
+    Decides how long a backfill waits before its next chunk.
+
+    Args:
+        max_replication_lag (float, optional): Wait while a PostgreSQL replica lags more seconds than this.
+        max_active_queries (int, optional): Wait while PostgreSQL runs more active queries than this.
+        pause (float): Seconds to sleep between chunks, leaving room for the application.
+        poll_interval (float): Seconds between checks while waiting.
+        max_wait (float): Seconds after which a chunk runs anyway, so that a stuck
+            replica cannot stall the backfill forever.
+        sleep (Callable[[float], None]): Sleep function (replaced in tests).
+    """
+
+    def __init__(self, max_replication_lag: Optional[float] = None, max_active_queries: Optional[int] = None,
+                 pause: float = 0.0, poll_interval: float = 1.0, max_wait: float = 300.0,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.max_replication_lag = max_replication_lag
+        self.max_active_queries = max_active_queries
+        self.pause = pause
+        self.poll_interval = poll_interval
+        self.max_wait = max_wait
+        self.sleep = sleep
+        self.waited = 0.0
+
+    def overloaded(self, connection: Connection) -> Optional[str]:
+        """
+        Checks the replication lag and the load of the database.
+
+        Args:
+            connection (Connection): Connection of the backfill.
+
+        Returns:
+            str: Reason to wait, or None if the next chunk may run. Other databases than
+                PostgreSQL are never reported as overloaded.
+        """
+        if connection.dialect.name != 'postgresql':
+            return None
+        if self.max_replication_lag is not None:
+            lag = connection.execute(text(
+                "SELECT COALESCE(EXTRACT(EPOCH FROM MAX(replay_lag)), 0) FROM pg_stat_replication")).scalar()
+            if lag is not None and float(lag) > self.max_replication_lag:
+                return f"replication lag {float(lag):.1f}s"
+        if self.max_active_queries is not None:
+            active = connection.execute(text(
+                "SELECT COUNT(*) FROM pg_stat_activity WHERE state = 'active' AND pid <> pg_backend_pid()")).scalar()
+            if active > self.max_active_queries:
+                return f"{active} active queries"
+        return None
+
+    def wait(self, connection: Connection) -> None:
+        """
+        Sleeps the pause, then for as long as the database is overloaded (at most max_wait).
+
+        Args:
+            connection (Connection): Connection of the backfill.
+        """
+        if self.pause:
+            self.sleep(self.pause)
+        waited = 0.0
+        while waited < self.max_wait:
+            reason = self.overloaded(connection)
+            if reason is None:
+                break
+            logger.info("Backfill waiting: %s", reason)
+            self.sleep(self.poll_interval)
+            waited += self.poll_interval
+        self.waited += waited
+
+
+class Progress:
+    """
+    Counters of a backfill run, with throughput and ETA estimates.
+
+    Args:
+        name (str): Name of the backfill.
+        first_key (int, optional): Smallest key of the table when the run started.
+        high_key (int, optional): Largest key of the table when the run started.
+        last_key (int, optional): Key the run resumes after.
+        rows_scanned (int): Rows scanned by earlier runs.
+        rows_updated (int): Rows updated by earlier runs.
+    """
+
+    def __init__(self, name: str, first_key: Optional[int], high_key: Optional[int], last_key: Optional[int] = None,
+                 rows_scanned: int = 0, rows_updated: int = 0):
+        self.name = name
+        self.first_key = first_key
+        self.high_key = high_key
+        self.start_key = last_key
+        self.last_key = last_key
+        self.rows_scanned = rows_scanned
+        self.rows_updated = rows_updated
+        self.run_rows = 0
+        self.conflicts = 0
+        self.chunks = 0
+        self.finished = False
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def rows_per_second(self) -> float:
+        """
+        Rows scanned per second by this run.
+        """
+        return self.run_rows / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def fraction(self) -> float:
+        """
+        Share of the key range walked so far (0 to 1).
+        """
+        if self.finished or self.high_key is None:
+            return 1.0
+        if self.last_key is None:
+            return 0.0
+        span = self.high_key - self.first_key
+        return min(1.0, (self.last_key - self.first_key) / span) if span > 0 else 1.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        """
+        Estimated seconds to the end of the key range, from this run's speed; None before the first chunk.
+        """
+        if self.finished or self.high_key is None:
+            return 0.0
+        if self.last_key is None or self.last_key == self.start_key:
+            return None
+        walked = self.last_key - (self.first_key - 1 if self.start_key is None else self.start_key)
+        return max(0.0, (self.high_key - self.last_key) * self.elapsed / walked)
+
+    def __str__(self) -> str:
+        eta = "?" if self.eta is None else f"{self.eta:.0f}s"
+        return (f"{self.name}: {self.fraction:.1%} (key {self.last_key}/{self.high_key}), "
+                f"{self.rows_scanned} scanned, {self.rows_updated} updated, "
+                f"{self.rows_per_second:.0f} rows/s, ETA {eta}")
+
+
+def _load_checkpoint(connection: Connection, name: str):
+    return connection.execute(select(checkpoints).where(checkpoints.c.name == name)).first()
+
+
+def _save_checkpoint(connection: Connection, progress: Progress, exists: bool) -> None:
+    now = datetime.utcnow()
+    values = dict(last_key=progress.last_key, rows_scanned=progress.rows_scanned,
+                  rows_updated=progress.rows_updated, updated_at=now,
+                  finished_at=now if progress.finished else None)
+    if exists:
+        connection.execute(checkpoints.update().where(checkpoints.c.name == progress.name).values(values))
+    else:
+        connection.execute(checkpoints.insert().values(name=progress.name, started_at=now, **values))
+
+
+def run_backfill(bind, backfill: Backfill, chunk_size: int = 1000, target_chunk_seconds: Optional[float] = 0.5,
+                 throttle: Optional[Throttle] = None, restart: bool = False, report_interval: float = 10.0,
+                 report: Optional[Callable[[Progress], None]] = None) -> Progress:
+    """
+    Runs (or resumes) a backfill until the end of the table.
+
+    Every chunk is read, updated and checkpointed in its own transaction. The
+    walk goes on until no rows are left, so rows inserted while it runs are
+    visited too; rows inserted after it finished must be maintained by the
+    application's write path (or picked up by a ``--restart`` run).
+
+    Args:
+        bind: Engine, or a Connection outside a transaction (or in autocommit mode, see run_in_migration).
+        backfill (Backfill): Backfill to run.
+        chunk_size (int): Initial number of rows per chunk.
+        target_chunk_seconds (float, optional): Chunk duration the chunk size adapts to
+            (halved when a chunk takes 1.5 times as long, grown by a quarter up to
+            10 times chunk_size when it takes under half); None keeps the size fixed.
+        throttle (Throttle, optional): Waits between chunks; by default none.
+        restart (bool): Walks the table from the start even if a checkpoint exists.
+        report_interval (float): Seconds between progress reports.
+        report (Callable[[Progress], None], optional): Progress reporter; logs by default.
+
+    Returns:
+        Progress: Final counters of the run.
+    """
+    if isinstance(bind, Engine):
+        with bind.connect() as connection:
+            return run_backfill(connection, backfill, chunk_size, target_chunk_seconds, throttle, restart,
+                                report_interval, report)
+    connection = bind
+    throttle = throttle or Throttle()
+    report = report or (lambda progress: logger.info("Backfill %s", progress))
+    key = backfill.table.c[backfill.key]
+
+    with connection.begin():
+        checkpoints.create(connection, checkfirst=True)
+        checkpoint = _load_checkpoint(connection, backfill.name)
+        first_key, high_key = connection.execute(select(func.min(key), func.max(key))).one()
+    exists = checkpoint is not None
+    if exists and checkpoint.finished_at is not None and not restart:
+        progress = Progress(backfill.name, first_key, high_key, checkpoint.last_key,
+                            checkpoint.rows_scanned, checkpoint.rows_updated)
+        progress.finished = True
+        return progress
+    if exists and not restart:
+        progress = Progress(backfill.name, first_key, high_key, checkpoint.last_key,
+                            checkpoint.rows_scanned, checkpoint.rows_updated)
+        logger.info("Resuming backfill %s after key %s", backfill.name, checkpoint.last_key)
+    else:
+        progress = Progress(backfill.name, first_key, high_key)
+
+    size = max_size = chunk_size
+    if target_chunk_seconds is not None:
+        max_size = chunk_size * 10
+    reported = time.monotonic()
+    while not progress.finished:
+        throttle.wait(connection)
+        started = time.monotonic()
+        with connection.begin():
+            rows = connection.execute(backfill.chunk(progress.last_key, size)).mappings().all()
+            updates: Dict[tuple, list] = {}
+            for row in rows:
+                values = backfill.compute(dict(row))
+                if values:
+                    parameters = {f'_old_{name}': row[name] for name in backfill.columns}
+                    parameters.update(values, _key=row[backfill.key])
+                    updates.setdefault(tuple(sorted(values)), []).append(parameters)
+            for names, parameters in updates.items():
+                updated = connection.execute(backfill.update(names), parameters).rowcount
+                progress.rows_updated += updated
+                progress.conflicts += len(parameters) - updated
+            if rows:
+                progress.last_key = rows[-1][backfill.key]
+                progress.rows_scanned += len(rows)
+                progress.run_rows += len(rows)
+            progress.finished = len(rows) < size
+            progress.chunks += 1
+            _save_checkpoint(connection, progress, exists)
+            exists = True
+        if progress.high_key is not None and progress.last_key is not None:
+            progress.high_key = max(progress.high_key, progress.last_key)
+        if target_chunk_seconds is not None:
+            elapsed = time.monotonic() - started
+            if elapsed > target_chunk_seconds * 1.5:
+                size = max(MIN_CHUNK_SIZE, size // 2)
+            elif elapsed < target_chunk_seconds / 2:
+                size = min(max_size, size + max(1, size // 4))
+        if progress.finished or time.monotonic() - reported >= report_interval:
+            report(progress)
+            reported = time.monotonic()
+    return progress
+
+
+def run_in_migration(op, backfill: Backfill, **options) -> Optional[Progress]:
+    """
+    Runs a backfill from an Alembic revision.
+
+    The revision's transaction is committed first (so that e.g. a new column
+    is visible and its lock released) and the chunks run in autocommit mode,
+    each UPDATE and checkpoint committing on its own. A chunk interrupted
+    between the two is simply redone on resume. In offline (``--sql``) mode
+    nothing is emitted; run the backfill from the command line instead.
+
+    Args:
+        op: The ``alembic.op`` module.
+        backfill (Backfill): Backfill to run.
+        **options: Keyword arguments of run_backfill.
+
+    Returns:
+        Progress: Final counters, or None in offline mode.
+    """
+    context = op.get_context()
+    if context.as_sql:
+        logger.warning("Skipping backfill %s in offline mode; run python -m repository.backfill %s",
+                       backfill.name, backfill.name)
+        return None
+    with context.autocommit_block():
+        return run_backfill(op.get_bind(), backfill, **options)
+
+
+BACKFILLS: Dict[str, Backfill] = {}
+
+
+def register(backfill: Backfill) -> Backfill:
+    """
+    Makes a backfill available to the command line.
+
+    Args:
+        backfill (Backfill): Backfill definition.
+
+    Returns:
+        Backfill: The same backfill.
+    """
+    BACKFILLS[backfill.name] = backfill
+    return backfill
+
+
+def birthday_ordinal(birthday) -> Optional[int]:
+    """
+    Returns the position of a birthday within a year as ``month * 100 + day``.
+
+    Args:
+        birthday (date, optional): Birthday, or its ISO string.
+
+    Returns:
+        int: E.g. 1231 for December 31st; None without a birthday.
+    """
+    if birthday is None:
+        return None
+    if isinstance(birthday, str):
+        birthday = date.fromisoformat(birthday)
+    return birthday.month * 100 + birthday.day
+
+
+def _compute_birthday_ordinal(row: dict) -> Optional[dict]:
+    ordinal = birthday_ordinal(row['birthday'])
+    return None if ordinal == row['birthday_ordinal'] else {'birthday_ordinal': ordinal}
+
+
+CONTACT_BIRTHDAY_ORDINAL = register(Backfill(
+    'contact-birthday-ordinal',
+    table('contacts', column('id', Integer), column('birthday', Date), column('birthday_ordinal', Integer)),
+    ['birthday', 'birthday_ordinal'], _compute_birthday_ordinal,
+))
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m repository.backfill", description="Runs an online backfill.")
+    parser.add_argument("name", choices=sorted(BACKFILLS))
+    parser.add_argument("--url", help="database URL (default: SQLALCHEMY_DATABASE_URL)")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the beginning")
+    parser.add_argument("--chunk-size", type=int)
+    parser.add_argument("--target-chunk-seconds", type=float)
+    parser.add_argument("--pause", type=float)
+    parser.add_argument("--max-replication-lag", type=float)
+    parser.add_argument("--max-active-queries", type=int)
+    args = parser.parse_args(argv)
+
+    # the application settings are only needed by the command line, not by migrations
+    from config import settings
+
+    def option(value, default):
+        return default if value is None else value
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    throttle = Throttle(
+        max_replication_lag=option(args.max_replication_lag, settings.backfill_max_replication_lag_seconds) or None,
+        max_active_queries=option(args.max_active_queries, settings.backfill_max_active_queries) or None,
+        pause=option(args.pause, settings.backfill_pause_seconds),
+    )
+    engine = create_engine(args.url or settings.sqlalchemy_database_url)
+    try:
+        run_backfill(engine, BACKFILLS[args.name], option(args.chunk_size, settings.backfill_chunk_size),
+                     option(args.target_chunk_seconds, settings.backfill_target_chunk_seconds) or None,
+                     throttle, args.restart)
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Database-side filters on the custom fields stored in ``Contact.additional_data``.
+
+On PostgreSQL the column is JSONB and every filter becomes a single
+containment test (``additional_data @> :criteria``) served by the GIN index.
+Elsewhere (SQLite with JSON1) the same criteria are translated into
+``json_type`` / ``json_extract`` / ``json_each`` conditions with the same
+meaning: values only match values of the same JSON type (``1`` is not
+``true``) and lists only match arrays.
+"""
+import json
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import and_, exists, func, select, type_coerce
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Session
+from contactpr import models
+from repository import queries
+
+
+def _literal(value: str) -> Any:
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def parse_filters(fields: Optional[List[str]] = None, contains: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Combines equality and containment query parameters into containment criteria.
+
+    Args:
+        fields (List[str], optional): ``key:value`` equality filters; the value is
+            read as a JSON literal (``age:30``, ``vip:true``) and falls back to a string.
+        contains (str, optional): JSON object the custom fields must contain.
+
+    Returns:
+        Dict[str, Any]: Criteria object; empty if no filter is given.
+
+    Raises:
+        ValueError: If a filter is malformed.
+    """
+    criteria = {}
+    if contains:
+        try:
+            criteria = json.loads(contains)
+        except ValueError:
+            raise ValueError("contains must be a JSON object")
+        if not isinstance(criteria, dict):
+            raise ValueError("contains must be a JSON object")
+    for item in fields or []:
+        key, separator, value = item.partition(":")
+        if not separator or not key:
+            raise ValueError(f"Invalid field filter {item!r}, expected key:value")
+        criteria[key] = _literal(value)
+    _check_keys(criteria)
+    return criteria
+
+
+def _check_keys(value: Any) -> None:
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if '"' in key or '\\' in key:
+                raise ValueError(f"Invalid custom field name {key!r}")
+            if item == {}:
+                raise ValueError("Empty objects are not supported in custom field filters")
+            _check_keys(item)
+    elif isinstance(value, list):
+        for item in value:
+            if isinstance(item, (dict, list)):
+                raise ValueError("Only scalar values are supported inside lists")
+
+
+def _matches(json_type, json_value, value: Any):
+    # compare JSON types as well: SQLite reads true as 1, PostgreSQL keeps them apart
+    if value is None:
+        return json_type == "null"
+    if isinstance(value, bool):
+        return json_type == ("true" if value else "false")
+    if isinstance(value, (int, float)):
+        return and_(json_type.in_(("integer", "real")), json_value == value)
+    return and_(json_type == "text", json_value == value)
+
+
+def _json_conditions(column, path: str, value: Any) -> Iterator:
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _json_conditions(column, f'{path}."{key}"', item)
+    elif isinstance(value, list):
+        # json_each also walks a scalar, which an array criterion must not match
+        yield func.json_type(column, path) == "array"
+        for item in value:
+            elements = func.json_each(column, path).table_valued("value", "type")
+            yield exists(select(1).select_from(elements).where(_matches(elements.c.type, elements.c.value, item)))
+    else:
+        yield _matches(func.json_type(column, path), func.json_extract(column, path), value)
+
+
+def custom_fields_clause(dialect: str, criteria: Dict[str, Any]):
+    """
+    Builds the WHERE clause matching contacts whose custom fields contain the criteria.
+
+    Args:
+        dialect (str): Name of the database dialect.
+        criteria (Dict[str, Any]): Criteria from parse_filters.
+
+    Returns:
+        ColumnElement: Filter condition.
+    """
+    if dialect == "postgresql":
+        return type_coerce(models.Contact.additional_data, JSONB).contains(criteria)
+    return and_(*_json_conditions(models.Contact.additional_data, "$", criteria))
+
+
+def _statement(db: Session, owner_id: int, criteria: Dict[str, Any]):
+    return select(models.Contact).where(
+        models.Contact.owner_id == owner_id,
+        models.Contact.deleted_at.is_(None),
+        custom_fields_clause(db.get_bind().dialect.name, criteria),
+    )
+
+
+def contacts_by_custom_fields(db: Session, owner_id: int, criteria: Dict[str, Any]) -> List[models.Contact]:
+    """
+    Retrieves a user's contacts whose custom fields match the criteria.
+
+    Args:
+        db (Session): Database session object.
+        owner_id (int): ID of the owner.
+        criteria (Dict[str, Any]): Criteria from parse_filters.
+
+    Returns:
+        List[models.Contact]: Matching contacts.
+    """
+    return db.execute(_statement(db, owner_id, criteria)).scalars().all()
+
+
+def contact_fields_by_custom_fields(db: Session, owner_id: int, criteria: Dict[str, Any],
+                                    fields: Tuple[str, ...]) -> List[dict]:
+    """
+    Retrieves some fields of a user's contacts whose custom fields match the criteria.
+
+    Args:
+        db (Session): Database session object.
+        owner_id (int): ID of the owner.
+        criteria (Dict[str, Any]): Criteria from parse_filters.
+        fields (Tuple[str, ...]): Field names to select.
+
+    Returns:
+        List[dict]: One dict of the selected fields per contact.
+    """
+    statement = _statement(db, owner_id, criteria).with_only_columns(*queries.contact_columns(fields))
+    return [dict(row._mapping) for row in db.execute(statement)]
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+from sqlalchemy import or_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from contactpr import models
+
+
+def acquire_lease(db: Session, name: str, holder: str, duration: timedelta) -> bool:
+    """
+    Takes or renews the lease of a job.
+
+    The lease is granted if nobody holds it, if ``holder`` already does or if
+    it has expired; the check and the write are a single statement, so of
+    several workers asking at once exactly one gets it.
+
+    Args:
+        db (Session): Database session object.
+        name (str): Name of the job.
+        holder (str): Identifier of the asking worker.
+        duration (timedelta): How long the lease is valid from now.
+
+    Returns:
+        bool: True if ``holder`` holds the lease now.
+    """
+    table = models.JobLease.__table__
+    now = datetime.utcnow()
+    values = {"name": name, "holder": holder, "expires_at": now + duration}
+    available = or_(table.c.holder == holder, table.c.expires_at < now)
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = (postgresql if dialect == "postgresql" else sqlite).insert(table).values(**values)
+        acquired = db.execute(insert.on_conflict_do_update(
+            index_elements=[table.c.name],
+            set_={"holder": insert.excluded.holder, "expires_at": insert.excluded.expires_at},
+            where=available)).rowcount
+    else:
+        acquired = db.execute(update(table).where(table.c.name == name, available).values(**values)).rowcount
+        if not acquired:
+            try:
+                with db.begin_nested():
+                    db.execute(table.insert().values(**values))
+                acquired = 1
+            except IntegrityError:
+                acquired = 0
+    db.commit()
+    return bool(acquired)
@@ -0,0 +1,367 @@
+"""
+Pre-built statements for the hot contact and user queries.
+
+The statements are constructed once at import time with bound parameters, so
+a request only binds values: SQLAlchemy skips rebuilding the query and finds
+the compiled SQL in the engine's compiled cache. On drivers that support
+server-side prepared statements (psycopg 3, see contactpr.database) the
+database also reuses the plan.
+"""
+import calendar
+import functools
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy import bindparam, column, or_, select, table, text
+from sqlalchemy.orm import Session
+from contactpr import models
+from repository.backfill import birthday_ordinal
+
+# Soft-deleted contacts (see repository.soft_delete) are excluded from every read.
+LIVE = models.Contact.deleted_at.is_(None)
+
+CONTACT_BY_ID = select(models.Contact).where(models.Contact.id == bindparam("contact_id"), LIVE)
+
+DELETED_CONTACT_BY_ID = select(models.Contact).where(
+    models.Contact.id == bindparam("contact_id"), models.Contact.deleted_at.isnot(None))
+
+CONTACTS_BY_OWNER = select(models.Contact).where(models.Contact.owner_id == bindparam("owner_id"), LIVE)
+
+# birthday_ordinal (month * 100 + day) turns "birthday within the next days" into an IN
+# list of a few ordinals, answered from ix_contacts_birthday_ordinal_live
+UPCOMING_BIRTHDAYS = select(models.Contact).where(
+    models.Contact.birthday_ordinal.in_(bindparam("ordinals", expanding=True)), LIVE)
+
+SEARCH_CONTACTS = select(models.Contact).where(or_(
+    models.Contact.first_name.ilike(bindparam("pattern")),
+    models.Contact.last_name.ilike(bindparam("pattern")),
+    models.Contact.email.ilike(bindparam("pattern")),
+), LIVE)
+
+# FTS5 trigram index maintained by triggers on SQLite (see models.CONTACTS_FTS_DDL)
+CONTACTS_FTS = table("contacts_fts", column("rowid"))
+
+SEARCH_CONTACTS_FTS = select(models.Contact).where(models.Contact.id.in_(
+    select(CONTACTS_FTS.c.rowid).where(text("contacts_fts MATCH :phrase"))
+), LIVE)
+
+CONTACT_NAMES_BY_OWNER = select(
+    models.Contact.id, models.Contact.first_name, models.Contact.last_name,
+    models.Contact.email, models.Contact.change_seq,
+).where(models.Contact.owner_id == bindparam("owner_id"), LIVE)
+
+BIRTHDAYS_BY_OWNER = select(
+    models.Contact.id, models.Contact.first_name, models.Contact.last_name, models.Contact.birthday,
+    models.Contact.updated_at,
+).where(models.Contact.owner_id == bindparam("owner_id"), models.Contact.birthday.isnot(None), LIVE)
+
+SYNC_STATE_BY_OWNER = select(models.ContactSyncState).where(models.ContactSyncState.owner_id == bindparam("owner_id"))
+
+CONTACT_IDS_BY_OWNER = select(models.Contact.id).where(models.Contact.owner_id == bindparam("owner_id"), LIVE)
+
+TAG_MEMBERSHIPS_BY_OWNER = select(models.Tag.name, models.contact_tags.c.contact_id).join(
+    models.contact_tags, models.contact_tags.c.tag_id == models.Tag.id,
+).join(
+    models.Contact, models.Contact.id == models.contact_tags.c.contact_id,
+).where(models.Tag.owner_id == bindparam("owner_id"), LIVE)
+
+TAGS_BY_NAMES = select(models.Tag).where(
+    models.Tag.owner_id == bindparam("owner_id"),
+    models.Tag.name.in_(bindparam("names", expanding=True)),
+)
+
+USER_BY_EMAIL = select(models.User).where(models.User.email == bindparam("email"))
+
+REFRESH_TOKEN_BY_HASH = select(models.RefreshToken).where(models.RefreshToken.token_hash == bindparam("token_hash"))
+
+REVOKED_FAMILY = select(models.RefreshToken.id).where(
+    models.RefreshToken.family_id == bindparam("family_id"), models.RefreshToken.revoked_at.isnot(None),
+).limit(1)
+
+
+def contact_columns(fields: Tuple[str, ...]) -> list:
+    """
+    Maps contact field names to model columns.
+
+    Args:
+        fields (Tuple[str, ...]): Field names of schemas.Contact.
+
+    Returns:
+        list: Columns of models.Contact.
+    """
+    return [getattr(models.Contact, name) for name in fields]
+
+
+@functools.lru_cache(maxsize=1024)
+def project(statement, fields: Tuple[str, ...]):
+    """
+    Narrows one of the pre-built contact statements to some columns.
+
+    Variants are cached like the statements themselves, so a sparse fieldset
+    costs no query construction either. Only pass module-level statements;
+    ad-hoc statements would fill the cache.
+
+    Args:
+        statement (Select): Pre-built statement selecting models.Contact.
+        fields (Tuple[str, ...]): Field names to select.
+
+    Returns:
+        Select: Column-limited statement with the same filters.
+    """
+    return statement.with_only_columns(*contact_columns(fields))
+
+
+def contact_fields(db: Session, statement, params: dict, fields: Tuple[str, ...]) -> List[dict]:
+    """
+    Runs a pre-built contact statement selecting only some columns.
+
+    Args:
+        db (Session): Database session object.
+        statement (Select): Pre-built statement selecting models.Contact.
+        params (dict): Bound parameter values.
+        fields (Tuple[str, ...]): Field names to select.
+
+    Returns:
+        List[dict]: One dict of the selected fields per contact.
+    """
+    return [dict(row._mapping) for row in db.execute(project(statement, fields), params)]
+
+
+def contact_by_id(db: Session, contact_id: int) -> Optional[models.Contact]:
+    """
+    Retrieves a contact by its ID.
+
+    Args:
+        db (Session): Database session object.
+        contact_id (int): ID of the contact.
+
+    Returns:
+        models.Contact: Contact, or None if not found.
+    """
+    return db.execute(CONTACT_BY_ID, {"contact_id": contact_id}).scalars().first()
+
+
+def deleted_contact_by_id(db: Session, contact_id: int) -> Optional[models.Contact]:
+    """
+    Retrieves a soft-deleted contact that has not been purged yet.
+
+    Args:
+        db (Session): Database session object.
+        contact_id (int): ID of the contact.
+
+    Returns:
+        models.Contact: Deleted contact, or None if not found.
+    """
+    return db.execute(DELETED_CONTACT_BY_ID, {"contact_id": contact_id}).scalars().first()
+
+
+def contacts_by_owner(db: Session, owner_id: int) -> List[models.Contact]:
+    """
+    Retrieves all contacts of a user.
+
+    Args:
+        db (Session): Database session object.
+        owner_id (int): ID of the owner.
+
+    Returns:
+        List[models.Contact]: Contacts of the user.
+    """
+    return db.execute(CONTACTS_BY_OWNER, {"owner_id": owner_id}).scalars().all()
+
+
+def upcoming_ordinals(today: date, days: int) -> List[int]:
+    """
+    Lists the birthday ordinals of a range of days, across the end of the year if needed.
+
+    In years without February 29th, birthdays on that day are celebrated on
+    February 28th, as in the iCal feed (``BYMONTHDAY=-1``).
+
+    Args:
+        today (date): First day of the range.
+        days (int): Number of days after today to include.
+
+    Returns:
+        List[int]: ``month * 100 + day`` of every day of the range.
+    """
+    ordinals = []
+    for offset in range(days + 1):
+        day = today + timedelta(days=offset)
+        ordinals.append(birthday_ordinal(day))
+        if day.month == 2 and day.day == 28 and not calendar.isleap(day.year):
+            ordinals.append(229)
+    return ordinals
+
+
+def upcoming_birthdays(db: Session, today: date, days: int) -> List[models.Contact]:
+    """
+    Retrieves contacts whose birthday falls within the next days.
+
+    Args:
+        db (Session): Database session object.
+        today (date): First day of the range.
+        days (int): Number of days after today to include.
+
+    Returns:
+        List[models.Contact]: Contacts with an upcoming birthday.
+    """
+    return db.execute(UPCOMING_BIRTHDAYS, {"ordinals": upcoming_ordinals(today, days)}).scalars().all()
+
+
+def search_statement(db: Session, query: str) -> Tuple[object, dict]:
+    """
+    Picks the contact search statement for the database of a session.
+
+    On SQLite, queries of at least three characters (one trigram) use the FTS5
+    index instead of scanning the table with LIKE.
+
+    Args:
+        db (Session): Database session object.
+        query (str): Substring to search for.
+
+    Returns:
+        Tuple[Select, dict]: Pre-built statement and its parameters.
+    """
+    if len(query) >= 3 and db.get_bind().dialect.name == "sqlite":
+        return SEARCH_CONTACTS_FTS, {"phrase": '"' + query.replace('"', '""') + '"'}
+    return SEARCH_CONTACTS, {"pattern": f"%{query}%"}
+
+
+def search_contacts(db: Session, query: str) -> List[models.Contact]:
+    """
+    Retrieves contacts whose first name, last name or email contains a substring.
+
+    Args:
+        db (Session): Database session object.
+        query (str): Substring to search for.
+
+    Returns:
+        List[models.Contact]: Matching contacts.
+    """
+    statement, params = search_statement(db, query)
+    return db.execute(statement, params).scalars().all()
+
+
+def contact_names_by_owner(db: Session, owner_id: int) -> list:
+    """
+    Retrieves (id, first_name, last_name, email, change_seq) rows of a user's contacts.
+
+    Args:
+        db (Session): Database session object.
+        owner_id (int): ID of the owner.
+
+    Returns:
+        list: Rows used to build the autocomplete and fuzzy search indexes.
+    """
+    return db.execute(CONTACT_NAMES_BY_OWNER, {"owner_id": owner_id}).all()
+
+
+def birthdays_by_owner(db: Session, owner_id: int) -> list:
+    """
+    Retrieves (id, first_name, last_name, birthday, updated_at) rows of a user's contacts that have a birthday.
+
+    Args:
+        db (Session): Database session object.
+        owner_id (int): ID of the owner.
+
+    Returns:
+        list: Rows used to render the birthday calendar.
+    """
+    return db.execute(BIRTHDAYS_BY_OWNER, {"owner_id": owner_id}).all()
+
+
+def sync_state(db: Session, owner_id: int) -> Optional[models.ContactSyncState]:
+    """
+    Retrieves the delta sync counters of a user.
+
+    Args:
+        db (Session): Database session object.
+        owner_id (int): ID of the user.
+
+    Returns:
+        models.ContactSyncState: Sync state, or None if the user never changed a contact.
+    """
+    return db.execute(SYNC_STATE_BY_OWNER, {"owner_id": owner_id}).scalars().first()
+
+
+def contact_ids_by_owner(db: Session, owner_id: int) -> List[int]:
+    """
+    Retrieves the IDs of all contacts of a user.
+
+    Args:
+        db (Session): Database session object.
+        owner_id (int): ID of the owner.
+
+    Returns:
+        List[int]: Contact IDs.
+    """
+    return db.execute(CONTACT_IDS_BY_OWNER, {"owner_id": owner_id}).scalars().all()
+
+
+def tag_memberships_by_owner(db: Session, owner_id: int) -> list:
+    """
+    Retrieves (tag name, contact id) pairs of a user's tags.
+
+    Args:
+        db (Session): Database session object.
+        owner_id (int): ID of the owner.
+
+    Returns:
+        list: Rows used to build the tag bitmap index.
+    """
+    return db.execute(TAG_MEMBERSHIPS_BY_OWNER, {"owner_id": owner_id}).all()
+
+
+def tags_by_names(db: Session, owner_id: int, names: List[str]) -> List[models.Tag]:
+    """
+    Retrieves a user's tags by name.
+
+    Args:
+        db (Session): Database session object.
+        owner_id (int): ID of the owner.
+        names (List[str]): Normalized tag names.
+
+    Returns:
+        List[models.Tag]: Existing tags among the names.
+    """
+    return db.execute(TAGS_BY_NAMES, {"owner_id": owner_id, "names": names}).scalars().all()
+
+
+def user_by_email(db: Session, email: str) -> Optional[models.User]:
+    """
+    Retrieves a user by email.
+
+    Args:
+        db (Session): Database session object.
+        email (str): Email address of the user.
+
+    Returns:
+        models.User: User, or None if not found.
+    """
+    return db.execute(USER_BY_EMAIL, {"email": email}).scalars().first()
+
+
+def refresh_token_by_hash(db: Session, token_hash: str) -> Optional[models.RefreshToken]:
+    """
+    Retrieves a refresh token by the digest of its value.
+
+    Args:
+        db (Session): Database session object.
+        token_hash (str): Hex SHA-256 digest of the token.
+
+    Returns:
+        models.RefreshToken: Token, or None if not found.
+    """
+    return db.execute(REFRESH_TOKEN_BY_HASH, {"token_hash": token_hash}).scalars().first()
+
+
+def family_revoked(db: Session, family_id: str) -> bool:
+    """
+    Checks whether a refresh-token family has been revoked.
+
+    Args:
+        db (Session): Database session object.
+        family_id (str): Identifier of the family.
+
+    Returns:
+        bool: True if any token of the family is revoked.
+    """
+    return db.execute(REVOKED_FAMILY, {"family_id": family_id}).first() is not None
@@ -0,0 +1,183 @@
+import hashlib
+import secrets
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+from contactpr import models
+from repository import queries
+
+
+class InvalidRefreshToken(Exception):
+    """
+    Raised for unknown, expired or revoked refresh tokens.
+    """
+
+
+class RefreshTokenReuse(InvalidRefreshToken):
+    """
+    Raised when an already rotated refresh token is presented again.
+
+    The token was probably stolen, so its whole family has been revoked.
+
+    Attributes:
+        user_id (int): Identifier of the user the family belongs to.
+        family_id (str): Identifier of the revoked family.
+    """
+
+    def __init__(self, user_id: int, family_id: str):
+        super().__init__(family_id)
+        self.user_id = user_id
+        self.family_id = family_id
+
+
+def hash_token(token: str) -> str:
+    """
+    Digests a refresh token for storage and lookup.
+
+    Refresh tokens are 256-bit random values, so a plain SHA-256 digest is
+    enough; a slow password hash would only add latency.
+
+    Args:
+        token (str): Token value.
+
+    Returns:
+        str: Hex SHA-256 digest.
+    """
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def issue_refresh_token(db: Session, user_id: int, lifetime: timedelta,
+                        family_id: Optional[str] = None) -> Tuple[str, models.RefreshToken]:
+    """
+    Creates a refresh token and stores its digest.
+
+    Args:
+        db (Session): Database session object.
+        user_id (int): Identifier of the user.
+        lifetime (timedelta): Validity of the token.
+        family_id (str, optional): Family to continue; a new family is started by default.
+
+    Returns:
+        Tuple[str, models.RefreshToken]: Token value (shown to the client once) and its row.
+    """
+    token = secrets.token_urlsafe(32)
+    now = datetime.utcnow()
+    row = models.RefreshToken(user_id=user_id, family_id=family_id or uuid.uuid4().hex,
+                              token_hash=hash_token(token), created_at=now, expires_at=now + lifetime)
+    db.add(row)
+    db.commit()
+    return token, row
+
+
+def rotate_refresh_token(db: Session, token: str, lifetime: timedelta) -> Tuple[str, models.RefreshToken]:
+    """
+    Exchanges a refresh token for its successor in the same family.
+
+    The presented token is claimed with a conditional UPDATE, so of two
+    concurrent refreshes with the same token only one succeeds and the other
+    is treated as reuse.
+
+    Args:
+        db (Session): Database session object.
+        token (str): Presented token value.
+        lifetime (timedelta): Validity of the new token.
+
+    Returns:
+        Tuple[str, models.RefreshToken]: New token value and its row.
+
+    Raises:
+        InvalidRefreshToken: If the token is unknown, expired or revoked.
+        RefreshTokenReuse: If the token was already rotated; the family is revoked.
+    """
+    row = queries.refresh_token_by_hash(db, hash_token(token))
+    now = datetime.utcnow()
+    if row is None or row.revoked_at is not None or row.expires_at <= now:
+        raise InvalidRefreshToken()
+    claimed = db.execute(
+        update(models.RefreshToken)
+        .where(models.RefreshToken.id == row.id, models.RefreshToken.used_at.is_(None),
+               models.RefreshToken.revoked_at.is_(None))
+        .values(used_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not claimed:
+        db.rollback()
+        revoke_family(db, row.family_id)
+        raise RefreshTokenReuse(row.user_id, row.family_id)
+    return issue_refresh_token(db, row.user_id, lifetime, row.family_id)
+
+
+def revoke_family(db: Session, family_id: str) -> int:
+    """
+    Revokes every token of a family.
+
+    Args:
+        db (Session): Database session object.
+        family_id (str): Identifier of the family.
+
+    Returns:
+        int: Number of newly revoked tokens.
+    """
+    revoked = db.execute(
+        update(models.RefreshToken)
+        .where(models.RefreshToken.family_id == family_id, models.RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return revoked
+
+
+def revoke_token(db: Session, token: str) -> Optional[models.RefreshToken]:
+    """
+    Revokes the family of a refresh token (logout).
+
+    Args:
+        db (Session): Database session object.
+        token (str): Token value.
+
+    Returns:
+        models.RefreshToken: Token row, or None if the token is unknown.
+    """
+    row = queries.refresh_token_by_hash(db, hash_token(token))
+    if row is not None:
+        revoke_family(db, row.family_id)
+    return row
+
+
+def revoked_families_since(db: Session, since: datetime) -> List[str]:
+    """
+    Lists families revoked after a point in time.
+
+    Args:
+        db (Session): Database session object.
+        since (datetime): Earliest revocation time.
+
+    Returns:
+        List[str]: Family identifiers.
+    """
+    return db.execute(
+        select(models.RefreshToken.family_id).where(models.RefreshToken.revoked_at >= since).distinct()
+    ).scalars().all()
+
+
+def purge_expired_refresh_tokens(db: Session) -> int:
+    """
+    Deletes expired refresh tokens.
+
+    An expired token can no longer be rotated, and every access token derived
+    from it expired long before, so its row carries no information.
+
+    Args:
+        db (Session): Database session object.
+
+    Returns:
+        int: Number of deleted tokens.
+    """
+    deleted = db.execute(
+        delete(models.RefreshToken).where(models.RefreshToken.expires_at < datetime.utcnow())
+    ).rowcount
+    db.commit()
+    return deleted
@@ -0,0 +1,100 @@
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+from contactpr import models
+from repository import sync as repository_sync
+
+
+def soft_delete_contact(db: Session, contact: models.Contact) -> Optional[int]:
+    """
+    Marks a contact as deleted; the row is removed later by purge_deleted_contacts.
+
+    Args:
+        db (Session): Database session object.
+        contact (models.Contact): Live contact to delete.
+
+    Returns:
+        int: Change sequence number of the deletion, or None for contacts without an owner.
+    """
+    seq = repository_sync.record_tombstone(db, contact)
+    contact.deleted_at = datetime.utcnow()
+    db.commit()
+    return seq
+
+
+def restore_contact(db: Session, contact: models.Contact, window: timedelta) -> bool:
+    """
+    Undoes a soft deletion that is still within the undo window.
+
+    The deletion tombstone is dropped and the contact gets a new change
+    sequence number, so delta sync clients see it as changed again.
+
+    Args:
+        db (Session): Database session object.
+        contact (models.Contact): Soft-deleted contact.
+        window (timedelta): How long deletions can be undone.
+
+    Returns:
+        bool: False if the undo window has expired.
+
+    Raises:
+        sqlalchemy.exc.IntegrityError: If a live contact with the same email was created meanwhile.
+    """
+    if contact.deleted_at < datetime.utcnow() - window:
+        return False
+    contact.deleted_at = None
+    if contact.owner_id is not None:
+        contact.change_seq = repository_sync.next_change_seq(db, contact.owner_id)
+        db.query(models.ContactTombstone).filter(
+            models.ContactTombstone.contact_id == contact.id).delete(synchronize_session=False)
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    db.refresh(contact)
+    return True
+
+
+def purge_deleted_contacts(db: Session, older_than: timedelta, batch_size: int, pause: float = 0.0,
+                           max_batches: Optional[int] = None) -> int:
+    """
+    Permanently removes contacts soft-deleted before the undo window.
+
+    Rows are deleted in short transactions of at most ``batch_size`` rows with
+    ``pause`` seconds between them, so a burst of deletions does not hold
+    long locks or produce a WAL/vacuum spike. On PostgreSQL concurrently
+    running purges skip each other's rows (SKIP LOCKED).
+
+    Args:
+        db (Session): Database session object.
+        older_than (timedelta): Minimum age of the soft deletions to purge.
+        batch_size (int): Maximum number of rows per transaction.
+        pause (float): Seconds to sleep between batches.
+        max_batches (int, optional): Maximum number of batches in this run.
+
+    Returns:
+        int: Number of purged contacts.
+    """
+    cutoff = datetime.utcnow() - older_than
+    purged = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        ids = db.execute(
+            select(models.Contact.id).where(models.Contact.deleted_at < cutoff)
+            .order_by(models.Contact.deleted_at).limit(batch_size).with_for_update(skip_locked=True)
+        ).scalars().all()
+        if not ids:
+            break
+        db.execute(delete(models.contact_tags).where(models.contact_tags.c.contact_id.in_(ids)))
+        db.execute(delete(models.Contact).where(models.Contact.id.in_(ids)))
+        db.commit()
+        purged += len(ids)
+        batches += 1
+        if len(ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return purged
@@ -0,0 +1,256 @@
+"""
+Per-owner contact statistics kept in the contact_stats summary table.
+
+Counters are updated in the same transaction as the contact write by a
+``before_flush`` hook, so every ORM write path (single routes, /batch,
+restores, future bulk imports) maintains them without extra calls. Writes
+that bypass the ORM (Core UPDATE/DELETE statements) are not seen; the
+periodic reconcile_contact_stats job repairs such drift.
+"""
+import time
+from collections import Counter
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import delete, event, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from contactpr import models
+
+Bucket = Tuple[int, str, str]
+
+# attributes that change which buckets a contact is counted in
+TRACKED = ("owner_id", "email", "birthday", "deleted_at")
+
+
+def contact_buckets(owner_id: Optional[int], email: Optional[str], birthday: Optional[date],
+                    deleted_at) -> List[Bucket]:
+    """
+    Lists the statistics buckets a contact is counted in.
+
+    Args:
+        owner_id (int, optional): Owner of the contact.
+        email (str, optional): Email of the contact.
+        birthday (date, optional): Birthday of the contact.
+        deleted_at (datetime, optional): Soft deletion time.
+
+    Returns:
+        List[Bucket]: (owner_id, kind, bucket) triples; empty for deleted or ownerless contacts.
+    """
+    if owner_id is None or deleted_at is not None:
+        return []
+    buckets = [(owner_id, "total", "")]
+    if birthday is not None:
+        buckets.append((owner_id, "birth_month", f"{birthday.month:02d}"))
+    if email and "@" in email:
+        domain = email.rsplit("@", 1)[1].strip().lower()[:255]
+        if domain:
+            buckets.append((owner_id, "email_domain", domain))
+    return buckets
+
+
+def _buckets_of(contact: models.Contact, committed: bool) -> List[Bucket]:
+    values = []
+    state = inspect(contact)
+    for name in TRACKED:
+        history = state.attrs[name].history
+        if committed and history.added:
+            values.append(history.deleted[0] if history.deleted else None)
+        else:
+            values.append(getattr(contact, name))
+    return contact_buckets(*values)
+
+
+def _load_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+# load the previous value of expired attributes before they are overwritten,
+# so that the flush hook can decrement the buckets the contact leaves
+for _name in TRACKED:
+    event.listen(getattr(models.Contact, _name), "set", _load_old_value, active_history=True)
+
+
+def _changed(contact: models.Contact) -> bool:
+    state = inspect(contact)
+    return any(state.attrs[name].history.has_changes() for name in TRACKED)
+
+
+def apply_deltas(db: Session, deltas: Dict[Bucket, int]) -> None:
+    """
+    Adds deltas to the counters, creating missing rows.
+
+    Args:
+        db (Session): Database session object.
+        deltas (Dict[Bucket, int]): Change per (owner_id, kind, bucket).
+    """
+    table = models.ContactStat.__table__
+    dialect = db.get_bind().dialect.name
+    # rows are locked in key order, the order reconcile_owners locks them in
+    for (owner_id, kind, bucket), delta in sorted(deltas.items()):
+        if not delta:
+            continue
+        if dialect in ("postgresql", "sqlite"):
+            insert = (postgresql if dialect == "postgresql" else sqlite).insert(table)
+            statement = insert.values(owner_id=owner_id, kind=kind, bucket=bucket, count=delta)
+            db.execute(statement.on_conflict_do_update(
+                index_elements=[table.c.owner_id, table.c.kind, table.c.bucket],
+                set_={"count": table.c.count + statement.excluded.count},
+            ))
+            continue
+        updated = db.execute(update(table).where(
+            table.c.owner_id == owner_id, table.c.kind == kind, table.c.bucket == bucket,
+        ).values(count=table.c.count + delta)).rowcount
+        if not updated:
+            db.execute(table.insert().values(owner_id=owner_id, kind=kind, bucket=bucket, count=delta))
+
+
+@event.listens_for(Session, "before_flush")
+def _track_contact_writes(session: Session, flush_context, instances) -> None:
+    deltas: Counter = Counter()
+    for contact in session.new:
+        if isinstance(contact, models.Contact):
+            deltas.update(_buckets_of(contact, committed=False))
+    for contact in session.dirty:
+        if isinstance(contact, models.Contact) and _changed(contact):
+            deltas.subtract(_buckets_of(contact, committed=True))
+            deltas.update(_buckets_of(contact, committed=False))
+    for contact in session.deleted:
+        if isinstance(contact, models.Contact):
+            deltas.subtract(_buckets_of(contact, committed=True))
+    if any(deltas.values()):
+        apply_deltas(session, deltas)
+
+
+def contact_stats(db: Session, owner_id: int, top_domains: int = 10) -> dict:
+    """
+    Reads the statistics of a user from the summary table.
+
+    Args:
+        db (Session): Database session object.
+        owner_id (int): Identifier of the user.
+        top_domains (int): Number of email domains to return.
+
+    Returns:
+        dict: ``total``, ``birthdays_by_month`` (all twelve months) and ``top_email_domains``.
+    """
+    rows = db.execute(
+        select(models.ContactStat.kind, models.ContactStat.bucket, models.ContactStat.count)
+        .where(models.ContactStat.owner_id == owner_id, models.ContactStat.count > 0)
+    ).all()
+    total = 0
+    months = {month: 0 for month in range(1, 13)}
+    domains = []
+    for kind, bucket, count in rows:
+        if kind == "total":
+            total = count
+        elif kind == "birth_month":
+            months[int(bucket)] = count
+        elif kind == "email_domain":
+            domains.append((bucket, count))
+    domains.sort(key=lambda item: (-item[1], item[0]))
+    return {
+        "total": total,
+        "birthdays_by_month": months,
+        "top_email_domains": [{"domain": domain, "count": count} for domain, count in domains[:top_domains]],
+    }
+
+
+def _actual_counts(db: Session, owner_ids: List[int]) -> Counter:
+    counts: Counter = Counter()
+    rows = db.execute(
+        select(models.Contact.owner_id, models.Contact.email, models.Contact.birthday)
+        .where(models.Contact.owner_id.in_(owner_ids), models.Contact.deleted_at.is_(None))
+    )
+    for owner_id, email, birthday in rows:
+        counts.update(contact_buckets(owner_id, email, birthday, None))
+    return counts
+
+
+def _locked_counts(db: Session, owner_ids: List[int]) -> Dict[Bucket, int]:
+    stat = models.ContactStat
+    rows = db.execute(
+        select(stat.owner_id, stat.kind, stat.bucket, stat.count).where(stat.owner_id.in_(owner_ids))
+        .order_by(stat.owner_id, stat.kind, stat.bucket).with_for_update()
+    )
+    return {(owner_id, kind, bucket): count for owner_id, kind, bucket, count in rows}
+
+
+def _set_counts(db: Session, counts: Dict[Bucket, int]) -> None:
+    table = models.ContactStat.__table__
+    dialect = db.get_bind().dialect.name
+    for (owner_id, kind, bucket), count in sorted(counts.items()):
+        if dialect in ("postgresql", "sqlite"):
+            insert = (postgresql if dialect == "postgresql" else sqlite).insert(table)
+            statement = insert.values(owner_id=owner_id, kind=kind, bucket=bucket, count=count)
+            db.execute(statement.on_conflict_do_update(
+                index_elements=[table.c.owner_id, table.c.kind, table.c.bucket],
+                set_={"count": statement.excluded.count},
+            ))
+            continue
+        updated = db.execute(update(table).where(
+            table.c.owner_id == owner_id, table.c.kind == kind, table.c.bucket == bucket,
+        ).values(count=count)).rowcount
+        if not updated:
+            db.execute(table.insert().values(owner_id=owner_id, kind=kind, bucket=bucket, count=count))
+
+
+def reconcile_owners(db: Session, owner_ids: Iterable[int]) -> int:
+    """
+    Recomputes the statistics of some users from their contacts and fixes differences.
+
+    The users' counters are locked (FOR UPDATE; on SQLite the writer's BEGIN
+    IMMEDIATE) before their contacts are counted, so a contact write either
+    committed before the count and is included, or waits for the fix to
+    commit and then applies its delta on top. Differences are overwritten
+    with the recounted values rather than adjusted by deltas.
+
+    Args:
+        db (Session): Database session object.
+        owner_ids (Iterable[int]): Users to check.
+
+    Returns:
+        int: Number of corrected counters.
+    """
+    owner_ids = list(owner_ids)
+    stored = _locked_counts(db, owner_ids)
+    actual = _actual_counts(db, owner_ids)
+    wrong = [key for key in actual.keys() | stored.keys() if actual.get(key, 0) != stored.get(key, 0)]
+    table = models.ContactStat.__table__
+    for owner_id, kind, bucket in sorted(key for key in wrong if not actual.get(key)):
+        db.execute(delete(table).where(
+            table.c.owner_id == owner_id, table.c.kind == kind, table.c.bucket == bucket))
+    _set_counts(db, {key: actual[key] for key in wrong if actual.get(key)})
+    db.commit()
+    return len(wrong)
+
+
+def reconcile_contact_stats(db: Session, batch_size: int, pause: float = 0.0) -> int:
+    """
+    Repairs drift of the statistics of all users, a batch of users per transaction.
+
+    Users are walked in id order (keyset pagination), so a run touches every
+    user once and each transaction stays short.
+
+    Args:
+        db (Session): Database session object.
+        batch_size (int): Number of users per transaction.
+        pause (float): Seconds to sleep between batches.
+
+    Returns:
+        int: Number of corrected counters.
+    """
+    corrected = 0
+    last_id = 0
+    while True:
+        owner_ids = db.execute(
+            select(models.User.id).where(models.User.id > last_id).order_by(models.User.id).limit(batch_size)
+        ).scalars().all()
+        if not owner_ids:
+            break
+        corrected += reconcile_owners(db, owner_ids)
+        last_id = owner_ids[-1]
+        if len(owner_ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return corrected
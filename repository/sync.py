@@ -0,0 +1,178 @@
+import base64
+import hashlib
+import hmac
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from contactpr import models
+from repository import queries
+from config import settings
+
+
+class StaleSyncToken(Exception):
+    """
+    Raised when a sync token points before the last tombstone compaction.
+    """
+
+
+def _sign(payload: str) -> str:
+    return hmac.new(settings.secret_key.encode('utf-8'), payload.encode('utf-8'), hashlib.sha256).hexdigest()[:16]
+
+
+def encode_sync_token(owner_id: int, seq: int) -> str:
+    """
+    Encodes an opaque, signed sync token.
+
+    Args:
+        owner_id (int): Identifier of the user the token belongs to.
+        seq (int): Change sequence number the client has seen.
+
+    Returns:
+        str: URL-safe sync token.
+    """
+    payload = f"{owner_id}:{seq}"
+    raw = f"{payload}:{_sign(payload)}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_sync_token(token: str, owner_id: int) -> Optional[int]:
+    """
+    Decodes a sync token issued by encode_sync_token.
+
+    Args:
+        token (str): Sync token.
+        owner_id (int): Identifier of the user presenting the token.
+
+    Returns:
+        int: Change sequence number, or None if the token is malformed, forged
+        or belongs to another user.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode('utf-8')
+        token_owner, seq, signature = raw.split(':')
+        payload = f"{token_owner}:{seq}"
+        if not hmac.compare_digest(signature, _sign(payload)) or int(token_owner) != owner_id:
+            return None
+        return int(seq)
+    except ValueError:
+        return None
+
+
+def next_change_seq(db: Session, owner_id: int) -> int:
+    """
+    Allocates the next change sequence number of a user.
+
+    The sync state row is locked until the surrounding transaction commits,
+    which keeps sequence numbers monotonic in commit order. The row is
+    created with ON CONFLICT DO NOTHING first, so that concurrent first
+    writes of a user both find a row to lock instead of both inserting it.
+
+    Args:
+        db (Session): Database session object.
+        owner_id (int): Identifier of the user.
+
+    Returns:
+        int: New change sequence number.
+    """
+    table = models.ContactSyncState.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = (postgresql if dialect == "postgresql" else sqlite).insert(table)
+        db.execute(insert.values(owner_id=owner_id, last_seq=0, compacted_seq=0).on_conflict_do_nothing(
+            index_elements=[table.c.owner_id]))
+    state = db.query(models.ContactSyncState).filter(
+        models.ContactSyncState.owner_id == owner_id).with_for_update().first()
+    if state is None:
+        state = models.ContactSyncState(owner_id=owner_id, last_seq=0, compacted_seq=0)
+        db.add(state)
+    state.last_seq += 1
+    db.flush()
+    return state.last_seq
+
+
+def record_tombstone(db: Session, contact: models.Contact) -> Optional[int]:
+    """
+    Records the deletion of a contact for delta sync.
+
+    Args:
+        db (Session): Database session object.
+        contact (models.Contact): Contact that is being deleted.
+
+    Returns:
+        int: Change sequence number of the deletion, or None for contacts without an owner.
+    """
+    if contact.owner_id is None:
+        return None
+    seq = next_change_seq(db, contact.owner_id)
+    db.add(models.ContactTombstone(contact_id=contact.id, owner_id=contact.owner_id, change_seq=seq))
+    return seq
+
+
+def get_changes(db: Session, owner_id: int, since: int, limit: int) -> Tuple[List[models.Contact], List[int], int, bool]:
+    """
+    Retrieves contacts changed and deleted after a change sequence number.
+
+    Args:
+        db (Session): Database session object.
+        owner_id (int): Identifier of the user.
+        since (int): Last change sequence number the client has seen.
+        limit (int): Maximum number of changes to return.
+
+    Returns:
+        tuple: Changed contacts, ids of deleted contacts, sequence number to
+        resume from and whether more changes are pending.
+
+    Raises:
+        StaleSyncToken: If tombstones after ``since`` were already compacted.
+    """
+    state = queries.sync_state(db, owner_id)
+    if state is None:
+        return [], [], since, False
+    if since < state.compacted_seq:
+        raise StaleSyncToken()
+    if since >= state.last_seq:
+        return [], [], since, False
+
+    contacts = db.query(models.Contact).filter(
+        models.Contact.owner_id == owner_id,
+        models.Contact.change_seq > since,
+        models.Contact.deleted_at.is_(None),
+    ).order_by(models.Contact.change_seq).limit(limit + 1).all()
+    tombstones = db.query(models.ContactTombstone).filter(
+        models.ContactTombstone.owner_id == owner_id,
+        models.ContactTombstone.change_seq > since,
+    ).order_by(models.ContactTombstone.change_seq).limit(limit + 1).all()
+
+    merged = sorted(contacts + tombstones, key=lambda row: row.change_seq)
+    page = merged[:limit]
+    changed = [row for row in page if isinstance(row, models.Contact)]
+    deleted = [row.contact_id for row in page if isinstance(row, models.ContactTombstone)]
+    next_seq = page[-1].change_seq if page else since
+    return changed, deleted, next_seq, len(merged) > limit
+
+
+def compact_tombstones(db: Session, older_than: timedelta) -> int:
+    """
+    Removes old tombstones and invalidates sync tokens that still need them.
+
+    Args:
+        db (Session): Database session object.
+        older_than (timedelta): Minimum age of the tombstones to remove.
+
+    Returns:
+        int: Number of removed tombstones.
+    """
+    cutoff = datetime.utcnow() - older_than
+    watermarks = db.query(models.ContactTombstone.owner_id, func.max(models.ContactTombstone.change_seq)).filter(
+        models.ContactTombstone.deleted_at < cutoff).group_by(models.ContactTombstone.owner_id).all()
+    for owner_id, max_seq in watermarks:
+        state = db.query(models.ContactSyncState).filter(
+            models.ContactSyncState.owner_id == owner_id).with_for_update().first()
+        if state is not None and state.compacted_seq < max_seq:
+            state.compacted_seq = max_seq
+    removed = db.query(models.ContactTombstone).filter(
+        models.ContactTombstone.deleted_at < cutoff).delete(synchronize_session=False)
+    db.commit()
+    return removed
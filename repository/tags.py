@@ -0,0 +1,71 @@
+from typing import Iterable, List
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from contactpr import models
+from repository import queries
+
+
+def normalize_tags(names: Iterable[str]) -> List[str]:
+    """
+    Normalizes tag names: strips whitespace, lower-cases and removes duplicates.
+
+    Args:
+        names (Iterable[str]): Tag names as entered by the user.
+
+    Returns:
+        List[str]: Sorted, unique, non-empty tag names.
+    """
+    return sorted({name.strip().lower() for name in names if name and name.strip()})
+
+
+def create_missing_tags(db: Session, owner_id: int, names: List[str]) -> None:
+    """
+    Creates the tags of a user that do not exist yet.
+
+    Tags created concurrently by another request are left alone instead of
+    failing on the unique (owner_id, name) constraint: PostgreSQL and SQLite
+    insert with ON CONFLICT DO NOTHING, other databases insert every tag in a
+    savepoint.
+
+    Args:
+        db (Session): Database session object.
+        owner_id (int): ID of the owner.
+        names (List[str]): Normalized tag names.
+    """
+    table = models.Tag.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = (postgresql if dialect == "postgresql" else sqlite).insert(table)
+        db.execute(insert.values([{"owner_id": owner_id, "name": name} for name in names]).on_conflict_do_nothing(
+            index_elements=[table.c.owner_id, table.c.name]))
+        return
+    for name in names:
+        try:
+            with db.begin_nested():
+                db.execute(table.insert().values(owner_id=owner_id, name=name))
+        except IntegrityError:
+            pass
+
+
+def set_contact_tags(db: Session, contact: models.Contact, names: Iterable[str]) -> List[str]:
+    """
+    Replaces the tags of a contact, creating missing tags of its owner.
+
+    Args:
+        db (Session): Database session object.
+        contact (models.Contact): Contact to tag.
+        names (Iterable[str]): New tag names.
+
+    Returns:
+        List[str]: Normalized tag names now attached to the contact.
+    """
+    names = normalize_tags(names)
+    existing = {tag.name: tag for tag in queries.tags_by_names(db, contact.owner_id, names)} if names else {}
+    missing = [name for name in names if name not in existing]
+    if missing:
+        create_missing_tags(db, contact.owner_id, missing)
+        existing = {tag.name: tag for tag in queries.tags_by_names(db, contact.owner_id, names)}
+    contact.tags = [existing[name] for name in names]
+    db.commit()
+    return names
@@ -0,0 +1,133 @@
+"""
+Production entry point.
+
+Runs the application under gunicorn with uvicorn workers (uvloop + httptools),
+preloads the app in the master before forking, sizes the database pool of
+every worker from the total connection budget and drains in-flight requests
+and background e-mail tasks on SIGTERM.
+
+Usage:
+    python server.py
+
+All knobs are read from the environment / .env through config.Settings
+(WEB_CONCURRENCY, WEB_BACKLOG, WEB_KEEPALIVE, WEB_GRACEFUL_TIMEOUT,
+WEB_PRELOAD, DB_MAX_CONNECTIONS, ...).
+"""
+import os
+import multiprocessing
+
+from gunicorn.app.base import BaseApplication
+from uvicorn.workers import UvicornWorker
+
+from config import settings
+
+
+def worker_count() -> int:
+    """
+    Returns the number of worker processes to start.
+
+    Returns:
+        int: settings.web_concurrency, or the number of CPU cores when it is 0.
+    """
+    if settings.web_concurrency > 0:
+        return settings.web_concurrency
+    return multiprocessing.cpu_count()
+
+
+def pool_size_per_worker(workers: int) -> int:
+    """
+    Splits the total database connection budget between workers.
+
+    Args:
+        workers (int): Number of worker processes.
+
+    Returns:
+        int: Maximum number of connections a single worker may hold.
+    """
+    return max(1, settings.db_max_connections // workers)
+
+
+class ContactsWorker(UvicornWorker):
+    """
+    Uvicorn worker running on uvloop and httptools.
+
+    The graceful shutdown timeout is a little shorter than gunicorn's, so that
+    uvicorn has time to run the lifespan shutdown (background task drain)
+    before the master kills the worker. The drain only gets what closing the
+    connections left of gunicorn's timeout: the app starts the shutdown clock
+    on the exit signal (see background_tasks.watch_exit_signals).
+    """
+    CONFIG_KWARGS = {"loop": "uvloop", "http": "httptools"}
+
+    def __init__(self, *args, **kwargs):
+        self.CONFIG_KWARGS = dict(
+            ContactsWorker.CONFIG_KWARGS,
+            timeout_graceful_shutdown=max(1, settings.web_graceful_timeout - 5),
+        )
+        super().__init__(*args, **kwargs)
+
+
+def post_fork(server, worker):
+    """
+    Drops database connections inherited from the master after a fork.
+
+    Args:
+        server (gunicorn.arbiter.Arbiter): Gunicorn master.
+        worker (gunicorn.workers.base.Worker): Freshly forked worker.
+    """
+    from contactpr.database import engine, read_engine
+    engine.dispose(close=False)
+    read_engine.dispose(close=False)
+
+
+class Server(BaseApplication):
+    """
+    Gunicorn application serving main.app.
+
+    Attributes:
+        options (dict): Gunicorn settings.
+    """
+
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from main import app
+        return app
+
+
+def run():
+    """
+    Starts gunicorn with settings derived from config.Settings.
+    """
+    workers = worker_count()
+    # Must happen before the app is loaded so that contactpr.database builds
+    # the engine with the per-worker pool size.
+    os.environ["DB_POOL_SIZE"] = str(pool_size_per_worker(workers))
+    os.environ["DB_MAX_OVERFLOW"] = "0"
+    settings.db_pool_size = pool_size_per_worker(workers)
+    settings.db_max_overflow = 0
+    # Tells contactpr.cache whether workers need a shared place for cache generations.
+    os.environ["WEB_WORKERS"] = str(workers)
+    settings.web_workers = workers
+
+    options = {
+        "bind": f"{settings.web_host}:{settings.web_port}",
+        "workers": workers,
+        "worker_class": ContactsWorker,
+        "preload_app": settings.web_preload,
+        "backlog": settings.web_backlog,
+        "keepalive": settings.web_keepalive,
+        "graceful_timeout": settings.web_graceful_timeout,
+        "post_fork": post_fork,
+    }
+    Server(options).run()
+
+
+if __name__ == "__main__":
+    run()
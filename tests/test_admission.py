@@ -0,0 +1,166 @@
+import asyncio
+import pytest
+from fastapi import FastAPI, Request
+from ..contactpr import batch, schemas
+from ..contactpr.admission import (AUTHENTICATED_READ, OTHER, AdaptiveLimiter, AdmissionMiddleware, Overloaded,
+                                   route_class)
+
+
+def _app(running, peak, delay=0.05):
+    app = FastAPI()
+
+    @app.get("/contacts/search/")
+    async def search_contacts():
+        running.append(1)
+        peak[0] = max(peak[0], len(running))
+        await asyncio.sleep(delay)
+        running.pop()
+        return []
+
+    return app
+
+
+async def _get(app, path="/contacts/search/", authorization=None, method="GET"):
+    headers = [(b"authorization", authorization)] if authorization else []
+    scope = {"type": "http", "method": method, "path": path, "raw_path": path.encode(), "query_string": b"",
+             "headers": headers, "root_path": "", "scheme": "http", "server": ("test", 80),
+             "client": ("test", 1), "http_version": "1.1"}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return messages[0]["status"], dict(messages[0]["headers"])
+
+
+def test_requests_are_classified_by_route():
+    assert route_class("GET", "/contacts/search/") == "expensive"
+    assert route_class("POST", "/signup") == "expensive"
+    assert route_class("GET", "/calendar/1/token/birthdays.ics") == "expensive"
+    assert route_class("GET", "/contacts/7") == "default"
+    assert route_class("POST", "/contacts/") == "default"
+    assert route_class("GET", "/admin/metrics") is None
+    assert route_class("GET", "/contacts/stream/") is None
+    assert route_class("POST", "/batch") is None
+
+
+def test_limit_decreases_on_slow_requests_and_recovers():
+    now = [0.0]
+    limiter = AdaptiveLimiter("test", target_latency=1.0, max_limit=10, queue_size=0, queue_timeout=1,
+                              clock=lambda: now[0])
+
+    async def scenario():
+        for _ in range(10):
+            await limiter.acquire()
+        # a burst of slow requests counts as one overload signal
+        for _ in range(5):
+            limiter.release(2.0)
+        assert int(limiter.limit) == 9
+        now[0] = 1.0
+        limiter.release(0.1, failed=True)
+        assert int(limiter.limit) == 8
+        while limiter.in_flight:
+            limiter.release(0.1)
+        # growth needs the limit to be in use
+        for _ in range(10):
+            await limiter.acquire()
+            limiter.release(0.1)
+        assert int(limiter.limit) == 8
+        for _ in range(10):
+            slots = int(limiter.limit)
+            for _ in range(slots):
+                await limiter.acquire()
+            for _ in range(slots):
+                limiter.release(0.1)
+
+    asyncio.run(scenario())
+    assert int(limiter.limit) == 10
+
+
+def test_full_queue_is_shed_and_authenticated_reads_go_first():
+    limiter = AdaptiveLimiter("test", target_latency=1.0, max_limit=1, queue_size=2, queue_timeout=5)
+    order = []
+
+    async def waiter(name, priority):
+        try:
+            await limiter.acquire(priority)
+        except Overloaded:
+            order.append(f"{name} shed")
+            return
+        order.append(name)
+        await asyncio.sleep(0)
+        limiter.release(0.01)
+
+    async def scenario():
+        await limiter.acquire()
+        tasks = [asyncio.ensure_future(waiter("anonymous 1", OTHER)),
+                 asyncio.ensure_future(waiter("anonymous 2", OTHER))]
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            await limiter.acquire(OTHER)
+        tasks.append(asyncio.ensure_future(waiter("user", AUTHENTICATED_READ)))
+        await asyncio.sleep(0)
+        limiter.release(0.01)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert order == ["anonymous 2 shed", "user", "anonymous 1"]
+    assert limiter.stats()["shed"] == 2 and limiter.in_flight == 0 and limiter.queued == 0
+
+
+def test_middleware_bounds_concurrency_and_sheds_with_retry_after():
+    running, peak = [], [0]
+    limiters = {"expensive": AdaptiveLimiter("expensive", target_latency=1.0, max_limit=2, queue_size=3,
+                                             queue_timeout=1)}
+    app = AdmissionMiddleware(_app(running, peak), limiters)
+
+    async def scenario():
+        return await asyncio.gather(*[_get(app, authorization=b"Bearer a") for _ in range(10)])
+
+    responses = asyncio.run(scenario())
+    statuses = sorted(status for status, _ in responses)
+    assert statuses == [200] * 5 + [503] * 5
+    assert peak[0] == 2
+    shed = [headers for status, headers in responses if status == 503]
+    assert all(int(headers[b"retry-after"]) >= 1 for headers in shed)
+    assert app.stats()["expensive"]["admitted"] == 5 and app.stats()["expensive"]["in_flight"] == 0
+
+
+def test_waiting_too_long_is_shed():
+    running, peak = [], [0]
+    limiters = {"expensive": AdaptiveLimiter("expensive", target_latency=1.0, max_limit=1, queue_size=10,
+                                             queue_timeout=0.02)}
+    app = AdmissionMiddleware(_app(running, peak, delay=0.1), limiters)
+
+    async def scenario():
+        return await asyncio.gather(_get(app), _get(app))
+
+    assert sorted(status for status, _ in asyncio.run(scenario())) == [200, 503]
+    assert limiters["expensive"].queued == 0
+
+
+def test_batch_reads_are_admitted_one_by_one():
+    running, peak = [], [0]
+    app = _app(running, peak)
+    limiters = {"expensive": AdaptiveLimiter("expensive", target_latency=1.0, max_limit=3, queue_size=20,
+                                             queue_timeout=2)}
+    # as in main.py, so that the sub-requests pass the middleware again
+    app.add_middleware(AdmissionMiddleware, limiters=limiters)
+    results = []
+
+    @app.post("/batch")
+    async def run_batch(request: Request):
+        items = [schemas.BatchRequestItem(id=str(number), path="/contacts/search/") for number in range(20)]
+        results.extend(await batch.run(request.app, request.scope, items, object()))
+        return {}
+
+    status, _ = asyncio.run(_get(app, "/batch", method="POST"))
+    assert status == 200
+    assert [result["status"] for result in results] == [200] * 20
+    # the 20 concurrent reads of the batch never exceed the limit of their class
+    assert peak[0] == 3
+    assert limiters["expensive"].stats()["admitted"] == 20
@@ -0,0 +1,76 @@
+from ..contactpr.autocomplete import PrefixIndex
+from ..contactpr.owner_cache import OwnerIndexCache
+
+
+def make_index():
+    return PrefixIndex([
+        (1, "John", "Doe", "john@example.com", 1),
+        (2, "Joanna", "Smith", "jo@example.com", 3),
+        (3, "Bob", "Johnson", "bob@example.com", 2),
+    ])
+
+
+def test_prefix_search_ranks_by_recency():
+    index = make_index()
+    assert [s["id"] for s in index.search("jo", 10, 100)] == [2, 3, 1]
+    assert [s["id"] for s in index.search("JOHN", 10, 100)] == [3, 1]
+    assert [s["id"] for s in index.search("jo do", 10, 100)] == [1]
+    assert index.search("x", 10, 100) == []
+
+
+def test_short_prefix_returns_the_true_most_recent_contacts():
+    # the alphabetically first names are the oldest contacts
+    index = PrefixIndex((i, f"Anna{i:04d}", "Doe", f"a{i}@example.com", i) for i in range(1, 1001))
+    index.add(2000, "Zoe", "Adams", "zoe@example.com", 5000)
+    assert [s["id"] for s in index.search("a", 3, 100)] == [2000, 1000, 999]
+    assert [s["id"] for s in index.search("an", 2, 100)] == [1000, 999]
+    assert [s["id"] for s in index.search("anna", 2, 100)] == [1000, 999]
+    assert [s["id"] for s in index.search("a doe", 2, 100)] == [1000, 999]
+    assert index.search("a", 3, 100) == index.search("a", 3, 100000)
+
+    index.remove(1000)
+    assert [s["id"] for s in index.search("an", 2, 100)] == [999, 998]
+
+
+def test_apply_events():
+    index = make_index()
+    index.apply({"type": "contact.updated", "contact_id": 1, "seq": 4,
+                 "contact": {"first_name": "Jonathan", "last_name": "Doe", "email": "jd@example.com"}})
+    assert index.search("jon", 10, 100)[0]["first_name"] == "Jonathan"
+    assert [s["id"] for s in index.search("john", 10, 100)] == [3]
+
+    index.apply({"type": "contact.deleted", "contact_id": 3})
+    assert index.search("john", 10, 100) == []
+    # 6 terms and 9 short-prefix recency entries
+    assert index.cost() == 15
+
+
+def test_owner_cache_builds_lazily_and_evicts():
+    cache = OwnerIndexCache(max_cost=10)
+    builds = []
+
+    def build():
+        builds.append(1)
+        return make_index()
+
+    first = cache.get(1, build)
+    assert cache.get(1, build) is first
+    assert len(builds) == 1
+
+    cache.get(2, build)
+    assert cache.stats() == {"owners": 1, "cost": 21}
+    assert cache.get(1, build) is not first
+
+
+def test_owner_cache_rebuilds_when_the_generation_moves():
+    generations = {1: 4}
+    cache = OwnerIndexCache(max_cost=100, generation=generations.get)
+    first = cache.get(1, make_index)
+    assert cache.get(1, make_index) is first
+
+    # another worker wrote a contact of owner 1
+    generations[1] = 5
+    second = cache.get(1, make_index)
+    assert second is not first
+    assert cache.get(1, make_index) is second
+    assert cache.stats() == {"owners": 1, "cost": 21}
@@ -0,0 +1,138 @@
+from datetime import date
+import pytest
+from sqlalchemy import create_engine, select, update
+from sqlalchemy.orm import sessionmaker
+from ..contactpr import models
+from ..repository import backfill, queries
+
+
+@pytest.fixture()
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'backfill.db'}")
+    models.Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(models.User.__table__.insert().values(id=1, email="owner@example.com"))
+        connection.execute(models.Contact.__table__.insert(), [
+            {"id": i, "first_name": f"First{i}", "owner_id": 1,
+             "birthday": date(1990, 1 + i % 12, 1 + i % 28) if i % 5 else None}
+            for i in range(1, 101)
+        ])
+    yield engine
+    engine.dispose()
+
+
+def ordinals(engine):
+    with engine.connect() as connection:
+        return dict(connection.execute(select(models.Contact.id, models.Contact.birthday_ordinal)).all())
+
+
+def test_orm_writes_keep_the_ordinal_in_sync(engine):
+    db = sessionmaker(bind=engine)()
+    contact = models.Contact(first_name="John", birthday=date(1990, 12, 31), owner_id=1)
+    db.add(contact)
+    db.commit()
+    assert contact.birthday_ordinal == 1231
+    contact.birthday = None
+    db.commit()
+    assert contact.birthday_ordinal is None
+    db.close()
+
+
+def test_leap_day_birthdays_are_upcoming_in_common_years(engine):
+    db = sessionmaker(bind=engine)()
+    leapling = models.Contact(first_name="Leap", birthday=date(1992, 2, 29), owner_id=1)
+    db.add(leapling)
+    db.commit()
+
+    def upcoming(today, days):
+        return leapling in queries.upcoming_birthdays(db, today, days)
+
+    assert upcoming(date(2025, 2, 25), 7)
+    assert upcoming(date(2025, 2, 28), 0)
+    assert not upcoming(date(2025, 3, 1), 7)
+    assert upcoming(date(2028, 2, 29), 0) and not upcoming(date(2028, 2, 28), 0)
+    assert queries.upcoming_ordinals(date(2025, 2, 27), 2) == [227, 228, 229, 301]
+    db.close()
+
+
+def test_backfill_updates_every_row_in_chunks(engine):
+    reports = []
+    progress = backfill.run_backfill(engine, backfill.CONTACT_BIRTHDAY_ORDINAL, chunk_size=30,
+                                     target_chunk_seconds=None, report_interval=0, report=reports.append)
+    assert progress.finished and progress.chunks == 4
+    assert progress.rows_scanned == 100 and progress.rows_updated == 80
+    assert progress.fraction == 1.0 and progress.eta == 0.0
+    assert len(reports) == 4 and "rows/s" in str(reports[-1])
+    values = ordinals(engine)
+    assert values[1] == 202 and values[12] == 113 and values[5] is None
+
+    # a finished backfill is not run again, unless restarted
+    assert backfill.run_backfill(engine, backfill.CONTACT_BIRTHDAY_ORDINAL).chunks == 0
+    progress = backfill.run_backfill(engine, backfill.CONTACT_BIRTHDAY_ORDINAL, restart=True)
+    assert progress.rows_scanned == 100 and progress.rows_updated == 0
+
+
+def test_interrupted_backfill_resumes_from_the_checkpoint(engine):
+    def failing(row):
+        if row["id"] == 55:
+            raise RuntimeError("interrupted")
+        return backfill._compute_birthday_ordinal(row)
+
+    broken = backfill.Backfill("contact-birthday-ordinal", backfill.CONTACT_BIRTHDAY_ORDINAL.table,
+                               ["birthday", "birthday_ordinal"], failing)
+    with pytest.raises(RuntimeError):
+        backfill.run_backfill(engine, broken, chunk_size=20, target_chunk_seconds=None)
+    values = ordinals(engine)
+    assert values[39] is not None and values[41] is None  # the failed chunk was rolled back
+
+    progress = backfill.run_backfill(engine, backfill.CONTACT_BIRTHDAY_ORDINAL, chunk_size=20,
+                                     target_chunk_seconds=None)
+    assert progress.start_key == 40 and progress.run_rows == 60 and progress.rows_scanned == 100
+    assert None not in [value for key, value in ordinals(engine).items() if key % 5]
+
+
+def test_update_skips_rows_changed_since_they_were_read(engine):
+    definition = backfill.CONTACT_BIRTHDAY_ORDINAL
+    with engine.begin() as connection:
+        connection.execute(update(models.Contact.__table__).where(models.Contact.id == 1)
+                           .values(birthday=date(1990, 7, 4)))
+        stale = {"_key": 1, "_old_birthday": date(1990, 2, 2), "_old_birthday_ordinal": None,
+                 "birthday_ordinal": 202}
+        fresh = {"_key": 2, "_old_birthday": date(1990, 3, 3), "_old_birthday_ordinal": None,
+                 "birthday_ordinal": 303}
+        assert connection.execute(definition.update(["birthday_ordinal"]), [stale, fresh]).rowcount == 1
+    values = ordinals(engine)
+    assert values[1] is None and values[2] == 303
+
+
+def test_throttle_waits_while_the_database_is_overloaded(engine):
+    sleeps = []
+    reasons = iter(["replication lag 12.0s", "replication lag 6.0s", None])
+
+    class Lagging(backfill.Throttle):
+        def overloaded(self, connection):
+            return next(reasons)
+
+    throttle = Lagging(pause=0.1, poll_interval=2, sleep=sleeps.append)
+    with engine.connect() as connection:
+        throttle.wait(connection)
+    assert sleeps == [0.1, 2, 2] and throttle.waited == 4
+
+    # other databases than PostgreSQL report no lag
+    with engine.connect() as connection:
+        assert backfill.Throttle(max_replication_lag=0, max_active_queries=0).overloaded(connection) is None
+
+
+def test_chunk_size_adapts_to_slow_chunks(engine, monkeypatch):
+    sizes = []
+    clock = iter(range(0, 10000, 2))
+    monkeypatch.setattr(backfill.time, "monotonic", lambda: next(clock))
+    original = backfill.Backfill.chunk
+
+    def recording(self, last_key, size):
+        sizes.append(size)
+        return original(self, last_key, size)
+
+    monkeypatch.setattr(backfill.Backfill, "chunk", recording)
+    backfill.run_backfill(engine, backfill.CONTACT_BIRTHDAY_ORDINAL, chunk_size=40, target_chunk_seconds=1)
+    assert sizes[:3] == [40, 20, 10]
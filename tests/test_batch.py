@@ -0,0 +1,22 @@
+import asyncio
+from fastapi import FastAPI
+from ..contactpr import batch, schemas
+from ..contactpr.models import User
+
+
+def test_failing_sub_request_only_fails_its_item():
+    app = FastAPI()
+
+    @app.get("/contacts/{contact_id}")
+    async def read_contact(contact_id: int):
+        if contact_id == 2:
+            raise RuntimeError("boom")
+        return {"id": contact_id}
+
+    items = [schemas.BatchRequestItem(id=str(number), path=f"/contacts/{number}") for number in (1, 2, 3)]
+    scope = {"type": "http", "headers": [], "server": ("test", 80), "client": ("test", 1)}
+    responses = asyncio.run(batch.run(app, scope, items, User(id=1, email="owner@example.com")))
+
+    assert [response["status"] for response in responses] == [200, 500, 200]
+    assert responses[1]["body"] == {"detail": "Internal Server Error"}
+    assert responses[2]["body"] == {"id": 3}
@@ -0,0 +1,93 @@
+import time
+from sqlalchemy import create_engine
+from ..contactpr.cache import ContactQueryCache, DatabaseGenerations, InMemorySharedTier, LocalLRU
+from ..contactpr.models import Base
+
+
+def counting_loader(result):
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return result
+    return loader, calls
+
+
+def test_read_through_and_generation_invalidation():
+    cache = ContactQueryCache(LocalLRU(1024))
+    loader, calls = counting_loader([{"id": 1}])
+
+    assert cache.get_or_load("contacts", 1, loader) == [{"id": 1}]
+    assert cache.get_or_load("contacts", 1, loader) == [{"id": 1}]
+    assert len(calls) == 1
+
+    cache.on_change({"type": "contact.updated", "owner_id": 2, "contact_id": 5})
+    cache.get_or_load("contacts", 1, loader)
+    assert len(calls) == 1
+
+    cache.on_change({"type": "contact.updated", "owner_id": 1, "contact_id": 1})
+    cache.get_or_load("contacts", 1, loader)
+    assert len(calls) == 2
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 2
+
+
+def test_none_results_are_not_cached():
+    cache = ContactQueryCache(LocalLRU(1024))
+    loader, calls = counting_loader(None)
+    cache.get_or_load("contact:1", 1, loader)
+    cache.get_or_load("contact:1", 1, loader)
+    assert len(calls) == 2
+
+
+def test_local_tier_evicts_and_expires():
+    local = LocalLRU(max_bytes=10)
+    local.set("a", "a", 6, ttl=60)
+    local.set("b", "b", 6, ttl=60)
+    assert local.get("a") is None
+    assert local.evictions == 1
+
+    local.set("c", "c", 1, ttl=-1)
+    assert local.get("c") is None
+    assert local.expirations == 1
+
+
+def test_shared_tier_is_used_across_workers():
+    shared = InMemorySharedTier()
+    first = ContactQueryCache(LocalLRU(1024), shared)
+    second = ContactQueryCache(LocalLRU(1024), shared)
+    loader, calls = counting_loader([{"id": 1}])
+
+    first.get_or_load("contacts", 1, loader)
+    assert second.get_or_load("contacts", 1, loader) == [{"id": 1}]
+    assert second.stats()["shared_hits"] == 1
+
+    first.bump(1)
+    second.get_or_load("contacts", 1, loader)
+    assert len(calls) == 2
+
+
+def test_database_generations_invalidate_other_workers():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    first = ContactQueryCache(LocalLRU(1024), generations=DatabaseGenerations(engine, ttl=0.05))
+    second_generations = DatabaseGenerations(engine, ttl=0.05)
+    second = ContactQueryCache(LocalLRU(1024), generations=second_generations)
+    loader, calls = counting_loader([{"id": 1}])
+
+    for _ in range(10):
+        second.get_or_load("contacts", 1, loader)
+    assert len(calls) == 1
+    # hits reuse the generation instead of reading it for every request
+    assert second_generations.reads == 1
+
+    first.on_change({"type": "contact.updated", "owner_id": 1, "contact_id": 1})
+    first.on_change({"type": "contact.updated", "owner_id": 1, "contact_id": 1})
+    # bumps take effect in their own worker at once, in others within the ttl
+    assert first.generation(1) == 2
+    assert second.cached_generation(1) == 0
+    time.sleep(0.06)
+    assert second.cached_generation(1) is None
+    assert second.generation(1) == 2
+    second.get_or_load("contacts", 1, loader)
+    assert len(calls) == 2
@@ -0,0 +1,86 @@
+import os
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from ..contactpr import models, schemas
+from ..repository import custom_fields
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def db(request):
+    if request.param == "sqlite":
+        engine = create_engine("sqlite://")
+    else:
+        url = os.environ.get("TEST_POSTGRES_URL")
+        if not url:
+            pytest.skip("TEST_POSTGRES_URL is not set")
+        engine = create_engine(url)
+        models.Base.metadata.drop_all(engine)
+    models.Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add(models.User(id=1, email="owner@example.com", hashed_password="x"))
+    fields = [
+        {"company": "Acme", "age": 30, "vip": True, "langs": ["en", "uk"]},
+        {"company": "Acme", "age": 41, "address": {"city": "Kyiv"}},
+        {"company": "Globex", "vip": False, "langs": ["en"]},
+        None,
+        {"company": "1", "vip": 1, "langs": "en"},
+    ]
+    for number, data in enumerate(fields, start=1):
+        session.add(models.Contact(id=number, first_name=f"First{number}", last_name="Last",
+                                   email=f"c{number}@example.com", phone_number=str(number),
+                                   additional_data=data, owner_id=1))
+    session.commit()
+    yield session
+    session.close()
+    if request.param == "postgresql":
+        models.Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+def matching(db, **params):
+    criteria = custom_fields.parse_filters(**params)
+    return sorted(contact.id for contact in custom_fields.contacts_by_custom_fields(db, 1, criteria))
+
+
+def test_equality_filters(db):
+    assert matching(db, fields=["company:Acme"]) == [1, 2]
+    assert matching(db, fields=["company:Acme", "age:41"]) == [2]
+    assert matching(db, fields=["vip:true"]) == [1]
+    assert matching(db, fields=["vip:false"]) == [3]
+
+
+def test_values_only_match_the_same_json_type(db):
+    assert matching(db, fields=["vip:1"]) == [5]
+    assert matching(db, fields=["company:1"]) == []
+    assert matching(db, contains='{"company": "1"}') == [5]
+    assert matching(db, contains='{"age": 30.0}') == [1]
+
+
+def test_containment_filters(db):
+    assert matching(db, contains='{"langs": ["en"]}') == [1, 3]
+    assert matching(db, contains='{"langs": ["uk", "en"]}') == [1]
+    assert matching(db, contains='{"address": {"city": "Kyiv"}}') == [2]
+
+
+def test_lists_only_match_arrays(db):
+    assert matching(db, contains='{"langs": ["en"]}') == [1, 3]
+    assert matching(db, contains='{"langs": []}') == [1, 3]
+    assert matching(db, contains='{"langs": "en"}') == [5]
+
+
+def test_invalid_filters():
+    with pytest.raises(ValueError):
+        custom_fields.parse_filters(fields=["company"])
+    with pytest.raises(ValueError):
+        custom_fields.parse_filters(contains="[1, 2]")
+    with pytest.raises(ValueError):
+        custom_fields.parse_filters(contains='{"address": {}}')
+    assert custom_fields.parse_filters() == {}
+
+
+def test_schema_accepts_legacy_strings():
+    base = {"first_name": "A", "last_name": "B", "email": "a@b.com", "phone_number": "1"}
+    assert schemas.ContactCreate(**base, additional_data="call after 6").additional_data == {"note": "call after 6"}
+    assert schemas.ContactCreate(**base, additional_data='{"vip": true}').additional_data == {"vip": True}
+    assert schemas.ContactUpdate(additional_data={"age": 30}).additional_data == {"age": 30}
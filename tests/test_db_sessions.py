@@ -0,0 +1,76 @@
+import pytest
+from fastapi import APIRouter, BackgroundTasks, Depends, FastAPI, Request
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, exc, select
+from sqlalchemy.orm import sessionmaker
+from ..contactpr import models
+from ..contactpr.database import RoutingSession, SessionScopedRoute, TimedQueuePool, _open, release
+
+
+@pytest.fixture()
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sessions.db'}", poolclass=TimedQueuePool, pool_size=1,
+                           max_overflow=0, pool_timeout=0.05, connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(models.User.__table__.insert().values(id=1, email="owner@example.com"))
+    yield engine
+    engine.dispose()
+
+
+def test_pool_reports_checkouts_timeouts_and_hold_times(engine):
+    pool = engine.pool
+    checkouts = pool.metrics.checkouts
+    with engine.connect():
+        assert pool.metrics.stats(pool)["in_use"] == 1
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+    stats = pool.metrics.stats(pool)
+    assert stats["checkouts"] == checkouts + 1 and stats["timeouts"] == 1
+    assert stats["in_use"] == 0 and stats["max_wait_ms"] >= 50 and stats["max_hold_ms"] > 0
+
+    # dispose() replaces the pool but keeps counting
+    engine.dispose()
+    with engine.connect():
+        pass
+    assert engine.pool.metrics.stats(engine.pool)["checkouts"] == checkouts + 2
+
+
+def test_read_only_session_refuses_writes_and_releases_its_connection(engine):
+    db = sessionmaker(class_=RoutingSession, bind=engine, read_only=True, expire_on_commit=False)()
+    user = db.execute(select(models.User)).scalar_one()
+    assert engine.pool.checkedout() == 1
+    release(db)
+    assert engine.pool.checkedout() == 0
+    assert user.email == "owner@example.com"  # still loaded, no new checkout
+    assert engine.pool.checkedout() == 0
+
+    db.add(models.Contact(first_name="John", owner_id=1))
+    with pytest.raises(exc.InvalidRequestError):
+        db.flush()
+    db.close()
+
+
+def test_route_closes_sessions_before_background_tasks(engine):
+    factory = sessionmaker(class_=RoutingSession, bind=engine)
+    in_use = []
+
+    def session(request: Request):
+        db = _open(factory, request)
+        try:
+            yield db
+        finally:
+            db.close()
+
+    router = APIRouter(route_class=SessionScopedRoute)
+
+    @router.get("/users/count")
+    def count_users(background_tasks: BackgroundTasks, db=Depends(session)):
+        background_tasks.add_task(lambda: in_use.append(engine.pool.checkedout()))
+        return {"count": len(db.execute(select(models.User.id)).all())}
+
+    app = FastAPI()
+    app.include_router(router)
+    response = TestClient(app).get("/users/count")
+    assert response.json() == {"count": 1}
+    assert in_use == [0]
@@ -0,0 +1,169 @@
+import asyncio
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from ..contactpr import events, routes
+from ..contactpr.cache import ContactQueryCache, LocalLRU
+from ..contactpr.events import ChangeBroker
+from ..contactpr.models import User
+
+
+class FlakyBackend:
+    """
+    Backend whose first connection drops; the second one delivers ``event`` from another worker.
+    """
+
+    def __init__(self, event):
+        self.event = event
+        self.connections = 0
+
+    async def listen(self, deliver, subscribed):
+        self.connections += 1
+        subscribed()
+        if self.connections == 1:
+            raise ConnectionError("connection reset")
+        deliver(self.event)
+        await asyncio.Event().wait()
+
+
+class DownBackend:
+    def publish(self, event):
+        raise ConnectionError("connection refused")
+
+
+def test_events_reach_subscriptions_and_listeners_of_the_owner():
+    broker = ChangeBroker(buffer_size=10)
+    heard = []
+    broker.add_listener(heard.append)
+
+    async def scenario():
+        mine, other = broker.subscribe(1), broker.subscribe(2)
+        broker.publish({"type": "contact.created", "owner_id": 1, "contact_id": 5})
+        await asyncio.sleep(0)
+        event = await mine.get(1)
+        assert await other.get(0.01) is None
+        broker.unsubscribe(mine)
+        broker.unsubscribe(other)
+        return event
+
+    event = asyncio.run(scenario())
+    assert event["contact_id"] == 5 and heard == [event]
+    assert broker.connections() == 0
+    # events of this worker coming back from the backend are not applied twice
+    broker.deliver(event)
+    assert len(heard) == 1
+
+
+def test_revocations_reach_listeners_but_not_connections():
+    broker = ChangeBroker(buffer_size=10)
+    heard = []
+    broker.add_listener(heard.append)
+
+    async def scenario():
+        subscription = broker.subscribe(1)
+        broker.publish({"type": "auth.revoked", "owner_id": 1, "family_id": "f"})
+        # as if from another worker through the backend
+        broker.deliver({"type": "auth.revoked", "owner_id": 1, "family_id": "g", "origin": "other"})
+        await asyncio.sleep(0)
+        try:
+            return await subscription.get(0.01)
+        finally:
+            broker.unsubscribe(subscription)
+
+    assert asyncio.run(scenario()) is None
+    assert [event["family_id"] for event in heard] == ["f", "g"]
+
+
+def test_slow_subscription_is_told_to_resync():
+    broker = ChangeBroker(buffer_size=2)
+
+    async def scenario():
+        subscription = broker.subscribe(1)
+        for seq in range(5):
+            broker.publish({"type": "contact.updated", "owner_id": 1, "contact_id": 1, "seq": seq})
+        await asyncio.sleep(0)
+        return [await subscription.get(0.01) for _ in range(3)]
+
+    resync, after, idle = asyncio.run(scenario())
+    assert resync == {"type": "resync", "owner_id": 1}
+    assert after is None and idle is None
+
+
+def test_backend_reconnects_and_resyncs(monkeypatch):
+    monkeypatch.setattr(events, "RECONNECT_MIN_SECONDS", 0.01)
+    broker = ChangeBroker(buffer_size=10)
+    remote = {"type": "contact.deleted", "owner_id": 1, "contact_id": 9, "origin": "other-worker"}
+    broker.backend = FlakyBackend(remote)
+    heard = []
+    broker.add_listener(heard.append)
+
+    async def scenario():
+        subscription = broker.subscribe(1)
+        broker._listen_task = asyncio.ensure_future(broker._listen())
+        received = [await subscription.get(1), await subscription.get(1)]
+        await broker.stop()
+        return received
+
+    resync, event = asyncio.run(scenario())
+    assert broker.backend.connections == 2
+    assert resync == {"type": "resync", "owner_id": 1}
+    assert event == remote
+    assert [event["type"] for event in heard] == ["resync", "contact.deleted"]
+
+
+def test_caches_drop_everything_on_resync():
+    cache = ContactQueryCache(LocalLRU(1024))
+    loads = []
+    cache.bump(1)
+    cache.get_or_load("contacts", 1, lambda: loads.append(1) or [1])
+    cache.get_or_load("contacts", 2, lambda: loads.append(2) or [2])
+    cache.on_change({"type": "resync", "owner_id": None})
+    cache.get_or_load("contacts", 1, lambda: loads.append(1) or [1])
+    cache.get_or_load("contacts", 2, lambda: loads.append(2) or [2])
+    assert loads == [1, 2, 1, 2]
+    assert cache.generation(1) > 1 and cache.generation(2) > 0
+
+
+def test_failed_backend_publish_is_delivered_locally():
+    broker = ChangeBroker(buffer_size=10)
+    broker.backend = DownBackend()
+
+    async def scenario():
+        subscription = broker.subscribe(3)
+        broker.publish({"type": "contact.created", "owner_id": 3, "contact_id": 1})
+        return await subscription.get(1)
+
+    assert asyncio.run(scenario())["contact_id"] == 1
+
+
+def test_stream_sends_heartbeats_and_events(monkeypatch):
+    monkeypatch.setattr(routes, "_authenticate_stream", lambda token: User(id=41, email="a@example.com"))
+    monkeypatch.setattr(routes.settings, "events_heartbeat_seconds", 0.01)
+
+    async def scenario():
+        response = await routes.stream_contacts(token="token")
+        frames = response.body_iterator
+        received = [await frames.__anext__(), await frames.__anext__()]
+        events.broker.publish({"type": "contact.created", "owner_id": 41, "contact_id": 2, "seq": 7})
+        received.append(await frames.__anext__())
+        await frames.aclose()
+        return received
+
+    connected, ping, created = asyncio.run(scenario())
+    assert connected == ": connected\n\n" and ping == ": ping\n\n"
+    assert created.startswith("id: 7\nevent: contact.created\n") and '"origin"' not in created
+    assert events.broker.connections() == 0
+
+
+def test_websocket_pushes_events_and_heartbeats(monkeypatch):
+    monkeypatch.setattr(routes, "_authenticate_stream", lambda token: User(id=42, email="a@example.com"))
+    monkeypatch.setattr(routes.settings, "events_heartbeat_seconds", 0.05)
+    app = FastAPI()
+    app.include_router(routes.router)
+
+    with TestClient(app).websocket_connect("/contacts/ws?token=token") as websocket:
+        assert websocket.receive_json() == {"type": "ping"}
+        events.broker.publish({"type": "contact.deleted", "owner_id": 42, "contact_id": 3, "seq": 8})
+        message = websocket.receive_json()
+        while message["type"] == "ping":
+            message = websocket.receive_json()
+    assert message == {"type": "contact.deleted", "owner_id": 42, "contact_id": 3, "seq": 8}
@@ -0,0 +1,39 @@
+import datetime
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from ..contactpr import models
+from ..repository import custom_fields, queries
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add(models.User(id=1, email="owner@example.com", hashed_password="x"))
+    session.add(models.Contact(id=1, first_name="John", last_name="Doe", email="john@example.com",
+                               phone_number="123", birthday=datetime.date(1990, 5, 1),
+                               additional_data={"company": "Acme"}, owner_id=1))
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_projection_selects_only_requested_columns(db):
+    statement = queries.project(queries.CONTACTS_BY_OWNER, ("id", "first_name"))
+    assert [column.name for column in statement.selected_columns] == ["id", "first_name"]
+    assert "additional_data" not in str(statement)
+    assert queries.project(queries.CONTACTS_BY_OWNER, ("id", "first_name")) is statement
+
+
+def test_contact_fields(db):
+    rows = queries.contact_fields(db, queries.CONTACTS_BY_OWNER, {"owner_id": 1}, ("id", "phone_number"))
+    assert rows == [{"id": 1, "phone_number": "123"}]
+    rows = queries.contact_fields(db, queries.CONTACT_BY_ID, {"contact_id": 1}, ("id", "birthday"))
+    assert rows == [{"id": 1, "birthday": datetime.date(1990, 5, 1)}]
+
+
+def test_custom_field_filters_with_fieldset(db):
+    rows = custom_fields.contact_fields_by_custom_fields(db, 1, {"company": "Acme"}, ("id", "last_name"))
+    assert rows == [{"id": 1, "last_name": "Doe"}]
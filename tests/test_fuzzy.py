@@ -0,0 +1,46 @@
+from ..contactpr.fuzzy import FuzzyIndex, edit_distance, normalize, phonetic_key
+
+
+def make_index():
+    return FuzzyIndex([
+        (1, "John", "Doe", "john@example.com", 1),
+        (2, "Oleksandr", "Shevchenko", "olek@example.com", 2),
+        (3, "Олександр", "Коваленко", "kov@example.com", 3),
+        (4, "Joanna", "Smith", "jo@example.com", 4),
+        (5, "Jon", "Dow", "jon@example.com", 5),
+    ])
+
+
+def test_normalization_and_phonetic_keys():
+    assert normalize("Zoë Anne-Marie") == ["zoe", "anne", "marie"]
+    assert normalize("Олександр") == ["oleksandr"]
+    assert {phonetic_key(word) for word in ("oleksandr", "olexandr", "alexander")} == {"ALKSNDR"}
+    assert phonetic_key("catherine") == phonetic_key("kathryn")
+    assert edit_distance("jonh", "john", 1) == 1
+    assert edit_distance("jonathan", "john", 1) == 2
+
+
+def test_typos_and_sound_alike_spellings():
+    index = make_index()
+    # equally close matches: the most recently changed contact first
+    assert [match["id"] for match in index.search("Jonh", 10)] == [5, 1]
+    assert index.search("John", 10)[0]["score"] == 1.0
+    assert [match["id"] for match in index.search("Olexandr", 10)] == [3, 2]
+    assert [match["id"] for match in index.search("Олександр", 10)] == [3, 2]
+    assert [match["id"] for match in index.search("oleksandr shevchneko", 10)] == [2]
+    assert [match["id"] for match in index.search("John Doe", 10)] == [1, 5]
+    assert index.search("xyz", 10) == []
+
+
+def test_apply_events():
+    index = make_index()
+    cost = index.cost()
+    index.apply({"type": "contact.updated", "contact_id": 1, "seq": 6,
+                 "contact": {"first_name": "Jonathan", "last_name": "Doe", "email": "jd@example.com"}})
+    assert [match["id"] for match in index.search("jonh", 10)] == [5]
+    assert index.search("jonathon", 10)[0]["first_name"] == "Jonathan"
+
+    index.apply({"type": "contact.deleted", "contact_id": 5})
+    index.apply({"type": "contact.deleted", "contact_id": 1})
+    assert index.search("jon", 10) == []
+    assert index.cost() < cost
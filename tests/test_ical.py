@@ -0,0 +1,74 @@
+import datetime
+from ..contactpr.ical import BirthdayFeedCache, render_event, feed_token, verify_feed_token
+
+
+def test_render_event_leap_day_and_escaping():
+    vevent = render_event(7, "Ann, Jr.", "Doe;", datetime.date(1992, 2, 29), datetime.datetime(2026, 3, 4, 5, 6, 7))
+    assert "DTSTART;VALUE=DATE:19920229\r\n" in vevent
+    # DTSTAMP is the last change of the contact, not the birthday
+    assert "DTSTAMP:20260304T050607Z\r\n" in vevent
+    assert "RRULE:FREQ=YEARLY;BYMONTH=2;BYMONTHDAY=-1\r\n" in vevent
+    assert "SUMMARY:Birthday: Ann\\, Jr. Doe\\;\r\n" in vevent
+
+
+def test_feed_token():
+    assert verify_feed_token(1, feed_token(1))
+    assert not verify_feed_token(2, feed_token(1))
+
+
+def test_cache_hit_does_not_call_loader_and_applies_changes():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return [(1, "John", "Doe", datetime.date(1990, 1, 1), datetime.datetime(2026, 1, 2))]
+
+    cache = BirthdayFeedCache(max_feeds=10)
+    body, etag = cache.get(1, loader)
+    assert b"Birthday: John Doe" in body
+    assert cache.get(1, loader) == (body, etag)
+    assert len(calls) == 1
+
+    cache.on_change({"type": "contact.created", "owner_id": 1, "contact_id": 2, "updated_at": "2026-05-06T07:08:09",
+                     "contact": {"first_name": "Jane", "last_name": "Roe", "birthday": "1991-05-03"}})
+    body, new_etag = cache.get(1, loader)
+    assert b"Birthday: Jane Roe" in body
+    assert b"DTSTAMP:20260506T070809Z" in body
+    assert new_etag != etag
+
+    cache.on_change({"type": "contact.deleted", "owner_id": 1, "contact_id": 1})
+    body, _ = cache.get(1, loader)
+    assert b"John" not in body
+    assert len(calls) == 1
+
+
+def test_cache_evicts_least_recently_used():
+    cache = BirthdayFeedCache(max_feeds=1)
+    cache.get(1, lambda: [])
+    cache.get(2, lambda: [])
+    assert cache.peek(1) is None
+    assert cache.peek(2) is not None
+
+
+def test_feed_is_reloaded_when_the_generation_moves():
+    generations = {1: 0}
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return [(1, "John", "Doe", datetime.date(1990, 1, 1), datetime.datetime(2026, 1, 2))]
+
+    known = {}
+    cache = BirthdayFeedCache(max_feeds=10, generation=generations.get, cached_generation=known.get)
+    cache.get(1, loader)
+    cache.get(1, loader)
+    assert len(calls) == 1
+    # peek answers only while the generation is known without reading it
+    assert cache.peek(1) is None
+    known[1] = 0
+    assert cache.peek(1) is not None
+
+    generations[1] = known[1] = 1
+    assert cache.peek(1) is None
+    cache.get(1, loader)
+    assert len(calls) == 2
@@ -0,0 +1,160 @@
+import asyncio
+import time
+from fastapi import FastAPI, HTTPException
+from sqlalchemy import create_engine
+from ..auth import create_jwt_token
+from ..contactpr.idempotency import DatabaseIdempotencyStore, IdempotencyMiddleware, InMemoryIdempotencyStore
+from ..contactpr.models import Base
+
+ANN = b"Bearer " + create_jwt_token({"sub": "ann@example.com"}).encode()
+BOB = b"Bearer " + create_jwt_token({"sub": "bob@example.com"}).encode()
+
+
+def _app(calls):
+    app = FastAPI()
+
+    @app.post("/contacts/", status_code=201)
+    async def create_contact(body: dict):
+        calls.append(body)
+        await asyncio.sleep(0.05)
+        if body.get("fail"):
+            raise RuntimeError("database unavailable")
+        if body.get("duplicate"):
+            raise HTTPException(status_code=409, detail="exists")
+        if body.get("invalid"):
+            raise HTTPException(status_code=400, detail="invalid")
+        if body.get("throttled"):
+            raise HTTPException(status_code=429, detail="too many requests")
+        return {"id": len(calls), **body}
+
+    return app
+
+
+async def _post(app, body: bytes, key=b"key-1", authorization=ANN, path="/contacts/"):
+    headers = [(b"content-type", b"application/json"), (b"authorization", authorization)]
+    if key is not None:
+        headers.append((b"idempotency-key", key))
+    scope = {"type": "http", "method": "POST", "path": path, "raw_path": path.encode(), "query_string": b"",
+             "headers": headers, "root_path": "", "scheme": "http", "server": ("test", 80),
+             "client": ("test", 1), "http_version": "1.1"}
+    messages, chunks = [], [body]
+
+    async def receive():
+        if chunks:
+            return {"type": "http.request", "body": chunks.pop(), "more_body": False}
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        messages.append(message)
+
+    try:
+        await app(scope, receive, send)
+    except RuntimeError:
+        return 500, {}, b""
+    return messages[0]["status"], dict(messages[0]["headers"]), b"".join(m.get("body", b"") for m in messages[1:])
+
+
+def test_retries_replay_the_first_response():
+    calls = []
+    app = IdempotencyMiddleware(_app(calls), InMemoryIdempotencyStore())
+
+    async def scenario():
+        first = await _post(app, b'{"name": "Ann"}')
+        retry = await _post(app, b'{"name": "Ann"}')
+        # a new token of the same user (e.g. after a refresh) still replays
+        token = create_jwt_token({"sub": "ann@example.com", "fam": "2"})
+        refreshed = await _post(app, b'{"name": "Ann"}', authorization=b"Bearer " + token.encode())
+        other_user = await _post(app, b'{"name": "Ann"}', authorization=BOB)
+        no_key = await _post(app, b'{"name": "Ann"}', key=None)
+        return first, retry, refreshed, other_user, no_key
+
+    first, retry, refreshed, other_user, no_key = asyncio.run(scenario())
+    assert first[0] == retry[0] == 201
+    assert retry[2] == refreshed[2] == first[2]
+    assert retry[1][b"idempotent-replayed"] == b"true"
+    assert b"idempotent-replayed" not in first[1]
+    assert len(calls) == 3
+    assert app.stats()["replays"] == 2
+
+
+def test_concurrent_duplicates_wait_for_the_first_execution():
+    calls = []
+    app = IdempotencyMiddleware(_app(calls), InMemoryIdempotencyStore())
+
+    async def scenario():
+        return await asyncio.gather(*(_post(app, b'{"name": "Ann"}') for _ in range(5)))
+
+    responses = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert {response[2] for response in responses} == {responses[0][2]}
+    assert app.stats()["waits"] == 4
+
+
+def test_key_reuse_with_another_body_is_rejected_and_errors_release_the_key():
+    calls = []
+    app = IdempotencyMiddleware(_app(calls), InMemoryIdempotencyStore())
+
+    async def scenario():
+        invalid = await _post(app, b'{"invalid": true}', key=b"k")
+        replayed_invalid = await _post(app, b'{"invalid": true}', key=b"k")
+        mismatch = await _post(app, b'{"name": "Bob"}', key=b"k")
+        failed = await _post(app, b'{"fail": true}', key=b"f")
+        retried = await _post(app, b'{"fail": true}', key=b"f")
+        return invalid, replayed_invalid, mismatch, failed, retried
+
+    invalid, replayed_invalid, mismatch, failed, retried = asyncio.run(scenario())
+    assert invalid[0] == replayed_invalid[0] == 400
+    assert replayed_invalid[1][b"idempotent-replayed"] == b"true"
+    assert mismatch[0] == 422
+    assert failed[0] == retried[0] == 500
+    assert [call for call in calls if call.get("fail")] == [{"fail": True}, {"fail": True}]
+
+
+def test_transient_statuses_are_not_replayed():
+    calls = []
+    app = IdempotencyMiddleware(_app(calls), InMemoryIdempotencyStore())
+
+    async def scenario():
+        throttled = [await _post(app, b'{"throttled": true}', key=b"t") for _ in range(2)]
+        conflicts = [await _post(app, b'{"duplicate": true}', key=b"d") for _ in range(2)]
+        return throttled + conflicts
+
+    responses = asyncio.run(scenario())
+    assert [response[0] for response in responses] == [429, 429, 409, 409]
+    assert all(b"idempotent-replayed" not in response[1] for response in responses)
+    assert len(calls) == 4
+
+
+def test_expired_records_are_swept_without_their_key_coming_back():
+    store = InMemoryIdempotencyStore()
+    for number in range(100):
+        store.claim(f"old-{number}", b"{}", ttl=0.01)
+    store.set("old-0", b"{}", ttl=60)
+    time.sleep(0.02)
+
+    assert store.claim("new", b"{}", ttl=60) is None
+    # only the key set again since and the new claim remain
+    assert len(store) == 2
+    assert store.get("old-0") == b"{}" and store.get("old-1") is None
+
+
+def test_database_store_is_shared_by_workers(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'idempotency.db'}")
+    Base.metadata.create_all(engine)
+    first, second = DatabaseIdempotencyStore(engine), DatabaseIdempotencyStore(engine)
+    calls = []
+    apps = [IdempotencyMiddleware(_app(calls), first), IdempotencyMiddleware(_app(calls), second)]
+
+    async def scenario():
+        return await asyncio.gather(*(_post(apps[number % 2], b'{"name": "Ann"}') for number in range(4)))
+
+    responses = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert {response[2] for response in responses} == {responses[0][2]}
+    assert sum(b"idempotent-replayed" in response[1] for response in responses) == 3
+    # an expired claim can be taken over, a live one cannot
+    assert first.claim("k", b"a", ttl=-1) is None
+    assert second.claim("k", b"b", ttl=60) is None
+    assert first.claim("k", b"c", ttl=60) == b"b"
+    second.delete("k")
+    assert first.get("k") is None
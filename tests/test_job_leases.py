@@ -0,0 +1,44 @@
+from datetime import timedelta
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from ..contactpr import maintenance, models
+from ..repository.job_leases import acquire_lease
+
+
+@pytest.fixture()
+def session_factory():
+    engine = create_engine("sqlite:///:memory:")
+    models.Base.metadata.create_all(engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def test_lease_is_held_by_one_worker_until_it_expires(session_factory):
+    db = session_factory()
+    assert acquire_lease(db, "purge", "a:1", timedelta(minutes=1))
+    assert not acquire_lease(db, "purge", "b:2", timedelta(minutes=1))
+    # the holder renews it; other jobs have leases of their own
+    assert acquire_lease(db, "purge", "a:1", timedelta(seconds=-1))
+    assert acquire_lease(db, "compact", "b:2", timedelta(minutes=1))
+    # an expired lease is taken over
+    assert acquire_lease(db, "purge", "b:2", timedelta(minutes=1))
+    assert not acquire_lease(db, "purge", "a:1", timedelta(minutes=1))
+    db.close()
+
+
+def test_shared_jobs_run_in_one_worker(monkeypatch, session_factory):
+    monkeypatch.setattr(maintenance, "SessionLocal", session_factory)
+    runs = []
+    job = lambda: runs.append(pid[0]) or len(runs)
+    pid = [1]
+    monkeypatch.setattr(maintenance.os, "getpid", lambda: pid[0])
+
+    monkeypatch.setattr(maintenance.settings, "web_workers", 1)
+    assert maintenance.leader_only("purge", 60, job) is job
+
+    monkeypatch.setattr(maintenance.settings, "web_workers", 4)
+    guarded = maintenance.leader_only("purge", 60, job)
+    for worker in (1, 2, 3, 4, 1, 2):
+        pid[0] = worker
+        guarded()
+    assert runs == [1, 1]
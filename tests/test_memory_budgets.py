@@ -0,0 +1,83 @@
+"""
+Peak allocation budgets of the list routes for a fixed dataset.
+
+Each request is measured with tracemalloc after a warm-up request and with
+the query cache invalidated, so the budget covers loading, serializing and
+caching the whole response. A route that starts materializing more than it
+used to (e.g. a list loaded twice, a query losing its column selection)
+fails here instead of showing up as worker RSS growth in production. Raise a
+budget only together with the change that justifies it.
+"""
+from datetime import date
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from ..main import app
+from ..auth import get_current_user, get_optional_user
+from ..contactpr import models
+from ..contactpr.cache import query_cache
+from ..contactpr.database import RoutingSession, get_db, get_read_db
+from ..contactpr.memprofile import peak_allocation
+
+CONTACTS = 2000
+
+# peak traced allocation of one request with CONTACTS contacts, in KiB
+BUDGETS_KIB = {
+    "/contacts/": 12288,
+    "/contacts/?fields=id,first_name": 2048,
+    "/contacts/search/?query=First1": 4608,
+    "/contacts/birthdays/": 4608,
+    "/contacts/7": 256,
+}
+
+
+@pytest.fixture(scope="module")
+def client():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(models.User.__table__.insert().values(id=1, email="owner@example.com"))
+        connection.execute(models.Contact.__table__.insert(), [
+            {"first_name": f"First{i}", "last_name": f"Last{i}", "email": f"contact{i}@example.com",
+             "phone_number": f"+38050{i:07d}", "birthday": date(1990, 1 + i % 12, 1 + i % 28),
+             "additional_data": "x" * 40, "owner_id": 1}
+            for i in range(CONTACTS)
+        ])
+    factory = sessionmaker(class_=RoutingSession, bind=engine, autoflush=False)
+    user = models.User(id=1, email="owner@example.com", confirmed=True)
+
+    def override_get_db():
+        db = factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    previous = dict(app.dependency_overrides)
+    app.dependency_overrides.update({
+        get_db: override_get_db,
+        get_read_db: override_get_db,
+        get_current_user: lambda: user,
+        get_optional_user: lambda: user,
+    })
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+    app.dependency_overrides.update(previous)
+    engine.dispose()
+
+
+def _invalidate():
+    query_cache.bump(1)
+    query_cache.bump("*")
+
+
+@pytest.mark.parametrize("path", BUDGETS_KIB)
+def test_route_stays_within_its_allocation_budget(client, path):
+    _invalidate()
+    assert client.get(path).status_code == 200
+    _invalidate()
+    response, peak = peak_allocation(client.get, path)
+    assert response.status_code == 200
+    assert peak <= BUDGETS_KIB[path] * 1024, f"{path} allocated {peak // 1024} KiB at peak"
@@ -0,0 +1,104 @@
+import asyncio
+from fastapi import FastAPI
+from ..contactpr import memprofile
+
+retained = []
+
+
+def _app():
+    app = FastAPI()
+
+    @app.get("/spike/{n}")
+    def spike(n: int):
+        rows = [{"id": i, "name": f"contact {i}"} for i in range(n)]
+        return {"count": len(rows)}
+
+    @app.get("/leak")
+    async def leak():
+        retained.append(bytearray(256 * 1024))
+        return {}
+
+    return app
+
+
+async def _request(app, path):
+    scope = {"type": "http", "method": "GET", "path": path, "raw_path": path.encode(), "query_string": b"",
+             "headers": [], "root_path": "", "scheme": "http", "server": ("test", 80), "client": ("test", 1),
+             "http_version": "1.1"}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return messages[0]["status"]
+
+
+def test_peak_allocation_measures_transient_memory():
+    result, peak = memprofile.peak_allocation(lambda n: len([str(i) for i in range(n)]), 50000)
+    assert result == 50000
+    assert peak > 50000 * 50
+
+
+def test_session_reports_peaks_and_retained_memory_per_route():
+    inner = _app()
+    app = memprofile.MemoryProfilerMiddleware(inner)
+
+    async def scenario():
+        session = memprofile.start(inner, seconds=10, requests=3)
+        assert await _request(app, "/spike/20000") == 200
+        assert await _request(app, "/spike/10") == 200
+        assert await _request(app, "/leak") == 200
+        await asyncio.wait_for(session.wait(), 5)
+        await asyncio.sleep(0)
+        return session.report()
+
+    report = asyncio.run(scenario())
+    assert memprofile.sessions.session is None
+    assert report["requests"] == 3 and report["overlapping_requests"] == 0
+    spike = report["routes"]["GET /spike/{n}"]
+    assert spike["requests"] == 2 and spike["max_peak_bytes"] > 1024 * 1024
+    assert spike["retained"]["size_diff"] < 64 * 1024
+    leak = report["routes"]["GET /leak"]["retained"]
+    assert leak["size_diff"] >= 256 * 1024
+    assert "bytearray" in leak["top"][0]["site"]
+
+
+def test_only_one_session_per_worker():
+    async def scenario():
+        session = memprofile.start(_app(), seconds=0.05)
+        try:
+            memprofile.start(_app(), seconds=0.05)
+        except memprofile.MemoryProfilerBusy:
+            busy = True
+        else:
+            busy = False
+        await session.wait()
+        await asyncio.sleep(0)
+        return busy
+
+    assert asyncio.run(scenario())
+    assert memprofile.sessions.session is None
+
+
+def test_concrete_path_is_resolved_to_its_route():
+    inner = _app()
+    app = memprofile.MemoryProfilerMiddleware(inner)
+
+    async def scenario():
+        session = memprofile.start(inner, seconds=10, route="/spike/10", requests=2)
+        assert await _request(app, "/leak") == 200
+        assert await _request(app, "/spike/10") == 200
+        assert await _request(app, "/spike/20") == 200
+        await asyncio.wait_for(session.wait(), 5)
+        await asyncio.sleep(0)
+        return session
+
+    session = asyncio.run(scenario())
+    assert session.route == "/spike/{n}"
+    report = session.report()
+    assert report["requests"] == 2
+    assert list(report["routes"]) == ["GET /spike/{n}"] and report["routes"]["GET /spike/{n}"]["requests"] == 2
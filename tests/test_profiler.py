@@ -0,0 +1,104 @@
+import asyncio
+import time
+from fastapi import FastAPI
+from ..contactpr import profiler
+
+
+def _app():
+    app = FastAPI()
+
+    @app.get("/busy/{n}")
+    def busy(n: int):
+        deadline = time.monotonic() + n / 1000
+        while time.monotonic() < deadline:
+            pass
+        return {"n": n}
+
+    return app
+
+
+async def _request(app, path):
+    scope = {"type": "http", "method": "GET", "path": path, "raw_path": path.encode(), "query_string": b"",
+             "headers": [], "root_path": "", "scheme": "http", "server": ("test", 80), "client": ("test", 1),
+             "http_version": "1.1"}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return messages[0]["status"]
+
+
+def test_idle_middleware_passes_requests_through():
+    app = profiler.ProfilerMiddleware(_app())
+    assert asyncio.run(_request(app, "/busy/1")) == 200
+    assert profiler.sessions.session is None
+
+
+def test_session_attributes_samples_to_routes_and_stops_after_requests():
+    inner = _app()
+    app = profiler.ProfilerMiddleware(inner)
+
+    async def scenario():
+        session = profiler.start(inner, seconds=10, route="/busy/{n}", requests=3, interval=0.001)
+        for _ in range(3):
+            assert await _request(app, "/busy/30") == 200
+        await asyncio.wait_for(session.wait(), 2)
+        await asyncio.sleep(0)
+        return session
+
+    session = asyncio.run(scenario())
+    assert profiler.sessions.session is None
+    assert session.finished_requests == 3
+    assert session.elapsed < 5
+    labels = {label for label, _ in session.samples}
+    assert labels == {"GET /busy/{n}"}
+    assert any("busy (" in frame for _, stack in session.samples for frame in stack)
+
+    line = session.collapsed().splitlines()[0]
+    assert line.startswith("GET /busy/{n};")
+    assert int(line.rsplit(" ", 1)[1]) >= 1
+    document = session.speedscope()
+    profile = document["profiles"][0]
+    assert profile["name"] == "GET /busy/{n}"
+    assert len(profile["samples"]) == len(profile["weights"])
+    assert max(max(stack) for stack in profile["samples"]) < len(document["shared"]["frames"])
+
+
+def test_only_one_session_per_worker():
+    async def scenario():
+        session = profiler.start(_app(), seconds=0.05)
+        try:
+            profiler.start(_app(), seconds=0.05)
+        except profiler.ProfilerBusy:
+            busy = True
+        else:
+            busy = False
+        await session.wait()
+        await asyncio.sleep(0)
+        return busy
+
+    assert asyncio.run(scenario())
+    assert profiler.sessions.session is None
+
+
+def test_concrete_path_is_resolved_to_its_route():
+    inner = _app()
+    app = profiler.ProfilerMiddleware(inner)
+
+    async def scenario():
+        session = profiler.start(inner, seconds=10, route="/busy/30", requests=2, interval=0.001)
+        for _ in range(2):
+            assert await _request(app, "/busy/30") == 200
+        await asyncio.wait_for(session.wait(), 2)
+        await asyncio.sleep(0)
+        return session
+
+    session = asyncio.run(scenario())
+    assert session.route == "/busy/{n}"
+    assert session.finished_requests == 2
+    assert {label for label, _ in session.samples} == {"GET /busy/{n}"}
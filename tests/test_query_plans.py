@@ -0,0 +1,405 @@
+"""
+Query-plan regression tests.
+
+Every SQL statement a route runs is captured while the route is called
+through the application, EXPLAINed against a seeded dataset and checked
+against the indexes the route must use: a new or changed query in
+contactpr/routes.py is checked without being registered here. SQLite always
+runs; PostgreSQL runs when TEST_POSTGRES_URL points to a scratch database
+(its tables are dropped afterwards) and also bounds the planner's row
+estimates.
+
+Plans are also compared with the snapshots in tests/query_plans/<dialect>.json
+recorded with the same database and SQLAlchemy versions, so any plan change
+fails with a diff. After reviewing a change, record the snapshots again with
+UPDATE_QUERY_PLANS=1.
+"""
+import difflib
+import json
+import os
+import random
+import re
+import sqlite3
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, FrozenSet, List, Optional
+import pytest
+import sqlalchemy
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from ..main import app
+from ..auth import get_current_user, get_optional_user
+from ..contactpr import autocomplete, fuzzy, models, tags as contact_tags
+from ..contactpr.cache import query_cache
+from ..contactpr.database import RoutingSession, get_db, get_read_db
+from ..repository import queries, stats as repository_stats, sync as repository_sync
+
+SNAPSHOTS = Path(__file__).parent / "query_plans"
+OWNERS = 20
+CONTACTS_PER_OWNER = 500
+OWNER_ID = 7
+# tables that grow with the data; a full scan of them is a regression
+LARGE_TABLES = frozenset({"contacts", "contact_tags", "contact_tombstones"})
+
+FIRST_NAMES = ["Oleksandr", "Olena", "Andrii", "Iryna", "Dmytro", "Kateryna", "Serhii", "Natalia", "Taras",
+               "Oksana", "Bohdan", "Yulia", "Mykola", "Sofiia", "Vasyl", "Mariia", "John", "Anna", "Peter",
+               "Emma"]
+LAST_NAMES = ["Shevchenko", "Kovalenko", "Bondarenko", "Tkachenko", "Kravchenko", "Melnyk", "Boiko",
+              "Kovalchuk", "Oliinyk", "Lysenko", "Marchenko", "Rudenko", "Savchenko", "Petrenko", "Smith",
+              "Brown", "Moroz", "Pavlenko", "Klymenko", "Hnatiuk"]
+DOMAINS = ["gmail.com", "ukr.net", "example.com", "i.ua", "outlook.com"]
+
+
+@dataclass(frozen=True)
+class Case:
+    """
+    A route call whose statements are checked.
+
+    Attributes:
+        label (str): Method and path, or a description for calls outside a route.
+        indexes (FrozenSet[str]): Indexes that must appear in the plans of the call;
+            ``a|b`` accepts either.
+        call (Callable, optional): Makes the call with the test client or a session;
+            by default a GET of the label's path.
+        max_rows (int): Upper bound of the row estimate of every statement (PostgreSQL only).
+        scans (FrozenSet[str]): Large tables the call may scan in full.
+    """
+    label: str
+    indexes: FrozenSet[str] = frozenset()
+    call: Optional[Callable] = field(default=None, compare=False)
+    max_rows: int = 1000
+    scans: FrozenSet[str] = frozenset()
+
+    def __str__(self):
+        return self.label
+
+
+def _get(path):
+    return lambda client, db: client.get(path)
+
+
+def _contact_id(owner_id: int, number: int) -> int:
+    return (owner_id - 1) * CONTACTS_PER_OWNER + number + 1
+
+
+# any index led by contacts.owner_id serves an owner's live contacts
+BY_OWNER = "ix_contacts_owner_live|ix_contacts_owner_birthday_ordinal|ix_contacts_owner_change_seq"
+# both cover live contacts by owner_id and cost the same for an owner_id lookup,
+# so which one is picked depends on the order they were created in
+TIED_INDEXES = re.compile(r"\bix_contacts_owner_(?:live|birthday_ordinal)\b")
+TIED_AS = "ix_contacts_owner_live"
+
+# contacts of OWNER_ID used by the cases below (the first ones are never soft-deleted)
+READ, UPDATED, DELETED, TAGGED = (_contact_id(OWNER_ID, number) for number in range(4))
+SYNC_SINCE = CONTACTS_PER_OWNER - 20
+# signed with SECRET_KEY, so it is kept out of the case label (the snapshot key)
+SYNC_TOKEN = repository_sync.encode_sync_token(OWNER_ID, SYNC_SINCE)
+
+CASES = [
+    Case("GET /contacts/", frozenset({BY_OWNER})),
+    Case("GET /contacts/?fields=id,first_name", frozenset({BY_OWNER})),
+    Case("GET /contacts/?field=company:Acme", frozenset({BY_OWNER})),
+    Case("GET /contacts/?tags=family", frozenset({BY_OWNER})),
+    Case(f"GET /contacts/{READ}", max_rows=1),
+    Case("GET /contacts/search/?query=oleks"),
+    Case("GET /contacts/birthdays/", frozenset({"ix_contacts_birthday_ordinal_live"})),
+    Case("GET /contacts/birthdays/?fields=id,birthday", frozenset({"ix_contacts_birthday_ordinal_live"})),
+    Case(f"GET /contacts/sync/ (since {SYNC_SINCE})",
+         frozenset({"ix_contacts_owner_change_seq", "ix_contact_tombstones_owner_change_seq"}),
+         call=lambda client, db: client.get(f"/contacts/sync/?token={SYNC_TOKEN}")),
+    Case("GET /contacts/autocomplete/?q=ol", frozenset({BY_OWNER})),
+    Case("GET /contacts/search/fuzzy/?q=olena", frozenset({BY_OWNER})),
+    Case("GET /tags/", frozenset({BY_OWNER})),
+    Case("GET /contacts/stats/", max_rows=100),
+    Case(f"PUT /contacts/{UPDATED}", max_rows=1,
+         call=lambda client, db: client.put(f"/contacts/{UPDATED}", json={"phone_number": "+380501112233"})),
+    Case(f"DELETE /contacts/{DELETED}", max_rows=1,
+         call=lambda client, db: client.delete(f"/contacts/{DELETED}")),
+    Case(f"POST /contacts/{DELETED}/restore", max_rows=1,
+         call=lambda client, db: client.post(f"/contacts/{DELETED}/restore")),
+    Case(f"PUT /contacts/{TAGGED}/tags", max_rows=10,
+         call=lambda client, db: client.put(f"/contacts/{TAGGED}/tags", json={"tags": ["work", "gym"]})),
+    Case("calendar feed", frozenset({BY_OWNER}),
+         call=lambda client, db: queries.birthdays_by_owner(db, OWNER_ID)),
+]
+
+
+def seed(engine) -> None:
+    """
+    Fills an empty database with OWNERS users of CONTACTS_PER_OWNER contacts each.
+
+    Names, birthdays, tags, custom fields and soft deletions are spread like
+    real address books, with a fixed random seed so that plans are repeatable.
+    """
+    rng = random.Random(2024)
+    models.Base.metadata.create_all(engine)
+    deleted_at = datetime(2026, 1, 1)
+    contacts, memberships, tombstones = [], [], []
+    for owner_id in range(1, OWNERS + 1):
+        for number in range(CONTACTS_PER_OWNER):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            birthday = date(1950, 1, 1) + timedelta(days=rng.randrange(365 * 55)) if rng.random() < 0.8 else None
+            contact_id = _contact_id(owner_id, number)
+            contacts.append({
+                "id": contact_id, "first_name": first, "last_name": last,
+                "email": f"{first}.{last}.{contact_id}@{rng.choice(DOMAINS)}".lower(),
+                "phone_number": f"+38050{contact_id:07d}", "birthday": birthday,
+                "birthday_ordinal": birthday.month * 100 + birthday.day if birthday else None,
+                "additional_data": {"company": rng.choice(["Acme", "Globex", "Initech", "Umbrella"])},
+                "owner_id": owner_id, "change_seq": number + 1,
+                "deleted_at": deleted_at if number >= 10 and rng.random() < 0.05 else None,
+            })
+            memberships.extend({"contact_id": contact_id, "tag_id": (owner_id - 1) * 5 + tag + 1}
+                               for tag in rng.sample(range(5), rng.randrange(3)))
+        tombstones.extend({"contact_id": 10 ** 6 + owner_id * 100 + number, "owner_id": owner_id,
+                           "change_seq": CONTACTS_PER_OWNER + number + 1, "deleted_at": deleted_at}
+                          for number in range(10))
+    with engine.begin() as connection:
+        connection.execute(models.User.__table__.insert(), [
+            {"id": owner_id, "email": f"owner{owner_id}@example.com", "hashed_password": "x", "confirmed": True}
+            for owner_id in range(1, OWNERS + 1)
+        ])
+        connection.execute(models.Tag.__table__.insert(), [
+            {"id": (owner_id - 1) * 5 + tag + 1, "owner_id": owner_id, "name": name}
+            for owner_id in range(1, OWNERS + 1)
+            for tag, name in enumerate(["family", "work", "friends", "gym", "school"])
+        ])
+        connection.execute(models.Contact.__table__.insert(), contacts)
+        connection.execute(models.contact_tags.insert(), memberships)
+        connection.execute(models.ContactTombstone.__table__.insert(), tombstones)
+        connection.execute(models.ContactSyncState.__table__.insert(), [
+            {"owner_id": owner_id, "last_seq": CONTACTS_PER_OWNER + 10, "compacted_seq": 0}
+            for owner_id in range(1, OWNERS + 1)
+        ])
+    db = sessionmaker(bind=engine)()
+    repository_stats.reconcile_contact_stats(db, OWNERS)
+    db.close()
+    with engine.begin() as connection:
+        connection.exec_driver_sql("ANALYZE")
+
+
+@dataclass
+class Plan:
+    """
+    EXPLAIN output of one captured statement.
+
+    Attributes:
+        sql (str): Statement.
+        lines (List[str]): Plan tree, one node per line.
+        indexes (set): Indexes the plan uses.
+        scans (set): Tables the plan reads in full.
+        rows (int, optional): Estimated rows of the top node (PostgreSQL only).
+    """
+    sql: str
+    lines: List[str]
+    indexes: set
+    scans: set
+    rows: Optional[int] = None
+
+
+SQLITE_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)$")
+SQLITE_INDEX = re.compile(r"USING (?:COVERING |INTEGER PRIMARY KEY|PRIMARY KEY)?(?:INDEX (\w+))?")
+
+
+def explain_sqlite(connection, sql: str, parameters) -> Plan:
+    rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + sql, parameters).all()
+    depth = {0: -1}
+    lines, indexes, scans = [], set(), set()
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node] + detail)
+        match = SQLITE_INDEX.search(detail)
+        if match and match.group(1):
+            indexes.add(match.group(1))
+        elif "USING INTEGER PRIMARY KEY" in detail:
+            indexes.add(f"{detail.split()[1]}_pkey")
+        elif "VIRTUAL TABLE" in detail:
+            indexes.add(detail.split()[1])
+        match = SQLITE_SCAN.match(detail)
+        if match:
+            scans.add(match.group(1))
+    return Plan(sql, lines, indexes, scans)
+
+
+def _walk(node, visit, depth=0):
+    visit(node, depth)
+    for child in node.get("Plans", ()):
+        _walk(child, visit, depth + 1)
+
+
+def explain_postgresql(connection, sql: str, parameters) -> Plan:
+    document = connection.exec_driver_sql("EXPLAIN (FORMAT JSON) " + sql, parameters).scalar()
+    root = (json.loads(document) if isinstance(document, str) else document)[0]["Plan"]
+    lines, indexes, scans = [], set(), set()
+
+    def visit(node, depth):
+        relation = f" on {node['Relation Name']}" if "Relation Name" in node else ""
+        index = f" using {node['Index Name']}" if "Index Name" in node else ""
+        lines.append("  " * depth + node["Node Type"] + relation + index)
+        if "Index Name" in node:
+            indexes.add(node["Index Name"])
+        if node["Node Type"] == "Seq Scan":
+            scans.add(node["Relation Name"])
+
+    _walk(root, visit)
+    return Plan(sql, lines, indexes, scans, root["Plan Rows"])
+
+
+EXPLAIN = {"sqlite": explain_sqlite, "postgresql": explain_postgresql}
+EXPLAINABLE = re.compile(r"^\s*(SELECT|WITH|UPDATE|DELETE)\b", re.IGNORECASE)
+
+
+def _versions(engine) -> str:
+    # plans depend on the planner, and the captured SQL on SQLAlchemy
+    if engine.dialect.name == "sqlite":
+        server = sqlite3.sqlite_version
+    else:
+        with engine.connect() as connection:
+            server = str(int(connection.exec_driver_sql("SHOW server_version_num").scalar()) // 10000)
+    return f"{engine.dialect.name} {server}, SQLAlchemy {sqlalchemy.__version__}"
+
+
+def capture_plans(engine) -> Dict[str, List[Plan]]:
+    """
+    Calls every case through the application and EXPLAINs the statements it ran.
+
+    Args:
+        engine: Seeded engine.
+
+    Returns:
+        Dict[str, List[Plan]]: Plans by case label.
+    """
+    factory = sessionmaker(class_=RoutingSession, bind=engine, autoflush=False)
+    user = models.User(id=OWNER_ID, email=f"owner{OWNER_ID}@example.com", confirmed=True)
+    statements = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def capture(connection, cursor, statement, parameters, context, executemany):
+        if not executemany and EXPLAINABLE.match(statement):
+            statements.append((statement, parameters))
+
+    def override_get_db():
+        db = factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    previous = dict(app.dependency_overrides)
+    app.dependency_overrides.update({
+        get_db: override_get_db,
+        get_read_db: override_get_db,
+        get_current_user: lambda: user,
+        get_optional_user: lambda: user,
+    })
+    plans = {}
+    try:
+        client = TestClient(app)
+        for case in CASES:
+            query_cache.bump(OWNER_ID)
+            query_cache.bump("*")
+            for cache in (autocomplete.index_cache, fuzzy.index_cache, contact_tags.index_cache):
+                cache.clear()
+            statements.clear()
+            db = factory()
+            try:
+                response = (case.call or _get(case.label.split(" ", 1)[1]))(client, db)
+            finally:
+                db.close()
+            assert getattr(response, "status_code", 200) < 400, f"{case}: {response.text}"
+            plans[case.label] = list(statements)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+        app.dependency_overrides.clear()
+        app.dependency_overrides.update(previous)
+    explain = EXPLAIN[engine.dialect.name]
+    with engine.connect() as connection:
+        return {label: [explain(connection, sql, parameters) for sql, parameters in captured]
+                for label, captured in plans.items()}
+
+
+def _render(plans: List[Plan]) -> List[str]:
+    lines = []
+    for plan in plans:
+        lines.append(" ".join(plan.sql.split()))
+        lines.extend("    " + TIED_INDEXES.sub(TIED_AS, line) for line in plan.lines)
+    return lines
+
+
+def _snapshot(dialect: str) -> Optional[dict]:
+    path = SNAPSHOTS / f"{dialect}.json"
+    return json.loads(path.read_text(encoding="utf-8")) if path.exists() else None
+
+
+def _diff(dialect: str, version: str, label: str, plans: List[Plan]) -> str:
+    snapshot = _snapshot(dialect)
+    if snapshot is None or snapshot["version"] != version or label not in snapshot["plans"]:
+        return "\n".join(["plan:"] + _render(plans))
+    return "\n".join(difflib.unified_diff(snapshot["plans"][label], _render(plans), "recorded plan",
+                                          "current plan", lineterm=""))
+
+
+@pytest.fixture(scope="module", params=["sqlite", "postgresql"])
+def captured(request, tmp_path_factory):
+    if request.param == "sqlite":
+        engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('plans') / 'contacts.db'}")
+    else:
+        url = os.environ.get("TEST_POSTGRES_URL")
+        if not url:
+            pytest.skip("TEST_POSTGRES_URL is not set")
+        engine = create_engine(url)
+        models.Base.metadata.drop_all(engine)
+    try:
+        seed(engine)
+        yield request.param, _versions(engine), capture_plans(engine)
+    finally:
+        if request.param == "postgresql":
+            models.Base.metadata.drop_all(engine)
+        engine.dispose()
+
+
+@pytest.mark.parametrize("case", CASES, ids=str)
+def test_route_uses_its_indexes(captured, case):
+    dialect, version, plans = captured
+    route_plans = plans[case.label]
+    assert route_plans, f"{case} ran no SQL"
+    used = set().union(*(plan.indexes for plan in route_plans))
+    scanned = set().union(*(plan.scans for plan in route_plans)) & (LARGE_TABLES - case.scans)
+    problems = []
+    missing = sorted(name for name in case.indexes if not used & set(name.split("|")))
+    if missing:
+        problems.append(f"indexes not used: {', '.join(missing)}")
+    if scanned:
+        problems.append(f"full scans of: {', '.join(sorted(scanned))}")
+    for plan in route_plans:
+        if plan.rows is not None and plan.rows > case.max_rows:
+            problems.append(f"estimated {plan.rows} rows, expected at most {case.max_rows}, for: "
+                            + " ".join(plan.sql.split()))
+    assert not problems, (f"{case} on {dialect}: " + "; ".join(problems) + "\n"
+                          + _diff(dialect, version, case.label, route_plans))
+
+
+def test_search_uses_the_text_index(captured):
+    dialect, version, plans = captured
+    search_plans = plans["GET /contacts/search/?query=oleks"]
+    index = {"sqlite": "contacts_fts", "postgresql": "ix_contacts_search_trgm"}[dialect]
+    assert any(index in plan.indexes for plan in search_plans), _diff(
+        dialect, version, "GET /contacts/search/?query=oleks", search_plans)
+
+
+def test_plans_match_the_recorded_snapshot(captured):
+    dialect, version, plans = captured
+    current = {label: _render(route_plans) for label, route_plans in plans.items()}
+    if os.environ.get("UPDATE_QUERY_PLANS"):
+        SNAPSHOTS.mkdir(exist_ok=True)
+        document = {"version": version, "plans": current}
+        (SNAPSHOTS / f"{dialect}.json").write_text(json.dumps(document, indent=2, ensure_ascii=False) + "\n",
+                                                    encoding="utf-8")
+        return
+    snapshot = _snapshot(dialect)
+    if snapshot is None or snapshot["version"] != version:
+        pytest.skip(f"no plan snapshot for {version}; record one with UPDATE_QUERY_PLANS=1")
+    changed = [label for label in current if current[label] != snapshot["plans"].get(label)]
+    assert not changed, "\n\n".join(_diff(dialect, version, label, plans[label]) for label in changed)
@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from ..contactpr import events, models
+from ..contactpr.bloom import BloomFilter
+from ..contactpr.cache import DatabaseGenerations
+from ..contactpr.revocation import RevocationFilter
+from ..repository import queries, refresh_tokens
+
+LIFETIME = timedelta(days=1)
+
+
+@pytest.fixture()
+def db_session():
+    engine = create_engine("sqlite:///:memory:")
+    models.Base.metadata.create_all(engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    session.add(models.User(id=1, email="owner@example.com", hashed_password="x"))
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_only_token_digests_are_stored(db_session: Session):
+    token, row = refresh_tokens.issue_refresh_token(db_session, 1, LIFETIME)
+    assert row.token_hash == refresh_tokens.hash_token(token)
+    assert token not in row.token_hash
+    assert queries.refresh_token_by_hash(db_session, row.token_hash) is row
+
+
+def test_rotation_keeps_the_family_and_detects_reuse(db_session: Session):
+    first, first_row = refresh_tokens.issue_refresh_token(db_session, 1, LIFETIME)
+    second, second_row = refresh_tokens.rotate_refresh_token(db_session, first, LIFETIME)
+    assert second != first
+    assert second_row.family_id == first_row.family_id
+    assert not queries.family_revoked(db_session, first_row.family_id)
+
+    with pytest.raises(refresh_tokens.RefreshTokenReuse) as reuse:
+        refresh_tokens.rotate_refresh_token(db_session, first, LIFETIME)
+    assert (reuse.value.user_id, reuse.value.family_id) == (1, first_row.family_id)
+    assert queries.family_revoked(db_session, first_row.family_id)
+    # the legitimate successor is revoked together with the stolen token
+    with pytest.raises(refresh_tokens.InvalidRefreshToken):
+        refresh_tokens.rotate_refresh_token(db_session, second, LIFETIME)
+
+
+def test_unknown_expired_and_logged_out_tokens_are_rejected(db_session: Session):
+    with pytest.raises(refresh_tokens.InvalidRefreshToken):
+        refresh_tokens.rotate_refresh_token(db_session, "unknown", LIFETIME)
+
+    expired, _ = refresh_tokens.issue_refresh_token(db_session, 1, timedelta(seconds=-1))
+    with pytest.raises(refresh_tokens.InvalidRefreshToken):
+        refresh_tokens.rotate_refresh_token(db_session, expired, LIFETIME)
+    assert refresh_tokens.purge_expired_refresh_tokens(db_session) == 1
+
+    token, row = refresh_tokens.issue_refresh_token(db_session, 1, LIFETIME)
+    assert refresh_tokens.revoke_token(db_session, token) is row
+    assert refresh_tokens.revoked_families_since(db_session, datetime.utcnow() - timedelta(minutes=1)) == [row.family_id]
+    with pytest.raises(refresh_tokens.InvalidRefreshToken):
+        refresh_tokens.rotate_refresh_token(db_session, token, LIFETIME)
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, 0.01, (f"family-{i}" for i in range(1000)))
+    assert all(f"family-{i}" in bloom for i in range(1000))
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_revocation_filter_confirms_hits_and_survives_reload():
+    revoked = RevocationFilter(100, 0.001)
+    confirmations = []
+
+    def confirm():
+        confirmations.append(1)
+        return True
+
+    assert not revoked.is_revoked("a", confirm)
+    assert confirmations == []
+
+    revoked.on_change({"type": "auth.revoked", "owner_id": 1, "family_id": "a"})
+    assert revoked.is_revoked("a", confirm)
+
+    def load():
+        # a revocation arriving while the filter is rebuilt is not lost
+        revoked.add("b")
+        return ["c"]
+
+    revoked.reload(load)
+    assert not revoked.is_revoked("a", lambda: False)
+    assert revoked.is_revoked("b", confirm) and revoked.is_revoked("c", confirm)
+    assert revoked.stats()["confirmed"] == 3
+
+
+def test_revocations_reach_other_workers_through_the_watermark(monkeypatch):
+    monkeypatch.setattr(events.settings, "web_workers", 4)
+    monkeypatch.setattr(events.settings, "events_redis_url", "")
+    assert not events.reach_every_worker()
+    monkeypatch.setattr(events.settings, "events_redis_url", "redis://localhost:6379/1")
+    assert events.reach_every_worker()
+
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(engine)
+    revoked_in_database = []
+    load = lambda: list(revoked_in_database)
+    here = RevocationFilter(100, 0.001, DatabaseGenerations(engine, ttl=0), load)
+    elsewhere = RevocationFilter(100, 0.001, DatabaseGenerations(engine, ttl=0), load)
+    confirmations = []
+
+    def confirm():
+        confirmations.append(1)
+        return True
+
+    assert not elsewhere.is_revoked("revoked-here", confirm)
+    # the worker that served /logout published the event only to itself
+    revoked_in_database.append("revoked-here")
+    here.on_change({"type": "auth.revoked", "owner_id": 1, "family_id": "revoked-here"})
+    assert elsewhere.is_revoked("revoked-here", confirm)
+    # valid tokens are still answered by the filter alone
+    assert not elsewhere.is_revoked("valid", confirm)
+    assert confirmations == [1]
@@ -1,40 +1,171 @@
-from fastapi.testclient import TestClient
-from ..main import app
-from ..contactpr.database import engine, SessionLocal, get_db
-
-
-client = TestClient(app)
-
-def override_get_db():
-    try:
-        db = SessionLocal()
-        yield db
-    finally:
-        db.close()
-
-app.dependency_overrides[get_db] = override_get_db
-
-def test_create_contact():
-    # Arrange
-    contact_data = {
-        "first_name": "John",
-        "last_name": "Doe",
-        "email": "john.doe@example.com",
-        "phone_number": "1234567890",
-        "birthday": "1990-01-01",
-        "additional_data": "Additional info"
-    }
-    
-    # Act
-    response = client.post("/contacts/", json=contact_data)
-    created_contact = response.json()
-    
-    # Assert
-    assert response.status_code == 200
-    assert created_contact["first_name"] == contact_data["first_name"]
-    assert created_contact["last_name"] == contact_data["last_name"]
-    assert created_contact["email"] == contact_data["email"]
-    assert created_contact["phone_number"] == contact_data["phone_number"]
-    assert created_contact["birthday"] == contact_data["birthday"]
-    assert created_contact["additional_data"] == contact_data["additional_data"]
-
+import asyncio
+from fastapi.testclient import TestClient
+from ..main import app
+from ..contactpr.database import engine, SessionLocal, get_db, get_read_db
+from ..contactpr.models import User
+from .. import auth
+from ..contactpr import events, routes
+from ..auth import create_jwt_token, get_current_user
+
+
+client = TestClient(app)
+
+def override_get_db():
+    try:
+        db = SessionLocal()
+        yield db
+    finally:
+        db.close()
+
+def override_get_current_user():
+    return User(id=1, email="owner@example.com", confirmed=True)
+
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+def test_create_contact():
+    # Arrange
+    contact_data = {
+        "first_name": "John",
+        "last_name": "Doe",
+        "email": "john.doe@example.com",
+        "phone_number": "1234567890",
+        "birthday": "1990-01-01",
+        "additional_data": "Additional info"
+    }
+    
+    # Act
+    response = client.post("/contacts/", json=contact_data)
+    created_contact = response.json()
+    
+    # Assert
+    assert response.status_code == 200
+    assert created_contact["first_name"] == contact_data["first_name"]
+    assert created_contact["last_name"] == contact_data["last_name"]
+    assert created_contact["email"] == contact_data["email"]
+    assert created_contact["phone_number"] == contact_data["phone_number"]
+    assert created_contact["birthday"] == contact_data["birthday"]
+    assert created_contact["additional_data"] == {"note": contact_data["additional_data"]}
+
+
+def test_batch_requests():
+    # Arrange
+    batch = {"requests": [
+        {"id": "profile", "path": "/users/profile/"},
+        {"id": "contacts", "path": "/contacts/?fields=id,first_name"},
+        {"id": "missing", "path": "/contacts/999999"},
+        {"id": "stream", "path": "/contacts/stream/"},
+    ]}
+
+    # Act
+    response = client.post("/batch", json=batch)
+    results = {item["id"]: item for item in response.json()["responses"]}
+
+    # Assert
+    assert response.status_code == 200
+    assert results["profile"]["status"] == 200
+    assert results["profile"]["body"]["email"] == "owner@example.com"
+    assert results["contacts"]["status"] == 200
+    assert all(set(contact) <= {"id", "first_name"} for contact in results["contacts"]["body"])
+    assert results["missing"]["status"] == 404
+    assert results["stream"]["status"] == 400
+
+
+def test_batch_authenticates_once_with_a_real_token(monkeypatch):
+    # Arrange
+    db = SessionLocal()
+    if db.query(User).filter(User.email == "batch.owner@example.com").first() is None:
+        db.add(User(email="batch.owner@example.com", hashed_password="x", confirmed=True))
+        db.commit()
+    db.close()
+    monkeypatch.delitem(app.dependency_overrides, get_current_user)
+    lookups = []
+    user_by_email = auth.queries.user_by_email
+    monkeypatch.setattr(auth.queries, "user_by_email", lambda db, email: lookups.append(email) or user_by_email(db, email))
+    token = create_jwt_token({"sub": "batch.owner@example.com"})
+    batch = {"requests": [
+        {"id": "profile", "path": "/users/profile/"},
+        {"id": "contacts", "path": "/contacts/?fields=id"},
+    ]}
+
+    # Act
+    response = client.post("/batch", json=batch, headers={"Authorization": f"Bearer {token}"})
+    unauthenticated = client.post("/batch", json=batch)
+    results = {item["id"]: item for item in response.json()["responses"]}
+
+    # Assert
+    assert response.status_code == 200
+    assert results["profile"]["status"] == 200
+    assert results["profile"]["body"]["email"] == "batch.owner@example.com"
+    assert results["contacts"]["status"] == 200
+    # the sub-requests reuse the user of the batch instead of decoding the token again
+    assert lookups == ["batch.owner@example.com"]
+    assert unauthenticated.status_code == 401
+
+
+def test_avatar_update_reaches_the_users_subscriptions(monkeypatch):
+    # Arrange
+    db = SessionLocal()
+    user = db.query(User).filter(User.email == "avatar.owner@example.com").first()
+    if user is None:
+        user = User(email="avatar.owner@example.com", hashed_password="x", confirmed=True)
+        db.add(user)
+        db.commit()
+    user_id = user.id
+    db.close()
+    monkeypatch.setitem(app.dependency_overrides, get_current_user,
+                        lambda: User(id=user_id, email="avatar.owner@example.com", confirmed=True))
+    uploads = []
+    monkeypatch.setattr(routes.cloudinary.uploader, "upload",
+                        lambda file, public_id, overwrite: uploads.append(public_id) or {"version": 3})
+
+    async def scenario():
+        subscription = events.broker.subscribe(user_id)
+        try:
+            response = await asyncio.to_thread(client.patch, "/avatar", files={"file": ("me.png", b"png")})
+            return response, await subscription.get(1)
+        finally:
+            events.broker.unsubscribe(subscription)
+
+    # Act
+    response, event = asyncio.run(scenario())
+
+    # Assert
+    assert response.status_code == 200
+    assert uploads == [f"NotesApp/{user_id}"]
+    assert event["type"] == "user.avatar"
+    assert event["user"]["avatar_url"] == response.json()["avatar_url"]
+    assert f"NotesApp/{user_id}" in event["user"]["avatar_url"]
+
+
+def test_signup_retry_with_idempotency_key_creates_one_user(monkeypatch):
+    # Arrange
+    sent = []
+
+    async def fake_send_email(email, username, host):
+        sent.append(email)
+
+    monkeypatch.setattr(routes, "send_email", fake_send_email)
+    db = SessionLocal()
+    db.query(User).filter(User.email == "signup.retry@example.com").delete()
+    db.commit()
+    db.close()
+    body = {"email": "signup.retry@example.com", "password": "secret"}
+    headers = {"Idempotency-Key": "signup-retry-1"}
+
+    # Act
+    first = client.post("/signup", json=body, headers=headers)
+    retry = client.post("/signup", json=body, headers=headers)
+    without_key = client.post("/signup", json=body)
+
+    # Assert
+    assert first.status_code == retry.status_code == 201
+    assert first.json()["user"]["email"] == "signup.retry@example.com"
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert without_key.status_code == 409
+    assert sent == ["signup.retry@example.com"]
+    db = SessionLocal()
+    assert db.query(User).filter(User.email == "signup.retry@example.com").count() == 1
+    db.close()
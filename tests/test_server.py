@@ -0,0 +1,64 @@
+import asyncio
+import signal
+import time
+import pytest
+from ..server import pool_size_per_worker, settings, worker_count
+from ..contactpr import background_tasks
+
+
+@pytest.fixture(autouse=True)
+def fresh_shutdown_clock(monkeypatch):
+    monkeypatch.setattr(background_tasks, "_shutdown_deadline", None)
+
+
+def test_connection_budget_is_split_between_workers(monkeypatch):
+    monkeypatch.setattr(settings, "db_max_connections", 90)
+    assert pool_size_per_worker(4) == 22
+    assert pool_size_per_worker(90) == 1
+    assert pool_size_per_worker(200) == 1
+
+
+def test_worker_count_defaults_to_cpu_cores(monkeypatch):
+    monkeypatch.setattr(settings, "web_concurrency", 3)
+    assert worker_count() == 3
+    monkeypatch.setattr(settings, "web_concurrency", 0)
+    assert worker_count() >= 1
+
+
+def test_exit_signal_starts_the_shutdown_clock():
+    handled = []
+    # stands in for the handler uvicorn installs for SIGTERM
+    original = signal.signal(signal.SIGUSR2, lambda received, frame: handled.append(received))
+    try:
+        background_tasks.watch_exit_signals(30, [signal.SIGUSR2])
+        signal.raise_signal(signal.SIGUSR2)
+        # uvicorn spent 20s closing connections; the drain gets what is left
+        background_tasks._shutdown_deadline -= 20
+        assert handled == [signal.SIGUSR2]
+        assert 8.5 < background_tasks.shutdown_time_left(30) <= 9.0
+        signal.raise_signal(signal.SIGUSR2)
+        assert background_tasks.shutdown_time_left(30) <= 9.0
+    finally:
+        signal.signal(signal.SIGUSR2, original)
+
+
+def test_drain_uses_what_is_left_of_the_budget():
+    background_tasks.begin_shutdown(1.2)
+
+    @background_tasks.track
+    async def slow_email():
+        await asyncio.sleep(5)
+
+    async def scenario():
+        task = asyncio.ensure_future(slow_email())
+        await asyncio.sleep(0)
+        started = time.monotonic()
+        flushed = await background_tasks.drain(background_tasks.shutdown_time_left(30, margin=1.0))
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return flushed, time.monotonic() - started
+
+    flushed, waited = asyncio.run(scenario())
+    assert not flushed
+    assert waited < 0.5
+    assert background_tasks.in_flight() == 0
@@ -0,0 +1,69 @@
+import threading
+import time
+import pytest
+from ..contactpr.singleflight import SingleFlight
+
+
+def run_concurrently(count, target):
+    results, errors = [], []
+
+    def worker():
+        try:
+            results.append(target())
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight(timeout=5)
+    calls = []
+
+    def load():
+        calls.append(1)
+        time.sleep(0.1)
+        return [1, 2, 3]
+
+    results, errors = run_concurrently(8, lambda: flights.do("birthdays", load))
+    assert len(calls) == 1
+    assert results == [[1, 2, 3]] * 8 and errors == []
+    assert flights.stats() == {"executions": 1, "coalesced": 7, "timeouts": 0, "errors": 0, "in_flight": 0}
+
+
+def test_errors_propagate_to_waiters():
+    flights = SingleFlight(timeout=5)
+
+    def load():
+        time.sleep(0.1)
+        raise ValueError("database is down")
+
+    results, errors = run_concurrently(4, lambda: flights.do("search:jo", load))
+    assert results == []
+    assert len(errors) == 4 and all(isinstance(error, ValueError) for error in errors)
+    assert flights.errors == 1
+
+
+def test_waiter_runs_itself_after_timeout():
+    flights = SingleFlight(timeout=0.05)
+    release = threading.Event()
+    leader = threading.Thread(target=lambda: flights.do("key", lambda: release.wait(2)))
+    leader.start()
+    time.sleep(0.02)
+    assert flights.do("key", lambda: "fallback") == "fallback"
+    assert flights.timeouts == 1
+    release.set()
+    leader.join()
+
+
+def test_sequential_calls_are_not_coalesced():
+    flights = SingleFlight(timeout=1)
+    assert flights.do("key", lambda: 1) == 1
+    assert flights.do("key", lambda: 2) == 2
+    with pytest.raises(KeyError):
+        flights.do("key", lambda: {}["missing"])
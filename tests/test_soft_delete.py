@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, sessionmaker
+from ..contactpr import models
+from ..repository import queries, soft_delete, sync as repository_sync
+
+
+@pytest.fixture()
+def db_session():
+    engine = create_engine("sqlite:///:memory:")
+    models.Base.metadata.create_all(engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    session.add(models.User(id=1, email="owner@example.com", hashed_password="x"))
+    session.commit()
+    yield session
+    session.close()
+
+
+def add_contact(db: Session, name: str) -> models.Contact:
+    contact = models.Contact(first_name=name, last_name="Doe", email=f"{name}@example.com",
+                             phone_number="1", owner_id=1)
+    contact.change_seq = repository_sync.next_change_seq(db, 1)
+    db.add(contact)
+    db.commit()
+    return contact
+
+
+def test_soft_deleted_contacts_are_hidden_and_restorable(db_session: Session):
+    contact = add_contact(db_session, "john")
+    add_contact(db_session, "jane")
+    soft_delete.soft_delete_contact(db_session, contact)
+
+    assert queries.contact_by_id(db_session, contact.id) is None
+    assert [c.first_name for c in queries.contacts_by_owner(db_session, 1)] == ["jane"]
+    assert queries.deleted_contact_by_id(db_session, contact.id) is contact
+
+    assert soft_delete.restore_contact(db_session, contact, timedelta(hours=1))
+    assert queries.contact_by_id(db_session, contact.id) is contact
+    changed, deleted, _, _ = repository_sync.get_changes(db_session, 1, 2, 10)
+    assert [c.id for c in changed] == [contact.id] and deleted == []
+
+
+def test_restore_respects_undo_window_and_email_reuse(db_session: Session):
+    contact = add_contact(db_session, "john")
+    soft_delete.soft_delete_contact(db_session, contact)
+    assert not soft_delete.restore_contact(db_session, contact, timedelta(seconds=-1))
+
+    add_contact(db_session, "john")
+    with pytest.raises(IntegrityError):
+        soft_delete.restore_contact(db_session, contact, timedelta(hours=1))
+
+
+def test_purge_removes_expired_rows_in_batches(db_session: Session):
+    contacts = [add_contact(db_session, f"c{number}") for number in range(7)]
+    for contact in contacts[:5]:
+        soft_delete.soft_delete_contact(db_session, contact)
+    contacts[0].deleted_at = datetime.utcnow() + timedelta(hours=1)
+    db_session.commit()
+
+    assert soft_delete.purge_deleted_contacts(db_session, timedelta(0), batch_size=2, max_batches=1) == 2
+    assert soft_delete.purge_deleted_contacts(db_session, timedelta(0), batch_size=2) == 2
+    remaining = db_session.query(models.Contact).count()
+    assert remaining == 3
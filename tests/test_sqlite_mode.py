@@ -0,0 +1,80 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from ..contactpr import models
+from ..contactpr.database import RoutingSession, create_sqlite_engines, is_sqlite_file
+from ..repository import queries, sync as repository_sync
+
+
+@pytest.fixture()
+def engines(tmp_path):
+    writer, reader = create_sqlite_engines(f"sqlite:///{tmp_path / 'contacts.db'}", 2, 5)
+    models.Base.metadata.create_all(writer)
+    yield writer, reader
+    writer.dispose()
+    reader.dispose()
+
+
+@pytest.fixture()
+def db_session(engines):
+    writer, reader = engines
+    session = sessionmaker(class_=RoutingSession, bind=writer, reader=reader, autoflush=False)()
+    session.add(models.User(id=1, email="owner@example.com", hashed_password="x"))
+    session.commit()
+    yield session
+    session.close()
+
+
+def add_contact(db, first_name, last_name, email):
+    contact = models.Contact(first_name=first_name, last_name=last_name, email=email, phone_number="1", owner_id=1)
+    db.add(contact)
+    db.commit()
+    return contact
+
+
+def test_only_file_databases_use_the_sqlite_mode():
+    assert is_sqlite_file("sqlite:///./contacts.db")
+    assert not is_sqlite_file("sqlite://")
+    assert not is_sqlite_file("sqlite:///:memory:")
+    assert not is_sqlite_file("postgresql://user@localhost/contacts")
+
+
+def test_connections_use_wal_and_readers_are_read_only(engines):
+    writer, reader = engines
+    with writer.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert connection.exec_driver_sql("PRAGMA synchronous").scalar() == 1
+    with reader.connect() as connection:
+        with pytest.raises(OperationalError):
+            connection.exec_driver_sql("DELETE FROM users")
+
+
+def test_selects_go_to_readers_until_the_transaction_writes(db_session, engines):
+    writer, reader = engines
+    contact = add_contact(db_session, "John", "Doe", "john@example.com")
+    assert db_session.get_bind(clause=queries.CONTACT_BY_ID) is reader
+
+    repository_sync.next_change_seq(db_session, 1)
+    assert db_session.writing
+    assert db_session.get_bind(clause=queries.CONTACT_BY_ID) is writer
+    db_session.commit()
+    assert not db_session.writing
+    assert queries.contact_by_id(db_session, contact.id) is contact
+
+
+def test_search_uses_the_trigram_index(db_session):
+    john = add_contact(db_session, "John", "Doe", "john@example.com")
+    add_contact(db_session, "Jane", "Smith", "jane@example.com")
+    statement, _ = queries.search_statement(db_session, "OHN")
+    assert statement is queries.SEARCH_CONTACTS_FTS
+    assert queries.search_contacts(db_session, "OHN") == [john]
+    assert {c.first_name for c in queries.search_contacts(db_session, "example")} == {"John", "Jane"}
+
+    john.first_name = "Jonathan"
+    db_session.commit()
+    assert queries.search_contacts(db_session, "john") == [john]
+    assert queries.search_contacts(db_session, "athan") == [john]
+
+    # short queries cannot use trigrams and fall back to LIKE
+    assert queries.search_statement(db_session, "jo")[0] is queries.SEARCH_CONTACTS
+    assert queries.search_contacts(db_session, "jo") == [john]
@@ -0,0 +1,94 @@
+from datetime import date, timedelta
+import pytest
+from sqlalchemy import create_engine, event, update
+from sqlalchemy.orm import Session, sessionmaker
+from ..contactpr import models
+from ..contactpr.database import RoutingSession, create_sqlite_engines
+from ..repository import soft_delete, stats
+
+
+@pytest.fixture()
+def db_session():
+    engine = create_engine("sqlite:///:memory:")
+    models.Base.metadata.create_all(engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    session.add_all([models.User(id=1, email="owner@example.com", hashed_password="x"),
+                     models.User(id=2, email="other@example.com", hashed_password="x")])
+    session.commit()
+    yield session
+    session.close()
+
+
+def add_contact(db: Session, email: str, birthday=None, owner_id: int = 1) -> models.Contact:
+    contact = models.Contact(first_name="John", last_name="Doe", email=email, phone_number="1",
+                             birthday=birthday, owner_id=owner_id)
+    db.add(contact)
+    db.commit()
+    return contact
+
+
+def test_writes_update_the_counters(db_session: Session):
+    john = add_contact(db_session, "john@Example.com", date(1990, 3, 1))
+    add_contact(db_session, "jane@example.com", date(1991, 3, 9))
+    add_contact(db_session, "bob@other.org")
+    add_contact(db_session, "someone@example.com", owner_id=2)
+
+    result = stats.contact_stats(db_session, 1)
+    assert result["total"] == 3
+    assert result["birthdays_by_month"][3] == 2
+    assert result["top_email_domains"] == [{"domain": "example.com", "count": 2}, {"domain": "other.org", "count": 1}]
+
+    db_session.expire_all()
+    john.email = "john@other.org"
+    john.birthday = date(1990, 12, 1)
+    db_session.commit()
+    result = stats.contact_stats(db_session, 1, top_domains=1)
+    assert result["birthdays_by_month"][3] == 1 and result["birthdays_by_month"][12] == 1
+    assert result["top_email_domains"] == [{"domain": "other.org", "count": 2}]
+
+    soft_delete.soft_delete_contact(db_session, john)
+    assert stats.contact_stats(db_session, 1)["total"] == 2
+    soft_delete.restore_contact(db_session, john, timedelta(hours=1))
+    assert stats.contact_stats(db_session, 1)["total"] == 3
+    db_session.delete(john)
+    db_session.commit()
+    assert stats.contact_stats(db_session, 1)["birthdays_by_month"][12] == 0
+    assert stats.contact_stats(db_session, 2)["total"] == 1
+
+
+def test_reconciliation_repairs_drift(db_session: Session):
+    add_contact(db_session, "john@example.com", date(1990, 3, 1))
+    add_contact(db_session, "jane@example.com", owner_id=2)
+    expected = [stats.contact_stats(db_session, owner_id) for owner_id in (1, 2)]
+
+    # Core statements bypass the flush hook
+    db_session.execute(update(models.Contact).where(models.Contact.owner_id == 1).values(birthday=date(1990, 7, 1)))
+    db_session.execute(update(models.ContactStat).where(models.ContactStat.owner_id == 2).values(count=5))
+    db_session.commit()
+
+    assert stats.reconcile_contact_stats(db_session, batch_size=1) == 4
+    assert stats.contact_stats(db_session, 1)["birthdays_by_month"][7] == 1
+    assert stats.contact_stats(db_session, 1)["birthdays_by_month"][3] == 0
+    assert stats.contact_stats(db_session, 2) == expected[1]
+    assert stats.reconcile_contact_stats(db_session, batch_size=1) == 0
+
+
+def test_reconciliation_counts_in_the_writer_transaction(tmp_path):
+    writer, reader = create_sqlite_engines(f"sqlite:///{tmp_path / 'contacts.db'}", 2, 5)
+    models.Base.metadata.create_all(writer)
+    db = sessionmaker(class_=RoutingSession, bind=writer, reader=reader, autoflush=False)()
+    db.add(models.User(id=1, email="owner@example.com", hashed_password="x"))
+    db.commit()
+    add_contact(db, "john@example.com", date(1990, 3, 1))
+    db.execute(update(models.ContactStat).values(count=7))
+    db.commit()
+    reads = []
+    event.listen(reader, "before_cursor_execute", lambda *args: reads.append(args[2]))
+
+    # the counters and the contacts are read under the writer lock, not from the reader pool
+    assert stats.reconcile_owners(db, [1]) == 3
+    assert reads == []
+    assert stats.contact_stats(db, 1)["total"] == 1
+    db.close()
+    writer.dispose()
+    reader.dispose()
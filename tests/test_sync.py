@@ -0,0 +1,88 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from ..contactpr.models import Base, Contact, User, ContactTombstone
+from ..repository import sync as repository_sync
+import pytest
+
+
+@pytest.fixture()
+def db_session():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    session = SessionLocal()
+    session.add(User(id=1, email="owner@example.com", hashed_password="x"))
+    session.commit()
+    yield session
+    session.close()
+
+
+def add_contact(db: Session, name: str) -> Contact:
+    contact = Contact(first_name=name, last_name="Doe", email=f"{name}@example.com", phone_number="1", owner_id=1)
+    contact.change_seq = repository_sync.next_change_seq(db, 1)
+    db.add(contact)
+    db.commit()
+    return contact
+
+
+def test_sync_token_roundtrip():
+    token = repository_sync.encode_sync_token(1, 42)
+    assert repository_sync.decode_sync_token(token, 1) == 42
+    assert repository_sync.decode_sync_token(token, 2) is None
+    assert repository_sync.decode_sync_token("garbage", 1) is None
+
+
+def test_get_changes_paginates_and_reports_deletions(db_session: Session):
+    first = add_contact(db_session, "john")
+    add_contact(db_session, "jane")
+    add_contact(db_session, "jack")
+    repository_sync.record_tombstone(db_session, first)
+    db_session.delete(first)
+    db_session.commit()
+
+    changed, deleted, next_seq, has_more = repository_sync.get_changes(db_session, 1, 0, 2)
+    assert [c.first_name for c in changed] == ["jane", "jack"]
+    assert deleted == []
+    assert has_more
+
+    changed, deleted, next_seq, has_more = repository_sync.get_changes(db_session, 1, next_seq, 2)
+    assert changed == []
+    assert deleted == [first.id]
+    assert not has_more
+
+    assert repository_sync.get_changes(db_session, 1, next_seq, 2) == ([], [], next_seq, False)
+
+
+def test_compacted_tombstones_invalidate_old_tokens(db_session: Session):
+    contact = add_contact(db_session, "john")
+    repository_sync.record_tombstone(db_session, contact)
+    db_session.delete(contact)
+    db_session.commit()
+
+    assert repository_sync.compact_tombstones(db_session, timedelta(seconds=-1)) == 1
+    assert db_session.query(ContactTombstone).count() == 0
+    with pytest.raises(repository_sync.StaleSyncToken):
+        repository_sync.get_changes(db_session, 1, 0, 10)
+
+
+def test_concurrent_first_writes_share_the_sync_state(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sync.db'}", connect_args={"timeout": 5})
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with SessionLocal() as session:
+        session.add(User(id=1, email="owner@example.com", hashed_password="x"))
+        session.commit()
+    first, second = SessionLocal(), SessionLocal()
+    # the first writer has not committed yet when the second one starts
+    assert repository_sync.next_change_seq(first, 1) == 1
+    with ThreadPoolExecutor(1) as pool:
+        pending = pool.submit(lambda: (repository_sync.next_change_seq(second, 1), second.commit()))
+        time.sleep(0.1)
+        first.commit()
+        seq, _ = pending.result()
+    assert seq == 2
+    first.close()
+    second.close()
@@ -0,0 +1,89 @@
+import random
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from ..contactpr import models
+from ..contactpr.bitmap import RoaringBitmap
+from ..contactpr.tags import TagIndex, parse_tags
+from ..repository import queries, tags as repository_tags
+
+
+def test_bitmap_operations_match_sets():
+    rng = random.Random(7)
+    a_values = {rng.randrange(300000) for _ in range(20000)}
+    b_values = set(range(60000, 140000, 3))
+    a, b = RoaringBitmap(a_values), RoaringBitmap(b_values)
+    assert set(a & b) == a_values & b_values
+    assert set(a | b) == a_values | b_values
+    assert set(a - b) == a_values - b_values
+    assert len(b) == len(b_values)
+    assert 60003 in b and 60004 not in b
+
+
+def test_bitmap_add_discard_converts_containers():
+    bitmap = RoaringBitmap()
+    for value in range(5000):
+        bitmap.add(value)
+    assert len(bitmap) == 5000
+    for value in range(0, 5000, 2):
+        bitmap.discard(value)
+    assert list(bitmap) == list(range(1, 5000, 2))
+
+
+def make_index():
+    return TagIndex([1, 2, 3, 4], [("family", 1), ("family", 2), ("work", 2), ("work", 3), ("vip", 3)])
+
+
+def test_tag_queries():
+    index = make_index()
+    assert list(index.query(all_tags=["family", "work"])) == [2]
+    assert list(index.query(any_tags=["family", "vip"])) == [1, 2, 3]
+    assert list(index.query(exclude_tags=["work"])) == [1, 4]
+    assert list(index.query(all_tags=["unknown"])) == []
+    assert index.counts() == {"family": 2, "vip": 1, "work": 2}
+
+
+def test_apply_events():
+    index = make_index()
+    index.apply({"type": "contact.tags", "contact_id": 1, "tags": ["work"]})
+    index.apply({"type": "contact.created", "contact_id": 5})
+    index.apply({"type": "contact.deleted", "contact_id": 3})
+    index.apply({"type": "contact.updated", "contact_id": 2})
+    assert list(index.query(all_tags=["work"])) == [1, 2]
+    assert list(index.query(exclude_tags=["family"])) == [1, 4, 5]
+    assert index.counts() == {"family": 1, "work": 2}
+    assert index.cost() == 4 + 3
+
+
+def test_parse_tags():
+    assert parse_tags(" Work,family,,WORK ") == ["family", "work"]
+    assert parse_tags(None) == []
+
+
+def test_tag_created_concurrently_is_reused(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'tags.db'}")
+    models.Base.metadata.create_all(engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db, other = Session(), Session()
+    db.add(models.User(id=1, email="owner@example.com", hashed_password="x"))
+    contact = models.Contact(first_name="John", last_name="Doe", email="john@example.com", phone_number="1",
+                             owner_id=1)
+    db.add(contact)
+    db.commit()
+
+    lookups, lookup = [], queries.tags_by_names
+
+    def tags_by_names(session, owner_id, names):
+        lookups.append(names)
+        if len(lookups) == 1:
+            # another request creates the same new tag right after this one looked it up
+            other.add(models.Tag(owner_id=1, name="family"))
+            other.commit()
+            return []
+        return lookup(session, owner_id, names)
+
+    monkeypatch.setattr(queries, "tags_by_names", tags_by_names)
+    assert repository_tags.set_contact_tags(db, contact, ["Family", "work"]) == ["family", "work"]
+    assert sorted(tag.name for tag in contact.tags) == ["family", "work"]
+    assert db.query(models.Tag).count() == 2
+    db.close()
+    other.close()
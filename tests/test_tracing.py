@@ -0,0 +1,19 @@
+from sqlalchemy import create_engine
+from ..contactpr import tracing
+
+
+def test_disabled_tracing_is_a_no_op():
+    def handler(value):
+        return value * 2
+
+    assert not tracing.enabled()
+    assert tracing.traced("handler")(handler) is handler
+    with tracing.span("password.hash", user=1) as span:
+        assert span is None
+    assert tracing.span("a") is tracing.span("b")
+
+
+def test_disabled_tracing_installs_no_engine_listeners():
+    engine = create_engine("sqlite://")
+    tracing.instrument_engine(engine)
+    assert not engine.dispatch.before_cursor_execute